@@ -0,0 +1,75 @@
+"""
+Compares the results of two benchmark runs, e.g., of the current and the previous revision
+
+    PYTHONPATH=. python -m benchmarks.compare baseline.json results.json --threshold 0.2
+
+Prints the relative change of the ingestion throughput and of the median query latencies. The exit code is 1, in case
+any measurement regressed by more than the threshold.
+"""
+
+import argparse
+import json
+import sys
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> tuple[list[str], list[str]]:
+    """
+    Compares the measurements, which are available in both results
+
+    :param baseline: The reference results
+    :param current: The results to check
+    :param threshold: The tolerated relative regression, e.g., 0.2 for 20%
+    :return: The report lines and the regressions
+    """
+
+    lines, regressions = [], []
+
+    def report(name: str, before: float, after: float, unit: str, higher_is_better: bool):
+        change = (after - before) / before if before > 0 else 0.0
+        regression = -change if higher_is_better else change
+        line = f"{name:<60} {before:>12.1f} {after:>12.1f} {unit:<6} {change:>+8.1%}"
+        lines.append(line)
+        if regression > threshold:
+            regressions.append(line)
+
+    baseline_ingestion = {(r["table"], r["path"]): r for r in baseline["ingestion"]}
+    for r in current["ingestion"]:
+        if (r["table"], r["path"]) in baseline_ingestion:
+            report(f"ingestion {r['table']} via {r['path']}",
+                   baseline_ingestion[(r["table"], r["path"])]["rows_per_second"], r["rows_per_second"], "rows/s",
+                   higher_is_better=True)
+
+    baseline_queries = {(r["query"], r["role"]): r for r in baseline["queries"]}
+    for r in current["queries"]:
+        if (r["query"], r["role"]) in baseline_queries:
+            report(f"query {r['query']} as {r['role']}", baseline_queries[(r["query"], r["role"])]["median_ms"],
+                   r["median_ms"], "ms", higher_is_better=False)
+
+    return lines, regressions
+
+
+def main():
+    """Parses the arguments and prints the comparison"""
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline", help="The JSON results of the reference run")
+    parser.add_argument("current", help="The JSON results to check")
+    parser.add_argument("--threshold", type=float, default=0.2, help="The tolerated relative regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    print(f"Comparing revision {baseline['environment']['revision']} to {current['environment']['revision']}")
+    lines, regressions = compare(baseline, current, args.threshold)
+    print("\n".join(lines))
+    if len(regressions) > 0:
+        print(f"\n{len(regressions)} measurements regressed by more than {args.threshold:.0%}:")
+        print("\n".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
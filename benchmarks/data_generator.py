@@ -0,0 +1,192 @@
+"""
+Generates reproducible synthetic time series for the benchmarks
+
+The data points of the benchmarks are identified by the data provider "rdp_benchmark" and are removed again before and
+after each run. Unitemporal series are sampled at a fixed rate. Bitemporal series consist of forecast runs, which are
+issued at a fixed interval and cover a fixed horizon at the same sampling rate.
+"""
+
+import dataclasses
+import datetime
+import json
+import random
+
+import sqlalchemy as sql
+
+benchmark_provider = "rdp_benchmark"
+
+type_names = ["double", "bigint", "boolean", "jsonb"]
+temporalities = ["unitemporal", "bitemporal"]
+
+# The eight raw tables as (temporality, type_name)
+raw_tables = [(temporality, type_name) for temporality in temporalities for type_name in type_names]
+
+# The array types used to pass a batch of samples at once
+_array_types = dict(double="DOUBLE PRECISION[]", bigint="BIGINT[]", boolean="BOOLEAN[]", jsonb="JSONB[]")
+
+
+@dataclasses.dataclass
+class GeneratorConfig:
+    """The shape of the synthetic data set"""
+
+    data_points: int = 10  # Per raw table and write path
+    days: float = 2.0  # Covered period of the unitemporal series and of the forecast issue times
+    sampling_interval: datetime.timedelta = datetime.timedelta(minutes=15)
+    issue_interval: datetime.timedelta = datetime.timedelta(hours=6)
+    horizon: datetime.timedelta = datetime.timedelta(days=1)
+    batch_size: int = 1000
+    seed: int = 42
+    end: datetime.datetime = None  # Defaults to the last midnight, such that repeated runs are comparable
+
+    def __post_init__(self):
+        if self.end is None:
+            today = datetime.datetime.now(datetime.timezone.utc).date()
+            self.end = datetime.datetime.combine(today, datetime.time(), tzinfo=datetime.timezone.utc)
+
+    @property
+    def begin(self) -> datetime.datetime:
+        """The begin of the generated period"""
+
+        return self.end - datetime.timedelta(days=self.days)
+
+    def to_dict(self) -> dict:
+        """Returns the configuration as JSON-serializable dict"""
+
+        config = dataclasses.asdict(self)
+        config.update(
+            sampling_interval=str(self.sampling_interval), issue_interval=str(self.issue_interval),
+            horizon=str(self.horizon), end=self.end.isoformat()
+        )
+        return config
+
+
+def get_series_key(path: str, temporality: str, type_name: str, index: int) -> dict[str, str]:
+    """Returns the identifying attributes of a benchmark data point"""
+
+    return dict(name=f"{path}_{index}", device_id=f"{temporality}_{type_name}", location_code="benchmark",
+                data_provider=benchmark_provider)
+
+
+def create_data_points(con: sql.Connection, config: GeneratorConfig, path: str, temporality: str,
+                       type_name: str) -> list[int]:
+    """
+    Creates the data points of one write path and raw table. Every second data point is public.
+
+    :param con: The connection of the data source user
+    :param config: The shape of the data set
+    :param path: The name of the write path, which is part of the data point name
+    :param temporality: The temporality of the raw table
+    :param type_name: The data type of the raw table
+    :return: The IDs of the data points
+    """
+
+    dp_ids = []
+    for index in range(config.data_points):
+        dp_id = con.execute(sql.text("""
+            SELECT dp_id FROM rdp_resolve_data_point_info(
+                :name, :device_id, :location_code, :data_provider,
+                initial_data_type => CAST(:data_type AS time_series_data_type),
+                initial_temporality => CAST(:temporality AS time_series_temporality)
+            );
+        """), parameters=dict(
+            get_series_key(path, temporality, type_name, index), data_type=type_name, temporality=temporality
+        )).scalar_one()
+        con.execute(sql.text("UPDATE data_points SET view_role = :view_role WHERE id = :dp_id;"),
+                    parameters=dict(dp_id=dp_id, view_role="view_public" if index % 2 == 0 else "view_internal"))
+        dp_ids.append(dp_id)
+    return dp_ids
+
+
+def generate_batches(config: GeneratorConfig, temporality: str, type_name: str, index: int):
+    """
+    Yields the samples of one series in batches
+
+    :param config: The shape of the data set
+    :param temporality: The temporality of the series
+    :param type_name: The data type of the series
+    :param index: The index of the series, which seeds the random values
+    :return: An iterator of dicts with the valid_times, transaction_times (bitemporal only) and values lists
+    """
+
+    rng = random.Random(f"{config.seed}-{temporality}-{type_name}-{index}")
+    batch = dict(valid_times=[], transaction_times=[], values=[])
+    for transaction_time, valid_time in _generate_times(config, temporality):
+        batch["valid_times"].append(valid_time)
+        batch["transaction_times"].append(transaction_time)
+        batch["values"].append(_generate_value(rng, type_name))
+        if len(batch["values"]) >= config.batch_size:
+            yield batch
+            batch = dict(valid_times=[], transaction_times=[], values=[])
+    if len(batch["values"]) > 0:
+        yield batch
+
+
+def get_insert_statement(relation: str, temporality: str, type_name: str) -> sql.TextClause:
+    """
+    Returns the statement that inserts a batch into the raw table or the legacy view via a single round trip
+
+    :param relation: The raw table or the legacy view (measurements or forecasts)
+    :param temporality: The temporality of the series
+    :param type_name: The data type of the series
+    """
+
+    if relation in ("measurements", "forecasts"):
+        columns = "dp_id, obs_time, fc_time, value" if temporality == "bitemporal" else "dp_id, obs_time, value"
+    else:
+        columns = "dp_id, valid_time, transaction_time, value" if temporality == "bitemporal" else \
+            "dp_id, valid_time, value"
+
+    transaction_times = ", CAST(:transaction_times AS TIMESTAMPTZ[])" if temporality == "bitemporal" else ""
+    return sql.text(f"""
+        INSERT INTO {relation}({columns})
+            SELECT :dp_id, samples.*
+                FROM unnest(
+                    CAST(:valid_times AS TIMESTAMPTZ[]){transaction_times},
+                    CAST(:values AS {_array_types[type_name]})
+                ) AS samples;
+    """)
+
+
+def remove_benchmark_data(con: sql.Connection) -> None:
+    """Removes the samples and the data points of the benchmarks"""
+
+    dp_ids = list(con.execute(sql.text("SELECT id FROM data_points WHERE data_provider = :data_provider;"),
+                              parameters=dict(data_provider=benchmark_provider)).scalars())
+    if len(dp_ids) == 0:
+        return
+
+    for temporality, type_name in raw_tables:
+        con.execute(sql.text(f"DELETE FROM raw_{temporality}_{type_name} WHERE dp_id = ANY(:dp_ids);"),
+                    parameters=dict(dp_ids=dp_ids))
+    con.execute(sql.text("DELETE FROM data_points WHERE id = ANY(:dp_ids);"), parameters=dict(dp_ids=dp_ids))
+
+
+def _generate_times(config: GeneratorConfig, temporality: str):
+    """Yields the transaction time (None for unitemporal series) and the valid time of each sample"""
+
+    if temporality == "unitemporal":
+        valid_time = config.begin
+        while valid_time < config.end:
+            yield None, valid_time
+            valid_time += config.sampling_interval
+        return
+
+    issue_time = config.begin
+    while issue_time < config.end:
+        valid_time = issue_time + config.sampling_interval
+        while valid_time <= issue_time + config.horizon:
+            yield issue_time, valid_time
+            valid_time += config.sampling_interval
+        issue_time += config.issue_interval
+
+
+def _generate_value(rng: random.Random, type_name: str):
+    """Returns a random value of the data type"""
+
+    if type_name == "double":
+        return round(rng.gauss(20.0, 5.0), 3)
+    elif type_name == "bigint":
+        return rng.randrange(0, 1000)
+    elif type_name == "boolean":
+        return rng.random() < 0.5
+    return json.dumps(dict(state=rng.choice(["idle", "running", "fault"]), level=rng.randrange(10)))
@@ -0,0 +1,254 @@
+"""
+Measures the ingestion throughput and the query latencies of the database at its current revision
+
+The benchmark writes a synthetic data set (see benchmarks.data_generator) via each write path into the eight raw tables
+and queries it afterward as admin and as the private and public visualization users, such that the cost of the row
+level security is visible as well. Run it against a local Timescale container, which has been upgraded to the revision
+under test, and compare the JSON results of two revisions via benchmarks.compare:
+
+    PYTHONPATH=. python -m benchmarks.run --output results.json
+
+The connection is taken from RDP_POSTGRES_URL. The credentials of the roles are taken from the same environment
+variables as in the migrations.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import statistics
+import time
+
+import dotenv
+import sqlalchemy as sql
+
+import benchmarks.data_generator as gen
+
+logger = logging.getLogger(__name__)
+
+# The write paths and the raw tables they support
+write_paths = {
+    "raw_table": gen.raw_tables,
+    "legacy_view": [("unitemporal", "double"), ("bitemporal", "double")],
+    "resolver_function": gen.raw_tables,
+}
+
+# The users by role, whereby the credentials are taken from the environment
+role_variables = {
+    "admin": ("POSTGRES_USER", "POSTGRES_PASSWORD"),
+    "data_source": ("POSTGRES_DATA_SOURCE_USER", "POSTGRES_DATA_SOURCE_PASSWORD"),
+    "private_vis": ("POSTGRES_DATA_VIS_USER", "POSTGRES_DATA_VIS_PASSWORD"),
+    "public_vis": ("POSTGRES_DATA_PUB_VIS_USER", "POSTGRES_DATA_PUB_VIS_PASSWORD"),
+}
+query_roles = ["admin", "private_vis", "public_vis"]
+
+
+def run_benchmarks(engines: dict[str, sql.Engine], config: gen.GeneratorConfig, repetitions: int = 10) -> dict:
+    """
+    Runs the ingestion and the query benchmarks and removes the synthetic data afterward
+
+    :param engines: The engines by role as in role_variables
+    :param config: The shape of the synthetic data set
+    :param repetitions: The number of measured executions of each query
+    :return: The JSON-serializable results including the environment of the run
+    """
+
+    with engines["admin"].begin() as con:
+        gen.remove_benchmark_data(con)
+        results = dict(environment=_get_environment(con), config=config.to_dict(), ingestion=[], queries=[])
+
+    try:
+        for path, tables in write_paths.items():
+            for temporality, type_name in tables:
+                results["ingestion"].append(measure_ingestion(engines["data_source"], config, path, temporality,
+                                                              type_name))
+
+        with engines["admin"].connect() as con:
+            for temporality, type_name in gen.raw_tables:
+                con.execute(sql.text(f"ANALYZE raw_{temporality}_{type_name};"))
+            con.execute(sql.text("ANALYZE data_points;"))
+            con.commit()
+
+        for role in query_roles:
+            for name, query, parameters in get_queries(config):
+                result = measure_query(engines[role], role, name, query, parameters, repetitions)
+                if result is not None:
+                    results["queries"].append(result)
+    finally:
+        with engines["admin"].begin() as con:
+            gen.remove_benchmark_data(con)
+
+    return results
+
+
+def measure_ingestion(engine: sql.Engine, config: gen.GeneratorConfig, path: str, temporality: str,
+                      type_name: str) -> dict:
+    """
+    Writes the series of one raw table via the write path and measures the throughput
+
+    Each batch is committed separately, as an ingestion client would do. For the resolver path, the data point is
+    resolved by its name before each batch.
+    """
+
+    with engine.begin() as con:
+        dp_ids = gen.create_data_points(con, config, path, temporality, type_name)
+
+    if path == "legacy_view":
+        relation = "forecasts" if temporality == "bitemporal" else "measurements"
+    else:
+        relation = f"raw_{temporality}_{type_name}"
+    statement = gen.get_insert_statement(relation, temporality, type_name)
+
+    row_count, batch_count = 0, 0
+    started_at = time.perf_counter()
+    with engine.connect() as con:
+        for index, dp_id in enumerate(dp_ids):
+            for batch in gen.generate_batches(config, temporality, type_name, index):
+                if path == "resolver_function":
+                    dp_id = con.execute(sql.text("""
+                        SELECT dp_id FROM rdp_resolve_data_point_info(
+                            :name, :device_id, :location_code, :data_provider
+                        );
+                    """), parameters=gen.get_series_key(path, temporality, type_name, index)).scalar_one()
+                con.execute(statement, parameters=dict(batch, dp_id=dp_id))
+                con.commit()
+                row_count += len(batch["values"])
+                batch_count += 1
+    seconds = time.perf_counter() - started_at
+
+    logger.info(f"Wrote {row_count} rows into {relation} via {path} at {row_count / seconds:.0f} rows/s")
+    return dict(path=path, table=f"raw_{temporality}_{type_name}", relation=relation, rows=row_count,
+                batches=batch_count, seconds=seconds, rows_per_second=row_count / seconds)
+
+
+def get_queries(config: gen.GeneratorConfig) -> list[tuple[str, str, dict]]:
+    """Returns the name, the statement and the parameters of each benchmarked query"""
+
+    last_day = dict(begin=config.end - datetime.timedelta(days=1), end=config.end)
+    queries = []
+    for temporality, type_name in gen.raw_tables:
+        time_filter = "valid_time >= :begin AND valid_time < :end"
+        queries.append((f"{temporality}_{type_name}_details_single", f"""
+            SELECT * FROM {temporality}_{type_name}_details
+                WHERE name = :name AND device_id = :device_id AND location_code = :location_code AND
+                    data_provider = :data_provider AND {time_filter};
+        """, dict(last_day, **gen.get_series_key("raw_table", temporality, type_name, 0))))
+        queries.append((f"{temporality}_{type_name}_details_all", f"""
+            SELECT * FROM {temporality}_{type_name}_details
+                WHERE data_provider = :data_provider AND {time_filter};
+        """, dict(last_day, data_provider=gen.benchmark_provider)))
+
+    series = gen.get_series_key("legacy_view", "bitemporal", "double", 0)
+    queries.append(("forecasts_latest", """
+        SELECT obs_time, value FROM forecasts_latest
+            WHERE name = :name AND device_id = :device_id AND location_code = :location_code AND
+                data_provider = :data_provider AND obs_time >= :begin AND obs_time < :end;
+    """, dict(last_day, **series)))
+    queries.append(("forecasts_horizon", """
+        SELECT obs_time, value FROM forecasts_horizon(
+            INTERVAL '6 hours', :begin, :end, :name, :location_code, :data_provider, :device_id
+        );
+    """, dict(last_day, **series)))
+    return queries
+
+
+def measure_query(engine: sql.Engine, role: str, name: str, query: str, parameters: dict,
+                  repetitions: int) -> dict | None:
+    """
+    Executes the query once to warm up the caches and measures the latency of the following executions
+
+    :return: The latency statistics or None, if the role is not permitted to execute the query
+    """
+
+    latencies = []
+    with engine.connect() as con:
+        try:
+            rows = len(con.execute(sql.text(query), parameters=parameters).fetchall())
+        except sql.exc.ProgrammingError as e:
+            if getattr(e.orig, "pgcode", None) != "42501":  # insufficient_privilege
+                raise
+            logger.info(f"Skipped {name}, since {role} is not permitted to query it")
+            return None
+        for _ in range(repetitions):
+            started_at = time.perf_counter()
+            con.execute(sql.text(query), parameters=parameters).fetchall()
+            latencies.append((time.perf_counter() - started_at) * 1000.0)
+        con.rollback()
+
+    latencies.sort()
+    logger.info(f"Queried {name} as {role} in {statistics.median(latencies):.1f}ms (median)")
+    return dict(query=name, role=role, rows=rows, repetitions=repetitions, min_ms=latencies[0],
+                median_ms=statistics.median(latencies), p95_ms=_percentile(latencies, 0.95), max_ms=latencies[-1])
+
+
+def _percentile(sorted_values: list[float], fraction: float) -> float:
+    """Returns the nearest-rank percentile of the sorted values"""
+
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def _get_environment(con: sql.Connection) -> dict:
+    """Returns the versions, which the results depend on"""
+
+    return dict(
+        started_at=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        revision=con.execute(sql.text("SELECT version_num FROM alembic_version;")).scalar_one_or_none(),
+        server_version=con.execute(sql.text("SHOW server_version;")).scalar_one(),
+        timescaledb_version=con.execute(sql.text("""
+            SELECT extversion FROM pg_extension WHERE extname = 'timescaledb';
+        """)).scalar_one_or_none(),
+    )
+
+
+def _create_engines() -> dict[str, sql.Engine]:
+    """Creates the engines of the roles based on RDP_POSTGRES_URL"""
+
+    if "RDP_POSTGRES_URL" not in os.environ:
+        raise KeyError("Expect the RDP_POSTGRES_URL environment variable to be available")
+
+    url = sql.make_url(os.environ["RDP_POSTGRES_URL"])
+    return {
+        role: sql.create_engine(url.set(username=os.environ[user_var], password=os.environ[password_var]))
+        for role, (user_var, password_var) in role_variables.items()
+    }
+
+
+def main():
+    """Parses the arguments, runs the benchmarks and writes the results"""
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default="benchmark_results.json", help="The JSON file of the results")
+    parser.add_argument("--data-points", type=int, default=10, help="The data points per raw table and write path")
+    parser.add_argument("--days", type=float, default=2.0, help="The covered period in days")
+    parser.add_argument("--sampling-minutes", type=float, default=15.0, help="The sampling interval in minutes")
+    parser.add_argument("--issue-hours", type=float, default=6.0, help="The forecast issue interval in hours")
+    parser.add_argument("--horizon-hours", type=float, default=24.0, help="The forecast horizon in hours")
+    parser.add_argument("--batch-size", type=int, default=1000, help="The samples per insert statement")
+    parser.add_argument("--repetitions", type=int, default=10, help="The measured executions per query")
+    parser.add_argument("--seed", type=int, default=42, help="The seed of the synthetic values")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    dotenv.load_dotenv(dotenv_path=".env")
+
+    config = gen.GeneratorConfig(
+        data_points=args.data_points, days=args.days,
+        sampling_interval=datetime.timedelta(minutes=args.sampling_minutes),
+        issue_interval=datetime.timedelta(hours=args.issue_hours),
+        horizon=datetime.timedelta(hours=args.horizon_hours), batch_size=args.batch_size, seed=args.seed
+    )
+    engines = _create_engines()
+    try:
+        results = run_benchmarks(engines, config, args.repetitions)
+    finally:
+        for engine in engines.values():
+            engine.dispose()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Wrote the results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ from alembic import op
 import sqlalchemy as sa
 
 import rdp_db.core.rev_2022_10_20_09_54_aa0daa782efc_introduce_access_policies as access_policy_def
+import rdp_db.utils.chunk_migration as chunk_migration
 
 # revision identifiers, used by Alembic.
 revision = '62ffa7f9c9a4'
@@ -133,22 +134,19 @@ def downgrade_hypertable_organization():
     op.execute(sa.text("""
         SELECT remove_compression_policy('forecasts', true); 
         SELECT set_chunk_time_interval('forecasts', INTERVAL '7 days');
-        -- Decompressed all compressed chunks. If that command fails with a deadlock, consider to stop the feeder 
-        -- processes like RedSQL
-        SELECT decompress_chunk(format('%I.%I', chunk_schema, chunk_name)::regclass) 
-            FROM chunk_compression_stats('forecasts')
-            WHERE compression_status = 'Compressed';
-        ALTER TABLE forecasts SET (timescaledb.compress=false);
+        SELECT remove_compression_policy('measurements', true);
+        SELECT set_chunk_time_interval('measurements', INTERVAL '7 days');
     """))
 
+    # Decompress all compressed chunks one by one. Each chunk is committed on its own such that the locks are released
+    # early and a rerun resumes after an interruption. In case of deadlocks, consider to stop the feeder processes like
+    # RedSQL.
+    with op.get_context().autocommit_block():
+        chunk_migration.decompress_chunks(op.get_bind(), "62ffa7f9c9a4_decompress_forecasts", "forecasts")
+        chunk_migration.decompress_chunks(op.get_bind(), "62ffa7f9c9a4_decompress_measurements", "measurements")
+
     op.execute(sa.text("""
-        SELECT remove_compression_policy('measurements', true);
-        SELECT set_chunk_time_interval('measurements', INTERVAL '7 days');
-        -- Decompressed all compressed chunks. If that command fails with a deadlock, consider to stop the feeder 
-        -- processes like RedSQL
-        SELECT decompress_chunk(format('%I.%I', chunk_schema, chunk_name)::regclass) 
-            FROM chunk_compression_stats('measurements')
-            WHERE compression_status = 'Compressed';
+        ALTER TABLE forecasts SET (timescaledb.compress=false);
         ALTER TABLE measurements SET (timescaledb.compress=false);
     """))
 
@@ -116,10 +116,15 @@ def upgrade_new_ts_tables():
     create_bitemporal_table("jsonb")
 
 
-def create_unitemporal_table(data_type: str):
-    """Creates an unitemporal tables for the given data type"""
+def create_unitemporal_table(data_type: str, type_name: str = None):
+    """
+    Creates an unitemporal tables for the given data type
+
+    :param data_type: The SQL type of the value column
+    :param type_name: The type name used in the table name. Defaults to the SQL type.
+    """
 
-    data_type_infix = data_type.replace(" ", "_")
+    data_type_infix = type_name if type_name is not None else data_type.replace(" ", "_")
 
     op.execute(sql.text(f"""
         CREATE TABLE raw_unitemporal_{data_type_infix} (
@@ -155,10 +160,15 @@ def create_unitemporal_table(data_type: str):
     grant_data_table_permissions(f"raw_unitemporal_{data_type_infix}")
 
 
-def create_bitemporal_table(data_type: str):
-    """Creates a bitemporal tables for the given data type"""
+def create_bitemporal_table(data_type: str, type_name: str = None):
+    """
+    Creates a bitemporal tables for the given data type
+
+    :param data_type: The SQL type of the value column
+    :param type_name: The type name used in the table name. Defaults to the SQL type.
+    """
 
-    data_type_infix = data_type.replace(" ", "_")
+    data_type_infix = type_name if type_name is not None else data_type.replace(" ", "_")
 
     op.execute(sql.text(f"""
         CREATE TABLE raw_bitemporal_{data_type_infix} (
@@ -0,0 +1,330 @@
+"""
+retention policies
+
+Introduces two retention levels. The coarse level drops entire chunks of a raw table via the timescale retention policy
+(drop_chunks). The fine level deletes the samples of selected data points only. The data points are selected by
+retention rules that match the data provider, the view role or a metadata key. The fine level is executed by a
+background job that processes one chunk and one data point segment at a time.
+
+Revision ID: 77ba4fbfe9d9
+Revises: 0678397a4d04
+Create Date: 2025-02-17 09:12:44.318207
+
+"""
+from alembic import op
+import sqlalchemy as sql
+
+# revision identifiers, used by Alembic.
+revision = '77ba4fbfe9d9'
+down_revision = '0678397a4d04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Installs the retention management"""
+
+    upgrade_raw_retention()
+    upgrade_retention_rules()
+    upgrade_retention_job()
+    upgrade_dry_run_report()
+
+
+def upgrade_raw_retention():
+    """Introduces the coarse retention that drops entire chunks of a raw table"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_set_raw_retention(
+                hypertable REGCLASS,
+                drop_after INTERVAL
+            ) RETURNS INTEGER
+        LANGUAGE plpgsql VOLATILE
+        AS $$
+        DECLARE
+            policy_id INTEGER;
+        BEGIN
+            IF NOT starts_with(hypertable::TEXT, 'raw_') THEN
+                RAISE EXCEPTION 'Retention can only be configured on raw tables, got %', hypertable;
+            END IF;
+
+            PERFORM remove_retention_policy(hypertable, if_exists => true);
+            IF drop_after IS NULL THEN
+                RETURN NULL;
+            END IF;
+
+            SELECT add_retention_policy(hypertable, drop_after) INTO policy_id;
+            RETURN policy_id;
+        END;
+        $$;
+
+        COMMENT ON FUNCTION rdp_set_raw_retention(REGCLASS, INTERVAL) IS
+            'Replaces the chunk-based retention policy of the given raw table. The chunks are dropped as soon as their
+             entire valid time range is older than drop_after. Passing NULL removes the policy.';
+    """))
+
+
+def upgrade_retention_rules():
+    """Creates the rule table and the view that resolves the effective retention period of each data point"""
+
+    op.execute(sql.text("""
+        CREATE TABLE rdp_retention_rules (
+            id SERIAL NOT NULL,
+            data_provider VARCHAR(128) DEFAULT NULL,
+            view_role TEXT DEFAULT NULL,
+            metadata_key TEXT DEFAULT NULL,
+            metadata_value JSONB DEFAULT NULL,
+            retention_period INTERVAL NOT NULL,
+            enabled BOOLEAN NOT NULL DEFAULT TRUE,
+            description TEXT DEFAULT NULL,
+            PRIMARY KEY (id),
+            CONSTRAINT check_selector CHECK (
+                data_provider IS NOT NULL OR view_role IS NOT NULL OR metadata_key IS NOT NULL
+            ),
+            CONSTRAINT check_metadata_value CHECK (metadata_value IS NULL OR metadata_key IS NOT NULL),
+            CONSTRAINT check_retention_period CHECK (retention_period > INTERVAL '0 seconds')
+        );
+
+        COMMENT ON TABLE rdp_retention_rules IS 'Rules that limit the time samples of matching data points are kept';
+        COMMENT ON COLUMN rdp_retention_rules.data_provider IS 'Matches data points of the given provider, if set';
+        COMMENT ON COLUMN rdp_retention_rules.view_role IS 'Matches data points having the given view role, if set';
+        COMMENT ON COLUMN rdp_retention_rules.metadata_key IS 'Matches data points having the metadata key, if set';
+        COMMENT ON COLUMN rdp_retention_rules.metadata_value
+            IS 'Optionally restricts the metadata key match to the given value';
+        COMMENT ON COLUMN rdp_retention_rules.retention_period
+            IS 'Samples having a valid time older than the retention period will be deleted';
+        COMMENT ON COLUMN rdp_retention_rules.enabled IS 'Allows to temporarily disable a rule without deleting it';
+        COMMENT ON COLUMN rdp_retention_rules.description IS 'Optional human-readable description of the rule';
+    """))
+
+    op.execute(sql.text("""
+        -- In case multiple rules match a data point, the longest retention period wins. By that, no rule is able to
+        -- delete data that another rule explicitly wants to keep.
+        CREATE OR REPLACE VIEW rdp_retention_targets(
+            dp_id, rule_id, retention_period, data_type, temporality
+        ) AS
+            SELECT DISTINCT ON (dp.id) dp.id, rule.id, rule.retention_period, dp.data_type, dp.temporality
+                FROM data_points AS dp
+                JOIN rdp_retention_rules AS rule
+                    ON ((rule.data_provider IS NULL OR rule.data_provider = dp.data_provider) AND
+                        (rule.view_role IS NULL OR rule.view_role = dp.view_role) AND
+                        (rule.metadata_key IS NULL OR (
+                            dp.metadata ? rule.metadata_key AND
+                            (rule.metadata_value IS NULL OR dp.metadata -> rule.metadata_key = rule.metadata_value)
+                        )))
+                WHERE rule.enabled
+                ORDER BY dp.id, rule.retention_period DESC, rule.id;
+
+        COMMENT ON VIEW rdp_retention_targets IS 'The effective retention period of each data point matched by a rule';
+    """))
+
+
+def upgrade_retention_job():
+    """Installs the background job that applies the retention rules"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE PROCEDURE rdp_apply_retention_rules(job_id INTEGER, config JSONB)
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            reference_time TIMESTAMPTZ := now();
+            min_period INTERVAL;
+            ht RECORD;
+            chunk RECORD;
+            target RECORD;
+            deleted_rows BIGINT;
+            chunk_deleted_rows BIGINT;
+        BEGIN
+            SELECT min(targets.retention_period) INTO min_period FROM rdp_retention_targets AS targets;
+            IF min_period IS NULL THEN
+                RAISE LOG 'No retention rule matches any data point';
+                RETURN;
+            END IF;
+
+            FOR ht IN
+                SELECT dim.hypertable_name, dim.column_name AS time_column
+                    FROM timescaledb_information.dimensions AS dim
+                    WHERE dim.hypertable_schema = 'public' AND starts_with(dim.hypertable_name, 'raw_') AND
+                        dim.dimension_number = 1
+                    ORDER BY dim.hypertable_name
+            LOOP
+                -- Several chunks may share one time slice, in case the table is partitioned by space as well
+                FOR chunk IN
+                    SELECT DISTINCT chunks.range_start, chunks.range_end
+                        FROM timescaledb_information.chunks AS chunks
+                        WHERE chunks.hypertable_schema = 'public' AND
+                            chunks.hypertable_name = ht.hypertable_name AND
+                            chunks.range_start < reference_time - min_period
+                        ORDER BY chunks.range_start
+                LOOP
+                    chunk_deleted_rows := 0;
+
+                    -- Delete segment by segment such that compressed chunks only decompress the affected data points
+                    FOR target IN EXECUTE format('
+                            SELECT DISTINCT raw.dp_id, targets.retention_period
+                                FROM %I AS raw
+                                JOIN rdp_retention_targets AS targets ON (targets.dp_id = raw.dp_id)
+                                WHERE raw.%I >= $1 AND raw.%I < $2 AND $1 < $3 - targets.retention_period
+                        ', ht.hypertable_name, ht.time_column, ht.time_column
+                        ) USING chunk.range_start, chunk.range_end, reference_time
+                    LOOP
+                        EXECUTE format('
+                                DELETE FROM %I WHERE dp_id = $1 AND %I >= $2 AND %I < LEAST($3, $4)
+                            ', ht.hypertable_name, ht.time_column, ht.time_column
+                            ) USING target.dp_id, chunk.range_start, chunk.range_end,
+                                reference_time - target.retention_period;
+                        GET DIAGNOSTICS deleted_rows = ROW_COUNT;
+                        chunk_deleted_rows := chunk_deleted_rows + deleted_rows;
+                    END LOOP;
+
+                    IF chunk_deleted_rows > 0 THEN
+                        RAISE LOG 'Retention deleted % rows from % in [%, %)',
+                            chunk_deleted_rows, ht.hypertable_name, chunk.range_start, chunk.range_end;
+                    END IF;
+                    COMMIT;  -- Release the locks of each chunk as early as possible
+                END LOOP;
+            END LOOP;
+        END;
+        $$;
+
+        COMMENT ON PROCEDURE rdp_apply_retention_rules(INTEGER, JSONB) IS
+            'Deletes the samples of all data points matched by a retention rule, which are older than the retention
+             period. The procedure is called by a background job but can be called manually as well.';
+    """))
+
+    op.execute(sql.text("""
+        SELECT add_job('rdp_apply_retention_rules', INTERVAL '1 day');
+    """))
+
+
+def upgrade_dry_run_report():
+    """Installs the functions that report the expected effects of the retention settings"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_retention_dry_run_chunks() RETURNS TABLE(
+            rule_id INTEGER,
+            hypertable_name TEXT,
+            chunk_name TEXT,
+            affected_rows BIGINT,
+            reclaimable_bytes BIGINT
+        )
+        LANGUAGE plpgsql STABLE
+        AS $$
+        DECLARE
+            reference_time TIMESTAMPTZ := now();
+            min_period INTERVAL;
+            ht RECORD;
+            chunk RECORD;
+            chunk_rows BIGINT;
+        BEGIN
+            SELECT min(targets.retention_period) INTO min_period FROM rdp_retention_targets AS targets;
+            IF min_period IS NULL THEN
+                RETURN;
+            END IF;
+
+            FOR ht IN
+                SELECT dim.hypertable_name, dim.column_name AS time_column
+                    FROM timescaledb_information.dimensions AS dim
+                    WHERE dim.hypertable_schema = 'public' AND starts_with(dim.hypertable_name, 'raw_') AND
+                        dim.dimension_number = 1
+                    ORDER BY dim.hypertable_name
+            LOOP
+                FOR chunk IN
+                    SELECT chunks.chunk_schema, chunks.chunk_name, chunks.range_start, chunks.range_end,
+                            sizes.total_bytes
+                        FROM timescaledb_information.chunks AS chunks
+                        JOIN chunks_detailed_size(format('public.%I', ht.hypertable_name)::REGCLASS) AS sizes
+                            ON (sizes.chunk_schema = chunks.chunk_schema AND sizes.chunk_name = chunks.chunk_name)
+                        WHERE chunks.hypertable_schema = 'public' AND
+                            chunks.hypertable_name = ht.hypertable_name AND
+                            chunks.range_start < reference_time - min_period
+                        ORDER BY chunks.range_start
+                LOOP
+                    EXECUTE format('SELECT count(*) FROM %I.%I', chunk.chunk_schema, chunk.chunk_name)
+                        INTO chunk_rows;
+                    CONTINUE WHEN chunk_rows = 0;
+
+                    -- The bytes are estimated by the share of affected rows in the chunk
+                    RETURN QUERY EXECUTE format('
+                            SELECT targets.rule_id, $1, $2, count(*),
+                                    (count(*) * $3::NUMERIC / $4)::BIGINT
+                                FROM %I.%I AS raw
+                                JOIN rdp_retention_targets AS targets ON (targets.dp_id = raw.dp_id)
+                                WHERE raw.%I < $5 - targets.retention_period
+                                GROUP BY targets.rule_id
+                        ', chunk.chunk_schema, chunk.chunk_name, ht.time_column
+                        ) USING ht.hypertable_name::TEXT, chunk.chunk_name::TEXT, chunk.total_bytes, chunk_rows,
+                            reference_time;
+                END LOOP;
+            END LOOP;
+        END;
+        $$;
+
+        COMMENT ON FUNCTION rdp_retention_dry_run_chunks() IS
+            'Lists the rows and the estimated bytes per chunk that the next run of the retention rules would delete.
+             The function scans all affected chunks and may therefore take some time.';
+    """))
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_retention_dry_run() RETURNS TABLE(
+            rule_id INTEGER,
+            rule_description TEXT,
+            hypertable_name TEXT,
+            affected_rows BIGINT,
+            reclaimable_bytes BIGINT
+        )
+        LANGUAGE SQL STABLE
+        AS $$
+            -- Coarse level: The chunks that will be dropped entirely
+            SELECT NULL::INTEGER, format('drop_chunks older than %s', (jobs.config ->> 'drop_after')),
+                    jobs.hypertable_name::TEXT, NULL::BIGINT, COALESCE(sum(sizes.total_bytes), 0)::BIGINT
+                FROM timescaledb_information.jobs AS jobs
+                CROSS JOIN LATERAL show_chunks(
+                        format('%I.%I', jobs.hypertable_schema, jobs.hypertable_name)::REGCLASS,
+                        older_than => (jobs.config ->> 'drop_after')::INTERVAL
+                    ) AS dropped(chunk)
+                JOIN chunks_detailed_size(format('%I.%I', jobs.hypertable_schema, jobs.hypertable_name)::REGCLASS)
+                        AS sizes
+                    ON (format('%I.%I', sizes.chunk_schema, sizes.chunk_name)::REGCLASS = dropped.chunk)
+                WHERE jobs.proc_name = 'policy_retention' AND jobs.hypertable_schema = 'public' AND
+                    starts_with(jobs.hypertable_name, 'raw_')
+                GROUP BY jobs.hypertable_schema, jobs.hypertable_name, jobs.config
+            UNION ALL
+            -- Fine level: The samples deleted by the retention rules
+            SELECT chunks.rule_id, rules.description, chunks.hypertable_name, sum(chunks.affected_rows)::BIGINT,
+                    sum(chunks.reclaimable_bytes)::BIGINT
+                FROM rdp_retention_dry_run_chunks() AS chunks
+                JOIN rdp_retention_rules AS rules ON (rules.id = chunks.rule_id)
+                GROUP BY chunks.rule_id, rules.description, chunks.hypertable_name
+            ORDER BY 1 NULLS FIRST, 3
+        $$;
+
+        COMMENT ON FUNCTION rdp_retention_dry_run() IS
+            'Reports the rows and the estimated bytes each retention rule and each chunk-based retention policy would
+             reclaim. Rows of the chunk-based policies are not counted.';
+    """))
+
+
+def downgrade():
+    """Removes the retention management including all configured policies"""
+
+    op.execute(sql.text("""
+        DROP FUNCTION IF EXISTS rdp_retention_dry_run();
+        DROP FUNCTION IF EXISTS rdp_retention_dry_run_chunks();
+    """))
+
+    op.execute(sql.text("""
+        SELECT delete_job(job_id) FROM timescaledb_information.jobs WHERE proc_name = 'rdp_apply_retention_rules';
+        DROP PROCEDURE IF EXISTS rdp_apply_retention_rules(INTEGER, JSONB);
+    """))
+
+    op.execute(sql.text("""
+        DROP VIEW IF EXISTS rdp_retention_targets;
+        DROP TABLE IF EXISTS rdp_retention_rules;
+    """))
+
+    op.execute(sql.text("""
+        SELECT remove_retention_policy(format('%I.%I', hypertable_schema, hypertable_name)::REGCLASS, if_exists => true)
+            FROM timescaledb_information.hypertables
+            WHERE hypertable_schema = 'public' AND starts_with(hypertable_name, 'raw_');
+        DROP FUNCTION IF EXISTS rdp_set_raw_retention(REGCLASS, INTERVAL);
+    """))
@@ -0,0 +1,175 @@
+"""
+forecast version compaction
+
+Periodically reissued forecasts store a full horizon per transaction time, although mostly the latest version and a few
+selected lead times are consumed later on. This revision adds a background job that thins out old forecast versions of
+the bitemporal tables. For each valid time, the latest version as well as the versions that are selected by the
+configured lead times (as used by the forecasts_horizon function) are kept.
+
+Revision ID: fbc573ee65b3
+Revises: 77ba4fbfe9d9
+Create Date: 2025-02-24 14:05:12.730914
+
+"""
+from alembic import op
+import sqlalchemy as sql
+
+# revision identifiers, used by Alembic.
+revision = 'fbc573ee65b3'
+down_revision = '77ba4fbfe9d9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Installs the compaction job"""
+
+    upgrade_compaction_progress()
+    upgrade_compaction_procedure()
+    upgrade_compaction_job()
+
+
+def upgrade_compaction_progress():
+    """Creates the table that tracks the already compacted time ranges"""
+
+    op.execute(sql.text("""
+        CREATE TABLE rdp_forecast_compaction_progress (
+            hypertable_name TEXT NOT NULL,
+            compacted_until TIMESTAMPTZ NOT NULL,
+            PRIMARY KEY (hypertable_name)
+        );
+        COMMENT ON TABLE rdp_forecast_compaction_progress
+            IS 'Keeps track of the valid time up to which the forecast versions of each table have been compacted';
+        COMMENT ON COLUMN rdp_forecast_compaction_progress.compacted_until
+            IS 'All chunks ending before that valid time are already compacted. Delete the row to start over again.';
+    """))
+
+
+def upgrade_compaction_procedure():
+    """Creates the procedure that compacts the old forecast versions"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE PROCEDURE rdp_compact_forecast_versions(job_id INTEGER, config JSONB)
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            reference_time TIMESTAMPTZ := now();
+            compact_after INTERVAL := COALESCE((config ->> 'compact_after')::INTERVAL, INTERVAL '30 days');
+            lead_times INTERVAL[];
+            ht RECORD;
+            chunk RECORD;
+            data_point RECORD;
+            deleted_rows BIGINT;
+            chunk_deleted_rows BIGINT;
+        BEGIN
+            IF config IS NULL OR NOT config ? 'keep_lead_times' THEN
+                lead_times := ARRAY[INTERVAL '1 hour', INTERVAL '6 hours', INTERVAL '1 day'];
+            ELSE
+                lead_times := ARRAY(
+                    SELECT lead_time::INTERVAL FROM jsonb_array_elements_text(config -> 'keep_lead_times') AS lead_time
+                );
+            END IF;
+
+            -- Only consider the row-based bitemporal tables that are partitioned by the valid time
+            FOR ht IN
+                SELECT dim.hypertable_name, COALESCE(progress.compacted_until, '-infinity') AS compacted_until
+                    FROM timescaledb_information.dimensions AS dim
+                    LEFT JOIN rdp_forecast_compaction_progress AS progress
+                        ON (progress.hypertable_name = dim.hypertable_name)
+                    WHERE dim.hypertable_schema = 'public' AND starts_with(dim.hypertable_name, 'raw_bitemporal_') AND
+                        dim.dimension_number = 1 AND dim.column_name = 'valid_time' AND
+                        EXISTS (
+                            SELECT FROM information_schema.columns AS col
+                                WHERE col.table_schema = dim.hypertable_schema AND
+                                    col.table_name = dim.hypertable_name AND col.column_name = 'transaction_time'
+                        )
+                    ORDER BY dim.hypertable_name
+            LOOP
+                FOR chunk IN
+                    SELECT DISTINCT chunks.range_start, chunks.range_end
+                        FROM timescaledb_information.chunks AS chunks
+                        WHERE chunks.hypertable_schema = 'public' AND
+                            chunks.hypertable_name = ht.hypertable_name AND
+                            chunks.range_end <= reference_time - compact_after AND
+                            chunks.range_end > ht.compacted_until
+                        ORDER BY chunks.range_start
+                LOOP
+                    chunk_deleted_rows := 0;
+
+                    -- Process one data point segment at a time to keep the decompression of compressed chunks local
+                    FOR data_point IN EXECUTE format('
+                            SELECT DISTINCT raw.dp_id FROM %I AS raw WHERE raw.valid_time >= $1 AND raw.valid_time < $2
+                        ', ht.hypertable_name) USING chunk.range_start, chunk.range_end
+                    LOOP
+                        EXECUTE format('
+                                WITH versions AS MATERIALIZED (
+                                    SELECT raw.valid_time, raw.transaction_time
+                                        FROM %I AS raw
+                                        WHERE raw.dp_id = $1 AND raw.valid_time >= $2 AND raw.valid_time < $3
+                                ), kept AS (
+                                    SELECT versions.valid_time, max(versions.transaction_time) AS transaction_time
+                                        FROM versions
+                                        GROUP BY versions.valid_time
+                                    UNION
+                                    SELECT versions.valid_time, max(versions.transaction_time) AS transaction_time
+                                        FROM versions
+                                        CROSS JOIN unnest($4::INTERVAL[]) AS leads(lead_time)
+                                        WHERE versions.valid_time - versions.transaction_time >= leads.lead_time
+                                        GROUP BY versions.valid_time, leads.lead_time
+                                )
+                                DELETE FROM %I AS raw
+                                    WHERE raw.dp_id = $1 AND raw.valid_time >= $2 AND raw.valid_time < $3 AND
+                                        NOT EXISTS (
+                                            SELECT FROM kept
+                                                WHERE kept.valid_time = raw.valid_time AND
+                                                    kept.transaction_time = raw.transaction_time
+                                        )
+                            ', ht.hypertable_name, ht.hypertable_name
+                            ) USING data_point.dp_id, chunk.range_start, chunk.range_end, lead_times;
+                        GET DIAGNOSTICS deleted_rows = ROW_COUNT;
+                        chunk_deleted_rows := chunk_deleted_rows + deleted_rows;
+                    END LOOP;
+
+                    INSERT INTO rdp_forecast_compaction_progress(hypertable_name, compacted_until)
+                        VALUES (ht.hypertable_name, chunk.range_end)
+                        ON CONFLICT (hypertable_name) DO UPDATE SET compacted_until = EXCLUDED.compacted_until;
+
+                    IF chunk_deleted_rows > 0 THEN
+                        RAISE LOG 'Compaction deleted % forecast versions from % in [%, %)',
+                            chunk_deleted_rows, ht.hypertable_name, chunk.range_start, chunk.range_end;
+                    END IF;
+                    COMMIT;  -- Release the locks of each chunk as early as possible
+                END LOOP;
+            END LOOP;
+        END;
+        $$;
+
+        COMMENT ON PROCEDURE rdp_compact_forecast_versions(INTEGER, JSONB) IS
+            'Deletes superseded forecast versions that are older than compact_after (default: 30 days). For each valid
+             time, the latest version and the versions selected by the lead times in keep_lead_times (default: 1 hour,
+             6 hours and 1 day) are kept. Hence, forecasts_horizon stays exact for those lead times.';
+    """))
+
+
+def upgrade_compaction_job():
+    """Registers the compaction job. The configuration may be changed via alter_job later on."""
+
+    op.execute(sql.text("""
+        SELECT add_job(
+                'rdp_compact_forecast_versions', INTERVAL '1 day',
+                config => jsonb_build_object(
+                    'compact_after', '30 days',
+                    'keep_lead_times', jsonb_build_array('1 hour', '6 hours', '1 day')
+                )
+            );
+    """))
+
+
+def downgrade():
+    """Removes the compaction job. Already deleted forecast versions cannot be restored."""
+
+    op.execute(sql.text("""
+        SELECT delete_job(job_id) FROM timescaledb_information.jobs WHERE proc_name = 'rdp_compact_forecast_versions';
+        DROP PROCEDURE IF EXISTS rdp_compact_forecast_versions(INTEGER, JSONB);
+        DROP TABLE IF EXISTS rdp_forecast_compaction_progress;
+    """))
@@ -0,0 +1,220 @@
+"""
+change-only storage
+
+Setpoints and status values are often polled at a high rate although they rarely change. This revision allows to mark
+unitemporal data points as change-only such that samples that equal the last stored value (or are within an absolute or
+relative deadband) are dropped at ingestion time. The companion LOCF functions reconstruct the regular series again.
+
+Revision ID: 6c1a03b3a121
+Revises: fbc573ee65b3
+Create Date: 2025-03-03 10:41:27.518206
+
+"""
+from alembic import op
+import sqlalchemy as sql
+
+# revision identifiers, used by Alembic.
+revision = '6c1a03b3a121'
+down_revision = 'fbc573ee65b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Installs the data point options, the filter triggers and the read functions"""
+
+    upgrade_data_point_options()
+    upgrade_deadband_filters()
+    upgrade_locf_functions()
+
+
+def upgrade_data_point_options():
+    """Adds the change-only settings to the data points"""
+
+    op.execute(sql.text("""
+        ALTER TABLE data_points ADD COLUMN change_only BOOLEAN NOT NULL DEFAULT FALSE;
+        ALTER TABLE data_points ADD COLUMN deadband_abs DOUBLE PRECISION NULL DEFAULT NULL;
+        ALTER TABLE data_points ADD COLUMN deadband_rel DOUBLE PRECISION NULL DEFAULT NULL;
+        ALTER TABLE data_points ADD CONSTRAINT check_deadband CHECK (
+            COALESCE(deadband_abs, 0) >= 0 AND COALESCE(deadband_rel, 0) >= 0
+        );
+
+        COMMENT ON COLUMN data_points.change_only
+            IS 'Only store unitemporal samples that differ from the last stored value. Use the LOCF functions to read.';
+        COMMENT ON COLUMN data_points.deadband_abs
+            IS 'Numeric change-only data points: Absolute deviation from the last stored value that is still dropped';
+        COMMENT ON COLUMN data_points.deadband_rel
+            IS 'Numeric change-only data points: Deviation relative to the last stored value that is still dropped';
+    """))
+
+
+def upgrade_deadband_filters():
+    """Creates the filter triggers on all unitemporal tables"""
+
+    op.execute(sql.text("""
+        -- Defines the trigger function that drops redundant samples of change-only data points. The first argument
+        -- specifies how to compare the values: 'numeric' considers the deadbands and 'exact' only drops equal values.
+        CREATE OR REPLACE FUNCTION rdp_tr_deadband() RETURNS TRIGGER
+        LANGUAGE plpgsql VOLATILE PARALLEL RESTRICTED
+        AS $$
+        DECLARE
+            comparison_mode TEXT := TG_ARGV[0];
+            ref_info RECORD;
+            deadband_clause TEXT := 'FALSE';
+            is_redundant BOOLEAN;
+        BEGIN
+            SELECT change_only, deadband_abs, deadband_rel INTO ref_info
+                FROM data_points
+                WHERE id = NEW.dp_id;
+
+            IF NOT COALESCE(ref_info.change_only, FALSE) THEN
+                RETURN NEW;
+            END IF;
+
+            IF comparison_mode = 'numeric' THEN
+                deadband_clause := 'abs(last_sample.value - $1) <= $4 OR
+                    abs(last_sample.value - $1) <= $5 * abs(last_sample.value)';
+            END IF;
+
+            EXECUTE format('
+                    SELECT last_sample.value IS NOT DISTINCT FROM $1 OR %s
+                        FROM (
+                            SELECT raw.value FROM %I.%I AS raw
+                                WHERE raw.dp_id = $2 AND raw.valid_time < $3
+                                ORDER BY raw.valid_time DESC
+                                LIMIT 1
+                        ) AS last_sample
+                ', deadband_clause, TG_TABLE_SCHEMA, TG_TABLE_NAME
+                ) INTO is_redundant
+                USING NEW.value, NEW.dp_id, NEW.valid_time, ref_info.deadband_abs, ref_info.deadband_rel;
+
+            IF COALESCE(is_redundant, FALSE) THEN
+                RETURN NULL;  -- Silently skip the sample
+            END IF;
+            RETURN NEW;
+        END;
+        $$
+    """))
+
+    add_deadband_filter("raw_unitemporal_double", "numeric")
+    add_deadband_filter("raw_unitemporal_bigint", "numeric")
+    add_deadband_filter("raw_unitemporal_boolean", "exact")
+    add_deadband_filter("raw_unitemporal_jsonb", "exact")
+
+
+def add_deadband_filter(table_name, comparison_mode):
+    """Creates the deadband filter trigger on the particular table. It fires after the type check."""
+
+    op.execute(sql.text(f"""
+        CREATE OR REPLACE TRIGGER deadband_filter
+            BEFORE INSERT
+            ON {table_name}
+            FOR EACH ROW
+            EXECUTE FUNCTION rdp_tr_deadband('{comparison_mode}');
+    """))
+
+
+def upgrade_locf_functions():
+    """Creates the LOCF read functions for all unitemporal types"""
+
+    create_locf_function("double", "DOUBLE PRECISION")
+    create_locf_function("bigint", "BIGINT")
+    create_locf_function("boolean", "BOOLEAN")
+    create_locf_function("jsonb", "JSONB")
+
+
+def create_locf_function(type_name: str, value_type: str):
+    """Creates the function that reconstructs a regular series from the change-only samples"""
+
+    op.execute(sql.text(f"""
+        CREATE OR REPLACE FUNCTION unitemporal_{type_name}_locf(
+            dp_ids INTEGER[],
+            series_begin TIMESTAMPTZ,
+            series_end TIMESTAMPTZ,
+            bucket_width INTERVAL
+        ) RETURNS TABLE(
+            dp_id INTEGER,
+            valid_time TIMESTAMPTZ,
+            value {value_type}
+        )
+        STABLE
+        SECURITY INVOKER
+        PARALLEL SAFE
+        AS $$
+            WITH samples AS (
+                SELECT raw.dp_id, raw.valid_time AS bucket_time, raw.valid_time, raw.value
+                    FROM unitemporal_{type_name}_details AS raw
+                    WHERE raw.dp_id = ANY(unitemporal_{type_name}_locf.dp_ids) AND
+                        raw.valid_time >= unitemporal_{type_name}_locf.series_begin AND
+                        raw.valid_time < unitemporal_{type_name}_locf.series_end
+                UNION ALL
+                -- The last sample before the series begin defines the initial value
+                SELECT seed.dp_id, unitemporal_{type_name}_locf.series_begin, seed.valid_time, seed.value
+                    FROM unnest(unitemporal_{type_name}_locf.dp_ids) AS ids(dp_id)
+                    CROSS JOIN LATERAL (
+                        SELECT raw.dp_id, raw.valid_time, raw.value
+                            FROM unitemporal_{type_name}_details AS raw
+                            WHERE raw.dp_id = ids.dp_id AND raw.valid_time < unitemporal_{type_name}_locf.series_begin
+                            ORDER BY raw.valid_time DESC
+                            LIMIT 1
+                    ) AS seed
+            )
+            SELECT samples.dp_id,
+                    time_bucket_gapfill(
+                        unitemporal_{type_name}_locf.bucket_width, samples.bucket_time,
+                        unitemporal_{type_name}_locf.series_begin, unitemporal_{type_name}_locf.series_end
+                    ) AS bucket,
+                    locf(last(samples.value, samples.valid_time)) AS value
+                FROM samples
+                GROUP BY samples.dp_id, bucket
+                ORDER BY samples.dp_id, bucket;
+        $$ LANGUAGE sql;
+
+        COMMENT ON FUNCTION unitemporal_{type_name}_locf(INTEGER[], TIMESTAMPTZ, TIMESTAMPTZ, INTERVAL)
+            IS 'Returns the last value of each bucket and carries the last observation forward to fill the gaps';
+        GRANT EXECUTE ON FUNCTION unitemporal_{type_name}_locf(INTEGER[], TIMESTAMPTZ, TIMESTAMPTZ, INTERVAL)
+            TO view_base;
+    """))
+
+
+def downgrade():
+    """Removes the change-only storage again. Already dropped samples cannot be restored."""
+
+    downgrade_locf_functions()
+    downgrade_deadband_filters()
+    downgrade_data_point_options()
+
+
+def downgrade_locf_functions():
+    """Drops the read functions"""
+
+    op.execute(sql.text("""
+        DROP FUNCTION IF EXISTS unitemporal_double_locf(INTEGER[], TIMESTAMPTZ, TIMESTAMPTZ, INTERVAL);
+        DROP FUNCTION IF EXISTS unitemporal_bigint_locf(INTEGER[], TIMESTAMPTZ, TIMESTAMPTZ, INTERVAL);
+        DROP FUNCTION IF EXISTS unitemporal_boolean_locf(INTEGER[], TIMESTAMPTZ, TIMESTAMPTZ, INTERVAL);
+        DROP FUNCTION IF EXISTS unitemporal_jsonb_locf(INTEGER[], TIMESTAMPTZ, TIMESTAMPTZ, INTERVAL);
+    """))
+
+
+def downgrade_deadband_filters():
+    """Drops the filter triggers"""
+
+    op.execute(sql.text("""
+        DROP TRIGGER IF EXISTS deadband_filter ON raw_unitemporal_double;
+        DROP TRIGGER IF EXISTS deadband_filter ON raw_unitemporal_bigint;
+        DROP TRIGGER IF EXISTS deadband_filter ON raw_unitemporal_boolean;
+        DROP TRIGGER IF EXISTS deadband_filter ON raw_unitemporal_jsonb;
+
+        DROP FUNCTION IF EXISTS rdp_tr_deadband;
+    """))
+
+
+def downgrade_data_point_options():
+    """Drops the data point settings"""
+
+    op.execute(sql.text("""
+        ALTER TABLE data_points DROP CONSTRAINT check_deadband;
+        ALTER TABLE data_points DROP COLUMN deadband_rel;
+        ALTER TABLE data_points DROP COLUMN deadband_abs;
+        ALTER TABLE data_points DROP COLUMN change_only;
+    """))
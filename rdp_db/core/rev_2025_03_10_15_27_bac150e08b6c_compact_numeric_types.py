@@ -0,0 +1,196 @@
+"""
+compact numeric types
+
+Extends the type system by the compact numeric types real, integer and smallint. Sensor values with a few significant
+digits and small status codes thereby need less storage than their double and bigint counterparts. Note that the
+additional enum values cannot be removed on downgrade. Only the tables and views will be dropped again.
+
+Revision ID: bac150e08b6c
+Revises: 6c1a03b3a121
+Create Date: 2025-03-10 15:27:48.180357
+
+"""
+import os
+import logging
+
+from alembic import op
+import sqlalchemy as sql
+
+import rdp_db.core.rev_2025_01_29_11_21_0678397a4d04_datatype_extension as rev_datatype
+import rdp_db.core.rev_2025_03_03_10_41_6c1a03b3a121_change_only_storage as rev_change_only
+
+logger = logging.getLogger(__name__)
+
+# revision identifiers, used by Alembic.
+revision = 'bac150e08b6c'
+down_revision = '6c1a03b3a121'
+branch_labels = None
+depends_on = None
+
+# The compact types and the corresponding SQL type names
+compact_types = {
+    "real": "REAL",
+    "integer": "INTEGER",
+    "smallint": "SMALLINT",
+}
+
+
+def upgrade():
+    """Installs the additional time series tables"""
+
+    upgrade_type_system()
+    upgrade_new_ts_tables()
+    upgrade_type_checks()
+    upgrade_data_views()
+    upgrade_change_only_storage()
+    upgrade_storage_comparison()
+
+
+def upgrade_type_system():
+    """Extends the data type enum. The new values must be committed before they can be used."""
+
+    with op.get_context().autocommit_block():
+        for type_name in compact_types:
+            op.execute(sql.text(f"ALTER TYPE time_series_data_type ADD VALUE IF NOT EXISTS '{type_name}';"))
+
+
+def upgrade_new_ts_tables():
+    """Creates the time-series tables for the compact types"""
+
+    for type_name in compact_types:
+        rev_datatype.create_unitemporal_table(type_name)
+        rev_datatype.create_bitemporal_table(type_name)
+
+
+def upgrade_type_checks():
+    """Installs the type checks on the new tables"""
+
+    for type_name in compact_types:
+        rev_datatype.add_type_check(f"raw_unitemporal_{type_name}", type_name, "unitemporal")
+        rev_datatype.add_type_check(f"raw_bitemporal_{type_name}", type_name, "bitemporal")
+
+
+def upgrade_data_views():
+    """Creates the details views for the compact types"""
+
+    for type_name in compact_types:
+        rev_datatype.append_typed_unitemporal_details_view(type_name, False)
+        rev_datatype.append_typed_bitemporal_details_view(type_name, False)
+
+
+def upgrade_change_only_storage():
+    """Enables the change-only storage for the compact types"""
+
+    for type_name, value_type in compact_types.items():
+        rev_change_only.add_deadband_filter(f"raw_unitemporal_{type_name}", "numeric")
+        rev_change_only.create_locf_function(type_name, value_type)
+
+
+def upgrade_storage_comparison():
+    """
+    Creates the storage comparison function and optionally reports the results for a synthetic dataset
+
+    The report creates and compresses scratch hypertables. Hence, it only runs if RDP_NUMERIC_STORAGE_REPORT_ROWS is set
+    to the number of sample rows.
+    """
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_compare_numeric_storage(sample_rows INTEGER DEFAULT 100000)
+        RETURNS TABLE(
+            data_type TEXT,
+            uncompressed_bytes BIGINT,
+            compressed_bytes BIGINT,
+            uncompressed_scan_ms DOUBLE PRECISION,
+            compressed_scan_ms DOUBLE PRECISION
+        )
+        LANGUAGE plpgsql VOLATILE
+        AS $$
+        DECLARE
+            scan_start TIMESTAMPTZ;
+        BEGIN
+            FOREACH data_type IN ARRAY ARRAY['double precision', 'real', 'integer', 'smallint'] LOOP
+                DROP TABLE IF EXISTS rdp_tmp_numeric_storage;
+                EXECUTE format('
+                        CREATE TABLE rdp_tmp_numeric_storage (
+                            dp_id INTEGER NOT NULL,
+                            valid_time TIMESTAMPTZ NOT NULL,
+                            value %s NULL,
+                            PRIMARY KEY (dp_id, valid_time)
+                        )
+                    ', data_type);
+                PERFORM create_hypertable(
+                        'rdp_tmp_numeric_storage', 'valid_time', chunk_time_interval => INTERVAL '1 day'
+                    );
+                ALTER TABLE rdp_tmp_numeric_storage SET (
+                    timescaledb.compress = true,
+                    timescaledb.compress_segmentby = 'dp_id',
+                    timescaledb.compress_orderby = 'valid_time'
+                );
+
+                -- The same slowly varying signal with three significant digits for all types. The integer types
+                -- store the rounded values.
+                EXECUTE format('
+                        INSERT INTO rdp_tmp_numeric_storage(dp_id, valid_time, value)
+                            SELECT sample_id %% 10, ''2020-01-01T00:00:00Z''::TIMESTAMPTZ +
+                                    (sample_id / 10) * INTERVAL ''1 second'',
+                                    round((200 + 50 * sin(sample_id / 3600.0))::NUMERIC, 0)::%s
+                                FROM generate_series(0, $1 - 1) AS sample_id
+                    ', data_type) USING sample_rows;
+
+                uncompressed_bytes := hypertable_size('rdp_tmp_numeric_storage');
+                scan_start := clock_timestamp();
+                PERFORM sum(tmp.value::DOUBLE PRECISION) FROM rdp_tmp_numeric_storage AS tmp;
+                uncompressed_scan_ms := 1000 * extract(EPOCH FROM clock_timestamp() - scan_start);
+
+                PERFORM compress_chunk(chunk) FROM show_chunks('rdp_tmp_numeric_storage') AS chunk;
+                compressed_bytes := hypertable_size('rdp_tmp_numeric_storage');
+                scan_start := clock_timestamp();
+                PERFORM sum(tmp.value::DOUBLE PRECISION) FROM rdp_tmp_numeric_storage AS tmp;
+                compressed_scan_ms := 1000 * extract(EPOCH FROM clock_timestamp() - scan_start);
+
+                DROP TABLE rdp_tmp_numeric_storage;
+                RETURN NEXT;
+            END LOOP;
+        END;
+        $$;
+
+        COMMENT ON FUNCTION rdp_compare_numeric_storage(INTEGER)
+            IS 'Compares the storage size and the scan speed of the numeric types on the same synthetic dataset';
+    """))
+
+    sample_rows = int(os.environ.get("RDP_NUMERIC_STORAGE_REPORT_ROWS", "0"))
+    if sample_rows <= 0:
+        return
+
+    results = op.get_bind().execute(
+        sql.text("SELECT * FROM rdp_compare_numeric_storage(:sample_rows);"), dict(sample_rows=sample_rows)
+    ).fetchall()
+    reference = next((res for res in results if res.data_type == "double precision"), None)
+    for res in results:
+        logger.info(
+            f"Numeric storage of {res.data_type} ({sample_rows} rows): "
+            f"{res.uncompressed_bytes} bytes uncompressed "
+            f"({res.uncompressed_bytes / reference.uncompressed_bytes:.0%} of double), "
+            f"{res.compressed_bytes} bytes compressed ({res.compressed_bytes / reference.compressed_bytes:.0%}), "
+            f"scan {res.uncompressed_scan_ms:.1f} ms uncompressed and {res.compressed_scan_ms:.1f} ms compressed"
+        )
+
+
+def downgrade():
+    """Removes the compact types again. The enum values remain as they cannot be dropped easily."""
+
+    op.execute(sql.text("""
+        DROP FUNCTION IF EXISTS rdp_compare_numeric_storage(INTEGER);
+    """))
+
+    for type_name in compact_types:
+        op.execute(sql.text(f"""
+            DROP FUNCTION IF EXISTS unitemporal_{type_name}_locf(INTEGER[], TIMESTAMPTZ, TIMESTAMPTZ, INTERVAL);
+            DROP VIEW IF EXISTS unitemporal_{type_name}_details, bitemporal_{type_name}_details;
+        """))
+
+        # Cannot drop multiple hypertables at once: https://github.com/timescale/timescaledb/issues/2303
+        op.execute(sql.text(f"""
+            DROP TABLE IF EXISTS raw_unitemporal_{type_name};
+            DROP TABLE IF EXISTS raw_bitemporal_{type_name};
+        """))
@@ -0,0 +1,291 @@
+"""
+category type
+
+Introduces the dictionary-encoded category type for operational states, modes and alarm texts. Each sample only stores
+a smallint code and the per-data-point dictionary in data_point_categories maps the codes to the labels. Note that the
+additional enum value cannot be removed on downgrade.
+
+Revision ID: e1c55647e8dd
+Revises: bac150e08b6c
+Create Date: 2025-03-17 13:52:36.904127
+
+"""
+from alembic import op
+import sqlalchemy as sql
+
+import rdp_db.core.rev_2025_01_29_11_21_0678397a4d04_datatype_extension as rev_datatype
+import rdp_db.core.rev_2025_03_03_10_41_6c1a03b3a121_change_only_storage as rev_change_only
+
+# revision identifiers, used by Alembic.
+revision = 'e1c55647e8dd'
+down_revision = 'bac150e08b6c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Installs the category type including the dictionary"""
+
+    upgrade_type_system()
+    upgrade_dictionary()
+    upgrade_new_ts_tables()
+    upgrade_data_views()
+    upgrade_encoding_function()
+    upgrade_conversion_function()
+    upgrade_change_only_storage()
+
+
+def upgrade_type_system():
+    """Extends the data type enum. The new value must be committed before it can be used."""
+
+    with op.get_context().autocommit_block():
+        op.execute(sql.text("ALTER TYPE time_series_data_type ADD VALUE IF NOT EXISTS 'category';"))
+
+
+def upgrade_dictionary():
+    """Creates the dictionary table that maps the codes to the labels"""
+
+    op.execute(sql.text("""
+        CREATE TABLE data_point_categories (
+            dp_id INTEGER NOT NULL,
+            code SMALLINT NOT NULL,
+            label TEXT NOT NULL,
+            PRIMARY KEY (dp_id, code),
+            UNIQUE (dp_id, label),
+            FOREIGN KEY (dp_id) REFERENCES data_points(id)
+        );
+        COMMENT ON TABLE data_point_categories
+            IS 'Dictionary that maps the codes of the category time series to their labels';
+        COMMENT ON COLUMN data_point_categories.code
+            IS 'The code that is stored in the raw category tables. Codes are unique per data point only.';
+
+        GRANT SELECT, INSERT ON data_point_categories TO data_source_base;
+        GRANT SELECT ON data_point_categories TO restricting_view_executor;
+    """))
+
+
+def upgrade_new_ts_tables():
+    """Creates the time-series tables that reference the dictionary"""
+
+    rev_datatype.create_unitemporal_table("smallint", "category")
+    rev_datatype.create_bitemporal_table("smallint", "category")
+
+    op.execute(sql.text("""
+        ALTER TABLE raw_unitemporal_category ADD CONSTRAINT raw_unitemporal_category_code_fkey
+            FOREIGN KEY (dp_id, value) REFERENCES data_point_categories(dp_id, code);
+        ALTER TABLE raw_bitemporal_category ADD CONSTRAINT raw_bitemporal_category_code_fkey
+            FOREIGN KEY (dp_id, value) REFERENCES data_point_categories(dp_id, code);
+        COMMENT ON COLUMN raw_unitemporal_category.value
+            IS 'The code of the category at the particular instant of time. See data_point_categories for the label.';
+        COMMENT ON COLUMN raw_bitemporal_category.value
+            IS 'The code of the category at the particular instant of time. See data_point_categories for the label.';
+    """))
+
+    rev_datatype.add_type_check("raw_unitemporal_category", "category", "unitemporal")
+    rev_datatype.add_type_check("raw_bitemporal_category", "category", "bitemporal")
+
+
+def upgrade_data_views():
+    """Creates the decoding details views and the dictionary view"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW unitemporal_category_details(
+            dp_id, valid_time, value, name, device_id, location_code, data_provider, unit, view_role, metadata,
+            data_type, temporality, value_code
+        ) AS
+        SELECT dp.id, raw.valid_time, cat.label, dp.name, dp.device_id, dp.location_code, dp.data_provider, dp.unit,
+                dp.view_role, dp.metadata, dp.data_type, dp.temporality, raw.value
+            FROM raw_unitemporal_category AS raw
+            JOIN data_points AS dp
+                ON (raw.dp_id = dp.id)
+            LEFT JOIN data_point_categories AS cat
+                ON (raw.dp_id = cat.dp_id AND raw.value = cat.code)
+            WHERE dp.temporality = 'unitemporal' AND dp.data_type = 'category';
+        COMMENT ON VIEW unitemporal_category_details
+            IS 'Joint time series and data point information. Filter on value_code to avoid decoding the labels.';
+
+        ALTER VIEW unitemporal_category_details OWNER TO restricting_view_executor;
+        GRANT SELECT, TRIGGER ON unitemporal_category_details TO view_base;
+    """))
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW bitemporal_category_details(
+            dp_id, valid_time, transaction_time, value, name, device_id, location_code, data_provider, unit, view_role,
+            metadata, data_type, temporality, value_code
+        ) AS
+        SELECT dp.id, raw.valid_time, raw.transaction_time, cat.label, dp.name, dp.device_id, dp.location_code,
+                dp.data_provider, dp.unit, dp.view_role, dp.metadata, dp.data_type, dp.temporality, raw.value
+            FROM raw_bitemporal_category AS raw
+            JOIN data_points AS dp
+                ON (raw.dp_id = dp.id)
+            LEFT JOIN data_point_categories AS cat
+                ON (raw.dp_id = cat.dp_id AND raw.value = cat.code)
+            WHERE dp.temporality = 'bitemporal' AND dp.data_type = 'category';
+        COMMENT ON VIEW bitemporal_category_details
+            IS 'Joint time series and data point information. Filter on value_code to avoid decoding the labels.';
+
+        ALTER VIEW bitemporal_category_details OWNER TO restricting_view_executor;
+        GRANT SELECT, TRIGGER ON bitemporal_category_details TO view_base;
+    """))
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW category_labels(
+            dp_id, code, label, name, device_id, location_code, data_provider, view_role
+        ) AS
+        SELECT dp.id, cat.code, cat.label, dp.name, dp.device_id, dp.location_code, dp.data_provider, dp.view_role
+            FROM data_point_categories AS cat
+            JOIN data_points AS dp
+                ON (cat.dp_id = dp.id);
+        COMMENT ON VIEW category_labels IS 'The dictionary of the category data points that are visible to the user';
+
+        ALTER VIEW category_labels OWNER TO restricting_view_executor;
+        GRANT SELECT ON category_labels TO view_base;
+    """))
+
+
+def upgrade_encoding_function():
+    """Creates the bulk encoding function for writers"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_encode_categories(dp_id INTEGER, labels TEXT[]) RETURNS SMALLINT[]
+        LANGUAGE plpgsql VOLATILE
+        AS $$
+        DECLARE
+            next_code INTEGER;
+        BEGIN
+            IF NOT EXISTS (
+                SELECT FROM data_points AS dp WHERE dp.id = rdp_encode_categories.dp_id AND dp.data_type = 'category'
+            ) THEN
+                RAISE EXCEPTION 'Invalid data point %, expected an existing category data point',
+                    rdp_encode_categories.dp_id;
+            END IF;
+
+            -- Serialize the code assignment of concurrent writers of the same data point
+            PERFORM pg_advisory_xact_lock(hashtext('rdp_encode_categories'), rdp_encode_categories.dp_id);
+
+            SELECT COALESCE(max(cat.code) + 1, 0) INTO next_code
+                FROM data_point_categories AS cat
+                WHERE cat.dp_id = rdp_encode_categories.dp_id;
+
+            INSERT INTO data_point_categories(dp_id, code, label)
+                SELECT rdp_encode_categories.dp_id, next_code + row_number() OVER (ORDER BY new_labels.first_pos) - 1,
+                        new_labels.label
+                    FROM (
+                        SELECT requested.label, min(requested.pos) AS first_pos
+                            FROM unnest(rdp_encode_categories.labels) WITH ORDINALITY AS requested(label, pos)
+                            WHERE requested.label IS NOT NULL AND NOT EXISTS (
+                                SELECT FROM data_point_categories AS cat
+                                    WHERE cat.dp_id = rdp_encode_categories.dp_id AND cat.label = requested.label
+                            )
+                            GROUP BY requested.label
+                    ) AS new_labels;
+
+            RETURN ARRAY(
+                SELECT cat.code
+                    FROM unnest(rdp_encode_categories.labels) WITH ORDINALITY AS requested(label, pos)
+                    LEFT JOIN data_point_categories AS cat
+                        ON (cat.dp_id = rdp_encode_categories.dp_id AND cat.label = requested.label)
+                    ORDER BY requested.pos
+            );
+        END;
+        $$;
+
+        GRANT EXECUTE ON FUNCTION rdp_encode_categories(INTEGER, TEXT[]) TO data_source_base;
+        COMMENT ON FUNCTION rdp_encode_categories(INTEGER, TEXT[])
+            IS 'Returns the codes of the given labels in the same order. Unknown labels are added to the dictionary.';
+    """))
+
+
+def upgrade_conversion_function():
+    """Creates the function that converts existing jsonb string series into category series"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_convert_jsonb_to_category(dp_id INTEGER) RETURNS BIGINT
+        LANGUAGE plpgsql VOLATILE
+        AS $$
+        DECLARE
+            dp_temporality time_series_temporality;
+            has_non_strings BOOLEAN;
+            converted_rows BIGINT;
+        BEGIN
+            SELECT dp.temporality INTO dp_temporality
+                FROM data_points AS dp
+                WHERE dp.id = rdp_convert_jsonb_to_category.dp_id AND dp.data_type = 'jsonb'
+                FOR UPDATE;
+            IF NOT FOUND THEN
+                RAISE EXCEPTION 'Invalid data point %, expected an existing jsonb data point',
+                    rdp_convert_jsonb_to_category.dp_id;
+            END IF;
+
+            EXECUTE format('
+                    SELECT EXISTS (
+                        SELECT FROM raw_%s_jsonb AS raw
+                            WHERE raw.dp_id = $1 AND jsonb_typeof(raw.value) <> ''string''
+                    )
+                ', dp_temporality) INTO has_non_strings USING rdp_convert_jsonb_to_category.dp_id;
+            IF has_non_strings THEN
+                RAISE EXCEPTION 'Data point % holds non-string values', rdp_convert_jsonb_to_category.dp_id;
+            END IF;
+
+            UPDATE data_points SET data_type = 'category' WHERE id = rdp_convert_jsonb_to_category.dp_id;
+            EXECUTE format('
+                    SELECT rdp_encode_categories($1, ARRAY(
+                        SELECT DISTINCT raw.value #>> ''{}'' FROM raw_%s_jsonb AS raw WHERE raw.dp_id = $1
+                    ))
+                ', dp_temporality) USING rdp_convert_jsonb_to_category.dp_id;
+
+            IF dp_temporality = 'unitemporal' THEN
+                WITH moved AS (
+                    DELETE FROM raw_unitemporal_jsonb AS raw WHERE raw.dp_id = rdp_convert_jsonb_to_category.dp_id
+                        RETURNING raw.dp_id, raw.valid_time, raw.value
+                )
+                INSERT INTO raw_unitemporal_category(dp_id, valid_time, value)
+                    SELECT moved.dp_id, moved.valid_time, cat.code
+                        FROM moved
+                        LEFT JOIN data_point_categories AS cat
+                            ON (cat.dp_id = moved.dp_id AND cat.label = moved.value #>> '{}');
+            ELSE
+                WITH moved AS (
+                    DELETE FROM raw_bitemporal_jsonb AS raw WHERE raw.dp_id = rdp_convert_jsonb_to_category.dp_id
+                        RETURNING raw.dp_id, raw.valid_time, raw.transaction_time, raw.value
+                )
+                INSERT INTO raw_bitemporal_category(dp_id, valid_time, transaction_time, value)
+                    SELECT moved.dp_id, moved.valid_time, moved.transaction_time, cat.code
+                        FROM moved
+                        LEFT JOIN data_point_categories AS cat
+                            ON (cat.dp_id = moved.dp_id AND cat.label = moved.value #>> '{}');
+            END IF;
+            GET DIAGNOSTICS converted_rows = ROW_COUNT;
+            RETURN converted_rows;
+        END;
+        $$;
+
+        COMMENT ON FUNCTION rdp_convert_jsonb_to_category(INTEGER)
+            IS 'Moves the string samples of a jsonb data point into the category tables and returns the moved rows';
+    """))
+
+
+def upgrade_change_only_storage():
+    """Enables the change-only storage and the LOCF reconstruction for the category type"""
+
+    rev_change_only.add_deadband_filter("raw_unitemporal_category", "exact")
+    rev_change_only.create_locf_function("category", "TEXT")
+
+
+def downgrade():
+    """Removes the category type again. The enum value remains as it cannot be dropped easily."""
+
+    op.execute(sql.text("""
+        DROP FUNCTION IF EXISTS unitemporal_category_locf(INTEGER[], TIMESTAMPTZ, TIMESTAMPTZ, INTERVAL);
+        DROP FUNCTION IF EXISTS rdp_convert_jsonb_to_category(INTEGER);
+        DROP FUNCTION IF EXISTS rdp_encode_categories(INTEGER, TEXT[]);
+        DROP VIEW IF EXISTS category_labels;
+        DROP VIEW IF EXISTS unitemporal_category_details, bitemporal_category_details;
+    """))
+
+    # Cannot drop multiple hypertables at once: https://github.com/timescale/timescaledb/issues/2303
+    op.execute(sql.text("""
+        DROP TABLE IF EXISTS raw_unitemporal_category;
+        DROP TABLE IF EXISTS raw_bitemporal_category;
+        DROP TABLE IF EXISTS data_point_categories;
+    """))
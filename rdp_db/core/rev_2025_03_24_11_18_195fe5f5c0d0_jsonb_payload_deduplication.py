@@ -0,0 +1,408 @@
+"""
+jsonb payload deduplication
+
+Configuration snapshots tend to repeat the same large documents many times. This revision introduces a content-addressed
+payload store such that the jsonb raw tables only keep a reference (the SHA-256 hash of the document) per sample. The
+details views rehydrate the payloads transparently. Already existing samples keep their inline value until they are
+compacted via rdp_compact_jsonb_payloads.
+
+Revision ID: 195fe5f5c0d0
+Revises: e1c55647e8dd
+Create Date: 2025-03-24 11:18:53.627184
+
+"""
+from alembic import op
+import sqlalchemy as sql
+
+import rdp_db.core.rev_2025_01_29_11_21_0678397a4d04_datatype_extension as rev_datatype
+import rdp_db.core.rev_2025_03_03_10_41_6c1a03b3a121_change_only_storage as rev_change_only
+import rdp_db.core.rev_2025_03_17_13_52_e1c55647e8dd_category_type as rev_category
+
+# revision identifiers, used by Alembic.
+revision = '195fe5f5c0d0'
+down_revision = 'e1c55647e8dd'
+branch_labels = None
+depends_on = None
+
+# Reads the jsonb value of a raw table aliased as raw, regardless whether it is stored inline or in the payload store
+payload_value_expression = """COALESCE(
+    raw.value, (SELECT pl.payload FROM rdp_jsonb_payloads AS pl WHERE pl.payload_hash = raw.payload_hash)
+)"""
+
+
+def upgrade():
+    """Installs the payload store and redirects the jsonb tables"""
+
+    upgrade_payload_store()
+    upgrade_payload_references()
+    upgrade_data_views()
+    upgrade_deadband_filter()
+    upgrade_maintenance_procedures()
+    upgrade_conversion_function()
+
+
+def upgrade_payload_store():
+    """Creates the payload table and the set-wise store function"""
+
+    op.execute(sql.text("""
+        CREATE TABLE rdp_jsonb_payloads (
+            payload_hash BYTEA NOT NULL,
+            payload JSONB NOT NULL,
+            stored_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (payload_hash)
+        );
+        COMMENT ON TABLE rdp_jsonb_payloads IS 'Content-addressed store of the jsonb time series payloads';
+        COMMENT ON COLUMN rdp_jsonb_payloads.payload_hash
+            IS 'SHA-256 hash of the canonical text representation of the payload';
+        COMMENT ON COLUMN rdp_jsonb_payloads.stored_at
+            IS 'The last time the payload has been stored, at a granularity of one minute. Recently stored payloads
+                are not purged, since their references may not be inserted yet.';
+
+        GRANT SELECT, INSERT, UPDATE (stored_at) ON rdp_jsonb_payloads TO data_source_base;
+        GRANT SELECT ON rdp_jsonb_payloads TO restricting_view_executor;
+    """))
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_store_jsonb_payloads(payloads JSONB[]) RETURNS BYTEA[]
+        LANGUAGE sql VOLATILE
+        AS $$
+            -- Refreshing the storage time protects the returned payloads from being purged until they are referenced
+            INSERT INTO rdp_jsonb_payloads AS pl(payload_hash, payload)
+                SELECT DISTINCT ON (payload_hash) sha256(convert_to(stored.payload::TEXT, 'UTF8')) AS payload_hash,
+                        stored.payload
+                    FROM unnest(rdp_store_jsonb_payloads.payloads) AS stored(payload)
+                    WHERE stored.payload IS NOT NULL
+                ON CONFLICT (payload_hash) DO UPDATE SET stored_at = EXCLUDED.stored_at
+                    WHERE pl.stored_at < EXCLUDED.stored_at - INTERVAL '1 minute';
+
+            SELECT ARRAY(
+                SELECT sha256(convert_to(stored.payload::TEXT, 'UTF8'))
+                    FROM unnest(rdp_store_jsonb_payloads.payloads) WITH ORDINALITY AS stored(payload, pos)
+                    ORDER BY stored.pos
+            );
+        $$;
+
+        GRANT EXECUTE ON FUNCTION rdp_store_jsonb_payloads(JSONB[]) TO data_source_base;
+        COMMENT ON FUNCTION rdp_store_jsonb_payloads(JSONB[])
+            IS 'Stores the given payloads at once and returns their hashes in the same order. The hashes can be
+                directly inserted into the payload_hash column of the jsonb raw tables within the grace period of
+                rdp_purge_jsonb_payloads.';
+    """))
+
+
+def upgrade_payload_references():
+    """Adds the payload reference column and the trigger that moves the payloads into the store"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_tr_compact_payload() RETURNS TRIGGER
+        LANGUAGE plpgsql VOLATILE PARALLEL RESTRICTED
+        AS $$
+        BEGIN
+            IF NEW.value IS NOT NULL THEN
+                NEW.payload_hash := sha256(convert_to(NEW.value::TEXT, 'UTF8'));
+                INSERT INTO rdp_jsonb_payloads(payload_hash, payload) VALUES (NEW.payload_hash, NEW.value)
+                    ON CONFLICT (payload_hash) DO NOTHING;
+                NEW.value := NULL;
+            ELSIF NEW.payload_hash IS NOT NULL AND NOT EXISTS (
+                SELECT FROM rdp_jsonb_payloads AS pl WHERE pl.payload_hash = NEW.payload_hash
+            ) THEN
+                -- Checked instead of a foreign key, such that purging the payloads does not scan the raw tables
+                RAISE EXCEPTION 'Unknown payload hash %, expected a hash returned by rdp_store_jsonb_payloads()',
+                    encode(NEW.payload_hash, 'hex');
+            END IF;
+            RETURN NEW;
+        END;
+        $$
+    """))
+
+    for table_name in ("raw_unitemporal_jsonb", "raw_bitemporal_jsonb"):
+        op.execute(sql.text(f"""
+            ALTER TABLE {table_name} ADD COLUMN payload_hash BYTEA NULL;
+            COMMENT ON COLUMN {table_name}.value
+                IS 'The inline payload of samples that have not been moved to the payload store (yet)';
+            COMMENT ON COLUMN {table_name}.payload_hash
+                IS 'Reference to the payload in rdp_jsonb_payloads';
+
+            -- Fires after the type check but before the deadband filter
+            CREATE OR REPLACE TRIGGER compact_payload
+                BEFORE INSERT OR UPDATE
+                ON {table_name}
+                FOR EACH ROW
+                EXECUTE FUNCTION rdp_tr_compact_payload();
+        """))
+
+
+def upgrade_data_views():
+    """Replaces the value of the jsonb details views. The left join is removed in case the value is not selected."""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW unitemporal_jsonb_details(
+            dp_id, valid_time, value, name, device_id, location_code, data_provider, unit, view_role, metadata,
+            data_type, temporality
+        ) AS
+        SELECT dp.id, raw.valid_time, COALESCE(raw.value, pl.payload), dp.name, dp.device_id, dp.location_code,
+                dp.data_provider, dp.unit, dp.view_role, dp.metadata, dp.data_type, dp.temporality
+            FROM raw_unitemporal_jsonb AS raw
+            JOIN data_points AS dp
+                ON (raw.dp_id = dp.id)
+            LEFT JOIN rdp_jsonb_payloads AS pl
+                ON (raw.payload_hash = pl.payload_hash)
+            WHERE dp.temporality = 'unitemporal' AND dp.data_type = 'jsonb';
+
+        CREATE OR REPLACE VIEW bitemporal_jsonb_details(
+            dp_id, valid_time, transaction_time, value, name, device_id, location_code, data_provider, unit, view_role,
+            metadata, data_type, temporality
+        ) AS
+        SELECT dp.id, raw.valid_time, raw.transaction_time, COALESCE(raw.value, pl.payload), dp.name, dp.device_id,
+                dp.location_code, dp.data_provider, dp.unit, dp.view_role, dp.metadata, dp.data_type, dp.temporality
+            FROM raw_bitemporal_jsonb AS raw
+            JOIN data_points AS dp
+                ON (raw.dp_id = dp.id)
+            LEFT JOIN rdp_jsonb_payloads AS pl
+                ON (raw.payload_hash = pl.payload_hash)
+            WHERE dp.temporality = 'bitemporal' AND dp.data_type = 'jsonb';
+    """))
+
+
+def upgrade_deadband_filter():
+    """Extends the deadband filter such that the payload references are compared instead of the inline values"""
+
+    create_deadband_function()
+    rev_change_only.add_deadband_filter("raw_unitemporal_jsonb", "payload")
+
+
+def create_deadband_function(rejection_statement: str = ""):
+    """
+    Creates the trigger function of the deadband filter, which supports the payload references
+
+    :param rejection_statement: Optionally, a statement that is executed for each dropped sample
+    """
+
+    op.execute(sql.text(f"""
+        -- Defines the trigger function that drops redundant samples of change-only data points. The first argument
+        -- specifies how to compare the values: 'numeric' considers the deadbands, 'exact' only drops equal values and
+        -- 'payload' compares the payload references.
+        CREATE OR REPLACE FUNCTION rdp_tr_deadband() RETURNS TRIGGER
+        LANGUAGE plpgsql VOLATILE PARALLEL RESTRICTED
+        AS $$
+        DECLARE
+            comparison_mode TEXT := TG_ARGV[0];
+            ref_info RECORD;
+            deadband_clause TEXT := 'FALSE';
+            is_redundant BOOLEAN;
+        BEGIN
+            SELECT change_only, deadband_abs, deadband_rel INTO ref_info
+                FROM data_points
+                WHERE id = NEW.dp_id;
+
+            IF NOT COALESCE(ref_info.change_only, FALSE) THEN
+                RETURN NEW;
+            END IF;
+
+            IF comparison_mode = 'payload' THEN
+                EXECUTE format('
+                        SELECT last_sample.payload_hash IS NOT DISTINCT FROM $1
+                            FROM (
+                                SELECT raw.payload_hash FROM %I.%I AS raw
+                                    WHERE raw.dp_id = $2 AND raw.valid_time < $3
+                                    ORDER BY raw.valid_time DESC
+                                    LIMIT 1
+                            ) AS last_sample
+                    ', TG_TABLE_SCHEMA, TG_TABLE_NAME
+                    ) INTO is_redundant
+                    USING NEW.payload_hash, NEW.dp_id, NEW.valid_time;
+            ELSE
+                IF comparison_mode = 'numeric' THEN
+                    deadband_clause := 'abs(last_sample.value - $1) <= $4 OR
+                        abs(last_sample.value - $1) <= $5 * abs(last_sample.value)';
+                END IF;
+
+                EXECUTE format('
+                        SELECT last_sample.value IS NOT DISTINCT FROM $1 OR %s
+                            FROM (
+                                SELECT raw.value FROM %I.%I AS raw
+                                    WHERE raw.dp_id = $2 AND raw.valid_time < $3
+                                    ORDER BY raw.valid_time DESC
+                                    LIMIT 1
+                            ) AS last_sample
+                    ', deadband_clause, TG_TABLE_SCHEMA, TG_TABLE_NAME
+                    ) INTO is_redundant
+                    USING NEW.value, NEW.dp_id, NEW.valid_time, ref_info.deadband_abs, ref_info.deadband_rel;
+            END IF;
+
+            IF COALESCE(is_redundant, FALSE) THEN
+                {rejection_statement}
+                RETURN NULL;  -- Silently skip the sample
+            END IF;
+            RETURN NEW;
+        END;
+        $$
+    """))
+
+
+def upgrade_maintenance_procedures():
+    """Creates the procedures that move existing payloads and purge the unreferenced ones"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE PROCEDURE rdp_compact_jsonb_payloads(job_id INTEGER DEFAULT NULL, config JSONB DEFAULT NULL)
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            table_name TEXT;
+            chunk RECORD;
+            compacted_rows BIGINT;
+        BEGIN
+            FOREACH table_name IN ARRAY ARRAY['raw_unitemporal_jsonb', 'raw_bitemporal_jsonb'] LOOP
+                FOR chunk IN
+                    SELECT DISTINCT chunks.range_start, chunks.range_end
+                        FROM timescaledb_information.chunks AS chunks
+                        WHERE chunks.hypertable_schema = 'public' AND chunks.hypertable_name = table_name
+                        ORDER BY chunks.range_start
+                LOOP
+                    -- The compact_payload trigger moves the inline values into the store
+                    EXECUTE format('
+                            UPDATE %I AS raw SET value = raw.value
+                                WHERE raw.valid_time >= $1 AND raw.valid_time < $2 AND raw.value IS NOT NULL
+                        ', table_name) USING chunk.range_start, chunk.range_end;
+                    GET DIAGNOSTICS compacted_rows = ROW_COUNT;
+                    IF compacted_rows > 0 THEN
+                        RAISE LOG 'Moved % payloads of % in [%, %) to the payload store',
+                            compacted_rows, table_name, chunk.range_start, chunk.range_end;
+                    END IF;
+                    COMMIT;
+                END LOOP;
+            END LOOP;
+        END;
+        $$;
+
+        COMMENT ON PROCEDURE rdp_compact_jsonb_payloads(INTEGER, JSONB)
+            IS 'Moves the inline payloads of the jsonb raw tables into the payload store, one chunk at a time';
+    """))
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE PROCEDURE rdp_purge_jsonb_payloads(job_id INTEGER DEFAULT NULL, config JSONB DEFAULT NULL)
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            grace_period INTERVAL := COALESCE((config ->> 'grace_period')::INTERVAL, INTERVAL '1 hour');
+            purged_rows BIGINT;
+        BEGIN
+            -- Block concurrent writers from referencing a payload that is about to be deleted. The payloads returned
+            -- by rdp_store_jsonb_payloads are referenced in later transactions and are kept for the grace period.
+            LOCK TABLE rdp_jsonb_payloads IN SHARE ROW EXCLUSIVE MODE;
+            DELETE FROM rdp_jsonb_payloads AS pl
+                WHERE pl.stored_at < now() - grace_period AND NOT EXISTS (
+                        SELECT FROM raw_unitemporal_jsonb AS raw WHERE raw.payload_hash = pl.payload_hash
+                    ) AND NOT EXISTS (
+                        SELECT FROM raw_bitemporal_jsonb AS raw WHERE raw.payload_hash = pl.payload_hash
+                    );
+            GET DIAGNOSTICS purged_rows = ROW_COUNT;
+            RAISE LOG 'Purged % unreferenced jsonb payloads', purged_rows;
+        END;
+        $$;
+
+        COMMENT ON PROCEDURE rdp_purge_jsonb_payloads(INTEGER, JSONB)
+            IS 'Deletes the payloads that are not referenced anymore, e.g., after applying the retention rules.
+                Payloads stored within the grace_period (default: 1 hour) are kept. The procedure scans all jsonb
+                samples and is therefore not scheduled by default.';
+    """))
+
+
+def upgrade_conversion_function():
+    """Replaces the conversion of jsonb series into category series such that the stored payloads are read"""
+
+    op.execute(sql.text(f"""
+        CREATE OR REPLACE FUNCTION rdp_convert_jsonb_to_category(dp_id INTEGER) RETURNS BIGINT
+        LANGUAGE plpgsql VOLATILE
+        AS $$
+        DECLARE
+            dp_temporality time_series_temporality;
+            has_non_strings BOOLEAN;
+            converted_rows BIGINT;
+        BEGIN
+            SELECT dp.temporality INTO dp_temporality
+                FROM data_points AS dp
+                WHERE dp.id = rdp_convert_jsonb_to_category.dp_id AND dp.data_type = 'jsonb'
+                FOR UPDATE;
+            IF NOT FOUND THEN
+                RAISE EXCEPTION 'Invalid data point %, expected an existing jsonb data point',
+                    rdp_convert_jsonb_to_category.dp_id;
+            END IF;
+
+            EXECUTE format('
+                    SELECT EXISTS (
+                        SELECT FROM raw_%s_jsonb AS raw
+                            WHERE raw.dp_id = $1 AND jsonb_typeof({payload_value_expression}) <> ''string''
+                    )
+                ', dp_temporality) INTO has_non_strings USING rdp_convert_jsonb_to_category.dp_id;
+            IF has_non_strings THEN
+                RAISE EXCEPTION 'Data point % holds non-string values', rdp_convert_jsonb_to_category.dp_id;
+            END IF;
+
+            UPDATE data_points SET data_type = 'category' WHERE id = rdp_convert_jsonb_to_category.dp_id;
+            EXECUTE format('
+                    SELECT rdp_encode_categories($1, ARRAY(
+                        SELECT DISTINCT {payload_value_expression} #>> ''{{}}''
+                            FROM raw_%s_jsonb AS raw
+                            WHERE raw.dp_id = $1
+                    ))
+                ', dp_temporality) USING rdp_convert_jsonb_to_category.dp_id;
+
+            IF dp_temporality = 'unitemporal' THEN
+                WITH moved AS (
+                    DELETE FROM raw_unitemporal_jsonb AS raw WHERE raw.dp_id = rdp_convert_jsonb_to_category.dp_id
+                        RETURNING raw.dp_id, raw.valid_time, {payload_value_expression} AS value
+                )
+                INSERT INTO raw_unitemporal_category(dp_id, valid_time, value)
+                    SELECT moved.dp_id, moved.valid_time, cat.code
+                        FROM moved
+                        LEFT JOIN data_point_categories AS cat
+                            ON (cat.dp_id = moved.dp_id AND cat.label = moved.value #>> '{{}}');
+            ELSE
+                WITH moved AS (
+                    DELETE FROM raw_bitemporal_jsonb AS raw WHERE raw.dp_id = rdp_convert_jsonb_to_category.dp_id
+                        RETURNING raw.dp_id, raw.valid_time, raw.transaction_time, {payload_value_expression} AS value
+                )
+                INSERT INTO raw_bitemporal_category(dp_id, valid_time, transaction_time, value)
+                    SELECT moved.dp_id, moved.valid_time, moved.transaction_time, cat.code
+                        FROM moved
+                        LEFT JOIN data_point_categories AS cat
+                            ON (cat.dp_id = moved.dp_id AND cat.label = moved.value #>> '{{}}');
+            END IF;
+            GET DIAGNOSTICS converted_rows = ROW_COUNT;
+            RETURN converted_rows;
+        END;
+        $$;
+    """))
+
+
+def downgrade():
+    """Moves the payloads back into the raw tables and removes the store"""
+
+    rev_category.upgrade_conversion_function()
+
+    op.execute(sql.text("""
+        DROP PROCEDURE IF EXISTS rdp_purge_jsonb_payloads(INTEGER, JSONB);
+        DROP PROCEDURE IF EXISTS rdp_compact_jsonb_payloads(INTEGER, JSONB);
+    """))
+
+    # Restores the original filter function and its comparison modes including 'exact' for the jsonb table
+    rev_change_only.upgrade_deadband_filters()
+
+    rev_datatype.append_typed_unitemporal_details_view("jsonb", False)
+    rev_datatype.append_typed_bitemporal_details_view("jsonb", False)
+
+    for table_name in ("raw_unitemporal_jsonb", "raw_bitemporal_jsonb"):
+        op.execute(sql.text(f"""
+            DROP TRIGGER IF EXISTS compact_payload ON {table_name};
+            UPDATE {table_name} AS raw SET value = pl.payload
+                FROM rdp_jsonb_payloads AS pl
+                WHERE raw.payload_hash = pl.payload_hash AND raw.value IS NULL;
+            ALTER TABLE {table_name} DROP COLUMN payload_hash;
+        """))
+
+    op.execute(sql.text("""
+        DROP FUNCTION IF EXISTS rdp_tr_compact_payload();
+        DROP FUNCTION IF EXISTS rdp_store_jsonb_payloads(JSONB[]);
+        DROP TABLE IF EXISTS rdp_jsonb_payloads;
+    """))
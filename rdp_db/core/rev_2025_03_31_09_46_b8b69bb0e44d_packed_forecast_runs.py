@@ -0,0 +1,255 @@
+"""
+packed forecast runs
+
+Introduces an alternative bitemporal representation for regularly sampled forecast runs. Instead of one row per valid
+time, each run is stored as a single row holding the first valid time, the step and the array of values. The unpacking
+view exposes the samples in the same format as bitemporal_double_details and the latest and horizon functions operate on
+the packed rows directly by only unpacking the requested array slices.
+
+Revision ID: b8b69bb0e44d
+Revises: 195fe5f5c0d0
+Create Date: 2025-03-31 09:46:20.391845
+
+"""
+from alembic import op
+import sqlalchemy as sql
+
+import rdp_db.core.rev_2025_01_29_11_21_0678397a4d04_datatype_extension as rev_datatype
+
+# revision identifiers, used by Alembic.
+revision = 'b8b69bb0e44d'
+down_revision = '195fe5f5c0d0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Installs the packed table, the views and the access functions"""
+
+    upgrade_packed_table()
+    upgrade_data_views()
+    upgrade_access_functions()
+
+
+def upgrade_packed_table():
+    """Creates the packed table including the derived end of the valid time range"""
+
+    op.execute(sql.text("""
+        CREATE TABLE raw_bitemporal_double_packed (
+            dp_id INTEGER NOT NULL,
+            transaction_time TIMESTAMPTZ NOT NULL,
+            valid_from TIMESTAMPTZ NOT NULL,
+            step INTERVAL NOT NULL,
+            valid_to TIMESTAMPTZ NOT NULL,
+            value_array DOUBLE PRECISION[] NOT NULL,
+            PRIMARY KEY (dp_id, valid_from, transaction_time),
+            FOREIGN KEY (dp_id) REFERENCES data_points(id),
+            -- The access functions derive the array positions from the duration of the step
+            CONSTRAINT check_step CHECK (
+                step > INTERVAL '0' AND date_part('year', step) = 0 AND date_part('month', step) = 0 AND
+                    date_part('day', step) = 0
+            ),
+            CONSTRAINT check_value_array CHECK (cardinality(value_array) > 0 AND array_ndims(value_array) = 1),
+            -- Bounds the valid time range of the runs such that the access functions can exclude the older chunks
+            CONSTRAINT check_run_length CHECK (valid_to - valid_from <= INTERVAL '31 days')
+        );
+        COMMENT ON TABLE raw_bitemporal_double_packed
+            IS 'Stores regularly sampled forecast runs of type double having one row per run';
+        COMMENT ON COLUMN raw_bitemporal_double_packed.dp_id
+            IS 'Reference to the data_points entry that holds all the details on the time series';
+        COMMENT ON COLUMN raw_bitemporal_double_packed.transaction_time
+            IS 'The time at which the run was created (e.g., the time a forecast was calculated)';
+        COMMENT ON COLUMN raw_bitemporal_double_packed.valid_from
+            IS 'The valid time of the first value in the array';
+        COMMENT ON COLUMN raw_bitemporal_double_packed.step
+            IS 'The valid time difference between two consecutive values. Calendar units such as days or months are
+                not supported, since their duration varies (e.g., use 24 hours instead of 1 day).';
+        COMMENT ON COLUMN raw_bitemporal_double_packed.valid_to
+            IS 'The exclusive end of the valid time range. Derived automatically on insert. A run covers 31 days at
+                most.';
+        COMMENT ON COLUMN raw_bitemporal_double_packed.value_array
+            IS 'The values of the run. The i-th value (1-based) is valid at valid_from + (i - 1) * step.';
+
+        CREATE INDEX raw_bitemporal_double_packed_valid_to_idx ON raw_bitemporal_double_packed(dp_id, valid_to);
+    """))
+
+    op.execute(sql.text("""
+        SELECT create_hypertable(
+                'raw_bitemporal_double_packed', 'valid_from',
+                chunk_time_interval=>INTERVAL '7 days'
+            );
+        ALTER TABLE raw_bitemporal_double_packed SET (
+            timescaledb.compress=true,
+            timescaledb.compress_segmentby='dp_id',
+            timescaledb.compress_orderby='valid_from, transaction_time DESC'
+        );
+        SELECT add_compression_policy('raw_bitemporal_double_packed', INTERVAL '14 days');
+    """))
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_tr_derive_valid_to() RETURNS TRIGGER
+        LANGUAGE plpgsql IMMUTABLE PARALLEL SAFE
+        AS $$
+        BEGIN
+            NEW.valid_to := NEW.valid_from + NEW.step * cardinality(NEW.value_array);
+            RETURN NEW;
+        END;
+        $$;
+
+        CREATE OR REPLACE TRIGGER derive_valid_to
+            BEFORE INSERT OR UPDATE
+            ON raw_bitemporal_double_packed
+            FOR EACH ROW
+            EXECUTE FUNCTION rdp_tr_derive_valid_to();
+    """))
+
+    rev_datatype.grant_data_table_permissions("raw_bitemporal_double_packed")
+    rev_datatype.add_type_check("raw_bitemporal_double_packed", "double", "bitemporal")
+
+
+def upgrade_data_views():
+    """Creates the view on the packed runs and the unpacking details view"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW bitemporal_double_packed_runs(
+            dp_id, transaction_time, valid_from, step, valid_to, value_array, name, device_id, location_code,
+            data_provider, unit, view_role, metadata, data_type, temporality
+        ) AS
+        SELECT dp.id, packed.transaction_time, packed.valid_from, packed.step, packed.valid_to, packed.value_array,
+                dp.name, dp.device_id, dp.location_code, dp.data_provider, dp.unit, dp.view_role, dp.metadata,
+                dp.data_type, dp.temporality
+            FROM raw_bitemporal_double_packed AS packed
+            JOIN data_points AS dp
+                ON (packed.dp_id = dp.id)
+            WHERE (dp.temporality IS NULL OR dp.temporality = 'bitemporal') AND dp.data_type = 'double';
+        COMMENT ON VIEW bitemporal_double_packed_runs IS 'Joint packed forecast runs and data point information';
+
+        ALTER VIEW bitemporal_double_packed_runs OWNER TO restricting_view_executor;
+        GRANT SELECT, TRIGGER ON bitemporal_double_packed_runs TO view_base;
+    """))
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW bitemporal_double_packed_details(
+            dp_id, valid_time, transaction_time, value, name, device_id, location_code, data_provider, unit, view_role,
+            metadata, data_type, temporality
+        ) AS
+        SELECT runs.dp_id, runs.valid_from + (samples.pos - 1) * runs.step, runs.transaction_time, samples.value,
+                runs.name, runs.device_id, runs.location_code, runs.data_provider, runs.unit, runs.view_role,
+                runs.metadata, runs.data_type, runs.temporality
+            FROM bitemporal_double_packed_runs AS runs
+            CROSS JOIN LATERAL unnest(runs.value_array) WITH ORDINALITY AS samples(value, pos);
+        COMMENT ON VIEW bitemporal_double_packed_details
+            IS 'Unpacked forecast runs in the format of bitemporal_double_details. Filters on the valid time cannot be
+                pushed down to the packed rows. Hence, prefer the corresponding functions for range queries.';
+
+        ALTER VIEW bitemporal_double_packed_details OWNER TO restricting_view_executor;
+        GRANT SELECT ON bitemporal_double_packed_details TO view_base;
+    """))
+
+
+def upgrade_access_functions():
+    """Creates the latest and horizon functions that only unpack the requested slices"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION bitemporal_double_packed_latest(
+            dp_ids INTEGER[],
+            series_begin TIMESTAMPTZ,
+            series_end TIMESTAMPTZ
+        ) RETURNS TABLE(
+            dp_id INTEGER,
+            valid_time TIMESTAMPTZ,
+            transaction_time TIMESTAMPTZ,
+            value DOUBLE PRECISION
+        )
+        STABLE
+        SECURITY INVOKER
+        PARALLEL SAFE
+        AS $$
+            SELECT DISTINCT ON (1, 2) runs.dp_id, runs.valid_from + (pos - 1) * runs.step, runs.transaction_time,
+                    runs.value_array[pos]
+                FROM bitemporal_double_packed_runs AS runs
+                CROSS JOIN LATERAL generate_series(
+                    GREATEST(1, ceil(
+                        extract(EPOCH FROM bitemporal_double_packed_latest.series_begin - runs.valid_from) /
+                        extract(EPOCH FROM runs.step)
+                    )::INTEGER + 1),
+                    LEAST(cardinality(runs.value_array), ceil(
+                        extract(EPOCH FROM bitemporal_double_packed_latest.series_end - runs.valid_from) /
+                        extract(EPOCH FROM runs.step)
+                    )::INTEGER)
+                ) AS pos
+                WHERE runs.dp_id = ANY(bitemporal_double_packed_latest.dp_ids) AND
+                    runs.valid_from < bitemporal_double_packed_latest.series_end AND
+                    -- Excludes the older chunks based on the maximum run length
+                    runs.valid_from > bitemporal_double_packed_latest.series_begin - INTERVAL '31 days' AND
+                    runs.valid_to > bitemporal_double_packed_latest.series_begin
+                ORDER BY 1, 2, 3 DESC;
+        $$ LANGUAGE sql;
+
+        COMMENT ON FUNCTION bitemporal_double_packed_latest(INTEGER[], TIMESTAMPTZ, TIMESTAMPTZ)
+            IS 'Returns the value of the latest run for each valid time in [series_begin, series_end)';
+        GRANT EXECUTE ON FUNCTION bitemporal_double_packed_latest(INTEGER[], TIMESTAMPTZ, TIMESTAMPTZ) TO view_base;
+    """))
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION bitemporal_double_packed_horizon(
+            dp_ids INTEGER[],
+            horizon INTERVAL,
+            series_begin TIMESTAMPTZ,
+            series_end TIMESTAMPTZ
+        ) RETURNS TABLE(
+            dp_id INTEGER,
+            valid_time TIMESTAMPTZ,
+            transaction_time TIMESTAMPTZ,
+            value DOUBLE PRECISION
+        )
+        STABLE
+        SECURITY INVOKER
+        PARALLEL SAFE
+        AS $$
+            SELECT DISTINCT ON (1, 2) runs.dp_id, runs.valid_from + (pos - 1) * runs.step, runs.transaction_time,
+                    runs.value_array[pos]
+                FROM bitemporal_double_packed_runs AS runs
+                CROSS JOIN LATERAL generate_series(
+                    GREATEST(1, ceil(
+                        extract(EPOCH FROM bitemporal_double_packed_horizon.series_begin - runs.valid_from) /
+                        extract(EPOCH FROM runs.step)
+                    )::INTEGER + 1, ceil(
+                        -- Skip the values that are closer to the transaction time than the horizon
+                        extract(EPOCH FROM
+                            runs.transaction_time + bitemporal_double_packed_horizon.horizon - runs.valid_from
+                        ) / extract(EPOCH FROM runs.step)
+                    )::INTEGER + 1),
+                    LEAST(cardinality(runs.value_array), ceil(
+                        extract(EPOCH FROM bitemporal_double_packed_horizon.series_end - runs.valid_from) /
+                        extract(EPOCH FROM runs.step)
+                    )::INTEGER)
+                ) AS pos
+                WHERE runs.dp_id = ANY(bitemporal_double_packed_horizon.dp_ids) AND
+                    runs.valid_from < bitemporal_double_packed_horizon.series_end AND
+                    -- Excludes the older chunks based on the maximum run length
+                    runs.valid_from > bitemporal_double_packed_horizon.series_begin - INTERVAL '31 days' AND
+                    runs.valid_to > bitemporal_double_packed_horizon.series_begin AND
+                    runs.valid_to > runs.transaction_time + bitemporal_double_packed_horizon.horizon
+                ORDER BY 1, 2, 3 DESC;
+        $$ LANGUAGE sql;
+
+        COMMENT ON FUNCTION bitemporal_double_packed_horizon(INTEGER[], INTERVAL, TIMESTAMPTZ, TIMESTAMPTZ)
+            IS 'Returns the value of the latest run that has been created at least horizon before each valid time in
+                [series_begin, series_end)';
+        GRANT EXECUTE ON FUNCTION bitemporal_double_packed_horizon(INTEGER[], INTERVAL, TIMESTAMPTZ, TIMESTAMPTZ)
+            TO view_base;
+    """))
+
+
+def downgrade():
+    """Removes the packed representation including all the contained data"""
+
+    op.execute(sql.text("""
+        DROP FUNCTION IF EXISTS bitemporal_double_packed_horizon(INTEGER[], INTERVAL, TIMESTAMPTZ, TIMESTAMPTZ);
+        DROP FUNCTION IF EXISTS bitemporal_double_packed_latest(INTEGER[], TIMESTAMPTZ, TIMESTAMPTZ);
+        DROP VIEW IF EXISTS bitemporal_double_packed_details;
+        DROP VIEW IF EXISTS bitemporal_double_packed_runs;
+        DROP TABLE IF EXISTS raw_bitemporal_double_packed;
+        DROP FUNCTION IF EXISTS rdp_tr_derive_valid_to();
+    """))
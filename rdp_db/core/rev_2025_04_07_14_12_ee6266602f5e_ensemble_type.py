@@ -0,0 +1,264 @@
+"""
+ensemble type
+
+Introduces the array-valued ensemble type for probabilistic forecasts. Instead of one data point per ensemble member or
+quantile, each sample stores all members in a single real array. The members are declared once per data point in
+data_point_ensemble_members, including the quantile level in case of quantile forecasts. The extraction and statistics
+functions evaluate the arrays server-side. Note that the additional enum value cannot be removed on downgrade.
+
+Revision ID: ee6266602f5e
+Revises: b8b69bb0e44d
+Create Date: 2025-04-07 14:12:51.207634
+
+"""
+from alembic import op
+import sqlalchemy as sql
+
+import rdp_db.core.rev_2025_01_29_11_21_0678397a4d04_datatype_extension as rev_datatype
+
+# revision identifiers, used by Alembic.
+revision = 'ee6266602f5e'
+down_revision = 'b8b69bb0e44d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Installs the ensemble type including the member declaration"""
+
+    upgrade_type_system()
+    upgrade_member_declaration()
+    upgrade_new_ts_tables()
+    upgrade_data_views()
+    upgrade_access_functions()
+
+
+def upgrade_type_system():
+    """Extends the data type enum. The new value must be committed before it can be used."""
+
+    with op.get_context().autocommit_block():
+        op.execute(sql.text("ALTER TYPE time_series_data_type ADD VALUE IF NOT EXISTS 'ensemble';"))
+
+    op.execute(sql.text("""
+        ALTER TABLE data_points ADD CONSTRAINT check_ensemble_temporality CHECK (
+            data_type <> 'ensemble' OR temporality = 'bitemporal'
+        );
+    """))
+
+
+def upgrade_member_declaration():
+    """Creates the side table that declares the members of each ensemble data point"""
+
+    op.execute(sql.text("""
+        CREATE TABLE data_point_ensemble_members (
+            dp_id INTEGER NOT NULL,
+            member_index SMALLINT NOT NULL,
+            label TEXT NOT NULL,
+            quantile_level DOUBLE PRECISION NULL,
+            PRIMARY KEY (dp_id, member_index),
+            UNIQUE (dp_id, label),
+            UNIQUE (dp_id, quantile_level),
+            FOREIGN KEY (dp_id) REFERENCES data_points(id),
+            CONSTRAINT check_member_index CHECK (member_index > 0),
+            CONSTRAINT check_quantile_level CHECK (quantile_level > 0 AND quantile_level < 1)
+        );
+        COMMENT ON TABLE data_point_ensemble_members
+            IS 'Declares the members or quantiles that are stored in the value arrays of the ensemble data points';
+        COMMENT ON COLUMN data_point_ensemble_members.member_index
+            IS 'The (1-based) position of the member in the value arrays';
+        COMMENT ON COLUMN data_point_ensemble_members.quantile_level
+            IS 'The level of the quantile in case of quantile forecasts or NULL for plain ensemble members';
+
+        GRANT SELECT, INSERT ON data_point_ensemble_members TO data_source_base;
+        GRANT SELECT ON data_point_ensemble_members TO restricting_view_executor;
+    """))
+
+
+def upgrade_new_ts_tables():
+    """Creates the bitemporal time-series table holding the member arrays"""
+
+    rev_datatype.create_bitemporal_table("REAL[]", "ensemble")
+
+    op.execute(sql.text("""
+        ALTER TABLE raw_bitemporal_ensemble ADD CONSTRAINT check_value_dimensions
+            CHECK (array_ndims(value) = 1);
+        COMMENT ON COLUMN raw_bitemporal_ensemble.value
+            IS 'The values of all members. See data_point_ensemble_members for the meaning of each position.';
+    """))
+
+    rev_datatype.add_type_check("raw_bitemporal_ensemble", "ensemble", "bitemporal")
+
+
+def upgrade_data_views():
+    """Creates the details view and the member view"""
+
+    rev_datatype.append_typed_bitemporal_details_view("ensemble", False)
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW ensemble_members(
+            dp_id, member_index, label, quantile_level, name, device_id, location_code, data_provider, view_role
+        ) AS
+        SELECT dp.id, mem.member_index, mem.label, mem.quantile_level, dp.name, dp.device_id, dp.location_code,
+                dp.data_provider, dp.view_role
+            FROM data_point_ensemble_members AS mem
+            JOIN data_points AS dp
+                ON (mem.dp_id = dp.id);
+        COMMENT ON VIEW ensemble_members IS 'The members of the ensemble data points that are visible to the user';
+
+        ALTER VIEW ensemble_members OWNER TO restricting_view_executor;
+        GRANT SELECT ON ensemble_members TO view_base;
+    """))
+
+
+def upgrade_access_functions():
+    """Creates the functions that extract single members and compute statistics on the arrays"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION bitemporal_ensemble_member(
+            dp_ids INTEGER[],
+            member_label TEXT,
+            series_begin TIMESTAMPTZ,
+            series_end TIMESTAMPTZ
+        ) RETURNS TABLE(
+            dp_id INTEGER,
+            valid_time TIMESTAMPTZ,
+            transaction_time TIMESTAMPTZ,
+            value REAL
+        )
+        STABLE
+        SECURITY INVOKER
+        PARALLEL SAFE
+        AS $$
+            SELECT ens.dp_id, ens.valid_time, ens.transaction_time, ens.value[mem.member_index]
+                FROM bitemporal_ensemble_details AS ens
+                JOIN ensemble_members AS mem
+                    ON (mem.dp_id = ens.dp_id AND mem.label = bitemporal_ensemble_member.member_label)
+                WHERE ens.dp_id = ANY(bitemporal_ensemble_member.dp_ids) AND
+                    ens.valid_time >= bitemporal_ensemble_member.series_begin AND
+                    ens.valid_time < bitemporal_ensemble_member.series_end
+                ORDER BY ens.dp_id, ens.valid_time, ens.transaction_time;
+        $$ LANGUAGE sql;
+
+        COMMENT ON FUNCTION bitemporal_ensemble_member(INTEGER[], TEXT, TIMESTAMPTZ, TIMESTAMPTZ)
+            IS 'Returns all versions of the given ensemble member in [series_begin, series_end)';
+        GRANT EXECUTE ON FUNCTION bitemporal_ensemble_member(INTEGER[], TEXT, TIMESTAMPTZ, TIMESTAMPTZ) TO view_base;
+    """))
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION bitemporal_ensemble_quantile(
+            dp_ids INTEGER[],
+            quantile_level DOUBLE PRECISION,
+            series_begin TIMESTAMPTZ,
+            series_end TIMESTAMPTZ
+        ) RETURNS TABLE(
+            dp_id INTEGER,
+            valid_time TIMESTAMPTZ,
+            transaction_time TIMESTAMPTZ,
+            value REAL
+        )
+        STABLE
+        SECURITY INVOKER
+        PARALLEL SAFE
+        AS $$
+            WITH levels AS (
+                -- The members of quantile forecasts next to the requested level, if any levels are declared
+                SELECT mem.dp_id,
+                        max(mem.quantile_level) FILTER (WHERE mem.quantile_level <= req.level) AS lower_level,
+                        (array_agg(mem.member_index ORDER BY mem.quantile_level DESC)
+                            FILTER (WHERE mem.quantile_level <= req.level))[1] AS lower_index,
+                        min(mem.quantile_level) FILTER (WHERE mem.quantile_level >= req.level) AS upper_level,
+                        (array_agg(mem.member_index ORDER BY mem.quantile_level)
+                            FILTER (WHERE mem.quantile_level >= req.level))[1] AS upper_index
+                    FROM ensemble_members AS mem
+                    CROSS JOIN (SELECT bitemporal_ensemble_quantile.quantile_level AS level) AS req
+                    WHERE mem.dp_id = ANY(bitemporal_ensemble_quantile.dp_ids) AND mem.quantile_level IS NOT NULL
+                    GROUP BY mem.dp_id
+            )
+            SELECT ens.dp_id, ens.valid_time, ens.transaction_time,
+                    CASE
+                        -- Plain ensembles: Interpolate the quantile from the members of the particular sample
+                        WHEN lvl.dp_id IS NULL THEN (
+                            SELECT percentile_cont(bitemporal_ensemble_quantile.quantile_level)
+                                    WITHIN GROUP (ORDER BY members.value)
+                                FROM unnest(ens.value) AS members(value)
+                        )::REAL
+                        WHEN lvl.lower_level = lvl.upper_level THEN ens.value[lvl.lower_index]
+                        -- Quantile forecasts: Interpolate linearly between the neighbouring declared levels. Levels
+                        -- outside the declared range result in NULL.
+                        ELSE (
+                            ens.value[lvl.lower_index] + (ens.value[lvl.upper_index] - ens.value[lvl.lower_index]) *
+                                (bitemporal_ensemble_quantile.quantile_level - lvl.lower_level) /
+                                (lvl.upper_level - lvl.lower_level)
+                        )::REAL
+                    END
+                FROM bitemporal_ensemble_details AS ens
+                LEFT JOIN levels AS lvl
+                    ON (lvl.dp_id = ens.dp_id)
+                WHERE ens.dp_id = ANY(bitemporal_ensemble_quantile.dp_ids) AND
+                    ens.valid_time >= bitemporal_ensemble_quantile.series_begin AND
+                    ens.valid_time < bitemporal_ensemble_quantile.series_end
+                ORDER BY ens.dp_id, ens.valid_time, ens.transaction_time;
+        $$ LANGUAGE sql;
+
+        COMMENT ON FUNCTION bitemporal_ensemble_quantile(INTEGER[], DOUBLE PRECISION, TIMESTAMPTZ, TIMESTAMPTZ)
+            IS 'Returns all versions of the given quantile in [series_begin, series_end). For quantile forecasts, the
+                declared levels are returned directly and other levels are linearly interpolated between the
+                neighbouring declared levels (NULL outside their range). The quantile of plain ensembles is computed
+                from the members of each sample.';
+        GRANT EXECUTE ON FUNCTION bitemporal_ensemble_quantile(INTEGER[], DOUBLE PRECISION, TIMESTAMPTZ, TIMESTAMPTZ)
+            TO view_base;
+    """))
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION bitemporal_ensemble_statistics(
+            dp_ids INTEGER[],
+            series_begin TIMESTAMPTZ,
+            series_end TIMESTAMPTZ
+        ) RETURNS TABLE(
+            dp_id INTEGER,
+            valid_time TIMESTAMPTZ,
+            transaction_time TIMESTAMPTZ,
+            member_count INTEGER,
+            mean DOUBLE PRECISION,
+            spread DOUBLE PRECISION
+        )
+        STABLE
+        SECURITY INVOKER
+        PARALLEL SAFE
+        AS $$
+            SELECT ens.dp_id, ens.valid_time, ens.transaction_time, stats.member_count, stats.mean, stats.spread
+                FROM bitemporal_ensemble_details AS ens
+                CROSS JOIN LATERAL (
+                    SELECT count(members.value)::INTEGER AS member_count, avg(members.value) AS mean,
+                            stddev_samp(members.value) AS spread
+                        FROM unnest(ens.value) AS members(value)
+                ) AS stats
+                WHERE ens.dp_id = ANY(bitemporal_ensemble_statistics.dp_ids) AND
+                    ens.valid_time >= bitemporal_ensemble_statistics.series_begin AND
+                    ens.valid_time < bitemporal_ensemble_statistics.series_end
+                ORDER BY ens.dp_id, ens.valid_time, ens.transaction_time;
+        $$ LANGUAGE sql;
+
+        COMMENT ON FUNCTION bitemporal_ensemble_statistics(INTEGER[], TIMESTAMPTZ, TIMESTAMPTZ)
+            IS 'Returns the number of non-null members, their mean and their sample standard deviation (spread) for all
+                versions in [series_begin, series_end)';
+        GRANT EXECUTE ON FUNCTION bitemporal_ensemble_statistics(INTEGER[], TIMESTAMPTZ, TIMESTAMPTZ) TO view_base;
+    """))
+
+
+def downgrade():
+    """Removes the ensemble type again. The enum value remains as it cannot be dropped easily."""
+
+    op.execute(sql.text("""
+        DROP FUNCTION IF EXISTS bitemporal_ensemble_statistics(INTEGER[], TIMESTAMPTZ, TIMESTAMPTZ);
+        DROP FUNCTION IF EXISTS bitemporal_ensemble_quantile(INTEGER[], DOUBLE PRECISION, TIMESTAMPTZ, TIMESTAMPTZ);
+        DROP FUNCTION IF EXISTS bitemporal_ensemble_member(INTEGER[], TEXT, TIMESTAMPTZ, TIMESTAMPTZ);
+        DROP VIEW IF EXISTS ensemble_members;
+        DROP VIEW IF EXISTS bitemporal_ensemble_details;
+    """))
+
+    op.execute(sql.text("""
+        DROP TABLE IF EXISTS raw_bitemporal_ensemble;
+        DROP TABLE IF EXISTS data_point_ensemble_members;
+        ALTER TABLE data_points DROP CONSTRAINT IF EXISTS check_ensemble_temporality;
+    """))
@@ -0,0 +1,251 @@
+"""
+transaction time access
+
+Adds a secondary access path by transaction time to all bitemporal tables. Each table receives a (dp_id,
+transaction_time) index for the uncompressed chunks and, if supported by the installed TimescaleDB version, chunk
+skipping on the transaction time such that compressed chunks outside the requested range are excluded as well. On top,
+forecast runs can be listed, deleted and replaced via dedicated functions. The writers do not get the DELETE privilege
+on the raw tables, but may only remove complete runs via these functions.
+
+Revision ID: 439abb99fc2c
+Revises: ee6266602f5e
+Create Date: 2025-04-14 10:37:02.885193
+
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sql
+
+import rdp_db.utils.db_version as db_version
+
+# revision identifiers, used by Alembic.
+revision = '439abb99fc2c'
+down_revision = 'ee6266602f5e'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger(__name__)
+
+bitemporal_tables = [
+    "raw_bitemporal_bigint", "raw_bitemporal_boolean", "raw_bitemporal_category", "raw_bitemporal_double",
+    "raw_bitemporal_double_packed", "raw_bitemporal_ensemble", "raw_bitemporal_integer", "raw_bitemporal_jsonb",
+    "raw_bitemporal_real", "raw_bitemporal_smallint",
+]
+
+# enable_chunk_skipping() is available since TimescaleDB 2.16
+chunk_skipping_version = (2, 16)
+
+
+def upgrade():
+    """Installs the access path and the run functions"""
+
+    upgrade_transaction_time_indices()
+    upgrade_chunk_skipping()
+    upgrade_run_functions()
+
+
+def upgrade_transaction_time_indices():
+    """Creates the transaction time indices"""
+
+    for table_name in bitemporal_tables:
+        op.execute(sql.text(f"""
+            CREATE INDEX IF NOT EXISTS {table_name}_transaction_time_idx
+                ON {table_name}(dp_id, transaction_time);
+        """))
+
+
+def upgrade_chunk_skipping():
+    """Tracks the transaction time range of each chunk, if supported"""
+
+    if not is_chunk_skipping_supported():
+        logger.info("TimescaleDB does not support chunk skipping. Only the indices will be used.")
+        return
+
+    op.execute(sql.text("""
+        DO $$
+        BEGIN
+            -- The setting is needed for enabling the skipping as well as for using it in the queries
+            EXECUTE format('ALTER DATABASE %I SET timescaledb.enable_chunk_skipping = on', current_database());
+        END;
+        $$;
+        SET timescaledb.enable_chunk_skipping = on;
+    """))
+
+    for table_name in bitemporal_tables:
+        op.execute(sql.text(f"""
+            SELECT enable_chunk_skipping('{table_name}', 'transaction_time', if_not_exists => TRUE);
+        """))
+
+
+def is_chunk_skipping_supported() -> bool:
+    """Checks whether the installed TimescaleDB version supports chunk skipping"""
+
+    ts_version = db_version.get_timescale_version(op.get_bind())
+    return ts_version is not None and ts_version >= chunk_skipping_version
+
+
+def upgrade_run_functions():
+    """
+    Creates the functions to list, delete and replace runs. The modifying functions run with the privileges of the owner
+    and are only executable by the data sources.
+    """
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION bitemporal_list_runs(
+            dp_ids INTEGER[],
+            issued_begin TIMESTAMPTZ,
+            issued_end TIMESTAMPTZ
+        ) RETURNS TABLE(
+            dp_id INTEGER,
+            transaction_time TIMESTAMPTZ,
+            first_valid_time TIMESTAMPTZ,
+            last_valid_time TIMESTAMPTZ,
+            sample_count BIGINT
+        )
+        LANGUAGE plpgsql STABLE
+        SECURITY INVOKER
+        AS $$
+        DECLARE
+            type_name time_series_data_type;
+        BEGIN
+            FOR type_name IN
+                SELECT DISTINCT dp.data_type
+                    FROM data_points AS dp
+                    WHERE dp.id = ANY(bitemporal_list_runs.dp_ids) AND
+                        (dp.temporality = 'bitemporal' OR (dp.temporality IS NULL AND dp.data_type = 'double'))
+            LOOP
+                RETURN QUERY EXECUTE format('
+                        SELECT details.dp_id, details.transaction_time, min(details.valid_time),
+                                max(details.valid_time), count(*)
+                            FROM bitemporal_%s_details AS details
+                            WHERE details.dp_id = ANY($1) AND details.transaction_time >= $2 AND
+                                details.transaction_time < $3
+                            GROUP BY details.dp_id, details.transaction_time
+                    ', type_name)
+                    USING bitemporal_list_runs.dp_ids, bitemporal_list_runs.issued_begin,
+                        bitemporal_list_runs.issued_end;
+            END LOOP;
+        END;
+        $$;
+
+        COMMENT ON FUNCTION bitemporal_list_runs(INTEGER[], TIMESTAMPTZ, TIMESTAMPTZ)
+            IS 'Lists the runs (transaction times) of the given bitemporal data points issued in [issued_begin,
+                issued_end) including their valid time range. The packed runs are not considered.';
+        GRANT EXECUTE ON FUNCTION bitemporal_list_runs(INTEGER[], TIMESTAMPTZ, TIMESTAMPTZ) TO view_base;
+    """))
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_delete_run(dp_id INTEGER, transaction_time TIMESTAMPTZ) RETURNS BIGINT
+        LANGUAGE plpgsql VOLATILE
+        SECURITY DEFINER  -- The data sources are not allowed to delete arbitrary samples
+        SET search_path = public, pg_temp
+        AS $$
+        DECLARE
+            table_name TEXT;
+            deleted_rows BIGINT;
+        BEGIN
+            IF NOT pg_has_role(session_user, 'data_source_base', 'MEMBER') THEN
+                RAISE EXCEPTION 'Permission denied, only data sources may delete runs'
+                    USING ERRCODE = 'insufficient_privilege';
+            END IF;
+
+            SELECT 'raw_bitemporal_' || dp.data_type INTO table_name
+                FROM data_points AS dp
+                WHERE dp.id = rdp_delete_run.dp_id AND
+                    (dp.temporality = 'bitemporal' OR (dp.temporality IS NULL AND dp.data_type = 'double'));
+            IF NOT FOUND THEN
+                RAISE EXCEPTION 'Invalid data point %, expected an existing bitemporal data point',
+                    rdp_delete_run.dp_id;
+            END IF;
+
+            EXECUTE format('DELETE FROM %I AS raw WHERE raw.dp_id = $1 AND raw.transaction_time = $2', table_name)
+                USING rdp_delete_run.dp_id, rdp_delete_run.transaction_time;
+            GET DIAGNOSTICS deleted_rows = ROW_COUNT;
+            RETURN deleted_rows;
+        END;
+        $$;
+
+        COMMENT ON FUNCTION rdp_delete_run(INTEGER, TIMESTAMPTZ)
+            IS 'Deletes all samples of the given data point and transaction time and returns the number of samples';
+        REVOKE EXECUTE ON FUNCTION rdp_delete_run(INTEGER, TIMESTAMPTZ) FROM PUBLIC;
+        GRANT EXECUTE ON FUNCTION rdp_delete_run(INTEGER, TIMESTAMPTZ) TO data_source_base;
+    """))
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_replace_run(
+            dp_id INTEGER,
+            transaction_time TIMESTAMPTZ,
+            valid_times TIMESTAMPTZ[],
+            run_values ANYARRAY
+        ) RETURNS BIGINT
+        LANGUAGE plpgsql VOLATILE
+        SECURITY DEFINER  -- Deletes the previous run, which the data sources are not allowed to do directly
+        SET search_path = public, pg_temp
+        AS $$
+        DECLARE
+            table_name TEXT;
+            inserted_rows BIGINT;
+        BEGIN
+            IF NOT pg_has_role(session_user, 'data_source_base', 'MEMBER') THEN
+                RAISE EXCEPTION 'Permission denied, only data sources may replace runs'
+                    USING ERRCODE = 'insufficient_privilege';
+            END IF;
+            IF cardinality(rdp_replace_run.valid_times) <> cardinality(rdp_replace_run.run_values) THEN
+                RAISE EXCEPTION 'Expected as many valid times as values, got % and %',
+                    cardinality(rdp_replace_run.valid_times), cardinality(rdp_replace_run.run_values);
+            END IF;
+
+            -- Also validates the data point
+            PERFORM rdp_delete_run(rdp_replace_run.dp_id, rdp_replace_run.transaction_time);
+
+            SELECT 'raw_bitemporal_' || dp.data_type INTO table_name
+                FROM data_points AS dp
+                WHERE dp.id = rdp_replace_run.dp_id;
+            EXECUTE format('
+                    INSERT INTO %I(dp_id, valid_time, transaction_time, value)
+                        SELECT $1, samples.valid_time, $2, samples.value
+                            FROM unnest($3, $4) AS samples(valid_time, value)
+                ', table_name)
+                USING rdp_replace_run.dp_id, rdp_replace_run.transaction_time, rdp_replace_run.valid_times,
+                    rdp_replace_run.run_values;
+            GET DIAGNOSTICS inserted_rows = ROW_COUNT;
+            RETURN inserted_rows;
+        END;
+        $$;
+
+        COMMENT ON FUNCTION rdp_replace_run(INTEGER, TIMESTAMPTZ, TIMESTAMPTZ[], ANYARRAY)
+            IS 'Atomically replaces all samples of the given data point and transaction time by the given ones and
+                returns the number of inserted samples';
+        REVOKE EXECUTE ON FUNCTION rdp_replace_run(INTEGER, TIMESTAMPTZ, TIMESTAMPTZ[], ANYARRAY) FROM PUBLIC;
+        GRANT EXECUTE ON FUNCTION rdp_replace_run(INTEGER, TIMESTAMPTZ, TIMESTAMPTZ[], ANYARRAY) TO data_source_base;
+    """))
+
+
+def downgrade():
+    """Removes the access path and the run functions again"""
+
+    op.execute(sql.text("""
+        DROP FUNCTION IF EXISTS rdp_replace_run(INTEGER, TIMESTAMPTZ, TIMESTAMPTZ[], ANYARRAY);
+        DROP FUNCTION IF EXISTS rdp_delete_run(INTEGER, TIMESTAMPTZ);
+        DROP FUNCTION IF EXISTS bitemporal_list_runs(INTEGER[], TIMESTAMPTZ, TIMESTAMPTZ);
+    """))
+
+    if is_chunk_skipping_supported():
+        op.execute(sql.text("SET timescaledb.enable_chunk_skipping = on;"))
+        for table_name in bitemporal_tables:
+            op.execute(sql.text(f"""
+                SELECT disable_chunk_skipping('{table_name}', 'transaction_time', if_not_exists => TRUE);
+            """))
+        op.execute(sql.text("""
+            DO $$
+            BEGIN
+                EXECUTE format('ALTER DATABASE %I RESET timescaledb.enable_chunk_skipping', current_database());
+            END;
+            $$;
+        """))
+
+    for table_name in bitemporal_tables:
+        op.execute(sql.text(f"""
+            DROP INDEX IF EXISTS {table_name}_transaction_time_idx;
+        """))
@@ -0,0 +1,500 @@
+"""
+space partitioning
+
+Allows to additionally partition the raw tables by a hash of dp_id such that multi-series queries and the compression
+jobs can process several chunks of the same time slice in parallel. Since TimescaleDB only adds dimensions to empty
+hypertables, a raw table with samples is rebuilt chunk by chunk into a space-partitioned copy, which finally replaces
+the original table (see rdp_db.utils.space_partitioning). The number of partitions is configured per raw table, either
+manually or during the migration via the RDP_SPACE_PARTITIONING environment variable (e.g.,
+"raw_unitemporal_double=4,raw_bitemporal_double=4").
+
+Revision ID: 0e9befceca9e
+Revises: 439abb99fc2c
+Create Date: 2025-04-21 16:03:44.671920
+
+"""
+import logging
+import os
+
+from alembic import op
+import sqlalchemy as sql
+
+import rdp_db.utils.space_partitioning as space_partitioning
+
+# revision identifiers, used by Alembic.
+revision = '0e9befceca9e'
+down_revision = '439abb99fc2c'
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger(__name__)
+
+
+def upgrade():
+    """Installs the partitioning functions and applies the configured partitioning"""
+
+    upgrade_change_log()
+    upgrade_partitioning_function()
+    upgrade_copy_function()
+    upgrade_swap_function()
+    upgrade_configured_partitioning()
+
+
+def upgrade_change_log():
+    """Creates the log of the time slices that are changed while a raw table is rebuilt"""
+
+    op.execute(sql.text("""
+        CREATE TABLE rdp_space_partitioning_changes (
+            hypertable_name TEXT NOT NULL,
+            bucket_start TIMESTAMPTZ NOT NULL,
+            bucket_end TIMESTAMPTZ NOT NULL,
+            PRIMARY KEY (hypertable_name, bucket_start)
+        );
+        COMMENT ON TABLE rdp_space_partitioning_changes IS
+            'The time slices of the raw tables that have been changed during the rebuild and need to be copied again';
+
+        CREATE OR REPLACE FUNCTION rdp_tr_log_space_partitioning_changes() RETURNS TRIGGER
+        LANGUAGE plpgsql
+        SECURITY DEFINER  -- The writers do not have access to the log
+        SET search_path = public, pg_temp
+        AS $$
+        DECLARE
+            bucket_width INTERVAL := TG_ARGV[1]::INTERVAL;
+            bucket_query TEXT := format('SELECT time_bucket($1, ($2).%I)', TG_ARGV[2]);
+            bucket_start TIMESTAMPTZ;
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                EXECUTE bucket_query INTO bucket_start USING bucket_width, OLD;
+                INSERT INTO rdp_space_partitioning_changes(hypertable_name, bucket_start, bucket_end)
+                    VALUES (TG_ARGV[0], bucket_start, bucket_start + bucket_width)
+                    ON CONFLICT DO NOTHING;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                EXECUTE bucket_query INTO bucket_start USING bucket_width, NEW;
+                INSERT INTO rdp_space_partitioning_changes(hypertable_name, bucket_start, bucket_end)
+                    VALUES (TG_ARGV[0], bucket_start, bucket_start + bucket_width)
+                    ON CONFLICT DO NOTHING;
+            END IF;
+            RETURN NULL;
+        END;
+        $$;
+    """))
+
+
+def upgrade_partitioning_function():
+    """Creates the function that adds or adjusts the space dimension of a raw table or prepares the rebuild"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_set_space_partitioning(
+                hypertable REGCLASS,
+                number_partitions INTEGER
+            ) RETURNS REGCLASS
+        LANGUAGE plpgsql VOLATILE
+        AS $$
+        DECLARE
+            source_name TEXT := hypertable::TEXT;
+            target_name TEXT := 'rdp_partitioning_' || hypertable::TEXT;
+            time_column TEXT;
+            chunk_interval INTERVAL;
+            segmentby TEXT;
+            orderby TEXT;
+            skipping_column TEXT;
+            obj RECORD;
+        BEGIN
+            IF NOT starts_with(source_name, 'raw_') THEN
+                RAISE EXCEPTION 'Space partitioning can only be configured on raw tables, got %', hypertable;
+            END IF;
+            IF number_partitions IS NULL OR number_partitions < 2 THEN
+                RAISE EXCEPTION 'Expected at least two partitions, got %', number_partitions;
+            END IF;
+
+            -- Existing dimensions only need to be adjusted. The new number is applied to new chunks only.
+            IF EXISTS (
+                SELECT FROM timescaledb_information.dimensions AS dim
+                    WHERE dim.hypertable_schema = 'public' AND dim.hypertable_name = source_name AND
+                        dim.column_name = 'dp_id'
+            ) THEN
+                PERFORM set_number_partitions(hypertable, number_partitions, 'dp_id');
+                RETURN NULL;
+            END IF;
+            IF NOT EXISTS (SELECT FROM show_chunks(hypertable)) THEN
+                PERFORM add_dimension(hypertable, 'dp_id', number_partitions => number_partitions);
+                RETURN NULL;
+            END IF;
+
+            -- Resumes an interrupted rebuild
+            IF to_regclass(target_name) IS NOT NULL THEN
+                RETURN target_name::REGCLASS;
+            END IF;
+
+            SELECT dim.column_name, dim.time_interval INTO time_column, chunk_interval
+                FROM timescaledb_information.dimensions AS dim
+                WHERE dim.hypertable_schema = 'public' AND dim.hypertable_name = source_name AND
+                    dim.dimension_type = 'Time';
+
+            -- Includes the columns, defaults, check constraints and comments. Index-backed constraints and indices get
+            -- temporary names, since their names must be unique within the schema until the swap.
+            EXECUTE format('CREATE TABLE %I (LIKE %s INCLUDING ALL EXCLUDING INDEXES)', target_name, hypertable);
+            FOR obj IN
+                SELECT con.conname, con.contype, pg_get_constraintdef(con.oid) AS definition
+                    FROM pg_constraint AS con
+                    WHERE con.conrelid = hypertable AND con.contype IN ('p', 'u', 'x', 'f')
+                    ORDER BY con.conname
+            LOOP
+                EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I %s', target_name,
+                    CASE WHEN obj.contype = 'f' THEN obj.conname ELSE 'rdp_sp_' || md5(obj.conname) END,
+                    obj.definition);
+            END LOOP;
+            FOR obj IN
+                SELECT cls.relname, idx.indisunique, substring(pg_get_indexdef(idx.indexrelid) FROM ' USING .*$')
+                        AS definition
+                    FROM pg_index AS idx
+                    JOIN pg_class AS cls ON (cls.oid = idx.indexrelid)
+                    WHERE idx.indrelid = hypertable AND NOT EXISTS (
+                        SELECT FROM pg_constraint AS con
+                            WHERE con.conindid = idx.indexrelid AND con.contype IN ('p', 'u', 'x')
+                    )
+                    ORDER BY cls.relname
+            LOOP
+                EXECUTE format('CREATE %sINDEX %I ON %I %s', CASE WHEN obj.indisunique THEN 'UNIQUE ' ELSE '' END,
+                    'rdp_sp_' || md5(obj.relname), target_name, obj.definition);
+            END LOOP;
+
+            PERFORM create_hypertable(target_name::REGCLASS, time_column::NAME, 'dp_id', number_partitions,
+                chunk_time_interval => chunk_interval, create_default_indexes => false);
+
+            SELECT string_agg(format('%I', cs.attname), ', ' ORDER BY cs.segmentby_column_index)
+                        FILTER (WHERE cs.segmentby_column_index IS NOT NULL),
+                    string_agg(concat_ws(' ', format('%I', cs.attname),
+                            CASE WHEN cs.orderby_asc THEN 'ASC' ELSE 'DESC' END,
+                            CASE WHEN cs.orderby_nullsfirst THEN 'NULLS FIRST' ELSE 'NULLS LAST' END),
+                        ', ' ORDER BY cs.orderby_column_index)
+                        FILTER (WHERE cs.orderby_column_index IS NOT NULL)
+                INTO segmentby, orderby
+                FROM timescaledb_information.compression_settings AS cs
+                WHERE cs.hypertable_schema = 'public' AND cs.hypertable_name = source_name;
+            IF EXISTS (
+                SELECT FROM timescaledb_information.hypertables AS ht
+                    WHERE ht.hypertable_schema = 'public' AND ht.hypertable_name = source_name AND
+                        ht.compression_enabled
+            ) THEN
+                EXECUTE format('ALTER TABLE %I SET (timescaledb.compress, timescaledb.compress_segmentby = %L%s)',
+                    target_name, COALESCE(segmentby, ''),
+                    COALESCE(format(', timescaledb.compress_orderby = %L', orderby), ''));
+            END IF;
+
+            IF to_regclass('_timescaledb_catalog.chunk_column_stats') IS NOT NULL THEN
+                FOR skipping_column IN EXECUTE '
+                    SELECT stats.column_name::TEXT
+                        FROM _timescaledb_catalog.chunk_column_stats AS stats
+                        JOIN _timescaledb_catalog.hypertable AS ht ON (ht.id = stats.hypertable_id)
+                        WHERE ht.schema_name = ''public'' AND ht.table_name = $1 AND stats.chunk_id = 0
+                ' USING source_name
+                LOOP
+                    PERFORM enable_chunk_skipping(target_name::REGCLASS, skipping_column::NAME);
+                END LOOP;
+            END IF;
+
+            -- Records the time slices changed by the feeders and jobs while the chunks are copied
+            EXECUTE format('
+                    CREATE TRIGGER rdp_space_partitioning_changes
+                        AFTER INSERT OR UPDATE OR DELETE ON %s
+                        FOR EACH ROW EXECUTE FUNCTION rdp_tr_log_space_partitioning_changes(%L, %L, %L)
+                ', hypertable, source_name, chunk_interval, time_column);
+
+            RETURN target_name::REGCLASS;
+        END;
+        $$;
+
+        COMMENT ON FUNCTION rdp_set_space_partitioning(REGCLASS, INTEGER) IS
+            'Partitions the given raw table by a hash of dp_id into the given number of partitions. Empty tables are
+             partitioned directly and, in case the table is already partitioned, only new chunks will use the adjusted
+             number of partitions. Otherwise, the function creates and returns the space-partitioned copy, which is
+             filled by rdp_copy_space_partitioning_chunk() and swapped by rdp_finish_space_partitioning().';
+    """))
+
+
+def upgrade_copy_function():
+    """Creates the function that copies a single chunk into the space-partitioned table"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_copy_space_partitioning_chunk(chunk REGCLASS) RETURNS BIGINT
+        LANGUAGE plpgsql VOLATILE
+        AS $$
+        DECLARE
+            chunk_info RECORD;
+            target_name TEXT;
+            time_column TEXT;
+            column_list TEXT;
+            copied_rows BIGINT;
+        BEGIN
+            SELECT ch.hypertable_name, ch.is_compressed, ch.range_start, ch.range_end INTO chunk_info
+                FROM timescaledb_information.chunks AS ch
+                WHERE ch.hypertable_schema = 'public' AND
+                    format('%I.%I', ch.chunk_schema, ch.chunk_name)::REGCLASS = rdp_copy_space_partitioning_chunk.chunk;
+            IF NOT FOUND THEN
+                RAISE EXCEPTION 'Invalid chunk %, expected a chunk of a raw table',
+                    rdp_copy_space_partitioning_chunk.chunk;
+            END IF;
+            target_name := 'rdp_partitioning_' || chunk_info.hypertable_name;
+            SELECT dim.column_name INTO time_column
+                FROM timescaledb_information.dimensions AS dim
+                WHERE dim.hypertable_schema = 'public' AND dim.hypertable_name = chunk_info.hypertable_name AND
+                    dim.dimension_type = 'Time';
+
+            SELECT string_agg(format('%I', att.attname), ', ' ORDER BY att.attnum) INTO column_list
+                FROM pg_attribute AS att
+                WHERE att.attrelid = target_name::REGCLASS AND att.attnum > 0 AND NOT att.attisdropped;
+
+            -- Removes the samples of a previous attempt, such that the chunk can be copied again
+            EXECUTE format('DELETE FROM %1$I WHERE %2$I >= $1 AND %2$I < $2', target_name, time_column)
+                USING chunk_info.range_start, chunk_info.range_end;
+            EXECUTE format('INSERT INTO %1$I(%2$s) SELECT %2$s FROM %3$s', target_name, column_list,
+                rdp_copy_space_partitioning_chunk.chunk);
+            GET DIAGNOSTICS copied_rows = ROW_COUNT;
+
+            -- Keeps the storage footprint of the compressed samples
+            IF chunk_info.is_compressed THEN
+                PERFORM compress_chunk(format('%I.%I', ch.chunk_schema, ch.chunk_name)::REGCLASS,
+                        if_not_compressed => true)
+                    FROM timescaledb_information.chunks AS ch
+                    WHERE ch.hypertable_schema = 'public' AND ch.hypertable_name = target_name AND
+                        ch.range_start < chunk_info.range_end AND ch.range_end > chunk_info.range_start;
+            END IF;
+            RETURN copied_rows;
+        END;
+        $$;
+
+        COMMENT ON FUNCTION rdp_copy_space_partitioning_chunk(REGCLASS) IS
+            'Copies the samples of the given chunk into the space-partitioned copy of its raw table and returns the
+             number of copied samples. The foreign keys of the copy are checked, whereas the ingestion triggers are
+             only attached on the swap, since the samples have already passed them.';
+    """))
+
+
+def upgrade_swap_function():
+    """Creates the function that replaces the raw table by its space-partitioned copy"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_finish_space_partitioning(hypertable REGCLASS) RETURNS BIGINT
+        LANGUAGE plpgsql VOLATILE
+        AS $$
+        DECLARE
+            source_name TEXT := hypertable::TEXT;
+            target_name TEXT := 'rdp_partitioning_' || hypertable::TEXT;
+            source_ref TEXT := format(' ON %I.%I ', 'public', hypertable::TEXT);
+            time_column TEXT;
+            column_list TEXT;
+            constraint_names TEXT[];
+            index_names TEXT[];
+            view_names TEXT[] := '{}';
+            view_statements TEXT[] := '{}';
+            object_name TEXT;
+            job_list JSONB;
+            job_config JSONB;
+            new_hypertable_id INTEGER;
+            new_job_id INTEGER;
+            bucket_rows BIGINT;
+            recopied_rows BIGINT := 0;
+            obj RECORD;
+        BEGIN
+            IF to_regclass(target_name) IS NULL THEN
+                RAISE EXCEPTION 'The space partitioning of % has not been prepared', hypertable;
+            END IF;
+
+            -- Blocks the feeders and readers until the tables are swapped
+            EXECUTE format('LOCK TABLE %s IN ACCESS EXCLUSIVE MODE', hypertable);
+
+            -- Copies the time slices again, which have been changed since the rebuild started
+            SELECT dim.column_name INTO time_column
+                FROM timescaledb_information.dimensions AS dim
+                WHERE dim.hypertable_schema = 'public' AND dim.hypertable_name = source_name AND
+                    dim.dimension_type = 'Time';
+            SELECT string_agg(format('%I', att.attname), ', ' ORDER BY att.attnum) INTO column_list
+                FROM pg_attribute AS att
+                WHERE att.attrelid = target_name::REGCLASS AND att.attnum > 0 AND NOT att.attisdropped;
+            FOR obj IN
+                SELECT changes.bucket_start, changes.bucket_end
+                    FROM rdp_space_partitioning_changes AS changes
+                    WHERE changes.hypertable_name = source_name
+                    ORDER BY changes.bucket_start
+            LOOP
+                EXECUTE format('DELETE FROM %1$I WHERE %2$I >= $1 AND %2$I < $2', target_name, time_column)
+                    USING obj.bucket_start, obj.bucket_end;
+                EXECUTE format('
+                        INSERT INTO %1$I(%2$s) SELECT %2$s FROM %3$s WHERE %4$I >= $1 AND %4$I < $2
+                    ', target_name, column_list, hypertable, time_column) USING obj.bucket_start, obj.bucket_end;
+                GET DIAGNOSTICS bucket_rows = ROW_COUNT;
+                recopied_rows := recopied_rows + bucket_rows;
+            END LOOP;
+            DELETE FROM rdp_space_partitioning_changes AS changes WHERE changes.hypertable_name = source_name;
+            EXECUTE format('DROP TRIGGER rdp_space_partitioning_changes ON %s', hypertable);
+
+            -- Attaches the triggers, privileges and comment of the original table to the copy
+            FOR obj IN
+                SELECT trg.tgname, trg.tgenabled, pg_get_triggerdef(trg.oid) AS definition
+                    FROM pg_trigger AS trg
+                    WHERE trg.tgrelid = hypertable AND NOT trg.tgisinternal AND trg.tgname <> 'ts_insert_blocker'
+                    ORDER BY trg.tgname
+            LOOP
+                IF position(source_ref IN obj.definition) = 0 THEN
+                    RAISE EXCEPTION 'The trigger % cannot be moved: %', obj.tgname, obj.definition;
+                END IF;
+                EXECUTE overlay(obj.definition PLACING format(' ON %I ', target_name)
+                    FROM position(source_ref IN obj.definition) FOR length(source_ref));
+                IF obj.tgenabled <> 'O' THEN
+                    EXECUTE format('ALTER TABLE %I %s TRIGGER %I', target_name,
+                        CASE obj.tgenabled
+                            WHEN 'D' THEN 'DISABLE' WHEN 'R' THEN 'ENABLE REPLICA' ELSE 'ENABLE ALWAYS'
+                        END, obj.tgname);
+                END IF;
+            END LOOP;
+
+            EXECUTE format('ALTER TABLE %I OWNER TO %I', target_name,
+                (SELECT pg_get_userbyid(cls.relowner) FROM pg_class AS cls WHERE cls.oid = hypertable));
+            FOR obj IN
+                SELECT acl.privilege_type, acl.grantee, acl.is_grantable
+                    FROM pg_class AS cls
+                    CROSS JOIN LATERAL aclexplode(cls.relacl) AS acl
+                    WHERE cls.oid = hypertable AND acl.grantee <> cls.relowner
+            LOOP
+                EXECUTE format('GRANT %s ON %I TO %s%s', obj.privilege_type, target_name,
+                    CASE WHEN obj.grantee = 0 THEN 'PUBLIC' ELSE format('%I', pg_get_userbyid(obj.grantee)) END,
+                    CASE WHEN obj.is_grantable THEN ' WITH GRANT OPTION' ELSE '' END);
+            END LOOP;
+            EXECUTE format('COMMENT ON TABLE %I IS %L', target_name, obj_description(hypertable, 'pg_class'));
+
+
+            -- The jobs are removed together with the original table and are defined again after the swap
+            SELECT COALESCE(jsonb_agg(to_jsonb(job) ORDER BY job.job_id), '[]') INTO job_list
+                FROM timescaledb_information.jobs AS job
+                WHERE job.hypertable_schema = 'public' AND job.hypertable_name = source_name;
+
+            -- The views refer to the table by its OID. Hence, they are defined again after the swap.
+            FOR obj IN
+                SELECT format('%I.%I', nsp.nspname, cls.relname) AS view_name, cls.relkind, cls.reloptions,
+                        rtrim(rtrim(pg_get_viewdef(cls.oid)), ';') AS definition
+                    FROM pg_class AS cls
+                    JOIN pg_namespace AS nsp ON (nsp.oid = cls.relnamespace)
+                    WHERE cls.oid IN (
+                        SELECT rw.ev_class
+                            FROM pg_depend AS dep
+                            JOIN pg_rewrite AS rw ON (dep.classid = 'pg_rewrite'::REGCLASS AND dep.objid = rw.oid)
+                            WHERE dep.refclassid = 'pg_class'::REGCLASS AND dep.refobjid = hypertable AND
+                                rw.ev_class <> hypertable
+                    )
+                    ORDER BY cls.oid
+            LOOP
+                IF obj.relkind <> 'v' THEN
+                    RAISE EXCEPTION 'The relation % depends on % and cannot be moved', obj.view_name, hypertable;
+                END IF;
+                view_names := view_names || obj.view_name;
+                view_statements := view_statements || format('CREATE OR REPLACE VIEW %s%s AS %s', obj.view_name,
+                    COALESCE(format(' WITH (%s)', array_to_string(obj.reloptions, ', ')), ''), obj.definition);
+            END LOOP;
+
+            SELECT array_agg(con.conname ORDER BY con.conname) INTO constraint_names
+                FROM pg_constraint AS con
+                WHERE con.conrelid = hypertable AND con.contype IN ('p', 'u', 'x');
+            SELECT array_agg(cls.relname ORDER BY cls.relname) INTO index_names
+                FROM pg_index AS idx
+                JOIN pg_class AS cls ON (cls.oid = idx.indexrelid)
+                WHERE idx.indrelid = hypertable AND NOT EXISTS (
+                    SELECT FROM pg_constraint AS con
+                        WHERE con.conindid = idx.indexrelid AND con.contype IN ('p', 'u', 'x')
+                );
+
+            -- Swaps the tables. Dropping the original table also removes its chunks and jobs.
+            EXECUTE format('ALTER TABLE %s RENAME TO %I', hypertable, source_name || '_unpartitioned');
+            EXECUTE format('ALTER TABLE %I RENAME TO %I', target_name, source_name);
+            FOREACH object_name IN ARRAY view_statements LOOP
+                EXECUTE object_name;
+            END LOOP;
+            EXECUTE format('DROP TABLE %I', source_name || '_unpartitioned');
+
+            FOREACH object_name IN ARRAY COALESCE(constraint_names, '{}') LOOP
+                EXECUTE format('ALTER TABLE %I RENAME CONSTRAINT %I TO %I', source_name, 'rdp_sp_' || md5(object_name),
+                    object_name);
+            END LOOP;
+            FOREACH object_name IN ARRAY COALESCE(index_names, '{}') LOOP
+                EXECUTE format('ALTER INDEX %I RENAME TO %I', 'rdp_sp_' || md5(object_name), object_name);
+            END LOOP;
+
+            -- Policies are added via their API, whereas other jobs are scheduled again with the adjusted config
+            SELECT ht.id INTO new_hypertable_id
+                FROM _timescaledb_catalog.hypertable AS ht
+                WHERE ht.schema_name = 'public' AND ht.table_name = source_name;
+            FOR obj IN
+                SELECT job.*
+                    FROM jsonb_populate_recordset(NULL::timescaledb_information.jobs, job_list) AS job
+                    ORDER BY job.job_id
+            LOOP
+                job_config := obj.config;
+                IF job_config ? 'hypertable_id' THEN
+                    job_config := job_config || jsonb_build_object('hypertable_id', new_hypertable_id);
+                END IF;
+                IF obj.proc_name = 'policy_compression' THEN
+                    new_job_id := add_compression_policy(source_name::REGCLASS,
+                        (obj.config ->> 'compress_after')::INTERVAL);
+                ELSIF obj.proc_name = 'policy_retention' THEN
+                    new_job_id := add_retention_policy(source_name::REGCLASS, (obj.config ->> 'drop_after')::INTERVAL);
+                ELSIF obj.proc_name = 'policy_reorder' THEN
+                    new_job_id := add_reorder_policy(source_name::REGCLASS, obj.config ->> 'index_name');
+                ELSE
+                    new_job_id := add_job(format('%I.%I', obj.proc_schema, obj.proc_name)::REGPROC,
+                        obj.schedule_interval, config => job_config);
+                END IF;
+                PERFORM alter_job(new_job_id, schedule_interval => obj.schedule_interval,
+                    max_runtime => obj.max_runtime, max_retries => obj.max_retries, retry_period => obj.retry_period,
+                    scheduled => obj.scheduled, config => job_config);
+            END LOOP;
+
+            RAISE LOG 'Swapped % with its space-partitioned copy, recopied % rows and redefined the views %',
+                source_name, recopied_rows, view_names;
+            RETURN recopied_rows;
+        END;
+        $$;
+
+        COMMENT ON FUNCTION rdp_finish_space_partitioning(REGCLASS) IS
+            'Replaces the raw table by its space-partitioned copy and returns the number of samples, which have been
+             copied again since they were changed during the rebuild. The table is locked during the swap.';
+    """))
+
+
+def upgrade_configured_partitioning():
+    """Applies the partitioning configured in the environment, if any"""
+
+    partitioning = get_configured_partitioning()
+    if len(partitioning) == 0:
+        return
+
+    # The chunks are copied in separate transactions, such that the migration does not hold the locks on the table
+    with op.get_context().autocommit_block():
+        for table_name, number_partitions in partitioning.items():
+            chunk_count = space_partitioning.set_space_partitioning(op.get_bind(), table_name, number_partitions)
+            logger.info(f"Partitioned {table_name} into {number_partitions} partitions, copied {chunk_count} chunks")
+
+
+def get_configured_partitioning() -> dict[str, int]:
+    """Parses the RDP_SPACE_PARTITIONING environment variable into the table names and the number of partitions"""
+
+    config = os.environ.get("RDP_SPACE_PARTITIONING", "")
+    partitioning = {}
+    for entry in config.split(","):
+        if entry.strip() == "":
+            continue
+        table_name, _, number_partitions = entry.partition("=")
+        partitioning[table_name.strip()] = int(number_partitions)
+    return partitioning
+
+
+def downgrade():
+    """Removes the functions. The space dimensions remain since they cannot be removed from hypertables."""
+
+    op.execute(sql.text("""
+        DROP FUNCTION IF EXISTS rdp_finish_space_partitioning(REGCLASS);
+        DROP FUNCTION IF EXISTS rdp_copy_space_partitioning_chunk(REGCLASS);
+        DROP FUNCTION IF EXISTS rdp_set_space_partitioning(REGCLASS, INTEGER);
+        DROP FUNCTION IF EXISTS rdp_tr_log_space_partitioning_changes() CASCADE;
+        DROP TABLE IF EXISTS rdp_space_partitioning_changes;
+    """))
@@ -0,0 +1,143 @@
+"""
+tiered storage
+
+Raw data is mostly written once and rarely read after some weeks. This revision introduces a background job that moves
+compressed chunks of the raw tables, including their indexes, to a designated (cold) tablespace once they are older
+than a configured age. The job processes a limited number of chunks per run and pauses in between to throttle the I/O.
+The tablespace is taken from the job configuration, which is initialized by the RDP_COLD_TABLESPACE environment
+variable on migration. Without a tablespace, the job does not move anything.
+
+Revision ID: 7f1fd2195bf9
+Revises: 0e9befceca9e
+Create Date: 2025-04-28 08:55:13.540278
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sql
+
+# revision identifiers, used by Alembic.
+revision = '7f1fd2195bf9'
+down_revision = '0e9befceca9e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Installs the tiering job and the usage view"""
+
+    upgrade_tiering_procedure()
+    upgrade_tiering_job()
+    upgrade_usage_view()
+
+
+def upgrade_tiering_procedure():
+    """Creates the procedure that moves the cold chunks"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE PROCEDURE rdp_move_cold_chunks(job_id INTEGER, config JSONB)
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            reference_time TIMESTAMPTZ := now();
+            target_tablespace NAME := config ->> 'tablespace';
+            move_after INTERVAL := COALESCE((config ->> 'move_after')::INTERVAL, INTERVAL '30 days');
+            max_chunks INTEGER := COALESCE((config ->> 'max_chunks')::INTEGER, 10);
+            pause INTERVAL := COALESCE((config ->> 'pause')::INTERVAL, INTERVAL '0 seconds');
+            chunk RECORD;
+            started_at TIMESTAMPTZ;
+        BEGIN
+            IF target_tablespace IS NULL THEN
+                RAISE LOG 'No cold tablespace configured, no chunks will be moved';
+                RETURN;
+            END IF;
+            IF NOT EXISTS (SELECT FROM pg_tablespace AS ts WHERE ts.spcname = target_tablespace) THEN
+                RAISE EXCEPTION 'The cold tablespace % does not exist', target_tablespace;
+            END IF;
+
+            FOR chunk IN
+                SELECT format('%I.%I', chunks.chunk_schema, chunks.chunk_name)::REGCLASS AS chunk_table,
+                        chunks.hypertable_name, chunks.range_start, chunks.range_end
+                    FROM timescaledb_information.chunks AS chunks
+                    WHERE chunks.hypertable_schema = 'public' AND starts_with(chunks.hypertable_name, 'raw_') AND
+                        chunks.is_compressed AND chunks.range_end <= reference_time - move_after AND
+                        chunks.chunk_tablespace IS DISTINCT FROM target_tablespace
+                    ORDER BY chunks.range_start, chunks.hypertable_name
+                    LIMIT max_chunks
+            LOOP
+                started_at := clock_timestamp();
+                PERFORM move_chunk(
+                    chunk => chunk.chunk_table,
+                    destination_tablespace => target_tablespace,
+                    index_destination_tablespace => target_tablespace
+                );
+                RAISE LOG 'Moved the chunk of % in [%, %) to % in %',
+                    chunk.hypertable_name, chunk.range_start, chunk.range_end, target_tablespace,
+                    clock_timestamp() - started_at;
+                COMMIT;  -- Release the locks of each chunk as early as possible
+
+                PERFORM pg_sleep(extract(EPOCH FROM pause));
+            END LOOP;
+        END;
+        $$;
+
+        COMMENT ON PROCEDURE rdp_move_cold_chunks(INTEGER, JSONB) IS
+            'Moves at most max_chunks (default: 10) compressed chunks of the raw tables that are older than move_after
+             (default: 30 days) including their indexes to the configured tablespace. Pauses for the given interval
+             (default: 0 seconds) after each chunk.';
+    """))
+
+
+def upgrade_tiering_job():
+    """Registers the tiering job. The configuration may be changed via alter_job later on."""
+
+    op.execute(sql.text("""
+        SELECT add_job(
+                'rdp_move_cold_chunks', INTERVAL '1 day',
+                config => jsonb_build_object(
+                    'tablespace', CAST(:tablespace AS TEXT),
+                    'move_after', '30 days',
+                    'max_chunks', 10,
+                    'pause', '10 seconds'
+                )
+            );
+    """).bindparams(tablespace=os.environ.get("RDP_COLD_TABLESPACE")))
+
+
+def upgrade_usage_view():
+    """Creates the view that reports the storage of each raw table per tablespace"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW rdp_tablespace_usage(
+            hypertable_name, tablespace_name, chunk_count, compressed_chunk_count, total_bytes
+        ) AS
+            SELECT ht.hypertable_name, COALESCE(chunks.chunk_tablespace, default_ts.spcname), count(*),
+                    count(*) FILTER (WHERE chunks.is_compressed), sum(sizes.total_bytes)
+                FROM timescaledb_information.hypertables AS ht
+                CROSS JOIN LATERAL chunks_detailed_size(
+                    format('%I.%I', ht.hypertable_schema, ht.hypertable_name)::REGCLASS
+                ) AS sizes
+                JOIN timescaledb_information.chunks AS chunks
+                    ON (chunks.chunk_schema = sizes.chunk_schema AND chunks.chunk_name = sizes.chunk_name)
+                CROSS JOIN (
+                    SELECT ts.spcname
+                        FROM pg_database AS db
+                        JOIN pg_tablespace AS ts ON (ts.oid = db.dattablespace)
+                        WHERE db.datname = current_database()
+                ) AS default_ts
+                WHERE ht.hypertable_schema = 'public' AND starts_with(ht.hypertable_name, 'raw_')
+                GROUP BY ht.hypertable_name, COALESCE(chunks.chunk_tablespace, default_ts.spcname);
+
+        COMMENT ON VIEW rdp_tablespace_usage IS 'The number of chunks and the storage of each raw table per tablespace';
+    """))
+
+
+def downgrade():
+    """Removes the tiering job. Already moved chunks remain in the cold tablespace."""
+
+    op.execute(sql.text("""
+        DROP VIEW IF EXISTS rdp_tablespace_usage;
+        SELECT delete_job(job_id) FROM timescaledb_information.jobs WHERE proc_name = 'rdp_move_cold_chunks';
+        DROP PROCEDURE IF EXISTS rdp_move_cold_chunks(INTEGER, JSONB);
+    """))
@@ -0,0 +1,83 @@
+"""
+latest forecasts lookup
+
+The forecasts_latest view selected the latest forecast of each observation time via a correlated subquery, which is
+executed as SubPlan once per row of the view. Instead, the latest forecast is now picked via DISTINCT ON in a lateral
+subquery per data point, which reads the primary key index backwards. Since the time filters only refer to the DISTINCT
+ON column, they are still pushed down to the raw table, such that TimescaleDB excludes the chunks. The lateral
+subquery is only executed for the bitemporal double data points. Additionally, the data points can be looked up by their
+identifying attributes via an index instead of scanning data_points entirely.
+
+Revision ID: 504e14088be8
+Revises: 7f1fd2195bf9
+Create Date: 2025-05-05 09:12:41.326148
+
+"""
+from alembic import op
+import sqlalchemy as sql
+
+import rdp_db.utils.online_index as online_index
+
+# revision identifiers, used by Alembic.
+revision = '504e14088be8'
+down_revision = '7f1fd2195bf9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Replaces the latest forecasts view and creates the lookup index"""
+
+    upgrade_latest_view()
+    upgrade_lookup_index()
+
+
+def upgrade_latest_view():
+    """Selects the latest forecast of each observation time without a correlated subquery"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW forecasts_latest(
+            dp_id, obs_time, fc_time, value, name, device_id, location_code, data_provider, unit, view_role, metadata
+        ) AS
+            SELECT dp.id, fc_latest.valid_time, fc_latest.transaction_time, fc_latest.value, dp.name, dp.device_id,
+                    dp.location_code, dp.data_provider, dp.unit, dp.view_role, dp.metadata
+                FROM data_points AS dp
+                CROSS JOIN LATERAL (
+                    SELECT DISTINCT ON (fc_full.valid_time) fc_full.valid_time, fc_full.transaction_time,
+                            fc_full.value
+                        FROM raw_bitemporal_double AS fc_full
+                        WHERE fc_full.dp_id = dp.id
+                        ORDER BY fc_full.valid_time DESC, fc_full.transaction_time DESC
+                ) AS fc_latest
+                WHERE (dp.temporality IS NULL OR dp.temporality = 'bitemporal') AND dp.data_type = 'double';
+    """))
+
+
+def upgrade_lookup_index():
+    """Creates the index on the identifying attributes without blocking the writers"""
+
+    with op.get_context().autocommit_block():
+        online_index.create_index(op.get_bind(), "data_points_lookup_idx", "data_points",
+                                  "name, location_code, data_provider, device_id")
+
+
+def downgrade():
+    """Restores the correlated subquery and drops the lookup index"""
+
+    with op.get_context().autocommit_block():
+        online_index.drop_index(op.get_bind(), "data_points_lookup_idx", "data_points")
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW forecasts_latest(
+            dp_id, obs_time, fc_time, value, name, device_id, location_code, data_provider, unit, view_role, metadata
+        ) AS
+            SELECT dp.id, fc_full.valid_time, fc_full.transaction_time, fc_full.value, dp.name, dp.device_id,
+                    dp.location_code, dp.data_provider, dp.unit, dp.view_role, dp.metadata
+                FROM raw_bitemporal_double AS fc_full
+                JOIN data_points AS dp ON (fc_full.dp_id = dp.id)
+                WHERE fc_full.transaction_time = (
+                        SELECT max(fc_red.transaction_time)
+                        FROM raw_bitemporal_double AS fc_red
+                        WHERE fc_red.dp_id = fc_full.dp_id AND fc_red.valid_time = fc_full.valid_time
+                    );
+    """))
@@ -0,0 +1,305 @@
+"""
+monitoring views
+
+Introduces the monitoring_base role and the rdp_monitoring_* views, which attribute the query statistics to the rdp
+objects, i.e., the details views, the horizon functions, the resolver functions and the raw tables. The statement
+statistics are taken from pg_stat_statements, which is installed if available. Without preloading the library via
+shared_preload_libraries, no statistics are collected and the statement views remain empty. Since
+pg_stat_statements does not keep a latency histogram, the 95th percentile is estimated from the mean and the standard
+deviation. The table statistics of the raw tables are aggregated over all chunks including the compressed ones.
+
+The statement texts of pg_stat_statements are only visible to privileged roles. Hence, rdp_monitoring_statement_stats()
+reads them with the privileges of its owner and is not granted to anyone. It skips the utility statements, whose text
+may contain secrets such as passwords. The monitoring role may only call rdp_monitoring_object_statements(), which
+returns the statements referring to the rdp objects and backs the rdp_monitoring_statements view.
+
+If POSTGRES_MONITORING_USER is set, a login user with the password POSTGRES_MONITORING_PASSWORD is created as member
+of monitoring_base.
+
+Revision ID: 999b49a397e5
+Revises: 504e14088be8
+Create Date: 2025-05-12 10:41:27.604318
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sql
+
+# revision identifiers, used by Alembic.
+revision = '999b49a397e5'
+down_revision = '504e14088be8'
+branch_labels = None
+depends_on = None
+
+monitoring_views = [
+    "rdp_monitoring_objects", "rdp_monitoring_statements", "rdp_monitoring_object_stats", "rdp_monitoring_table_stats",
+    "rdp_monitoring_job_stats",
+]
+
+
+def upgrade():
+    """Installs the statistics views and the monitoring role"""
+
+    upgrade_statement_statistics()
+    upgrade_object_views()
+    upgrade_table_views()
+    upgrade_monitoring_role()
+
+
+def upgrade_statement_statistics():
+    """Installs pg_stat_statements, if available, and the function that exposes the statistics of this database"""
+
+    op.execute(sql.text("""
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT FROM pg_available_extensions WHERE name = 'pg_stat_statements') THEN
+                CREATE EXTENSION IF NOT EXISTS pg_stat_statements;
+            END IF;
+        END;
+        $$;
+    """))
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_monitoring_statement_stats()
+            RETURNS TABLE(
+                queryid BIGINT,
+                query TEXT,
+                calls BIGINT,
+                total_time DOUBLE PRECISION,
+                mean_time DOUBLE PRECISION,
+                stddev_time DOUBLE PRECISION,
+                max_time DOUBLE PRECISION,
+                rows BIGINT,
+                shared_blks_hit BIGINT,
+                shared_blks_read BIGINT
+            )
+            LANGUAGE plpgsql STABLE
+            SECURITY DEFINER  -- The statements of other users are only visible to privileged roles
+            SET search_path = pg_catalog, public
+            AS $$
+            DECLARE
+                extension_schema NAME;
+                -- The planable statements. Utility statements (e.g., ALTER ROLE ... PASSWORD) are skipped.
+                dml_pattern TEXT := '^[[:space:]]*(select|insert|update|delete|merge|with|values|table)([^a-z0-9_]|$)';
+            BEGIN
+                SELECT ns.nspname INTO extension_schema
+                    FROM pg_extension AS ext
+                    JOIN pg_namespace AS ns ON (ns.oid = ext.extnamespace)
+                    WHERE ext.extname = 'pg_stat_statements';
+                IF extension_schema IS NULL THEN
+                    RETURN;
+                END IF;
+
+                RETURN QUERY EXECUTE format('
+                    SELECT stmt.queryid, stmt.query, stmt.calls, stmt.total_exec_time, stmt.mean_exec_time,
+                            stmt.stddev_exec_time, stmt.max_exec_time, stmt.rows, stmt.shared_blks_hit,
+                            stmt.shared_blks_read
+                        FROM %I.pg_stat_statements AS stmt
+                        WHERE stmt.dbid = (SELECT db.oid FROM pg_database AS db WHERE db.datname = current_database())
+                            AND stmt.query ~* $1
+                ', extension_schema) USING dml_pattern;
+            EXCEPTION
+                WHEN object_not_in_prerequisite_state THEN
+                    RETURN;  -- The library is not preloaded and no statistics are collected
+            END;
+            $$;
+
+        COMMENT ON FUNCTION rdp_monitoring_statement_stats() IS
+            'Returns the pg_stat_statements statistics of the planable statements of the current database, if
+             available. The times are in ms. Not granted, since the texts of all users are returned.';
+    """))
+
+
+def upgrade_object_views():
+    """Creates the views that attribute the statement statistics to the rdp objects"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW rdp_monitoring_objects(object_type, object_name) AS
+            SELECT 'details_view', cls.relname::TEXT
+                FROM pg_class AS cls
+                WHERE cls.relnamespace = 'public'::REGNAMESPACE AND cls.relkind = 'v' AND cls.relname ~ '_details$'
+            UNION
+            SELECT 'horizon_function', proc.proname::TEXT
+                FROM pg_proc AS proc
+                WHERE proc.pronamespace = 'public'::REGNAMESPACE AND proc.proname ~ '_horizon$'
+            UNION
+            SELECT 'resolver_function', proc.proname::TEXT
+                FROM pg_proc AS proc
+                WHERE proc.pronamespace = 'public'::REGNAMESPACE AND
+                    proc.proname IN ('rdp_resolve_data_point_info', 'get_or_create_data_point_id')
+            UNION
+            SELECT 'raw_table', ht.hypertable_name::TEXT
+                FROM timescaledb_information.hypertables AS ht
+                WHERE ht.hypertable_schema = 'public' AND starts_with(ht.hypertable_name, 'raw_');
+
+        COMMENT ON VIEW rdp_monitoring_objects IS 'The rdp objects, to which the statement statistics are attributed';
+    """))
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_monitoring_object_statements()
+            RETURNS TABLE(
+                object_type TEXT,
+                object_name TEXT,
+                queryid BIGINT,
+                query TEXT,
+                calls BIGINT,
+                total_time DOUBLE PRECISION,
+                mean_time DOUBLE PRECISION,
+                stddev_time DOUBLE PRECISION,
+                max_time DOUBLE PRECISION,
+                rows BIGINT,
+                shared_blks_hit BIGINT,
+                shared_blks_read BIGINT
+            )
+            LANGUAGE sql STABLE
+            SECURITY DEFINER  -- Exposes the statements on the rdp objects only
+            SET search_path = pg_catalog, public
+            AS $$
+                SELECT obj.object_type, obj.object_name, stmt.queryid, stmt.query, stmt.calls, stmt.total_time,
+                        stmt.mean_time, stmt.stddev_time, stmt.max_time, stmt.rows, stmt.shared_blks_hit,
+                        stmt.shared_blks_read
+                    FROM public.rdp_monitoring_objects AS obj
+                    JOIN public.rdp_monitoring_statement_stats() AS stmt
+                        ON (stmt.query ~* ('(^|[^a-z0-9_$])' || obj.object_name || '([^a-z0-9_$]|$)'));
+            $$;
+
+        COMMENT ON FUNCTION rdp_monitoring_object_statements() IS
+            'Returns the statement statistics of rdp_monitoring_statement_stats() for each rdp object the statement
+             refers to';
+    """))
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW rdp_monitoring_statements(
+            object_type, object_name, queryid, query, calls, total_time_ms, mean_time_ms, p95_time_ms, rows,
+            shared_blks_hit, shared_blks_read, hit_ratio
+        ) AS
+            SELECT stmt.object_type, stmt.object_name, stmt.queryid, stmt.query, stmt.calls, stmt.total_time,
+                    stmt.mean_time, LEAST(stmt.mean_time + 1.645 * stmt.stddev_time, stmt.max_time), stmt.rows,
+                    stmt.shared_blks_hit, stmt.shared_blks_read,
+                    stmt.shared_blks_hit::DOUBLE PRECISION / NULLIF(stmt.shared_blks_hit + stmt.shared_blks_read, 0)
+                FROM rdp_monitoring_object_statements() AS stmt;
+
+        COMMENT ON VIEW rdp_monitoring_statements IS
+            'The statements referring to each rdp object. A statement referring to several objects is listed for each
+             of them. The 95th percentile is estimated as mean + 1.645 * stddev, capped by the maximum.';
+    """))
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW rdp_monitoring_object_stats(
+            object_type, object_name, statement_count, calls, total_time_ms, mean_time_ms, p95_time_ms, rows,
+            shared_blks_hit, shared_blks_read, hit_ratio
+        ) AS
+            SELECT obj.object_type, obj.object_name, count(stmt.queryid), COALESCE(sum(stmt.calls), 0),
+                    COALESCE(sum(stmt.total_time_ms), 0), sum(stmt.total_time_ms) / NULLIF(sum(stmt.calls), 0),
+                    max(stmt.p95_time_ms), COALESCE(sum(stmt.rows), 0), COALESCE(sum(stmt.shared_blks_hit), 0),
+                    COALESCE(sum(stmt.shared_blks_read), 0),
+                    sum(stmt.shared_blks_hit)::DOUBLE PRECISION /
+                        NULLIF(sum(stmt.shared_blks_hit + stmt.shared_blks_read), 0)
+                FROM rdp_monitoring_objects AS obj
+                LEFT JOIN rdp_monitoring_statements AS stmt
+                    ON (stmt.object_type = obj.object_type AND stmt.object_name = obj.object_name)
+                GROUP BY obj.object_type, obj.object_name;
+
+        COMMENT ON VIEW rdp_monitoring_object_stats IS
+            'The statement statistics per rdp object. The p95 time is the highest estimate of the single statements.';
+    """))
+
+
+def upgrade_table_views():
+    """Creates the views on the table and the job statistics of the raw tables"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW rdp_monitoring_table_stats(
+            hypertable_name, chunk_count, seq_scan, seq_tup_read, idx_scan, idx_tup_fetch, n_tup_ins, n_tup_upd,
+            n_tup_del, n_live_tup, n_dead_tup, heap_blks_hit, heap_blks_read, hit_ratio, last_autovacuum,
+            last_autoanalyze
+        ) AS
+            WITH chunk_tables AS (
+                SELECT ht.table_name AS hypertable_name, ch.id AS chunk_id, ch.schema_name, ch.table_name
+                    FROM _timescaledb_catalog.hypertable AS ht
+                    JOIN _timescaledb_catalog.chunk AS ch ON (ch.hypertable_id = ht.id)
+                    WHERE ht.schema_name = 'public' AND starts_with(ht.table_name, 'raw_') AND NOT ch.dropped
+                UNION ALL
+                -- The compressed data of a chunk is stored in a dedicated table
+                SELECT ht.table_name, ch.id, comp.schema_name, comp.table_name
+                    FROM _timescaledb_catalog.hypertable AS ht
+                    JOIN _timescaledb_catalog.chunk AS ch ON (ch.hypertable_id = ht.id)
+                    JOIN _timescaledb_catalog.chunk AS comp ON (comp.id = ch.compressed_chunk_id)
+                    WHERE ht.schema_name = 'public' AND starts_with(ht.table_name, 'raw_') AND NOT ch.dropped
+            )
+            SELECT ht.hypertable_name, count(DISTINCT chunks.chunk_id), COALESCE(sum(stat.seq_scan), 0),
+                    COALESCE(sum(stat.seq_tup_read), 0), COALESCE(sum(stat.idx_scan), 0),
+                    COALESCE(sum(stat.idx_tup_fetch), 0), COALESCE(sum(stat.n_tup_ins), 0),
+                    COALESCE(sum(stat.n_tup_upd), 0), COALESCE(sum(stat.n_tup_del), 0),
+                    COALESCE(sum(stat.n_live_tup), 0), COALESCE(sum(stat.n_dead_tup), 0),
+                    COALESCE(sum(io.heap_blks_hit), 0), COALESCE(sum(io.heap_blks_read), 0),
+                    sum(io.heap_blks_hit)::DOUBLE PRECISION / NULLIF(sum(io.heap_blks_hit + io.heap_blks_read), 0),
+                    max(stat.last_autovacuum), max(stat.last_autoanalyze)
+                FROM timescaledb_information.hypertables AS ht
+                LEFT JOIN chunk_tables AS chunks ON (chunks.hypertable_name = ht.hypertable_name)
+                LEFT JOIN pg_stat_user_tables AS stat
+                    ON (stat.schemaname = chunks.schema_name AND stat.relname = chunks.table_name)
+                LEFT JOIN pg_statio_user_tables AS io ON (io.relid = stat.relid)
+                WHERE ht.hypertable_schema = 'public' AND starts_with(ht.hypertable_name, 'raw_')
+                GROUP BY ht.hypertable_name;
+
+        COMMENT ON VIEW rdp_monitoring_table_stats IS
+            'The access statistics of each raw table summed over its uncompressed and compressed chunks';
+    """))
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW rdp_monitoring_job_stats(
+            job_id, application_name, proc_name, hypertable_name, scheduled, schedule_interval, last_run_started_at,
+            last_successful_finish, last_run_status, last_run_duration, next_start, total_runs, total_successes,
+            total_failures
+        ) AS
+            SELECT jobs.job_id, jobs.application_name, jobs.proc_name, jobs.hypertable_name, jobs.scheduled,
+                    jobs.schedule_interval, stats.last_run_started_at, stats.last_successful_finish,
+                    stats.last_run_status, stats.last_run_duration, COALESCE(stats.next_start, jobs.next_start),
+                    COALESCE(stats.total_runs, 0), COALESCE(stats.total_successes, 0),
+                    COALESCE(stats.total_failures, 0)
+                FROM timescaledb_information.jobs AS jobs
+                LEFT JOIN timescaledb_information.job_stats AS stats ON (stats.job_id = jobs.job_id)
+                WHERE jobs.hypertable_schema = 'public' OR jobs.proc_schema = 'public';
+
+        COMMENT ON VIEW rdp_monitoring_job_stats IS 'The run statistics of the background jobs of the rdp objects';
+    """))
+
+
+def upgrade_monitoring_role():
+    """Creates the monitoring role and optionally its login user"""
+
+    op.execute(sql.text(f"""
+        CREATE ROLE monitoring_base NOSUPERUSER NOCREATEDB NOCREATEROLE INHERIT NOLOGIN NOREPLICATION NOBYPASSRLS;
+        COMMENT ON ROLE monitoring_base IS 'Allows to read the performance statistics of the rdp objects';
+
+        REVOKE ALL ON FUNCTION rdp_monitoring_statement_stats(), rdp_monitoring_object_statements() FROM PUBLIC;
+        GRANT EXECUTE ON FUNCTION rdp_monitoring_object_statements() TO monitoring_base;
+        GRANT SELECT ON TABLE {", ".join(monitoring_views)} TO monitoring_base;
+    """))
+
+    monitoring_user = os.environ.get("POSTGRES_MONITORING_USER")
+    if monitoring_user is not None:
+        op.execute(sql.text(f"""
+            CREATE ROLE "{monitoring_user}"
+                NOSUPERUSER NOCREATEDB NOCREATEROLE INHERIT
+                LOGIN PASSWORD '{os.environ['POSTGRES_MONITORING_PASSWORD']}'
+                IN ROLE monitoring_base;
+            COMMENT ON ROLE "{monitoring_user}" IS 'User to collect the performance statistics';
+        """))
+
+
+def downgrade():
+    """Removes the statistics views and the monitoring role. The pg_stat_statements extension is kept."""
+
+    monitoring_user = os.environ.get("POSTGRES_MONITORING_USER")
+    if monitoring_user is not None:
+        op.execute(sql.text(f'DROP ROLE IF EXISTS "{monitoring_user}";'))
+
+    op.execute(sql.text(f"""
+        DROP VIEW IF EXISTS {", ".join(reversed(monitoring_views))};
+        DROP FUNCTION IF EXISTS rdp_monitoring_object_statements();
+        DROP FUNCTION IF EXISTS rdp_monitoring_statement_stats();
+        DROP ROLE monitoring_base;
+    """))
@@ -0,0 +1,223 @@
+"""
+compression health views
+
+Adds monitoring views on the compression state of the raw tables. rdp_monitoring_hypertable_health reports the chunks
+per state, the uncompressed backlog that is older than compress_after and the compression ratio of each raw table.
+rdp_monitoring_largest_segments lists the largest dp_id segments of the compressed chunks and
+rdp_monitoring_compression_jobs reports failed or late compression jobs with their last error. Since the job errors and
+the compressed chunks are only visible to privileged roles, they are read via security definer functions.
+
+Revision ID: fbcdd98790f9
+Revises: 999b49a397e5
+Create Date: 2025-05-19 14:07:52.913470
+
+"""
+from alembic import op
+import sqlalchemy as sql
+
+# revision identifiers, used by Alembic.
+revision = 'fbcdd98790f9'
+down_revision = '999b49a397e5'
+branch_labels = None
+depends_on = None
+
+health_views = [
+    "rdp_monitoring_hypertable_health", "rdp_monitoring_largest_segments", "rdp_monitoring_compression_jobs",
+]
+health_functions = ["rdp_monitoring_segment_sizes(INTEGER)", "rdp_monitoring_last_job_errors()"]
+
+
+def upgrade():
+    """Creates the compression health views and grants them to the monitoring role"""
+
+    upgrade_hypertable_health()
+    upgrade_segment_sizes()
+    upgrade_compression_jobs()
+
+    op.execute(sql.text(f"""
+        REVOKE ALL ON FUNCTION {", ".join(health_functions)} FROM PUBLIC;
+        GRANT EXECUTE ON FUNCTION {", ".join(health_functions)} TO monitoring_base;
+        GRANT SELECT ON TABLE {", ".join(health_views)} TO monitoring_base;
+    """))
+
+
+def upgrade_hypertable_health():
+    """Creates the view on the chunk states, the compression backlog and the compression ratio"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW rdp_monitoring_hypertable_health(
+            hypertable_name, compress_after, chunk_count, uncompressed_chunk_count, compressed_chunk_count,
+            partially_compressed_chunk_count, frozen_chunk_count, backlog_chunk_count, backlog_bytes,
+            oldest_backlog_end, before_compression_bytes, after_compression_bytes, compression_ratio
+        ) AS
+            SELECT ht.hypertable_name, policies.compress_after, states.chunk_count, states.uncompressed_chunk_count,
+                    states.compressed_chunk_count, states.partially_compressed_chunk_count, states.frozen_chunk_count,
+                    states.backlog_chunk_count, COALESCE(states.backlog_bytes, 0), states.oldest_backlog_end,
+                    comp.before_compression_total_bytes, comp.after_compression_total_bytes,
+                    comp.before_compression_total_bytes::DOUBLE PRECISION /
+                        NULLIF(comp.after_compression_total_bytes, 0)
+                FROM timescaledb_information.hypertables AS ht
+                LEFT JOIN (
+                    SELECT jobs.hypertable_name, (jobs.config ->> 'compress_after')::INTERVAL AS compress_after
+                        FROM timescaledb_information.jobs AS jobs
+                        WHERE jobs.proc_name = 'policy_compression' AND jobs.hypertable_schema = 'public'
+                ) AS policies ON (policies.hypertable_name = ht.hypertable_name)
+                CROSS JOIN LATERAL (
+                    -- The status is a bit set of compressed (1), unordered (2), frozen (4) and partial (8)
+                    SELECT count(*) AS chunk_count,
+                            count(*) FILTER (WHERE cat.status & 1 = 0) AS uncompressed_chunk_count,
+                            count(*) FILTER (WHERE cat.status & 1 = 1) AS compressed_chunk_count,
+                            count(*) FILTER (WHERE cat.status & 8 = 8) AS partially_compressed_chunk_count,
+                            count(*) FILTER (WHERE cat.status & 4 = 4) AS frozen_chunk_count,
+                            count(*) FILTER (
+                                WHERE cat.status & 1 = 0 AND chunks.range_end < now() - policies.compress_after
+                            ) AS backlog_chunk_count,
+                            sum(sizes.total_bytes) FILTER (
+                                WHERE cat.status & 1 = 0 AND chunks.range_end < now() - policies.compress_after
+                            ) AS backlog_bytes,
+                            min(chunks.range_end) FILTER (
+                                WHERE cat.status & 1 = 0 AND chunks.range_end < now() - policies.compress_after
+                            ) AS oldest_backlog_end
+                        FROM chunks_detailed_size(format('%I.%I', ht.hypertable_schema, ht.hypertable_name)::REGCLASS)
+                            AS sizes
+                        JOIN timescaledb_information.chunks AS chunks
+                            ON (chunks.chunk_schema = sizes.chunk_schema AND chunks.chunk_name = sizes.chunk_name)
+                        JOIN _timescaledb_catalog.chunk AS cat
+                            ON (cat.schema_name = chunks.chunk_schema AND cat.table_name = chunks.chunk_name)
+                ) AS states
+                LEFT JOIN LATERAL hypertable_compression_stats(
+                    format('%I.%I', ht.hypertable_schema, ht.hypertable_name)::REGCLASS
+                ) AS comp ON TRUE
+                WHERE ht.hypertable_schema = 'public' AND starts_with(ht.hypertable_name, 'raw_');
+
+        COMMENT ON VIEW rdp_monitoring_hypertable_health IS
+            'The chunks per compression state, the uncompressed chunks that are older than compress_after (backlog)
+             and the compression ratio of each raw table';
+    """))
+
+
+def upgrade_segment_sizes():
+    """Creates the function and the view on the largest dp_id segments of the compressed chunks"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_monitoring_segment_sizes(max_segments INTEGER DEFAULT 10)
+            RETURNS TABLE(
+                hypertable_name TEXT,
+                dp_id INTEGER,
+                chunk_count BIGINT,
+                batch_count BIGINT,
+                row_count BIGINT,
+                compressed_bytes BIGINT
+            )
+            LANGUAGE plpgsql STABLE
+            SECURITY DEFINER  -- The compressed chunks are only accessible by the owner
+            SET search_path = pg_catalog, public
+            AS $$
+            DECLARE
+                ht RECORD;
+            BEGIN
+                -- Only the segment columns are read from the compressed batches. Reading the compressed values (e.g.,
+                -- via pg_column_size of the rows) would detoast all batches. Instead, the compressed size of each
+                -- chunk is apportioned to its segments by their share of the rows.
+                FOR ht IN
+                    SELECT h.table_name, string_agg(format(
+                            'SELECT %L::TEXT AS chunk_schema, %L::TEXT AS chunk_name, comp.dp_id,
+                                    count(*) AS batch_count, sum(comp._ts_meta_count) AS row_count
+                                FROM %I.%I AS comp
+                                GROUP BY comp.dp_id',
+                            ch.schema_name, ch.table_name, comp_ch.schema_name, comp_ch.table_name
+                        ), ' UNION ALL ') AS segments_query
+                        FROM _timescaledb_catalog.hypertable AS h
+                        JOIN _timescaledb_catalog.chunk AS ch ON (ch.hypertable_id = h.id)
+                        JOIN _timescaledb_catalog.chunk AS comp_ch ON (comp_ch.id = ch.compressed_chunk_id)
+                        WHERE h.schema_name = 'public' AND starts_with(h.table_name, 'raw_') AND NOT ch.dropped
+                        GROUP BY h.table_name
+                LOOP
+                    RETURN QUERY EXECUTE format('
+                        SELECT %L::TEXT, seg.dp_id, count(*), sum(seg.batch_count)::BIGINT,
+                                sum(seg.row_count)::BIGINT,
+                                round(sum(stats.after_compression_total_bytes::NUMERIC * seg.row_count /
+                                    NULLIF(seg.chunk_row_count, 0)))::BIGINT AS compressed_bytes
+                            FROM (
+                                SELECT chunk_seg.*,
+                                        sum(chunk_seg.row_count) OVER (PARTITION BY chunk_seg.chunk_name)
+                                            AS chunk_row_count
+                                    FROM (%s) AS chunk_seg
+                            ) AS seg
+                            JOIN chunk_compression_stats(%L::REGCLASS) AS stats
+                                ON (stats.chunk_schema = seg.chunk_schema AND stats.chunk_name = seg.chunk_name)
+                            GROUP BY seg.dp_id
+                            ORDER BY compressed_bytes DESC
+                            LIMIT %s
+                    ', ht.table_name, ht.segments_query, format('public.%I', ht.table_name), max_segments);
+                END LOOP;
+            END;
+            $$;
+
+        COMMENT ON FUNCTION rdp_monitoring_segment_sizes(INTEGER) IS
+            'Returns the max_segments largest dp_id segments of the compressed chunks of each raw table. The size is
+             estimated from the compressed size of each chunk by the share of rows of the segment. Scans the
+             segment columns of the compressed chunks, i.e., one row per batch, without detoasting the batches.';
+
+        CREATE OR REPLACE VIEW rdp_monitoring_largest_segments(
+            hypertable_name, dp_id, chunk_count, batch_count, row_count, compressed_bytes
+        ) AS
+            SELECT seg.hypertable_name, seg.dp_id, seg.chunk_count, seg.batch_count, seg.row_count,
+                    seg.compressed_bytes
+                FROM rdp_monitoring_segment_sizes() AS seg;
+
+        COMMENT ON VIEW rdp_monitoring_largest_segments IS
+            'The ten largest dp_id segments of the compressed chunks of each raw table';
+    """))
+
+
+def upgrade_compression_jobs():
+    """Creates the view on the state and the last error of the compression jobs"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE FUNCTION rdp_monitoring_last_job_errors()
+            RETURNS TABLE(job_id INTEGER, error_time TIMESTAMPTZ, sqlerrcode TEXT, err_message TEXT)
+            LANGUAGE sql STABLE
+            SECURITY DEFINER  -- The job errors are only visible to the owners of the jobs
+            SET search_path = pg_catalog, public
+            AS $$
+                SELECT DISTINCT ON (err.job_id) err.job_id, err.finish_time, err.sqlerrcode, err.err_message
+                    FROM timescaledb_information.job_errors AS err
+                    ORDER BY err.job_id, err.finish_time DESC NULLS LAST;
+            $$;
+
+        COMMENT ON FUNCTION rdp_monitoring_last_job_errors() IS 'Returns the most recent error of each job';
+
+        CREATE OR REPLACE VIEW rdp_monitoring_compression_jobs(
+            job_id, hypertable_name, scheduled, schedule_interval, last_run_status, last_run_started_at,
+            last_successful_finish, next_start, total_failures, is_failed, is_late, last_error_time, last_error
+        ) AS
+            SELECT jobs.job_id, jobs.hypertable_name, jobs.scheduled, jobs.schedule_interval, stats.last_run_status,
+                    stats.last_run_started_at, stats.last_successful_finish,
+                    COALESCE(stats.next_start, jobs.next_start), COALESCE(stats.total_failures, 0),
+                    COALESCE(stats.last_run_status = 'Failed', FALSE),
+                    jobs.scheduled AND COALESCE(
+                        COALESCE(stats.next_start, jobs.next_start) < now() - jobs.schedule_interval OR
+                            stats.last_successful_finish < now() - 2 * jobs.schedule_interval,
+                        FALSE
+                    ),
+                    err.error_time, err.err_message
+                FROM timescaledb_information.jobs AS jobs
+                LEFT JOIN timescaledb_information.job_stats AS stats ON (stats.job_id = jobs.job_id)
+                LEFT JOIN rdp_monitoring_last_job_errors() AS err ON (err.job_id = jobs.job_id)
+                WHERE jobs.proc_name = 'policy_compression' AND jobs.hypertable_schema = 'public' AND
+                    starts_with(jobs.hypertable_name, 'raw_');
+
+        COMMENT ON VIEW rdp_monitoring_compression_jobs IS
+            'The compression jobs of the raw tables. A job is late, if its start is overdue by a schedule interval or
+             its last success is older than two intervals.';
+    """))
+
+
+def downgrade():
+    """Removes the compression health views"""
+
+    op.execute(sql.text(f"""
+        DROP VIEW IF EXISTS {", ".join(reversed(health_views))};
+        DROP FUNCTION IF EXISTS {", ".join(health_functions)};
+    """))
@@ -0,0 +1,277 @@
+"""
+ingestion statistics
+
+Tracks the freshness and the volume of the ingested samples per data point to detect stalled or noisy feeders without
+scanning the raw tables. Since TimescaleDB does not support transition tables on hypertables, a row trigger appends
+each stored sample to the unlogged rdp_ingestion_queue, which avoids the WAL and any index maintenance. The deadband
+filter additionally queues the dropped samples as rejected. The background job rdp_aggregate_ingestion_stats drains
+the queue every minute into the per data point counters (rdp_ingestion_stats) and hourly buckets
+(rdp_ingestion_counts). The view rdp_ingestion_freshness exposes them together with the data point attributes subject to
+the row level security of the data points. The view rdp_monitoring_ingestion_stats sums the counters per value type
+for the monitoring role. Samples that fail the type check abort the transaction and are therefore
+not counted. The tracking trigger is added to all raw tables that exist at this revision. Later revisions that add raw
+tables have to add it via add_tracking_trigger().
+
+Revision ID: 1b0360c8e24a
+Revises: fbcdd98790f9
+Create Date: 2025-05-26 09:34:18.072655
+
+"""
+from alembic import op
+import sqlalchemy as sql
+
+import rdp_db.core.rev_2025_03_24_11_18_195fe5f5c0d0_jsonb_payload_deduplication as rev_payload
+
+# revision identifiers, used by Alembic.
+revision = '1b0360c8e24a'
+down_revision = 'fbcdd98790f9'
+branch_labels = None
+depends_on = None
+
+packed_table = "raw_bitemporal_double_packed"
+
+# Queues the samples dropped by the deadband filter as rejected
+reject_statement = "INSERT INTO rdp_ingestion_queue(dp_id, valid_time, rejected) " \
+                   "VALUES (NEW.dp_id, NEW.valid_time, TRUE);"
+
+
+def upgrade():
+    """Installs the ingestion counters, the tracking triggers, the aggregation job and the freshness view"""
+
+    upgrade_statistics_tables()
+    upgrade_tracking_triggers()
+    rev_payload.create_deadband_function(rejection_statement=reject_statement)
+    upgrade_aggregation_job()
+    upgrade_freshness_view()
+    upgrade_monitoring_view()
+
+
+def upgrade_statistics_tables():
+    """Creates the queue of the ingested samples and the aggregated counters"""
+
+    op.execute(sql.text("""
+        CREATE UNLOGGED TABLE rdp_ingestion_queue (
+            dp_id INTEGER NOT NULL,
+            valid_time TIMESTAMPTZ NOT NULL,
+            ingest_time TIMESTAMPTZ NOT NULL DEFAULT now(),
+            rejected BOOLEAN NOT NULL DEFAULT FALSE
+        );
+        COMMENT ON TABLE rdp_ingestion_queue
+            IS 'The recently ingested samples, which are not aggregated yet. Lost on a crash by design.';
+        GRANT INSERT ON TABLE rdp_ingestion_queue TO data_source_base;
+
+        CREATE TABLE rdp_ingestion_stats (
+            dp_id INTEGER NOT NULL,
+            last_ingest_time TIMESTAMPTZ NULL,
+            last_valid_time TIMESTAMPTZ NULL,
+            total_rows BIGINT NOT NULL DEFAULT 0,
+            rejected_rows BIGINT NOT NULL DEFAULT 0,
+            last_rejected_time TIMESTAMPTZ NULL,
+            PRIMARY KEY (dp_id),
+            FOREIGN KEY (dp_id) REFERENCES data_points(id) ON DELETE CASCADE
+        );
+        COMMENT ON TABLE rdp_ingestion_stats IS 'The ingestion counters of each data point since the tracking started';
+        COMMENT ON COLUMN rdp_ingestion_stats.last_ingest_time
+            IS 'The start of the last transaction that stored a sample';
+        COMMENT ON COLUMN rdp_ingestion_stats.last_valid_time IS 'The latest valid time of all stored samples';
+        COMMENT ON COLUMN rdp_ingestion_stats.rejected_rows IS 'The number of samples dropped by the deadband filter';
+        CREATE INDEX rdp_ingestion_stats_last_ingest_time_idx ON rdp_ingestion_stats(last_ingest_time);
+
+        CREATE TABLE rdp_ingestion_counts (
+            dp_id INTEGER NOT NULL,
+            bucket TIMESTAMPTZ NOT NULL,
+            row_count BIGINT NOT NULL DEFAULT 0,
+            rejected_count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (dp_id, bucket),
+            FOREIGN KEY (dp_id) REFERENCES data_points(id) ON DELETE CASCADE
+        );
+        COMMENT ON TABLE rdp_ingestion_counts
+            IS 'The number of stored and rejected samples of each data point per hour of the ingestion time';
+
+        GRANT SELECT ON TABLE rdp_ingestion_stats, rdp_ingestion_counts TO restricting_view_executor;
+    """))
+
+
+def upgrade_tracking_triggers():
+    """Creates the trigger function that queues the stored samples and adds it to all raw tables"""
+
+    op.execute(sql.text("""
+        -- Queues each stored sample. The packed runs are represented by the valid time of their last value.
+        CREATE OR REPLACE FUNCTION rdp_tr_track_ingestion() RETURNS TRIGGER
+        LANGUAGE plpgsql VOLATILE PARALLEL RESTRICTED
+        AS $$
+        BEGIN
+            IF TG_ARGV[0] = 'packed' THEN
+                INSERT INTO rdp_ingestion_queue(dp_id, valid_time) VALUES (NEW.dp_id, NEW.valid_to - NEW.step);
+            ELSE
+                INSERT INTO rdp_ingestion_queue(dp_id, valid_time) VALUES (NEW.dp_id, NEW.valid_time);
+            END IF;
+            RETURN NULL;
+        END;
+        $$
+    """))
+
+    for table_name in get_raw_tables():
+        add_tracking_trigger(table_name, "sample")
+    add_tracking_trigger(packed_table, "packed")
+
+
+def get_raw_tables() -> list[str]:
+    """Returns the raw tables that store one sample per row, i.e., all raw tables except the packed forecast runs"""
+
+    return op.get_bind().execute(sql.text("""
+        SELECT ht.hypertable_name
+            FROM timescaledb_information.hypertables AS ht
+            WHERE ht.hypertable_schema = 'public' AND starts_with(ht.hypertable_name, 'raw_') AND
+                ht.hypertable_name <> :packed_table
+            ORDER BY ht.hypertable_name;
+    """), dict(packed_table=packed_table)).scalars().all()
+
+
+def add_tracking_trigger(table_name: str, row_layout: str):
+    """Creates the tracking trigger on the particular table. It only fires for the actually stored rows."""
+
+    op.execute(sql.text(f"""
+        CREATE OR REPLACE TRIGGER track_ingestion
+            AFTER INSERT
+            ON {table_name}
+            FOR EACH ROW
+            EXECUTE FUNCTION rdp_tr_track_ingestion('{row_layout}');
+    """))
+
+
+def upgrade_aggregation_job():
+    """Creates the procedure that aggregates the queued samples and schedules it every minute"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE PROCEDURE rdp_aggregate_ingestion_stats(job_id INTEGER, config JSONB)
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            keep_buckets INTERVAL := COALESCE((config ->> 'keep_buckets')::INTERVAL, INTERVAL '2 days');
+        BEGIN
+            WITH drained AS (
+                DELETE FROM rdp_ingestion_queue AS queue
+                    RETURNING queue.dp_id, queue.valid_time, queue.ingest_time, queue.rejected
+            ), samples AS (
+                -- The data point may be deleted in the meantime
+                SELECT drained.*
+                    FROM drained
+                    WHERE EXISTS (SELECT FROM data_points AS dp WHERE dp.id = drained.dp_id)
+            ), counts AS (
+                INSERT INTO rdp_ingestion_counts AS cnt(dp_id, bucket, row_count, rejected_count)
+                    SELECT samples.dp_id, time_bucket(INTERVAL '1 hour', samples.ingest_time),
+                            count(*) FILTER (WHERE NOT samples.rejected), count(*) FILTER (WHERE samples.rejected)
+                        FROM samples
+                        GROUP BY 1, 2
+                    ON CONFLICT (dp_id, bucket) DO UPDATE SET
+                        row_count = cnt.row_count + EXCLUDED.row_count,
+                        rejected_count = cnt.rejected_count + EXCLUDED.rejected_count
+            )
+            INSERT INTO rdp_ingestion_stats AS stats(
+                    dp_id, last_ingest_time, last_valid_time, total_rows, rejected_rows, last_rejected_time
+                )
+                SELECT samples.dp_id, max(samples.ingest_time) FILTER (WHERE NOT samples.rejected),
+                        max(samples.valid_time) FILTER (WHERE NOT samples.rejected),
+                        count(*) FILTER (WHERE NOT samples.rejected), count(*) FILTER (WHERE samples.rejected),
+                        max(samples.ingest_time) FILTER (WHERE samples.rejected)
+                    FROM samples
+                    GROUP BY samples.dp_id
+                ON CONFLICT (dp_id) DO UPDATE SET
+                    last_ingest_time = GREATEST(stats.last_ingest_time, EXCLUDED.last_ingest_time),
+                    last_valid_time = GREATEST(stats.last_valid_time, EXCLUDED.last_valid_time),
+                    total_rows = stats.total_rows + EXCLUDED.total_rows,
+                    rejected_rows = stats.rejected_rows + EXCLUDED.rejected_rows,
+                    last_rejected_time = GREATEST(stats.last_rejected_time, EXCLUDED.last_rejected_time);
+
+            DELETE FROM rdp_ingestion_counts AS cnt WHERE cnt.bucket < now() - keep_buckets;
+        END;
+        $$;
+
+        COMMENT ON PROCEDURE rdp_aggregate_ingestion_stats(INTEGER, JSONB) IS
+            'Moves the queued samples to the ingestion counters and removes the hourly buckets that are older than
+             keep_buckets (default: 2 days)';
+
+        SELECT add_job(
+                'rdp_aggregate_ingestion_stats', INTERVAL '1 minute',
+                config => jsonb_build_object('keep_buckets', '2 days')
+            );
+    """))
+
+
+def upgrade_freshness_view():
+    """Creates the view on the ingestion counters that applies the access policies of the data points"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW rdp_ingestion_freshness(
+            dp_id, name, device_id, location_code, data_provider, data_type, temporality, view_role,
+            last_ingest_time, ingest_age, last_valid_time, rows_last_hour, rows_last_day, total_rows, rejected_rows,
+            last_rejected_time
+        ) AS
+            SELECT dp.id, dp.name, dp.device_id, dp.location_code, dp.data_provider, dp.data_type, dp.temporality,
+                    dp.view_role, stats.last_ingest_time, now() - stats.last_ingest_time, stats.last_valid_time,
+                    COALESCE(counts.rows_last_hour, 0), COALESCE(counts.rows_last_day, 0), stats.total_rows,
+                    stats.rejected_rows, stats.last_rejected_time
+                FROM rdp_ingestion_stats AS stats
+                JOIN data_points AS dp ON (dp.id = stats.dp_id)
+                LEFT JOIN LATERAL (
+                    -- The partially covered oldest bucket is weighted by its overlap with the window
+                    SELECT round(sum(cnt.row_count * LEAST(1, GREATEST(0,
+                                extract(EPOCH FROM cnt.bucket + INTERVAL '1 hour' - (now() - INTERVAL '1 hour')) / 3600
+                            ))))::BIGINT AS rows_last_hour,
+                            round(sum(cnt.row_count * LEAST(1, GREATEST(0,
+                                extract(EPOCH FROM cnt.bucket + INTERVAL '1 hour' - (now() - INTERVAL '1 day')) / 3600
+                            ))))::BIGINT AS rows_last_day
+                        FROM rdp_ingestion_counts AS cnt
+                        WHERE cnt.dp_id = stats.dp_id AND cnt.bucket > now() - INTERVAL '25 hours'
+                ) AS counts ON TRUE;
+
+        ALTER VIEW rdp_ingestion_freshness OWNER TO restricting_view_executor;
+        GRANT SELECT ON rdp_ingestion_freshness TO view_base;
+
+        COMMENT ON VIEW rdp_ingestion_freshness IS
+            'The last ingestion and the ingestion volume of each visible data point. The rows of the last hour and
+             day are estimated from hourly buckets. The counters are updated every minute.';
+    """))
+
+
+def upgrade_monitoring_view():
+    """Creates the view on the ingestion counters per value type for the monitoring role"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW rdp_monitoring_ingestion_stats(
+            data_type, temporality, data_point_count, total_rows, rejected_rows, last_ingest_time
+        ) AS
+            SELECT dp.data_type, dp.temporality, count(*), sum(stats.total_rows)::BIGINT,
+                    sum(stats.rejected_rows)::BIGINT, max(stats.last_ingest_time)
+                FROM rdp_ingestion_stats AS stats
+                JOIN data_points AS dp ON (dp.id = stats.dp_id)
+                GROUP BY dp.data_type, dp.temporality;
+
+        GRANT SELECT ON TABLE rdp_monitoring_ingestion_stats TO monitoring_base;
+
+        COMMENT ON VIEW rdp_monitoring_ingestion_stats IS
+            'The ingestion counters summed over all data points per value type. The counters only decrease, if data
+             points are deleted.';
+    """))
+
+
+def downgrade():
+    """Removes the ingestion statistics and restores the deadband filter"""
+
+    op.execute(sql.text("""
+        DROP VIEW IF EXISTS rdp_monitoring_ingestion_stats;
+        DROP VIEW IF EXISTS rdp_ingestion_freshness;
+        SELECT delete_job(job_id) FROM timescaledb_information.jobs
+            WHERE proc_name = 'rdp_aggregate_ingestion_stats';
+        DROP PROCEDURE IF EXISTS rdp_aggregate_ingestion_stats(INTEGER, JSONB);
+    """))
+
+    rev_payload.create_deadband_function()
+    for table_name in [*get_raw_tables(), packed_table]:
+        op.execute(sql.text(f"DROP TRIGGER IF EXISTS track_ingestion ON {table_name};"))
+
+    op.execute(sql.text("""
+        DROP FUNCTION IF EXISTS rdp_tr_track_ingestion;
+        DROP TABLE IF EXISTS rdp_ingestion_counts, rdp_ingestion_stats, rdp_ingestion_queue;
+    """))
@@ -0,0 +1,187 @@
+"""
+background data migrations
+
+Adds the framework to rewrite large amounts of data in the background instead of within the migration transaction. A
+revision registers a task in rdp_data_migrations (see rdp_db.utils.data_migration), which is processed by the
+rdp_run_data_migrations job in bounded batches. Each batch is committed together with its progress, such that the
+processing resumes after interruptions. The rdp_data_migration_status view reports the progress of the tasks.
+
+Revision ID: e22033b26415
+Revises: 1b0360c8e24a
+Create Date: 2025-06-02 11:18:43.205817
+
+"""
+from alembic import op
+import sqlalchemy as sql
+
+# revision identifiers, used by Alembic.
+revision = 'e22033b26415'
+down_revision = '1b0360c8e24a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Creates the task table, the runner job and the status view"""
+
+    upgrade_task_table()
+    upgrade_runner()
+    upgrade_status_view()
+
+
+def upgrade_task_table():
+    """Creates the table of the registered data migrations and their progress"""
+
+    op.execute(sql.text("""
+        CREATE TABLE rdp_data_migrations (
+            name TEXT NOT NULL,
+            description TEXT,
+            batch_statement TEXT NOT NULL,
+            batch_size INTEGER NOT NULL DEFAULT 10000 CHECK (batch_size > 0),
+            batch_delay INTERVAL NOT NULL DEFAULT INTERVAL '100 milliseconds',
+            status TEXT NOT NULL DEFAULT 'pending'
+                CHECK (status IN ('pending', 'running', 'paused', 'completed', 'failed')),
+            resume_key TEXT,
+            total_rows BIGINT,
+            processed_rows BIGINT NOT NULL DEFAULT 0,
+            batch_count BIGINT NOT NULL DEFAULT 0,
+            error_count INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            registered_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            started_at TIMESTAMPTZ,
+            last_batch_at TIMESTAMPTZ,
+            completed_at TIMESTAMPTZ,
+            PRIMARY KEY (name)
+        );
+
+        COMMENT ON TABLE rdp_data_migrations IS
+            'The data migrations that are processed in the background by the rdp_run_data_migrations job';
+        COMMENT ON COLUMN rdp_data_migrations.batch_statement IS
+            'Processes the batch after the resume key ($1, NULL in the first batch) with at most batch_size ($2) rows.
+             Returns the next resume key and the number of processed rows. A NULL key completes the task.';
+        COMMENT ON COLUMN rdp_data_migrations.batch_delay IS 'The pause after each batch to throttle the migration';
+        COMMENT ON COLUMN rdp_data_migrations.status IS
+            'The state of the task. Paused and failed tasks are skipped until the status is reset to running.';
+        COMMENT ON COLUMN rdp_data_migrations.total_rows IS 'The optional number of rows to estimate the progress';
+        COMMENT ON COLUMN rdp_data_migrations.error_count IS 'The number of consecutive failed batches';
+    """))
+
+
+def upgrade_runner():
+    """Creates the job that processes the pending data migrations batch by batch"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE PROCEDURE rdp_run_data_migrations(job_id INTEGER, config JSONB)
+        LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            deadline TIMESTAMPTZ := clock_timestamp() +
+                COALESCE((config ->> 'max_runtime')::INTERVAL, INTERVAL '50 seconds');
+            max_errors INTEGER := COALESCE((config ->> 'max_errors')::INTEGER, 5);
+            skipped TEXT[] := '{}';
+            task rdp_data_migrations;
+            batch_start TIMESTAMPTZ;
+            next_key TEXT;
+            batch_rows BIGINT;
+            error_message TEXT;
+        BEGIN
+            WHILE clock_timestamp() < deadline LOOP
+                -- Locking the task defers concurrent changes of its status until the batch is committed
+                SELECT * INTO task
+                    FROM rdp_data_migrations AS mig
+                    WHERE mig.status IN ('pending', 'running') AND mig.name <> ALL(skipped)
+                    ORDER BY mig.registered_at, mig.name
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED;
+                EXIT WHEN NOT FOUND;
+
+                batch_start := clock_timestamp();
+                BEGIN
+                    EXECUTE task.batch_statement INTO next_key, batch_rows USING task.resume_key, task.batch_size;
+                    UPDATE rdp_data_migrations AS mig SET
+                            status = CASE WHEN next_key IS NULL THEN 'completed' ELSE 'running' END,
+                            resume_key = next_key,
+                            processed_rows = mig.processed_rows + COALESCE(batch_rows, 0),
+                            batch_count = mig.batch_count + 1,
+                            error_count = 0,
+                            started_at = COALESCE(mig.started_at, batch_start),
+                            last_batch_at = clock_timestamp(),
+                            completed_at = CASE WHEN next_key IS NULL THEN clock_timestamp() END
+                        WHERE mig.name = task.name;
+                EXCEPTION WHEN OTHERS THEN
+                    -- The batch is rolled back and retried in the next run
+                    GET STACKED DIAGNOSTICS error_message = MESSAGE_TEXT;
+                    UPDATE rdp_data_migrations AS mig SET
+                            status = CASE WHEN mig.error_count + 1 >= max_errors THEN 'failed' ELSE mig.status END,
+                            error_count = mig.error_count + 1,
+                            last_error = error_message
+                        WHERE mig.name = task.name;
+                    skipped := skipped || task.name;
+                    RAISE WARNING 'The data migration % failed: %', task.name, error_message;
+                END;
+                COMMIT;
+
+                PERFORM pg_sleep(LEAST(
+                    extract(EPOCH FROM task.batch_delay), GREATEST(0, extract(EPOCH FROM deadline - clock_timestamp()))
+                ));
+            END LOOP;
+        END;
+        $$;
+
+        COMMENT ON PROCEDURE rdp_run_data_migrations(INTEGER, JSONB) IS
+            'Processes the pending data migrations in the order of their registration until max_runtime (default: 50
+             seconds) is exceeded. Each batch is committed separately. A task fails after max_errors (default: 5)
+             consecutive errors.';
+
+        SELECT add_job(
+                'rdp_run_data_migrations', INTERVAL '1 minute',
+                config => jsonb_build_object('max_runtime', '50 seconds', 'max_errors', 5)
+            );
+    """))
+
+
+def upgrade_status_view():
+    """Creates the view on the progress of the data migrations and grants it to the monitoring role"""
+
+    op.execute(sql.text("""
+        CREATE OR REPLACE VIEW rdp_data_migration_status(
+            name, description, status, processed_rows, total_rows, progress, batch_count, rows_per_second,
+            estimated_completion, error_count, last_error, registered_at, started_at, last_batch_at, completed_at
+        ) AS
+            SELECT mig.name, mig.description, mig.status, mig.processed_rows, mig.total_rows,
+                    CASE
+                        WHEN mig.status = 'completed' THEN 1.0
+                        ELSE LEAST(1.0, mig.processed_rows::DOUBLE PRECISION / NULLIF(mig.total_rows, 0))
+                    END,
+                    mig.batch_count, rates.rows_per_second,
+                    CASE WHEN mig.status IN ('pending', 'running') AND mig.total_rows > mig.processed_rows THEN
+                        mig.last_batch_at + (mig.total_rows - mig.processed_rows) / NULLIF(rates.rows_per_second, 0) *
+                            INTERVAL '1 second'
+                    END,
+                    mig.error_count, mig.last_error, mig.registered_at, mig.started_at, mig.last_batch_at,
+                    mig.completed_at
+                FROM rdp_data_migrations AS mig
+                CROSS JOIN LATERAL (
+                    -- Includes the throttling delays
+                    SELECT mig.processed_rows /
+                            NULLIF(extract(EPOCH FROM mig.last_batch_at - mig.started_at)::DOUBLE PRECISION, 0)
+                        AS rows_per_second
+                ) AS rates;
+
+        COMMENT ON VIEW rdp_data_migration_status IS
+            'The progress of the background data migrations. The completion is estimated from the average rate, if
+             the total number of rows is known.';
+
+        GRANT SELECT ON TABLE rdp_data_migration_status TO monitoring_base;
+    """))
+
+
+def downgrade():
+    """Removes the data migration framework including the pending tasks"""
+
+    op.execute(sql.text("""
+        DROP VIEW IF EXISTS rdp_data_migration_status;
+        SELECT delete_job(job_id) FROM timescaledb_information.jobs WHERE proc_name = 'rdp_run_data_migrations';
+        DROP PROCEDURE IF EXISTS rdp_run_data_migrations(INTEGER, JSONB);
+        DROP TABLE IF EXISTS rdp_data_migrations;
+    """))
@@ -1,5 +1,7 @@
+import contextlib
 import logging
 import os
+import pathlib
 import re
 
 from logging.config import fileConfig
@@ -8,9 +10,13 @@ from alembic import context
 
 import dotenv
 import sqlalchemy
+import sqlalchemy.exc
+import sqlalchemy.pool
 import tenacity
 
 import rdp_db.utils.db_version as db_version
+import rdp_db.utils.migration_stats as migration_stats
+import rdp_db.utils.schema_state as schema_state
 
 # Populate the local environment variables
 dotenv.load_dotenv(dotenv_path=".env")
@@ -109,28 +115,248 @@ def _connect_to_db(db_url: str) -> sqlalchemy.engine.Engine:
     return engine
 
 
+@contextlib.contextmanager
+def _migration_lock(engine: sqlalchemy.engine.Engine):
+    """
+    Serializes concurrent migrators via a session-level advisory lock, which is held by a dedicated connection
+
+    Hence, a second migrator neither overwrites the paused jobs of the first one nor resumes them too early. The lock is
+    released by the server as well, if the migration process gets killed.
+    """
+
+    with engine.connect() as conn:
+        if not conn.execute(sqlalchemy.text("SELECT pg_try_advisory_lock(hashtext('rdp_migration'));")).scalar_one():
+            logger.info("Another migration is running, wait for it to finish")
+            conn.execute(sqlalchemy.text("SELECT pg_advisory_lock(hashtext('rdp_migration'));"))
+        conn.commit()
+        try:
+            yield
+        finally:
+            conn.execute(sqlalchemy.text("SELECT pg_advisory_unlock(hashtext('rdp_migration'));"))
+            conn.commit()
+
+
+def _pause_background_jobs(engine: sqlalchemy.engine.Engine) -> None:
+    """
+    Pauses the scheduled Timescale jobs on the public hypertables (compression, retention, etc.), the refresh jobs of
+    the continuous aggregates and the jobs of the rdp_ procedures
+
+    Already running jobs are not interrupted. The paused jobs are kept in the rdp_paused_jobs table to resume them
+    afterward. Jobs left paused by an interrupted migration are resumed before pausing the jobs again. Since the
+    caller holds the migration lock, the table cannot belong to a concurrently running migration.
+    """
+
+    with engine.begin() as conn:
+        if db_version.get_timescale_version(conn) is None:
+            return  # Nothing to pause in a fresh database
+
+        if conn.execute(sqlalchemy.text("SELECT to_regclass('public.rdp_paused_jobs');")).scalar_one() is not None:
+            logger.warning("A previous migration has not resumed the background jobs, resume them first")
+            _resume_paused_jobs(conn)
+
+        conn.execute(sqlalchemy.text("""
+            CREATE TABLE rdp_paused_jobs (
+                job_id INTEGER NOT NULL,
+                proc_name TEXT NOT NULL,
+                hypertable_name TEXT,
+                paused_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (job_id)
+            );
+        """))
+        job_ids = list(conn.execute(sqlalchemy.text("""
+            INSERT INTO rdp_paused_jobs(job_id, proc_name, hypertable_name)
+                SELECT job.job_id, job.proc_name, job.hypertable_name
+                    FROM timescaledb_information.jobs AS job
+                    WHERE job.scheduled AND (
+                        job.hypertable_schema = 'public' OR
+                        (job.proc_schema = 'public' AND starts_with(job.proc_name, 'rdp_')) OR
+                        -- The refresh jobs refer to the materialized hypertables in the internal schema
+                        EXISTS (
+                            SELECT FROM timescaledb_information.continuous_aggregates AS cagg
+                                WHERE cagg.view_schema = 'public' AND
+                                    cagg.materialization_hypertable_schema = job.hypertable_schema AND
+                                    cagg.materialization_hypertable_name = job.hypertable_name
+                        )
+                    )
+                RETURNING job_id;
+        """)).scalars())
+        for job_id in sorted(job_ids):
+            conn.execute(sqlalchemy.text("SELECT alter_job(:job_id, scheduled => false);"),
+                         parameters=dict(job_id=job_id))
+
+    if len(job_ids) > 0:
+        logger.info(f"Paused the background jobs {sorted(job_ids)} during the migration")
+
+
+def _resume_background_jobs(engine: sqlalchemy.engine.Engine) -> None:
+    """Resumes the previously paused jobs, unless they have been removed by the migration"""
+
+    with engine.begin() as conn:
+        if conn.execute(sqlalchemy.text("SELECT to_regclass('public.rdp_paused_jobs');")).scalar_one() is None:
+            return
+        job_ids = _resume_paused_jobs(conn)
+
+    if len(job_ids) > 0:
+        logger.info(f"Resumed the background jobs {job_ids}")
+
+
+def _resume_paused_jobs(conn: sqlalchemy.Connection) -> list[int]:
+    """Resumes the jobs recorded in rdp_paused_jobs, drops the table and returns the IDs of the resumed jobs"""
+
+    # Policies that a revision has moved to a rebuilt hypertable are matched by their procedure and hypertable
+    job_ids = list(conn.execute(sqlalchemy.text("""
+        SELECT job.job_id
+            FROM timescaledb_information.jobs AS job
+            JOIN rdp_paused_jobs AS paused
+                ON (paused.job_id = job.job_id OR (
+                    NOT job.scheduled AND paused.proc_name = job.proc_name AND
+                    paused.hypertable_name = job.hypertable_name AND job.hypertable_schema = 'public'
+                ))
+            GROUP BY job.job_id
+            ORDER BY job.job_id;
+    """)).scalars())
+    for job_id in job_ids:
+        conn.execute(sqlalchemy.text("SELECT alter_job(:job_id, scheduled => true);"), parameters=dict(job_id=job_id))
+    conn.execute(sqlalchemy.text("DROP TABLE rdp_paused_jobs;"))
+    return job_ids
+
+
+def _is_lock_conflict(exc: BaseException) -> bool:
+    """Checks whether the exception has been caused by a lock timeout or a deadlock"""
+
+    return isinstance(exc, sqlalchemy.exc.DBAPIError) and \
+        getattr(exc.orig, "pgcode", None) in ("55P03", "40P01")  # lock_not_available, deadlock_detected
+
+
+def _allows_retries() -> bool:
+    """Relative targets (e.g., "-1") must not be retried, as they would be resolved again from the new head"""
+
+    revision = getattr(config.cmd_opts, "revision", None)
+    return revision is None or re.search(r"[+-]\d+$", str(revision)) is None
+
+
+def _version_locations() -> list[pathlib.Path]:
+    """Returns the directories of the revision files as configured in alembic.ini"""
+
+    locations = config.get_main_option("version_locations")
+    if locations is None:
+        return [pathlib.Path(context.script.dir) / "versions"]
+
+    separator = config.get_main_option("version_path_separator", "os")
+    separator = {"os": os.pathsep, "space": " ", "newline": "\n"}.get(separator, separator)
+    return [pathlib.Path(location.strip()) for location in locations.split(separator) if location.strip()]
+
+
+def _is_up_to_date() -> bool:
+    """
+    Checks via a single connection whether an upgrade to head has nothing to do
+
+    The check is restricted to "upgrade head" and may be disabled by setting RDP_FAST_START to "off". Neither the
+    database is created nor are the revisions loaded beforehand, and an unreachable database is left to the usual
+    path with its retries. Manual changes of the schema since the last migration are reported as warnings or, if
+    RDP_SCHEMA_DRIFT is set to "fail", abort the migration before any revision runs.
+    """
+
+    command = getattr(config.cmd_opts, "cmd", None)
+    revision = getattr(config.cmd_opts, "revision", None)
+    if os.environ.get("RDP_FAST_START", "on").lower() == "off" or command is None or \
+            command[0].__name__ != "upgrade" or revision not in ("head", "heads"):
+        return False
+
+    heads = schema_state.find_heads(_version_locations())
+    engine = sqlalchemy.create_engine(os.environ["RDP_POSTGRES_URL"], poolclass=sqlalchemy.pool.NullPool)
+    try:
+        with engine.connect() as conn:
+            up_to_date, drift = schema_state.check(conn, heads)
+    except sqlalchemy.exc.OperationalError:
+        logger.debug("The database is not available yet, the fast start is skipped")
+        return False
+    finally:
+        engine.dispose()
+
+    if len(drift) > 0:
+        message = "The schema has been changed since the last migration:\n  " + "\n  ".join(drift)
+        if os.environ.get("RDP_SCHEMA_DRIFT", "warn").lower() == "fail":
+            raise RuntimeError(message)
+        logger.warning(message)
+    if up_to_date:
+        logger.info(f"The database is already at {', '.join(sorted(heads))}, nothing to migrate")
+    return up_to_date
+
+
 def run_migrations_online():
     """Run migrations in 'online' mode.
 
     In this scenario we need to create an Engine
     and associate a connection with the context.
 
-    """
-    if "RDP_POSTGRES_URL" not in os.environ:
-        raise KeyError("Expect the RDP_POSTGRES_URL environment variable to be available")
+    The background jobs are paused during the migration to avoid lock conflicts. Each statement may wait for locks up
+    to RDP_MIGRATION_LOCK_TIMEOUT (default: 10s). In case of a lock timeout or a deadlock, only the failed revision is
+    retried with a backoff, since each revision runs in its own transaction. The dedicated transactions also allow
+    revisions to execute non-transactional steps, such as the index builds of rdp_db.utils.online_index, in an
+    autocommit_block().
 
-    auto_create_db()
-    connectable = _connect_to_db(os.environ["RDP_POSTGRES_URL"])
+    If the database is already at head and its schema matches the structure recorded after the last migration,
+    nothing is done at all (see rdp_db.utils.schema_state).
 
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection, target_metadata=target_metadata,
-            transaction_per_migration=True  # Avoid deadlocks, by the dedicated compression policy process
-        )
-        db_version.init_version(connection)
-
-        with context.begin_transaction():
-            context.run_migrations()
+    The cost of each revision is logged and recorded in rdp_migration_history. If RDP_MIGRATION_EXPLAIN_URL is set,
+    the migration is applied as a dry run to this copy of the database instead and the plans of the heavy statements
+    are recorded as well.
+    """
+    explain_url = os.environ.get("RDP_MIGRATION_EXPLAIN_URL")
+    if explain_url is not None:
+        logger.info("Dry run against the database copy given in RDP_MIGRATION_EXPLAIN_URL")
+        connectable = _connect_to_db(explain_url)
+    else:
+        if "RDP_POSTGRES_URL" not in os.environ:
+            raise KeyError("Expect the RDP_POSTGRES_URL environment variable to be available")
+        if _is_up_to_date():
+            return
+
+        auto_create_db()
+        connectable = _connect_to_db(os.environ["RDP_POSTGRES_URL"])
+
+    with _migration_lock(connectable):
+        _pause_background_jobs(connectable)
+        try:
+            with connectable.connect() as connection, migration_stats.MigrationRecorder(
+                connectable, connection, explain=explain_url is not None,
+                heavy_threshold=float(os.environ.get("RDP_MIGRATION_HEAVY_STATEMENT_SECONDS", "1.0"))
+            ) as recorder:
+                connection.execute(sqlalchemy.text("SELECT set_config('lock_timeout', :lock_timeout, false);"),
+                                   parameters=dict(lock_timeout=os.environ.get("RDP_MIGRATION_LOCK_TIMEOUT", "10s")))
+                # Keep the session setting but do not start the migration in an external transaction
+                connection.commit()
+
+                context.configure(
+                    connection=connection, target_metadata=target_metadata,
+                    transaction_per_migration=True,  # Only roll back the failed revision on lock conflicts
+                    on_version_apply=recorder.on_version_apply
+                )
+                db_version.init_version(connection)
+
+                retrying = tenacity.Retrying(
+                    wait=tenacity.wait_exponential(multiplier=2, min=1, max=30),
+                    stop=tenacity.stop_after_attempt(
+                        int(os.environ.get("RDP_MIGRATION_ATTEMPTS", "5")) if _allows_retries() else 1
+                    ),
+                    retry=tenacity.retry_if_exception(_is_lock_conflict),
+                    before_sleep=tenacity.before_sleep_log(logger, logging.WARNING),
+                    reraise=True
+                )
+                for attempt in retrying:
+                    with attempt:
+                        recorder.reset()
+                        # The revisions that already succeeded are committed. Hence, the migration continues at the
+                        # failed one.
+                        with context.begin_transaction():
+                            context.run_migrations()
+        finally:
+            _resume_background_jobs(connectable)
+
+    if explain_url is None:
+        with connectable.begin() as connection:
+            schema_state.record(connection)
 
 
 if context.is_offline_mode():
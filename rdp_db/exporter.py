@@ -0,0 +1,354 @@
+"""
+Exposes the monitoring views of the database as Prometheus metrics
+
+The exporter polls the database in a fixed interval via a single pooled connection and caches the rendered metrics, such
+that scraping never queries the database. It reports the ingestion counters per value type, the access statistics of
+each raw table, the compression backlog and the chunk states, the failures of the background jobs, the size of the
+data points catalog and the latency of the resolver functions. The statement based metrics require pg_stat_statements
+(see the monitoring views). Connect as a member of monitoring_base via RDP_POSTGRES_URL and run:
+
+    python -m rdp_db.exporter --port 9187 --interval 30
+
+The metrics are served at http://<host>:<port>/metrics in the Prometheus text format.
+"""
+
+import argparse
+import dataclasses
+import decimal
+import http.server
+import logging
+import os
+import threading
+import time
+
+import sqlalchemy as sql
+
+logger = logging.getLogger(__name__)
+
+content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@dataclasses.dataclass(frozen=True)
+class Metric:
+    """A metric family whose samples are taken from one column of a query result"""
+
+    name: str
+    kind: str  # "gauge" or "counter"
+    description: str
+    column: str
+
+
+@dataclasses.dataclass(frozen=True)
+class MetricQuery:
+    """A query whose rows provide the samples of several metrics, labeled by the given columns"""
+
+    statement: sql.TextClause
+    labels: tuple[str, ...]
+    metrics: tuple[Metric, ...]
+
+
+metric_queries = [
+    MetricQuery(
+        statement=sql.text("""
+            SELECT stats.data_type::TEXT AS data_type, stats.temporality::TEXT AS temporality, stats.total_rows,
+                    stats.rejected_rows, extract(EPOCH FROM stats.last_ingest_time) AS last_ingest
+                FROM rdp_monitoring_ingestion_stats AS stats;
+        """),
+        labels=("data_type", "temporality"),
+        metrics=(
+            Metric("rdp_ingested_rows_total", "counter", "Samples stored into the raw tables", "total_rows"),
+            Metric("rdp_rejected_rows_total", "counter", "Samples dropped by the deadband filter", "rejected_rows"),
+            Metric("rdp_last_ingest_timestamp_seconds", "gauge",
+                   "The start of the last transaction that stored a sample", "last_ingest"),
+        ),
+    ),
+    MetricQuery(
+        statement=sql.text("""
+            SELECT stats.hypertable_name AS hypertable, stats.seq_scan, stats.idx_scan, stats.n_live_tup,
+                    stats.n_dead_tup
+                FROM rdp_monitoring_table_stats AS stats;
+        """),
+        labels=("hypertable",),
+        metrics=(
+            Metric("rdp_raw_table_seq_scans", "gauge", "Sequential scans on the current chunks", "seq_scan"),
+            Metric("rdp_raw_table_index_scans", "gauge", "Index scans on the current chunks", "idx_scan"),
+            Metric("rdp_raw_table_live_rows", "gauge", "Estimated live rows in the raw table", "n_live_tup"),
+            Metric("rdp_raw_table_dead_rows", "gauge", "Estimated dead rows in the raw table", "n_dead_tup"),
+        ),
+    ),
+    MetricQuery(
+        statement=sql.text("""
+            SELECT health.hypertable_name AS hypertable, health.backlog_chunk_count, health.backlog_bytes,
+                    extract(EPOCH FROM now() - health.oldest_backlog_end) AS backlog_age,
+                    health.before_compression_bytes, health.after_compression_bytes, health.compression_ratio
+                FROM rdp_monitoring_hypertable_health AS health;
+        """),
+        labels=("hypertable",),
+        metrics=(
+            Metric("rdp_compression_backlog_chunks", "gauge",
+                   "Uncompressed chunks that are older than compress_after", "backlog_chunk_count"),
+            Metric("rdp_compression_backlog_bytes", "gauge",
+                   "Storage of the uncompressed chunks that are older than compress_after", "backlog_bytes"),
+            Metric("rdp_compression_backlog_age_seconds", "gauge",
+                   "Time since the end of the oldest chunk in the backlog", "backlog_age"),
+            Metric("rdp_compression_before_bytes", "gauge",
+                   "Storage of the compressed chunks before compression", "before_compression_bytes"),
+            Metric("rdp_compression_after_bytes", "gauge",
+                   "Storage of the compressed chunks after compression", "after_compression_bytes"),
+            Metric("rdp_compression_ratio", "gauge", "Storage before divided by after compression",
+                   "compression_ratio"),
+        ),
+    ),
+    MetricQuery(
+        statement=sql.text("""
+            SELECT health.hypertable_name AS hypertable, states.state, states.chunks
+                FROM rdp_monitoring_hypertable_health AS health
+                CROSS JOIN LATERAL (
+                    VALUES ('uncompressed', health.uncompressed_chunk_count),
+                        ('compressed', health.compressed_chunk_count),
+                        ('partially_compressed', health.partially_compressed_chunk_count),
+                        ('frozen', health.frozen_chunk_count)
+                ) AS states(state, chunks);
+        """),
+        labels=("hypertable", "state"),
+        metrics=(
+            Metric("rdp_raw_table_chunks", "gauge", "Chunks of the raw table by compression state", "chunks"),
+        ),
+    ),
+    MetricQuery(
+        statement=sql.text("""
+            SELECT jobs.job_id::TEXT AS job_id, jobs.proc_name AS proc,
+                    COALESCE(jobs.hypertable_name, '') AS hypertable, jobs.total_runs, jobs.total_failures,
+                    (jobs.last_run_status = 'Failed')::INTEGER AS last_run_failed,
+                    extract(EPOCH FROM jobs.last_successful_finish) AS last_success
+                FROM rdp_monitoring_job_stats AS jobs;
+        """),
+        labels=("job_id", "proc", "hypertable"),
+        metrics=(
+            Metric("rdp_job_runs_total", "counter", "Runs of the background job", "total_runs"),
+            Metric("rdp_job_failures_total", "counter", "Failed runs of the background job", "total_failures"),
+            Metric("rdp_job_last_run_failed", "gauge", "Whether the last run of the job failed", "last_run_failed"),
+            Metric("rdp_job_last_success_timestamp_seconds", "gauge",
+                   "The end of the last successful run of the job", "last_success"),
+        ),
+    ),
+    MetricQuery(
+        statement=sql.text("""
+            SELECT jobs.hypertable_name AS hypertable, jobs.is_late::INTEGER AS is_late
+                FROM rdp_monitoring_compression_jobs AS jobs;
+        """),
+        labels=("hypertable",),
+        metrics=(
+            Metric("rdp_compression_job_late", "gauge", "Whether the compression job of the raw table is late",
+                   "is_late"),
+        ),
+    ),
+    MetricQuery(
+        statement=sql.text("""
+            SELECT GREATEST(cls.reltuples, 0) AS row_estimate, pg_total_relation_size(cls.oid) AS total_bytes
+                FROM pg_class AS cls
+                WHERE cls.oid = 'public.data_points'::REGCLASS;
+        """),
+        labels=(),
+        metrics=(
+            Metric("rdp_data_points_estimated_rows", "gauge", "Estimated number of data points", "row_estimate"),
+            Metric("rdp_data_points_bytes", "gauge", "Storage of the data points including the indexes",
+                   "total_bytes"),
+        ),
+    ),
+    MetricQuery(
+        statement=sql.text("""
+            SELECT mig.name AS migration, mig.processed_rows, mig.progress, (mig.status = 'failed')::INTEGER AS failed
+                FROM rdp_data_migration_status AS mig
+                WHERE mig.status <> 'completed';
+        """),
+        labels=("migration",),
+        metrics=(
+            Metric("rdp_data_migration_rows_total", "counter", "Rows processed by the background data migration",
+                   "processed_rows"),
+            Metric("rdp_data_migration_progress_ratio", "gauge",
+                   "Progress of the background data migration, if the total number of rows is known", "progress"),
+            Metric("rdp_data_migration_failed", "gauge", "Whether the background data migration failed", "failed"),
+        ),
+    ),
+    MetricQuery(
+        statement=sql.text("""
+            SELECT stats.object_name AS function, stats.calls, stats.total_time_ms / 1000 AS total_seconds,
+                    stats.mean_time_ms / 1000 AS mean_seconds, stats.p95_time_ms / 1000 AS p95_seconds
+                FROM rdp_monitoring_object_stats AS stats
+                WHERE stats.object_type = 'resolver_function';
+        """),
+        labels=("function",),
+        metrics=(
+            Metric("rdp_resolver_calls_total", "counter", "Calls of the statements using the resolver", "calls"),
+            Metric("rdp_resolver_time_seconds_total", "counter", "Execution time of the statements using the resolver",
+                   "total_seconds"),
+            Metric("rdp_resolver_mean_seconds", "gauge", "Mean execution time of the statements using the resolver",
+                   "mean_seconds"),
+            Metric("rdp_resolver_p95_seconds", "gauge",
+                   "Estimated 95th percentile of the execution time of the statements using the resolver",
+                   "p95_seconds"),
+        ),
+    ),
+]
+
+
+class MetricsCollector:
+    """Polls the database in the background and keeps the rendered metrics of the last poll"""
+
+    def __init__(self, engine: sql.Engine, interval: float):
+        """
+        Initializes the collector without polling the database yet
+
+        :param engine: The engine to the database, preferably with a pool of a single connection
+        :param interval: The time between two polls in seconds
+        """
+
+        self.engine = engine
+        self.interval = interval
+        self._exposition = render_metrics([], up=False, duration=0.0)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    @property
+    def exposition(self) -> str:
+        """The rendered metrics of the last poll"""
+
+        with self._lock:
+            return self._exposition
+
+    def poll(self) -> None:
+        """Queries all metrics within a single transaction and replaces the cached exposition"""
+
+        started_at = time.monotonic()
+        try:
+            with self.engine.connect() as con:
+                results = [(query, con.execute(query.statement).all()) for query in metric_queries]
+            exposition = render_metrics(results, up=True, duration=time.monotonic() - started_at)
+        except sql.exc.SQLAlchemyError as e:
+            logger.warning(f"Cannot poll the metrics: {e}")
+            exposition = render_metrics([], up=False, duration=time.monotonic() - started_at)
+
+        with self._lock:
+            self._exposition = exposition
+
+    def run(self) -> None:
+        """Polls the database until stopped"""
+
+        while not self._stopped.is_set():
+            self.poll()
+            self._stopped.wait(self.interval)
+
+    def stop(self) -> None:
+        """Stops polling after the current poll"""
+
+        self._stopped.set()
+
+
+def render_metrics(results: list[tuple[MetricQuery, list[sql.Row]]], up: bool, duration: float) -> str:
+    """
+    Renders the query results in the Prometheus text format
+
+    :param results: The rows of each query
+    :param up: Whether the last poll succeeded
+    :param duration: The duration of the last poll in seconds
+    :return: The exposition including the state of the exporter
+    """
+
+    lines = [
+        "# HELP rdp_exporter_up Whether the last poll of the database succeeded",
+        "# TYPE rdp_exporter_up gauge",
+        f"rdp_exporter_up {int(up)}",
+        "# HELP rdp_exporter_poll_duration_seconds Duration of the last poll of the database",
+        "# TYPE rdp_exporter_poll_duration_seconds gauge",
+        f"rdp_exporter_poll_duration_seconds {_format_value(duration)}",
+    ]
+    for query, rows in results:
+        for metric in query.metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for row in rows:
+                value = getattr(row, metric.column)
+                if value is None:
+                    continue
+                labels = ",".join(f'{label}="{_escape_label(getattr(row, label))}"' for label in query.labels)
+                lines.append(f"{metric.name}{{{labels}}} {_format_value(value)}" if labels else
+                             f"{metric.name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _escape_label(value) -> str:
+    """Escapes the label value as required by the text format"""
+
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: int | float | decimal.Decimal) -> str:
+    """Formats the sample value, whereby integral values are rendered without a fraction"""
+
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def create_server(collector: MetricsCollector, address: str, port: int) -> http.server.ThreadingHTTPServer:
+    """
+    Creates the HTTP server that serves the cached metrics of the collector at /metrics
+
+    :param collector: The collector that provides the metrics
+    :param address: The address to bind to
+    :param port: The port to listen on or 0 to pick a free one
+    :return: The server, which is not started yet
+    """
+
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        """Serves the cached exposition"""
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+
+            body = collector.exposition.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} {format % args}")
+
+    return http.server.ThreadingHTTPServer((address, port), MetricsHandler)
+
+
+def main() -> None:
+    """Parses the arguments and serves the metrics of the database given by RDP_POSTGRES_URL"""
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--address", default="0.0.0.0", help="The address to bind to")
+    parser.add_argument("--port", type=int, default=9187, help="The port to listen on")
+    parser.add_argument("--interval", type=float, default=30.0, help="The time between two polls in seconds")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if "RDP_POSTGRES_URL" not in os.environ:
+        raise KeyError("Expect the RDP_POSTGRES_URL environment variable to be available")
+
+    engine = sql.create_engine(os.environ["RDP_POSTGRES_URL"], pool_size=1, max_overflow=0, pool_pre_ping=True)
+    collector = MetricsCollector(engine, args.interval)
+    threading.Thread(target=collector.run, name="rdp-exporter-poll", daemon=True).start()
+
+    server = create_server(collector, args.address, args.port)
+    logger.info(f"Serving the metrics at http://{args.address}:{server.server_port}/metrics")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        collector.stop()
+        server.server_close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
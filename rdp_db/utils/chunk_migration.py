@@ -0,0 +1,156 @@
+"""
+Implements utilities for migrations that decompress, compress or rewrite the chunks of hypertables
+
+Processing all chunks in a single statement holds the locks on the entire hypertable until the migration transaction
+ends and is likely to deadlock with feeders. Instead, the helpers process one chunk per committed transaction and record
+the processed chunks. In case the migration fails or is interrupted, a rerun skips the chunks already processed. Since
+the transactions are committed independently of the migration, the helpers must be executed in autocommit mode, e.g.:
+
+    with op.get_context().autocommit_block():
+        chunk_migration.decompress_chunks(op.get_bind(), "62ffa7f9c9a4_decompress_forecasts", "forecasts")
+"""
+
+import logging
+import time
+
+import sqlalchemy as sql
+
+logger = logging.getLogger(__name__)
+
+
+def decompress_chunks(connection: sql.Connection, task: str, hypertable: str) -> int:
+    """
+    Decompresses all compressed chunks of the hypertable chunk by chunk
+
+    :param connection: The connection to the active database in autocommit mode
+    :param task: The name under which the progress is recorded. It must be unique among the concurrent migrations.
+    :param hypertable: The name of the hypertable in the public schema
+    :return: The number of processed chunks
+    """
+
+    return process_chunks(
+        connection, task, hypertable,
+        "SELECT decompress_chunk(CAST(:chunk AS REGCLASS), if_compressed => true);",
+        only_compressed=True
+    )
+
+
+def compress_chunks(connection: sql.Connection, task: str, hypertable: str, older_than: str = None) -> int:
+    """
+    Compresses all uncompressed chunks of the hypertable chunk by chunk
+
+    :param connection: The connection to the active database in autocommit mode
+    :param task: The name under which the progress is recorded. It must be unique among the concurrent migrations.
+    :param hypertable: The name of the hypertable in the public schema
+    :param older_than: Optionally, only compress the chunks that end before now() - older_than (e.g., "2 days")
+    :return: The number of processed chunks
+    """
+
+    return process_chunks(
+        connection, task, hypertable,
+        "SELECT compress_chunk(CAST(:chunk AS REGCLASS), if_not_compressed => true);",
+        only_compressed=False, older_than=older_than
+    )
+
+
+def process_chunks(connection: sql.Connection, task: str, hypertable: str, chunk_statement: str,
+                   only_compressed: bool = None, older_than: str = None) -> int:
+    """
+    Executes the statement for each chunk of the hypertable in a dedicated, committed transaction
+
+    The statement may refer to the chunk via the :chunk (qualified chunk name), :range_start and :range_end parameters.
+    Data-rewriting revisions can use it to, e.g., update the samples of one time slice at a time. The chunks are
+    processed in the order of their time range. After the last chunk, the progress of the task is removed again.
+
+    :param connection: The connection to the active database in autocommit mode
+    :param task: The name under which the progress is recorded. It must be unique among the concurrent migrations.
+    :param hypertable: The name of the hypertable in the public schema
+    :param chunk_statement: The SQL statement that processes a single chunk
+    :param only_compressed: Only process compressed (True) or uncompressed (False) chunks. None processes all chunks.
+    :param older_than: Optionally, only process the chunks that end before now() - older_than (e.g., "2 days")
+    :return: The number of processed chunks
+    """
+
+    if connection.get_isolation_level() != "AUTOCOMMIT":
+        raise ValueError("The chunks must be processed in autocommit mode, e.g. within autocommit_block()")
+
+    _create_progress_table(connection)
+    chunks = connection.execute(sql.text("""
+        SELECT format('%I.%I', chunks.chunk_schema, chunks.chunk_name) AS chunk, chunks.range_start,
+                chunks.range_end, COALESCE(sizes.total_bytes, 0) AS total_bytes
+            FROM timescaledb_information.chunks AS chunks
+            LEFT JOIN chunks_detailed_size(CAST(:hypertable AS REGCLASS)) AS sizes
+                ON (sizes.chunk_schema = chunks.chunk_schema AND sizes.chunk_name = chunks.chunk_name)
+            WHERE chunks.hypertable_schema = 'public' AND chunks.hypertable_name = :hypertable AND
+                (CAST(:only_compressed AS BOOLEAN) IS NULL OR chunks.is_compressed = :only_compressed) AND
+                (CAST(:older_than AS INTERVAL) IS NULL OR chunks.range_end <= now() - CAST(:older_than AS INTERVAL)) AND
+                NOT EXISTS (
+                    SELECT FROM rdp_chunk_migration_progress AS progress
+                        WHERE progress.task = :task AND
+                            progress.chunk_name = format('%I.%I', chunks.chunk_schema, chunks.chunk_name)
+                )
+            ORDER BY chunks.range_start, chunks.chunk_name;
+    """), parameters=dict(
+        hypertable=hypertable, task=task, only_compressed=only_compressed, older_than=older_than
+    )).fetchall()
+
+    if len(chunks) > 0:
+        logger.info(f"{task}: Processing {len(chunks)} chunks of {hypertable}")
+
+    processed_bytes = 0
+    task_start = time.monotonic()
+    for chunk_index, chunk in enumerate(chunks):
+        chunk_start = time.monotonic()
+
+        # Commit the chunk and its progress record atomically, such that a rerun does not process it twice
+        connection.exec_driver_sql("BEGIN;")
+        try:
+            connection.execute(sql.text(chunk_statement), parameters=dict(
+                chunk=chunk.chunk, range_start=chunk.range_start, range_end=chunk.range_end
+            ))
+            connection.execute(sql.text("""
+                INSERT INTO rdp_chunk_migration_progress(task, chunk_name) VALUES (:task, :chunk);
+            """), parameters=dict(task=task, chunk=chunk.chunk))
+            connection.exec_driver_sql("COMMIT;")
+        except Exception:
+            connection.exec_driver_sql("ROLLBACK;")
+            raise
+
+        chunk_duration = time.monotonic() - chunk_start
+        processed_bytes += chunk.total_bytes
+        logger.info(
+            f"{task}: Processed chunk {chunk_index + 1}/{len(chunks)} ({chunk.chunk}) in {chunk_duration:.1f}s, "
+            f"{processed_bytes / 1e6 / max(time.monotonic() - task_start, 1e-3):.1f} MB/s on average"
+        )
+
+    _finish_task(connection, task)
+    return len(chunks)
+
+
+def _create_progress_table(connection: sql.Connection) -> None:
+    """Creates the table that keeps track of the processed chunks, if needed"""
+
+    connection.execute(sql.text("""
+        CREATE TABLE IF NOT EXISTS rdp_chunk_migration_progress (
+            task TEXT NOT NULL,
+            chunk_name TEXT NOT NULL,
+            processed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (task, chunk_name)
+        );
+    """))
+
+
+def _finish_task(connection: sql.Connection, task: str) -> None:
+    """Removes the progress of the completed task and the progress table itself, if no other task is pending"""
+
+    connection.execute(sql.text("DELETE FROM rdp_chunk_migration_progress WHERE task = :task;"),
+                       parameters=dict(task=task))
+    connection.execute(sql.text("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT FROM rdp_chunk_migration_progress) THEN
+                DROP TABLE rdp_chunk_migration_progress;
+            END IF;
+        END;
+        $$;
+    """))
@@ -0,0 +1,84 @@
+"""
+Implements the registration of data migrations that are processed in the background
+
+Rewriting large tables within a revision holds the locks until the migration transaction ends and delays the
+deployment for the duration of the rewrite. Instead, the revision only changes the schema and registers a task in the
+rdp_data_migrations table. The rdp_run_data_migrations job processes the registered tasks in bounded batches, each in
+its own transaction, and throttles them by the configured delay between the batches. The progress is reported by the
+rdp_data_migration_status view.
+
+The batch statement receives the resume key reached so far as $1 (NULL in the first batch) and the batch size as $2.
+It has to return a single row with the next resume key and the number of processed rows, whereby a NULL key marks the
+task as completed. Batches over the chunks of a hypertable may, e.g., use the end of the last processed chunk as key.
+For instance, a revision may register the following task:
+
+    data_migration.register(op.get_bind(), "e22033b26415_trim_units", '''
+        WITH batch AS (
+            SELECT id FROM data_points WHERE id > COALESCE(CAST($1 AS INTEGER), 0) ORDER BY id LIMIT $2
+        ), updated AS (
+            UPDATE data_points SET unit = trim(unit) WHERE id IN (SELECT id FROM batch)
+        )
+        SELECT max(id)::TEXT, count(*) FROM batch;
+    ''')
+
+Since the batches run concurrently to the feeders, the batch statements and the application must tolerate partially
+migrated data. Later revisions that rely on the migrated data can check the completion via require_completed().
+"""
+
+import sqlalchemy as sql
+
+
+def register(connection: sql.Connection, name: str, batch_statement: str, batch_size: int = 10000,
+             batch_delay: str = "100 milliseconds", total_rows: int = None, description: str = None) -> None:
+    """
+    Registers the data migration or restarts it with the given settings, if it has been registered before
+
+    :param connection: The connection to the active database, e.g., the migration connection
+    :param name: The unique name of the task, e.g., prefixed by the revision
+    :param batch_statement: The SQL statement that processes a single batch as described in the module
+    :param batch_size: The maximum number of rows per batch, which is passed to the statement
+    :param batch_delay: The pause after each batch to throttle the migration (e.g., "1 second")
+    :param total_rows: Optionally, the number of rows to process in order to estimate the progress
+    :param description: Optionally, a human-readable description of the task
+    """
+
+    connection.execute(sql.text("""
+        INSERT INTO rdp_data_migrations(name, description, batch_statement, batch_size, batch_delay, total_rows)
+            VALUES (:name, :description, :batch_statement, :batch_size, CAST(:batch_delay AS INTERVAL), :total_rows)
+            ON CONFLICT (name) DO UPDATE SET
+                description = EXCLUDED.description, batch_statement = EXCLUDED.batch_statement,
+                batch_size = EXCLUDED.batch_size, batch_delay = EXCLUDED.batch_delay,
+                total_rows = EXCLUDED.total_rows, status = 'pending', resume_key = NULL, processed_rows = 0,
+                batch_count = 0, error_count = 0, last_error = NULL, registered_at = now(), started_at = NULL,
+                last_batch_at = NULL, completed_at = NULL;
+    """), parameters=dict(
+        name=name, description=description, batch_statement=batch_statement, batch_size=batch_size,
+        batch_delay=batch_delay, total_rows=total_rows
+    ))
+
+
+def unregister(connection: sql.Connection, name: str) -> None:
+    """Removes the data migration, e.g., in the downgrade of the registering revision, regardless of its progress"""
+
+    connection.execute(sql.text("DELETE FROM rdp_data_migrations WHERE name = :name;"), parameters=dict(name=name))
+
+
+def require_completed(connection: sql.Connection, name: str) -> None:
+    """
+    Ensures that the data migration has been completed
+
+    :param connection: The connection to the active database
+    :param name: The name of the task
+    :raise RuntimeError: The task is unknown or not completed yet
+    """
+
+    status = connection.execute(sql.text("""
+        SELECT status, processed_rows, total_rows FROM rdp_data_migrations WHERE name = :name;
+    """), parameters=dict(name=name)).one_or_none()
+    if status is None:
+        raise RuntimeError(f"The data migration '{name}' is not registered")
+    if status.status != "completed":
+        raise RuntimeError(
+            f"The data migration '{name}' is {status.status} ({status.processed_rows} of "
+            f"{status.total_rows if status.total_rows is not None else 'unknown'} rows). Retry after its completion."
+        )
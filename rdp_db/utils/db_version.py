@@ -2,6 +2,8 @@
 Implements some utilities that manage the version of the target database
 """
 
+import re
+
 import sqlalchemy as sql
 
 _detected_version = None
@@ -32,4 +34,25 @@ def get_version_int() -> int:
     if _detected_version is None:
         raise ValueError("The version has not been properly initialized")
 
-    return _detected_version
\ No newline at end of file
+    return _detected_version
+
+
+def get_timescale_version(connection: sql.Connection) -> tuple[int, ...] | None:
+    """
+    Returns the version of the installed TimescaleDB extension, e.g. (2, 18, 0)
+
+    In contrast to the server version, the extension may be installed or updated by the migrations themselves. Hence,
+    the version is queried on each call.
+
+    :param connection: The connection to the active database
+    :return: The numeric version components or None, in case the extension is not installed
+    """
+
+    resp = connection.execute(sql.text("""
+        SELECT extversion AS version FROM pg_extension WHERE extname = 'timescaledb';
+    """))
+    result = resp.fetchone()
+    if result is None:
+        return None
+
+    return tuple(int(part) for part in re.findall(r"\d+", result.version)[:3])
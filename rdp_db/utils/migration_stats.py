@@ -0,0 +1,237 @@
+"""
+Implements the instrumentation that records the cost of each applied revision
+
+The recorder hooks into the SQLAlchemy events of the migration connection and into Alembic's on_version_apply callback.
+Per revision, it records the wall time, the number of executed statements, the affected rows and the time the
+migration backend waited on locks. The latter is sampled from pg_stat_activity via a dedicated connection. The results
+are logged and stored in the rdp_migration_history table within the transaction of the revision itself.
+
+Optionally, the heavy statements can be explained. Since each explainable statement is planned before its execution,
+this is intended for dry runs against a copy of the database (see RDP_MIGRATION_EXPLAIN_URL).
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+
+import sqlalchemy as sql
+
+logger = logging.getLogger(__name__)
+
+# Only single DML statements can be explained, DDL and DO blocks are recorded without a plan
+_explainable_pattern = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+
+
+class MigrationRecorder:
+    """Records the statistics of each revision applied via the given migration connection"""
+
+    def __init__(self, engine: sql.Engine, connection: sql.Connection, explain: bool = False,
+                 heavy_threshold: float = 1.0, max_heavy_statements: int = 5, lock_sample_interval: float = 0.1):
+        """
+        Initializes the recorder without attaching it to the connection yet
+
+        :param engine: The engine used to open the lock sampling connection
+        :param connection: The connection that executes the migration
+        :param explain: Plans each explainable statement beforehand and stores the plans of the heavy ones
+        :param heavy_threshold: The minimal execution time of a statement in seconds to be reported as heavy
+        :param max_heavy_statements: The maximum number of heavy statements reported per revision
+        :param lock_sample_interval: The interval in seconds in which the lock waits are sampled
+        """
+
+        self.engine = engine
+        self.connection = connection
+        self.explain = explain
+        self.heavy_threshold = heavy_threshold
+        self.max_heavy_statements = max_heavy_statements
+        self.lock_sample_interval = lock_sample_interval
+
+        self._lock = threading.Lock()
+        self._stop_sampling = threading.Event()
+        self._sampler = None
+        self._suspended = False
+        self.reset()
+
+    def __enter__(self) -> "MigrationRecorder":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """Creates the history table if needed, attaches the event listeners and starts sampling the lock waits"""
+
+        self.connection.execute(sql.text("""
+            CREATE TABLE IF NOT EXISTS rdp_migration_history (
+                id BIGSERIAL PRIMARY KEY,
+                revision TEXT NOT NULL,
+                direction TEXT NOT NULL CHECK (direction IN ('upgrade', 'downgrade')),
+                started_at TIMESTAMPTZ NOT NULL,
+                finished_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                wall_seconds DOUBLE PRECISION NOT NULL,
+                statement_count INTEGER NOT NULL,
+                affected_rows BIGINT NOT NULL,
+                lock_wait_seconds DOUBLE PRECISION NOT NULL,
+                heavy_statements JSONB NOT NULL DEFAULT '[]'
+            );
+            COMMENT ON TABLE rdp_migration_history IS
+                'The wall time, the number of statements, the affected rows, the lock waits and the heaviest statements
+                 of each applied revision';
+        """))
+        backend_pid = self.connection.execute(sql.text("SELECT pg_backend_pid();")).scalar_one()
+        self.connection.commit()
+
+        sql.event.listen(self.connection, "before_cursor_execute", self._before_cursor_execute)
+        sql.event.listen(self.connection, "after_cursor_execute", self._after_cursor_execute)
+
+        self._stop_sampling.clear()
+        self._sampler = threading.Thread(
+            target=self._sample_lock_waits, args=(backend_pid,), name="rdp-lock-sampler", daemon=True
+        )
+        self._sampler.start()
+
+    def stop(self) -> None:
+        """Detaches the event listeners and stops the lock sampling"""
+
+        if sql.event.contains(self.connection, "before_cursor_execute", self._before_cursor_execute):
+            sql.event.remove(self.connection, "before_cursor_execute", self._before_cursor_execute)
+            sql.event.remove(self.connection, "after_cursor_execute", self._after_cursor_execute)
+
+        self._stop_sampling.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+
+    def reset(self) -> None:
+        """Starts recording a new revision, e.g. on a retry of a failed revision"""
+
+        with self._lock:
+            self._started_at = time.time()
+            self._started_monotonic = time.monotonic()
+            self._statement_count = 0
+            self._affected_rows = 0
+            self._lock_wait = 0.0
+            self._heavy_statements = []
+
+    def on_version_apply(self, ctx, step, heads, run_args) -> None:
+        """Reports the statistics of the applied revision and starts recording the next one"""
+
+        with self._lock:
+            stats = dict(
+                revision=step.up_revision_id,
+                direction="upgrade" if step.is_upgrade else "downgrade",
+                started_at=self._started_at,
+                wall_seconds=time.monotonic() - self._started_monotonic,
+                statement_count=self._statement_count,
+                affected_rows=self._affected_rows,
+                lock_wait_seconds=self._lock_wait,
+                heavy_statements=sorted(self._heavy_statements, key=lambda s: s["seconds"], reverse=True),
+            )
+
+        logger.info(
+            f"{stats['direction'].capitalize()} of {stats['revision']} took {stats['wall_seconds']:.1f}s, executed "
+            f"{stats['statement_count']} statements affecting {stats['affected_rows']} rows and waited "
+            f"{stats['lock_wait_seconds']:.1f}s on locks"
+        )
+        for heavy in stats["heavy_statements"]:
+            logger.info(f"Heavy statement in {stats['revision']} took {heavy['seconds']:.1f}s: "
+                        f"{_abbreviate(heavy['statement'])}")
+
+        # Store the record in the transaction of the revision, such that rolled back attempts are not reported
+        self._suspended = True
+        try:
+            ctx.connection.execute(sql.text("""
+                INSERT INTO rdp_migration_history(revision, direction, started_at, wall_seconds, statement_count,
+                        affected_rows, lock_wait_seconds, heavy_statements)
+                    VALUES (:revision, :direction, to_timestamp(:started_at), :wall_seconds, :statement_count,
+                        :affected_rows, :lock_wait_seconds, CAST(:heavy_statements AS JSONB));
+            """), parameters=dict(stats, heavy_statements=json.dumps(stats["heavy_statements"])))
+        finally:
+            self._suspended = False
+
+        self.reset()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        """Optionally plans the statement and starts the timer"""
+
+        if self._suspended:
+            return
+
+        plan = None
+        if self.explain and not executemany and _is_explainable(statement):
+            plan = _explain(cursor, statement, parameters)
+        conn.info["rdp_statement_plan"] = plan
+        conn.info["rdp_statement_start"] = time.monotonic()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        """Accounts the executed statement"""
+
+        if self._suspended or "rdp_statement_start" not in conn.info:
+            return
+
+        duration = time.monotonic() - conn.info.pop("rdp_statement_start")
+        plan = conn.info.pop("rdp_statement_plan", None)
+        with self._lock:
+            self._statement_count += 1
+            self._affected_rows += max(cursor.rowcount, 0)
+            if duration >= self.heavy_threshold:
+                self._heavy_statements.append(dict(statement=statement.strip(), seconds=duration, plan=plan))
+                self._heavy_statements.sort(key=lambda s: s["seconds"], reverse=True)
+                del self._heavy_statements[self.max_heavy_statements:]
+
+    def _sample_lock_waits(self, backend_pid: int) -> None:
+        """Accumulates the time in which the migration backend waits on a lock until the sampling is stopped"""
+
+        try:
+            with self.engine.connect() as conn:
+                conn.execution_options(isolation_level="AUTOCOMMIT")
+                last_sample = time.monotonic()
+                while not self._stop_sampling.wait(self.lock_sample_interval):
+                    is_waiting = conn.execute(sql.text("""
+                        SELECT EXISTS (
+                            SELECT FROM pg_stat_activity AS activity
+                                WHERE activity.pid = :pid AND activity.wait_event_type = 'Lock'
+                        );
+                    """), parameters=dict(pid=backend_pid)).scalar_one()
+
+                    now = time.monotonic()
+                    if is_waiting:
+                        with self._lock:
+                            self._lock_wait += now - last_sample
+                    last_sample = now
+        except sql.exc.SQLAlchemyError:
+            logger.warning("Cannot sample the lock waits of the migration", exc_info=True)
+
+
+def _is_explainable(statement: str) -> bool:
+    """Checks whether the statement is a single DML statement"""
+
+    return _explainable_pattern.match(statement) is not None and ";" not in statement.strip().rstrip(";")
+
+
+def _explain(cursor, statement: str, parameters) -> list | None:
+    """Returns the JSON plan of the statement without executing it. The migration transaction is not affected."""
+
+    in_transaction = cursor.connection.info.transaction_status != 0  # Not idle
+    try:
+        if in_transaction:
+            cursor.execute("SAVEPOINT rdp_explain;")
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {statement.strip().rstrip(';')}", parameters)
+        plan = cursor.fetchone()[0]
+        if in_transaction:
+            cursor.execute("RELEASE SAVEPOINT rdp_explain;")
+        return plan
+    except Exception as e:
+        logger.debug(f"Cannot explain the statement: {e}")
+        if in_transaction:
+            cursor.execute("ROLLBACK TO SAVEPOINT rdp_explain;")
+        return None
+
+
+def _abbreviate(statement: str, max_length: int = 200) -> str:
+    """Returns the statement as single line of limited length for logging"""
+
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= max_length else statement[:max_length - 3] + "..."
@@ -0,0 +1,126 @@
+"""
+Implements utilities for revisions that create or drop indexes without blocking the writers
+
+Within the migration transaction, CREATE INDEX blocks all writes to the table until the transaction ends. Instead, the
+helpers build the indexes on plain tables via CREATE INDEX CONCURRENTLY and on hypertables via TimescaleDB's
+transaction_per_chunk option, which only locks one chunk at a time. Both variants cannot be executed within a
+transaction block. Hence, the helpers must be executed in autocommit mode, e.g.:
+
+    with op.get_context().autocommit_block():
+        online_index.create_index(op.get_bind(), "data_points_unit_idx", "data_points", "unit")
+
+A failed build leaves an invalid index behind, which is still maintained on each write but never used by queries. The
+helpers drop such an index after a failure and before a rerun. Since the statements of a revision preceding the
+autocommit block are already committed, a rerun repeats them and the revision needs to be idempotent.
+"""
+
+import logging
+import re
+import time
+
+import sqlalchemy as sql
+
+logger = logging.getLogger(__name__)
+
+_identifier_pattern = re.compile(r"^[a-z_][a-z0-9_]*$")
+
+
+def create_index(connection: sql.Connection, index_name: str, table_name: str, columns: str, unique: bool = False,
+                 where: str = None) -> None:
+    """
+    Creates the index without blocking the writers, unless it already exists
+
+    :param connection: The connection to the active database in autocommit mode
+    :param index_name: The name of the index in the public schema
+    :param table_name: The name of the plain table or the hypertable in the public schema
+    :param columns: The column list of the index, e.g. "dp_id, valid_time DESC"
+    :param unique: Creates a unique index
+    :param where: Optionally, the predicate of a partial index
+    """
+
+    _check_preconditions(connection, index_name, table_name)
+    if _drop_invalid_index(connection, index_name, table_name):
+        logger.warning(f"Dropped the invalid index {index_name} of a previous run")
+
+    is_hypertable = _is_hypertable(connection, table_name)
+    statement = " ".join(filter(None, [
+        "CREATE UNIQUE INDEX" if unique else "CREATE INDEX",
+        None if is_hypertable else "CONCURRENTLY",
+        f"IF NOT EXISTS {index_name} ON {table_name} ({columns})",
+        "WITH (timescaledb.transaction_per_chunk)" if is_hypertable else None,
+        f"WHERE {where}" if where is not None else None,
+    ]))
+
+    started_at = time.monotonic()
+    try:
+        # Pass the statement as is, such that neither colons nor percent signs are interpreted as parameters
+        connection.exec_driver_sql(statement, execution_options=dict(no_parameters=True))
+    except Exception:
+        if _drop_invalid_index(connection, index_name, table_name):
+            logger.warning(f"Dropped the invalid index {index_name} after the failed build")
+        raise
+    logger.info(f"Created the index {index_name} on {table_name} in {time.monotonic() - started_at:.1f}s")
+
+
+def drop_index(connection: sql.Connection, index_name: str, table_name: str) -> None:
+    """
+    Drops the index without blocking the readers and writers of plain tables, if it exists
+
+    On hypertables, the index is dropped from all chunks in a single transaction, which does not need to rebuild
+    anything and is typically short.
+
+    :param connection: The connection to the active database in autocommit mode
+    :param index_name: The name of the index in the public schema
+    :param table_name: The name of the indexed plain table or hypertable in the public schema
+    """
+
+    _check_preconditions(connection, index_name, table_name)
+    _drop(connection, index_name, table_name)
+
+
+def _check_preconditions(connection: sql.Connection, index_name: str, table_name: str) -> None:
+    """Ensures that the statements can be executed outside a transaction and that the names are safe to embed"""
+
+    if connection.get_isolation_level() != "AUTOCOMMIT":
+        raise ValueError("The index must be built in autocommit mode, e.g. within autocommit_block()")
+
+    for name in (index_name, table_name):
+        if not _identifier_pattern.match(name):
+            raise ValueError(f"The name '{name}' is invalid. Only [a-z_][a-z0-9_]* is allowed")
+
+
+def _is_hypertable(connection: sql.Connection, table_name: str) -> bool:
+    """Checks whether the table in the public schema is a hypertable"""
+
+    return connection.execute(sql.text("""
+        SELECT EXISTS (
+            SELECT FROM timescaledb_information.hypertables AS ht
+                WHERE ht.hypertable_schema = 'public' AND ht.hypertable_name = :table_name
+        );
+    """), parameters=dict(table_name=table_name)).scalar_one()
+
+
+def _drop_invalid_index(connection: sql.Connection, index_name: str, table_name: str) -> bool:
+    """Drops the index, if it exists but is invalid, and returns whether it has been dropped"""
+
+    is_invalid = connection.execute(sql.text("""
+        SELECT EXISTS (
+            SELECT FROM pg_index AS idx
+                JOIN pg_class AS cls ON (cls.oid = idx.indexrelid)
+                JOIN pg_namespace AS ns ON (ns.oid = cls.relnamespace)
+                WHERE ns.nspname = 'public' AND cls.relname = :index_name AND NOT idx.indisvalid
+        );
+    """), parameters=dict(index_name=index_name)).scalar_one()
+
+    if is_invalid:
+        _drop(connection, index_name, table_name)
+    return is_invalid
+
+
+def _drop(connection: sql.Connection, index_name: str, table_name: str) -> None:
+    """Drops the index concurrently, unless the table is a hypertable, which does not support it"""
+
+    if _is_hypertable(connection, table_name):
+        connection.execute(sql.text(f"DROP INDEX IF EXISTS public.{index_name};"))
+    else:
+        connection.execute(sql.text(f"DROP INDEX CONCURRENTLY IF EXISTS public.{index_name};"))
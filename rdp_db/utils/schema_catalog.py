@@ -0,0 +1,478 @@
+"""
+Implements utilities that capture the schema of the target database from its catalogs
+
+The snapshot covers all objects that the revisions create in the public schema including the TimescaleDB configuration
+(dimensions, compression settings and jobs), the roles referenced by the objects and the content of the plain tables.
+Two snapshots, e.g., the one recorded after the last migration and the current one, can be compared to detect
+changes of the schema. Objects of extensions and the bookkeeping tables of
+the migration environment are not included.
+"""
+
+import json
+
+import sqlalchemy as sql
+
+# The tables that are maintained by the migration environment rather than by the revisions
+ignored_tables = [
+    "alembic_version", "rdp_migration_history", "rdp_chunk_migration_progress", "rdp_schema_state", "rdp_paused_jobs",
+]
+
+# Selects the relations of the public schema that are neither part of an extension nor of the ignored tables. The
+# relations of the migration environment are identified by the tables, their indexes and their owned sequences.
+user_relations_cte = """
+    ignored_relations AS (
+        SELECT cls.oid
+            FROM pg_class AS cls
+            WHERE cls.relnamespace = 'public'::regnamespace AND cls.relname = ANY(CAST(:ignored_tables AS TEXT[]))
+        UNION
+        SELECT idx.indexrelid
+            FROM pg_index AS idx
+            JOIN pg_class AS cls ON (cls.oid = idx.indrelid)
+            WHERE cls.relnamespace = 'public'::regnamespace AND cls.relname = ANY(CAST(:ignored_tables AS TEXT[]))
+        UNION
+        SELECT dep.objid
+            FROM pg_depend AS dep
+            JOIN pg_class AS cls ON (cls.oid = dep.refobjid)
+            WHERE dep.classid = 'pg_class'::regclass AND dep.refclassid = 'pg_class'::regclass AND
+                dep.deptype = 'a' AND cls.relnamespace = 'public'::regnamespace AND
+                cls.relname = ANY(CAST(:ignored_tables AS TEXT[]))
+    ), user_relations AS (
+        SELECT cls.oid, cls.relname, cls.relkind, cls.relpersistence, cls.relowner, cls.relacl, cls.reloptions,
+                cls.relrowsecurity, cls.relforcerowsecurity,
+                EXISTS (
+                    SELECT FROM timescaledb_information.hypertables AS ht
+                        WHERE ht.hypertable_schema = 'public' AND ht.hypertable_name = cls.relname
+                ) AS is_hypertable
+            FROM pg_class AS cls
+            WHERE cls.relnamespace = 'public'::regnamespace AND cls.relkind IN ('r', 'p', 'v', 'm', 'S', 'i') AND
+                NOT cls.relispartition AND
+                cls.oid NOT IN (SELECT ignored.oid FROM ignored_relations AS ignored) AND
+                NOT EXISTS (
+                    SELECT FROM pg_depend AS dep
+                        WHERE dep.classid = 'pg_class'::regclass AND dep.objid = cls.oid AND dep.deptype = 'e'
+                )
+    )
+"""
+
+
+def get_relations(connection: sql.Connection, kinds: str) -> list[sql.Row]:
+    """
+    Returns the relations of the public schema, which are created by the revisions
+
+    :param connection: The connection to the active database
+    :param kinds: The requested relation kinds as in pg_class.relkind, e.g., "rv" for tables and views
+    :return: The rows with the oid, name, kind, persistence, owner, acl, options, row_security, force_row_security
+        and is_hypertable columns ordered by the name
+    """
+
+    return connection.execute(sql.text(f"""
+        WITH {user_relations_cte}
+        SELECT rel.oid, rel.relname AS name, rel.relkind AS kind, rel.relpersistence AS persistence,
+                pg_get_userbyid(rel.relowner) AS owner, rel.relacl AS acl, rel.reloptions AS options,
+                rel.relrowsecurity AS row_security, rel.relforcerowsecurity AS force_row_security, rel.is_hypertable
+            FROM user_relations AS rel
+            WHERE rel.relkind = ANY(CAST(:kinds AS "char"[]))
+            ORDER BY rel.relname;
+    """), parameters=dict(ignored_tables=ignored_tables, kinds=list(kinds))).fetchall()
+
+
+def get_functions(connection: sql.Connection) -> list[sql.Row]:
+    """
+    Returns the functions and procedures of the public schema, which are created by the revisions
+
+    :param connection: The connection to the active database
+    :return: The rows with the oid, identity, kind, owner and definition columns ordered by the identity. The
+        definition of aggregates is None.
+    """
+
+    return connection.execute(sql.text("""
+        SELECT proc.oid, proc.oid::regprocedure::TEXT AS identity, proc.prokind AS kind,
+                pg_get_userbyid(proc.proowner) AS owner,
+                CASE WHEN proc.prokind <> 'a' THEN pg_get_functiondef(proc.oid) END AS definition
+            FROM pg_proc AS proc
+            WHERE proc.pronamespace = 'public'::regnamespace AND
+                NOT EXISTS (
+                    SELECT FROM pg_depend AS dep
+                        WHERE dep.classid = 'pg_proc'::regclass AND dep.objid = proc.oid AND dep.deptype = 'e'
+                )
+            ORDER BY 2;
+    """)).fetchall()
+
+
+def get_referenced_roles(connection: sql.Connection) -> list[str]:
+    """
+    Returns the roles that own, are granted privileges on or are subject to policies of the user objects including
+    all roles that are transitively connected to them via memberships. Superusers and predefined roles are excluded.
+
+    :param connection: The connection to the active database
+    :return: The role names in the order of their dependencies, i.e., the roles before their members
+    """
+
+    return list(connection.execute(sql.text(f"""
+        WITH RECURSIVE {user_relations_cte}, direct_roles AS (
+            SELECT rel.relowner AS role_id FROM user_relations AS rel
+            UNION
+            SELECT acl.grantee FROM user_relations AS rel CROSS JOIN LATERAL aclexplode(rel.relacl) AS acl
+            UNION
+            SELECT acl.grantee
+                FROM pg_attribute AS att
+                JOIN user_relations AS rel ON (rel.oid = att.attrelid)
+                CROSS JOIN LATERAL aclexplode(att.attacl) AS acl
+            UNION
+            SELECT proc.proowner FROM pg_proc AS proc WHERE proc.pronamespace = 'public'::regnamespace
+            UNION
+            SELECT acl.grantee
+                FROM pg_proc AS proc
+                CROSS JOIN LATERAL aclexplode(proc.proacl) AS acl
+                WHERE proc.pronamespace = 'public'::regnamespace
+            UNION
+            SELECT unnest(pol.polroles) FROM pg_policy AS pol JOIN user_relations AS rel ON (rel.oid = pol.polrelid)
+        ), connected_roles AS (
+            SELECT direct_roles.role_id FROM direct_roles
+            UNION
+            SELECT CASE WHEN mem.roleid = connected.role_id THEN mem.member ELSE mem.roleid END
+                FROM connected_roles AS connected
+                JOIN pg_roles AS rol ON (rol.oid = connected.role_id)
+                JOIN pg_auth_members AS mem ON (connected.role_id IN (mem.roleid, mem.member))
+                WHERE NOT rol.rolsuper AND NOT starts_with(rol.rolname, 'pg_')  -- Do not follow unrelated members
+        ), relevant_roles AS (
+            SELECT rol.oid, rol.rolname
+                FROM pg_roles AS rol
+                WHERE rol.oid IN (SELECT connected.role_id FROM connected_roles AS connected) AND
+                    NOT rol.rolsuper AND NOT starts_with(rol.rolname, 'pg_')
+        ), role_depths AS (
+            SELECT rol.oid, 0 AS depth FROM relevant_roles AS rol
+            UNION ALL
+            SELECT mem.member, depths.depth + 1
+                FROM role_depths AS depths
+                JOIN pg_auth_members AS mem ON (mem.roleid = depths.oid)
+                WHERE mem.member IN (SELECT rol.oid FROM relevant_roles AS rol)
+        )
+        SELECT rol.rolname
+            FROM relevant_roles AS rol
+            JOIN role_depths AS depths ON (depths.oid = rol.oid)
+            GROUP BY rol.rolname
+            ORDER BY max(depths.depth), rol.rolname;
+    """), parameters=dict(ignored_tables=ignored_tables)).scalars())
+
+
+def get_memberships(connection: sql.Connection, roles: list[str]) -> list[sql.Row]:
+    """
+    Returns the memberships among the given roles
+
+    :param connection: The connection to the active database
+    :param roles: The names of the considered roles
+    :return: The rows with the role_name, member_name, admin_option and inherit_option columns. The inherit option is
+        None before PostgreSQL 16, which does not support the option per membership.
+    """
+
+    has_inherit_option = connection.execute(sql.text("""
+        SELECT EXISTS (
+            SELECT FROM pg_attribute
+                WHERE attrelid = 'pg_auth_members'::regclass AND attname = 'inherit_option' AND NOT attisdropped
+        );
+    """)).scalar_one()
+
+    inherit_option = "mem.inherit_option" if has_inherit_option else "CAST(NULL AS BOOLEAN)"
+    return connection.execute(sql.text(f"""
+        SELECT pg_get_userbyid(mem.roleid) AS role_name, pg_get_userbyid(mem.member) AS member_name,
+                mem.admin_option, {inherit_option} AS inherit_option
+            FROM pg_auth_members AS mem
+            WHERE pg_get_userbyid(mem.roleid) = ANY(CAST(:roles AS TEXT[])) AND
+                pg_get_userbyid(mem.member) = ANY(CAST(:roles AS TEXT[]))
+            ORDER BY 1, 2;
+    """), parameters=dict(roles=roles)).fetchall()
+
+
+def snapshot(connection: sql.Connection, include_state: bool = True) -> dict[str, dict[str, str]]:
+    """
+    Captures the schema of the database from its catalogs
+
+    :param connection: The connection to the active database
+    :param include_state: Also captures the state that changes during the operation, i.e., the content of the plain
+        tables, the last values of the sequences and whether the jobs are scheduled
+    :return: The normalized definitions by the category (e.g., "views") and the name of each object
+    """
+
+    roles = get_referenced_roles(connection)
+    relations = get_relations(connection, "rpvmSi")
+    functions = get_functions(connection)
+
+    catalog = {
+        "extensions": _query_dict(connection, "SELECT extname, extversion FROM pg_extension;"),
+        "roles": _query_dict(connection, """
+            SELECT rol.rolname, concat_ws(' ',
+                    CASE WHEN rol.rolinherit THEN 'INHERIT' ELSE 'NOINHERIT' END,
+                    CASE WHEN rol.rolcanlogin THEN 'LOGIN' ELSE 'NOLOGIN' END,
+                    CASE WHEN rol.rolcreaterole THEN 'CREATEROLE' END,
+                    CASE WHEN rol.rolcreatedb THEN 'CREATEDB' END,
+                    CASE WHEN rol.rolreplication THEN 'REPLICATION' END,
+                    CASE WHEN rol.rolbypassrls THEN 'BYPASSRLS' END,
+                    shobj_description(rol.oid, 'pg_authid'))
+                FROM pg_roles AS rol
+                WHERE rol.rolname = ANY(CAST(:roles AS TEXT[]));
+        """, roles=roles),
+        "memberships": {
+            f"{row.member_name} in {row.role_name}": f"admin={row.admin_option} inherit={row.inherit_option}"
+            for row in get_memberships(connection, roles)
+        },
+        "types": _query_dict(connection, """
+            SELECT typ.typname, string_agg(enum.enumlabel, ', ' ORDER BY enum.enumsortorder)
+                FROM pg_type AS typ
+                JOIN pg_enum AS enum ON (enum.enumtypid = typ.oid)
+                WHERE typ.typnamespace = 'public'::regnamespace
+                GROUP BY typ.typname;
+        """),
+        "sequences": _query_dict(connection, """
+            SELECT seq.sequencename, concat_ws(' ', seq.data_type, seq.start_value, seq.min_value, seq.max_value,
+                    seq.increment_by, seq.cycle, seq.cache_size, CASE WHEN :include_state THEN seq.last_value END)
+                FROM pg_sequences AS seq
+                WHERE seq.schemaname = 'public' AND seq.sequencename = ANY(CAST(:names AS TEXT[]));
+        """, names=[rel.name for rel in relations if rel.kind == "S"], include_state=include_state),
+        "relations": {
+            rel.name: f"kind={rel.kind} persistence={rel.persistence} owner={rel.owner} options={rel.options} "
+                      f"row_security={rel.row_security} force_row_security={rel.force_row_security} "
+                      f"hypertable={rel.is_hypertable}"
+            for rel in relations
+        },
+        "columns": _query_dict(connection, """
+            SELECT format('%s.%s', att.attrelid::regclass, att.attname), concat_ws(' ',
+                    rank() OVER (PARTITION BY att.attrelid ORDER BY att.attnum),
+                    format_type(att.atttypid, att.atttypmod),
+                    CASE WHEN att.attnotnull THEN 'NOT NULL' END,
+                    'DEFAULT ' || pg_get_expr(def.adbin, def.adrelid))
+                FROM pg_attribute AS att
+                LEFT JOIN pg_attrdef AS def ON (def.adrelid = att.attrelid AND def.adnum = att.attnum)
+                WHERE att.attrelid = ANY(CAST(:oids AS OID[])) AND att.attnum > 0 AND NOT att.attisdropped;
+        """, oids=[rel.oid for rel in relations if rel.kind in "rpvm"]),
+        "constraints": _query_dict(connection, """
+            SELECT format('%s on %s', con.conname, con.conrelid::regclass), pg_get_constraintdef(con.oid)
+                FROM pg_constraint AS con
+                WHERE con.conrelid = ANY(CAST(:oids AS OID[]));
+        """, oids=[rel.oid for rel in relations if rel.kind in "rp"]),
+        "indexes": _query_dict(connection, """
+            SELECT idx.indexrelid::regclass::TEXT, pg_get_indexdef(idx.indexrelid) || ' valid=' || idx.indisvalid
+                FROM pg_index AS idx
+                WHERE idx.indexrelid = ANY(CAST(:oids AS OID[]));
+        """, oids=[rel.oid for rel in relations if rel.kind == "i"]),
+        "views": _query_dict(connection, """
+            SELECT cls.relname, pg_get_viewdef(cls.oid) FROM pg_class AS cls WHERE cls.oid = ANY(CAST(:oids AS OID[]));
+        """, oids=[rel.oid for rel in relations if rel.kind in "vm"]),
+        "functions": {f.identity: f"kind={f.kind} owner={f.owner}\n{f.definition}" for f in functions},
+        "triggers": _query_dict(connection, """
+            SELECT format('%s on %s', trg.tgname, trg.tgrelid::regclass),
+                    pg_get_triggerdef(trg.oid) || ' enabled=' || trg.tgenabled
+                FROM pg_trigger AS trg
+                WHERE trg.tgrelid = ANY(CAST(:oids AS OID[])) AND NOT trg.tgisinternal;
+        """, oids=[rel.oid for rel in relations if rel.kind in "rpv"]),
+        "policies": _query_dict(connection, """
+            SELECT format('%s on %s', pol.policyname, pol.tablename),
+                    concat_ws(' ', pol.permissive, pol.cmd, pol.roles::TEXT, pol.qual, pol.with_check)
+                FROM pg_policies AS pol
+                WHERE pol.schemaname = 'public';
+        """),
+        "privileges": _query_dict(connection, f"""
+            WITH {user_relations_cte}, privileges AS (
+                SELECT format('%s %s', CASE WHEN rel.relkind = 'S' THEN 'SEQUENCE' ELSE 'TABLE' END, rel.relname)
+                        AS object_name, acl.*
+                    FROM user_relations AS rel
+                    CROSS JOIN LATERAL aclexplode(COALESCE(
+                        rel.relacl, acldefault(CASE WHEN rel.relkind = 'S' THEN 's' ELSE 'r' END::"char", rel.relowner)
+                    )) AS acl
+                    WHERE rel.relkind <> 'i'
+                UNION ALL
+                SELECT format('COLUMN %s.%s', rel.relname, att.attname), acl.*
+                    FROM user_relations AS rel
+                    JOIN pg_attribute AS att ON (att.attrelid = rel.oid)
+                    CROSS JOIN LATERAL aclexplode(att.attacl) AS acl
+                UNION ALL
+                SELECT format('FUNCTION %s', proc.oid::regprocedure), acl.*
+                    FROM pg_proc AS proc
+                    CROSS JOIN LATERAL aclexplode(COALESCE(proc.proacl, acldefault('f', proc.proowner))) AS acl
+                    WHERE proc.oid = ANY(CAST(:function_oids AS OID[]))
+            )
+            SELECT entries.object_name, string_agg(entries.entry, ', ' ORDER BY entries.entry)
+                FROM (
+                    SELECT privileges.object_name, concat_ws(' ',
+                            CASE WHEN privileges.grantee = 0 THEN 'PUBLIC' ELSE pg_get_userbyid(privileges.grantee) END,
+                            privileges.privilege_type,
+                            CASE WHEN privileges.is_grantable THEN 'WITH GRANT OPTION' END) AS entry
+                        FROM privileges
+                ) AS entries
+                GROUP BY entries.object_name;
+        """, ignored_tables=ignored_tables, function_oids=[f.oid for f in functions]),
+        "comments": {
+            f"{row.type} {row.identity}": row.description for row in get_comments(connection, relations, functions)
+        },
+        "hypertables": _query_dict(connection, """
+            SELECT dim.hypertable_name, string_agg(concat_ws(' ', dim.column_name, dim.dimension_type,
+                    dim.time_interval, dim.integer_interval, dim.num_partitions), ', ' ORDER BY dim.dimension_number)
+                FROM timescaledb_information.dimensions AS dim
+                WHERE dim.hypertable_schema = 'public'
+                GROUP BY dim.hypertable_name;
+        """),
+        "compression": {
+            row.hypertable_name: f"segmentby={row.segmentby} orderby={row.orderby}"
+            for row in get_compression_settings(connection)
+        },
+        "chunk_skipping": {
+            f"{row.hypertable_name}.{row.column_name}": "enabled" for row in get_chunk_skipping(connection)
+        },
+        "jobs": _query_dict(connection, """
+            SELECT concat_ws(' on ', job.proc_name, job.hypertable_name), concat_ws(' ',
+                    job.schedule_interval, job.max_runtime, job.max_retries, job.retry_period,
+                    CASE WHEN :include_state THEN job.scheduled END, job.fixed_schedule, job.config - 'hypertable_id')
+                FROM timescaledb_information.jobs AS job
+                WHERE job.job_id >= 1000;
+        """, include_state=include_state),
+        "settings": _query_dict(connection, """
+            SELECT setting.config, 'set'
+                FROM pg_db_role_setting AS db_setting
+                JOIN pg_database AS db ON (db.oid = db_setting.setdatabase)
+                CROSS JOIN LATERAL unnest(db_setting.setconfig) AS setting(config)
+                WHERE db.datname = current_database() AND db_setting.setrole = 0;
+        """),
+    }
+
+    if not include_state:
+        return catalog
+
+    catalog["data"] = {}
+    for rel in relations:
+        if rel.kind == "r" and not rel.is_hypertable:
+            catalog["data"][rel.name] = connection.execute(sql.text(f"""
+                SELECT format('%s rows, md5 %s', count(*), md5(COALESCE(string_agg(t::TEXT, E'\\n' ORDER BY t::TEXT),
+                        '')))
+                    FROM public.{_quote_ident(rel.name)} AS t;
+            """)).scalar_one()
+
+    return catalog
+
+
+def get_comments(connection: sql.Connection, relations: list[sql.Row], functions: list[sql.Row]) -> list[sql.Row]:
+    """
+    Returns the comments on the user objects of the public schema
+
+    :param connection: The connection to the active database
+    :param relations: The user relations as returned by get_relations()
+    :param functions: The user functions as returned by get_functions()
+    :return: The rows with the type, identity and description columns, whereby the type and the identity are given as
+        by pg_identify_object()
+    """
+
+    return connection.execute(sql.text("""
+        SELECT obj.type, obj.identity, descr.description
+            FROM pg_description AS descr
+            CROSS JOIN LATERAL pg_identify_object(descr.classoid, descr.objoid, descr.objsubid) AS obj
+            WHERE (descr.classoid = 'pg_class'::regclass AND descr.objoid = ANY(CAST(:relation_oids AS OID[]))) OR
+                (descr.classoid = 'pg_proc'::regclass AND descr.objoid = ANY(CAST(:function_oids AS OID[]))) OR
+                (descr.classoid = 'pg_type'::regclass AND descr.objoid IN (
+                    SELECT enum.enumtypid
+                        FROM pg_enum AS enum
+                        JOIN pg_type AS typ ON (typ.oid = enum.enumtypid)
+                        WHERE typ.typnamespace = 'public'::regnamespace
+                )) OR
+                (descr.classoid = 'pg_constraint'::regclass AND descr.objoid IN (
+                    SELECT con.oid FROM pg_constraint AS con WHERE con.conrelid = ANY(CAST(:relation_oids AS OID[]))
+                )) OR
+                (descr.classoid = 'pg_trigger'::regclass AND descr.objoid IN (
+                    SELECT trg.oid FROM pg_trigger AS trg WHERE trg.tgrelid = ANY(CAST(:relation_oids AS OID[]))
+                )) OR
+                (descr.classoid = 'pg_policy'::regclass AND descr.objoid IN (
+                    SELECT pol.oid FROM pg_policy AS pol WHERE pol.polrelid = ANY(CAST(:relation_oids AS OID[]))
+                ))
+            ORDER BY 1, 2;
+    """), parameters=dict(
+        relation_oids=[rel.oid for rel in relations], function_oids=[f.oid for f in functions]
+    )).fetchall()
+
+
+def get_compression_settings(connection: sql.Connection) -> list[sql.Row]:
+    """
+    Returns the compression settings of the hypertables in the public schema
+
+    :param connection: The connection to the active database
+    :return: The rows with the hypertable_name, segmentby and orderby columns. The latter are formatted as in the
+        timescaledb.compress_segmentby and timescaledb.compress_orderby storage parameters.
+    """
+
+    return connection.execute(sql.text("""
+        SELECT ht.hypertable_name,
+                string_agg(format('%I', cs.attname), ', ' ORDER BY cs.segmentby_column_index)
+                    FILTER (WHERE cs.segmentby_column_index IS NOT NULL) AS segmentby,
+                string_agg(concat_ws(' ', format('%I', cs.attname),
+                        CASE WHEN cs.orderby_asc THEN 'ASC' ELSE 'DESC' END,
+                        CASE WHEN cs.orderby_nullsfirst THEN 'NULLS FIRST' ELSE 'NULLS LAST' END),
+                    ', ' ORDER BY cs.orderby_column_index)
+                    FILTER (WHERE cs.orderby_column_index IS NOT NULL) AS orderby
+            FROM timescaledb_information.hypertables AS ht
+            JOIN timescaledb_information.compression_settings AS cs
+                ON (cs.hypertable_schema = ht.hypertable_schema AND cs.hypertable_name = ht.hypertable_name)
+            WHERE ht.hypertable_schema = 'public' AND ht.compression_enabled
+            GROUP BY ht.hypertable_name
+            ORDER BY ht.hypertable_name;
+    """)).fetchall()
+
+
+def get_chunk_skipping(connection: sql.Connection) -> list[sql.Row]:
+    """
+    Returns the columns of the hypertables in the public schema for which chunk skipping is enabled
+
+    :param connection: The connection to the active database
+    :return: The rows with the hypertable_name and column_name columns. The list is empty, if the installed TimescaleDB
+        version does not support chunk skipping.
+    """
+
+    has_column_stats = connection.execute(sql.text("""
+        SELECT to_regclass('_timescaledb_catalog.chunk_column_stats') IS NOT NULL;
+    """)).scalar_one()
+    if not has_column_stats:
+        return []
+
+    return connection.execute(sql.text("""
+        SELECT ht.table_name AS hypertable_name, stats.column_name::TEXT AS column_name
+            FROM _timescaledb_catalog.chunk_column_stats AS stats
+            JOIN _timescaledb_catalog.hypertable AS ht ON (ht.id = stats.hypertable_id)
+            WHERE ht.schema_name = 'public' AND stats.chunk_id = 0
+            ORDER BY 1, 2;
+    """)).fetchall()
+
+
+def diff(expected: dict[str, dict[str, str]], actual: dict[str, dict[str, str]]) -> list[str]:
+    """
+    Compares two snapshots
+
+    :param expected: The reference snapshot, e.g., of the database set up by replaying all revisions
+    :param actual: The snapshot to check
+    :return: The human-readable differences. An empty list indicates equivalent schemas.
+    """
+
+    differences = []
+    for category in sorted(set(expected) | set(actual)):
+        expected_objects, actual_objects = expected.get(category, {}), actual.get(category, {})
+        for name in sorted(set(expected_objects) | set(actual_objects)):
+            if name not in actual_objects:
+                differences.append(f"{category}: {name} is missing")
+            elif name not in expected_objects:
+                differences.append(f"{category}: {name} is unexpected")
+            elif expected_objects[name] != actual_objects[name]:
+                differences.append(
+                    f"{category}: {name} differs, expected {json.dumps(expected_objects[name])}, "
+                    f"got {json.dumps(actual_objects[name])}"
+                )
+    return differences
+
+
+def _query_dict(connection: sql.Connection, query: str, **parameters) -> dict[str, str]:
+    """Executes the query and returns the first column as keys and the second one as values"""
+
+    return {
+        str(row[0]): str(row[1])
+        for row in connection.execute(sql.text(query), parameters=parameters)
+    }
+
+
+def _quote_ident(name: str) -> str:
+    """Quotes the SQL identifier"""
+
+    return '"' + name.replace('"', '""') + '"'
@@ -0,0 +1,138 @@
+"""
+Implements the bookkeeping that allows the migration environment to skip upgrades of databases that are already at head
+
+After each online migration, the environment records the applied heads together with the structure of the schema, as
+captured by schema_catalog without the operational state, and its checksum in the rdp_schema_state table. On the next
+start, a single connection suffices to compare the stored version and the checksum of the current schema against the
+record. If both match and the heads of the revision files are reached, nothing needs to run. A checksum mismatch at
+the recorded heads indicates that the schema has been altered manually since the last migration, e.g., by replacing
+a view, and the differences are reported before any revision runs into them.
+
+The heads are determined from the revision files without importing them, since loading all revisions is a noticeable
+part of the start-up time.
+"""
+
+import ast
+import hashlib
+import json
+import pathlib
+import re
+
+import sqlalchemy as sql
+
+import rdp_db.utils.schema_catalog as schema_catalog
+
+# The categories that change independently of the revisions, e.g., by upgrading the TimescaleDB image
+_ignored_categories = ["extensions"]
+
+_identifier_pattern = re.compile(r"^(revision|down_revision)\s*(?::[^=]*)?=\s*(.+?)\s*$", re.MULTILINE)
+
+
+def find_heads(version_locations: list[pathlib.Path]) -> set[str]:
+    """
+    Determines the heads from the revision identifiers in the revision files
+
+    :param version_locations: The directories that contain the revision files
+    :return: The revisions that no other revision refers to as its predecessor
+    """
+
+    revisions, predecessors = set(), set()
+    for location in version_locations:
+        for path in location.glob("*.py"):
+            identifiers = {
+                match.group(1): ast.literal_eval(match.group(2))
+                for match in _identifier_pattern.finditer(path.read_text())
+            }
+            if "revision" not in identifiers:
+                continue  # Not a revision file
+
+            revisions.add(identifiers["revision"])
+            down_revision = identifiers.get("down_revision")
+            if isinstance(down_revision, str):
+                predecessors.add(down_revision)
+            elif down_revision is not None:
+                predecessors.update(down_revision)  # Merge revision
+
+    return revisions - predecessors
+
+
+def get_current_heads(connection: sql.Connection) -> set[str]:
+    """Returns the revisions stored in the alembic_version table or an empty set in case of a fresh database"""
+
+    if connection.execute(sql.text("SELECT to_regclass('public.alembic_version');")).scalar_one() is None:
+        return set()
+    return set(connection.execute(sql.text("SELECT version_num FROM alembic_version;")).scalars())
+
+
+def get_structure(connection: sql.Connection) -> dict[str, dict[str, str]]:
+    """Captures the schema without the operational state and the categories maintained outside the revisions"""
+
+    structure = schema_catalog.snapshot(connection, include_state=False)
+    for category in _ignored_categories:
+        structure.pop(category, None)
+    return structure
+
+
+def get_checksum(structure: dict[str, dict[str, str]]) -> str:
+    """Returns the SHA-256 checksum of the normalized schema structure"""
+
+    return hashlib.sha256(json.dumps(structure, sort_keys=True).encode()).hexdigest()
+
+
+def check(connection: sql.Connection, heads: set[str]) -> tuple[bool, list[str]]:
+    """
+    Compares the database against the recorded state and the heads of the revision files
+
+    :param connection: The connection to the active database
+    :param heads: The heads of the revision files, e.g., as returned by find_heads()
+    :return: Whether the database is at the given heads without any drift and the human-readable differences of the
+        schema to the recorded one. The differences are empty, if no state has been recorded at the current revision.
+    """
+
+    if connection.execute(sql.text("SELECT to_regclass('public.rdp_schema_state');")).scalar_one() is None:
+        return False, []
+
+    recorded = connection.execute(sql.text("""
+        SELECT heads, checksum, structure FROM rdp_schema_state;
+    """)).one_or_none()
+    current_heads = get_current_heads(connection)
+    if recorded is None or set(recorded.heads) != current_heads:
+        return False, []  # The record does not describe the current revision
+
+    structure = get_structure(connection)
+    if get_checksum(structure) != recorded.checksum:
+        return False, schema_catalog.diff(recorded.structure, structure)
+    return current_heads == heads, []
+
+
+def record(connection: sql.Connection) -> None:
+    """
+    Records the structure of the schema at the current revision
+
+    An existing record of the same revision is kept. Hence, manual changes are still reported as drift after
+    migrations that did not apply any revision.
+    """
+
+    connection.execute(sql.text("""
+        CREATE TABLE IF NOT EXISTS rdp_schema_state (
+            heads TEXT[] NOT NULL,
+            checksum TEXT NOT NULL,
+            structure JSONB NOT NULL,
+            recorded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        COMMENT ON TABLE rdp_schema_state IS
+            'The schema structure and its checksum after the last migration, which allow skipping the migration and
+             detecting manual changes';
+    """))
+
+    heads = get_current_heads(connection)
+    recorded_heads = connection.execute(sql.text("SELECT heads FROM rdp_schema_state;")).scalar_one_or_none()
+    if recorded_heads is not None and set(recorded_heads) == heads:
+        return
+
+    structure = get_structure(connection)
+    connection.execute(sql.text("DELETE FROM rdp_schema_state;"))
+    connection.execute(sql.text("""
+        INSERT INTO rdp_schema_state(heads, checksum, structure)
+            VALUES (:heads, :checksum, CAST(:structure AS JSONB));
+    """), parameters=dict(heads=sorted(heads), checksum=get_checksum(structure), structure=json.dumps(structure)))
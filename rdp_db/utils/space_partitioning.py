@@ -0,0 +1,53 @@
+"""
+Implements the space partitioning of raw tables that already contain samples
+
+TimescaleDB only adds dimensions to empty hypertables. Instead of moving all samples out of the table and back within a
+single transaction, the raw table is rebuilt into a space-partitioned copy chunk by chunk, each in its own committed
+transaction (see rdp_db.utils.chunk_migration). The time slices, which the feeders and jobs change in the meantime, are
+logged and copied again, when the copy finally replaces the original table. Only this swap locks the table. Since the
+helper commits the transactions itself, it must be executed in autocommit mode, e.g.:
+
+    with op.get_context().autocommit_block():
+        space_partitioning.set_space_partitioning(op.get_bind(), "raw_unitemporal_double", 4)
+"""
+
+import logging
+
+import sqlalchemy as sql
+
+import rdp_db.utils.chunk_migration as chunk_migration
+
+logger = logging.getLogger(__name__)
+
+
+def set_space_partitioning(connection: sql.Connection, hypertable: str, number_partitions: int) -> int:
+    """
+    Partitions the raw table by a hash of dp_id into the given number of partitions
+
+    Empty and already partitioned tables are adjusted in place. Otherwise, the table is rebuilt. In case the rebuild is
+    interrupted, a rerun continues after the chunks already copied.
+
+    :param connection: The connection to the active database in autocommit mode
+    :param hypertable: The name of the raw table in the public schema
+    :param number_partitions: The number of hash partitions, at least two
+    :return: The number of copied chunks, zero if the table has not been rebuilt
+    """
+
+    if connection.get_isolation_level() != "AUTOCOMMIT":
+        raise ValueError("The table must be rebuilt in autocommit mode, e.g. within autocommit_block()")
+
+    target = connection.execute(sql.text("""
+        SELECT CAST(rdp_set_space_partitioning(CAST(:hypertable AS REGCLASS), :number_partitions) AS TEXT);
+    """), parameters=dict(hypertable=hypertable, number_partitions=number_partitions)).scalar_one()
+    if target is None:
+        return 0
+
+    chunk_count = chunk_migration.process_chunks(
+        connection, f"space_partitioning_{hypertable}", hypertable,
+        "SELECT rdp_copy_space_partitioning_chunk(CAST(:chunk AS REGCLASS));"
+    )
+    recopied_rows = connection.execute(sql.text("""
+        SELECT rdp_finish_space_partitioning(CAST(:hypertable AS REGCLASS));
+    """), parameters=dict(hypertable=hypertable)).scalar_one()
+    logger.info(f"Swapped {hypertable} with {target}, recopied {recopied_rows} rows changed during the rebuild")
+    return chunk_count
@@ -7,7 +7,9 @@ precedence.
 """
 import contextlib
 import datetime
+import hashlib
 import os
+import pathlib
 import urllib.parse
 
 import alembic.config
@@ -79,14 +81,102 @@ def get_sql_url(username: str, password: str):
     return f"postgresql://{username}:{password}@{host}:{port}/{db}"
 
 
+@pytest.fixture(scope="session")
+def template_db() -> str:
+    """
+    Provides the template database, which is built once by replaying all revisions
+
+    The template is reused across test sessions until the revisions or the relevant environment variables change. Since
+    the revisions create and drop the roles of the entire cluster, the outdated copies of the template are dropped
+    before rebuilding it. An advisory lock ensures that only a single pytest-xdist worker builds the template.
+    """
+
+    base_name = os.environ["POSTGRES_DB"]
+    template_name = f"{base_name}_template"
+    fingerprint = get_template_fingerprint()
+
+    with hlp.get_admin_engine() as engine, engine.connect() as con:
+        con.execute(sql.text("SELECT pg_advisory_lock(hashtext('rdp_test_template'));"))
+        try:
+            comment = con.execute(sql.text("""
+                SELECT shobj_description(oid, 'pg_database') FROM pg_database WHERE datname = :template_name;
+            """), parameters=dict(template_name=template_name)).scalar_one_or_none()
+            if comment != fingerprint:
+                build_template_db(con, base_name, template_name, fingerprint)
+        finally:
+            con.execute(sql.text("SELECT pg_advisory_unlock(hashtext('rdp_test_template'));"))
+
+    return template_name
+
+
+@pytest.fixture(scope="session", autouse=True)
+def worker_db(template_db) -> str:
+    """
+    Provides the database of the current pytest-xdist worker, to which all connection fixtures and migrations refer
+
+    The database initially is a copy of the template. It is only reset by the clean_db fixture.
+    """
+
+    db_name = f"{os.environ['POSTGRES_DB']}_test_{os.environ.get('PYTEST_XDIST_WORKER', 'main')}"
+    with hlp.get_admin_engine() as engine:
+        hlp.create_db(engine, db_name, template_db)
+
+    with hlp.use_database(db_name):
+        yield db_name
+
+    with hlp.get_admin_engine() as engine:
+        hlp.drop_db(engine, db_name)
+
+
 @pytest.fixture()
-def clean_db():
-    """Provides a clean DB environment by resetting and building the entire DB via alembic"""
+def clean_db(template_db, worker_db):
+    """Provides a clean DB environment by copying the template database"""
 
-    do_redeployment_cycle()
+    with hlp.get_admin_engine() as engine:
+        hlp.create_db(engine, worker_db, template_db)
     return ""
 
 
+def get_template_fingerprint() -> str:
+    """Returns the hash of the revisions, the migration environment and its configuration"""
+
+    package_path = pathlib.Path(__file__).parent.parent / "rdp_db"
+    digest = hashlib.sha256()
+    for path in sorted([*package_path.glob("*.py"), *package_path.glob("*/*.py")]):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    for name in ("POSTGRES_DATA_SOURCE_USER", "POSTGRES_DATA_VIS_USER", "POSTGRES_DATA_PUB_VIS_USER",
+                 "POSTGRES_MONITORING_USER", "RDP_SPACE_PARTITIONING", "RDP_COLD_TABLESPACE"):
+        digest.update(f"{name}={os.environ.get(name)}".encode())
+    return f"rdp test template {digest.hexdigest()}"
+
+
+def build_template_db(con: sql.Connection, base_name: str, template_name: str, fingerprint: str):
+    """Builds the template database via a full redeployment cycle, which always replays all revisions"""
+
+    # The copies hold privileges of the roles, which the redeployment drops
+    for db_name in con.execute(sql.text("""
+        SELECT datname FROM pg_database WHERE starts_with(datname, :prefix);
+    """), parameters=dict(prefix=f"{base_name}_test_")).scalars().all():
+        hlp.drop_db(con.engine, db_name)
+
+    if con.execute(sql.text("SELECT EXISTS (SELECT FROM pg_database WHERE datname = :template_name);"),
+                   parameters=dict(template_name=template_name)).scalar_one():
+        con.execute(sql.text(f"ALTER DATABASE {hlp.quote_db_name(template_name)} ALLOW_CONNECTIONS true;"))
+
+    with hlp.use_database(template_name):
+        do_redeployment_cycle()
+
+    # Copying requires that nobody, including the Timescale job scheduler, is connected to the template
+    con.execute(sql.text(f"""
+        COMMENT ON DATABASE {hlp.quote_db_name(template_name)} IS '{fingerprint}';
+        ALTER DATABASE {hlp.quote_db_name(template_name)} ALLOW_CONNECTIONS false;
+    """))
+    con.execute(sql.text("""
+        SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE datname = :template_name;
+    """), parameters=dict(template_name=template_name))
+
+
 @tenacity.retry(
     wait=tenacity.wait_exponential(multiplier=1.2, min=1, max=10),
     stop=tenacity.stop_after_delay(30),
@@ -203,6 +293,57 @@ def basic_dp_test_set(clean_db, sql_engine_data_source) -> dict[str, int]:
             view_role="view_public", data_type='jsonb', temporality='bitemporal'
         ),
 
+        "loc2-dev0-pr-0-uni-real-0": hlp.create_dp(
+            sql_engine_data_source, "name_0", "device_0", "location_6", "provider_1",
+            view_role="view_internal", data_type='real', temporality='unitemporal'
+        ),
+        "loc2-dev0-pub-0-uni-real-1": hlp.create_dp(
+            sql_engine_data_source, "name_1", "device_0", "location_6", "provider_1",
+            view_role="view_public", data_type='real', temporality='unitemporal'
+        ),
+        "loc2-dev0-pr-0-bi-real-0": hlp.create_dp(
+            sql_engine_data_source, "name_0", "device_0", "location_6", "provider_2",
+            view_role="view_internal", data_type='real', temporality='bitemporal'
+        ),
+        "loc2-dev0-pub-0-bi-real-1": hlp.create_dp(
+            sql_engine_data_source, "name_1", "device_0", "location_6", "provider_2",
+            view_role="view_public", data_type='real', temporality='bitemporal'
+        ),
+
+        "loc2-dev0-pr-0-uni-int32-0": hlp.create_dp(
+            sql_engine_data_source, "name_0", "device_0", "location_7", "provider_1",
+            view_role="view_internal", data_type='integer', temporality='unitemporal'
+        ),
+        "loc2-dev0-pub-0-uni-int32-1": hlp.create_dp(
+            sql_engine_data_source, "name_1", "device_0", "location_7", "provider_1",
+            view_role="view_public", data_type='integer', temporality='unitemporal'
+        ),
+        "loc2-dev0-pr-0-bi-int32-0": hlp.create_dp(
+            sql_engine_data_source, "name_0", "device_0", "location_7", "provider_2",
+            view_role="view_internal", data_type='integer', temporality='bitemporal'
+        ),
+        "loc2-dev0-pub-0-bi-int32-1": hlp.create_dp(
+            sql_engine_data_source, "name_1", "device_0", "location_7", "provider_2",
+            view_role="view_public", data_type='integer', temporality='bitemporal'
+        ),
+
+        "loc2-dev0-pr-0-uni-int16-0": hlp.create_dp(
+            sql_engine_data_source, "name_0", "device_0", "location_8", "provider_1",
+            view_role="view_internal", data_type='smallint', temporality='unitemporal'
+        ),
+        "loc2-dev0-pub-0-uni-int16-1": hlp.create_dp(
+            sql_engine_data_source, "name_1", "device_0", "location_8", "provider_1",
+            view_role="view_public", data_type='smallint', temporality='unitemporal'
+        ),
+        "loc2-dev0-pr-0-bi-int16-0": hlp.create_dp(
+            sql_engine_data_source, "name_0", "device_0", "location_8", "provider_2",
+            view_role="view_internal", data_type='smallint', temporality='bitemporal'
+        ),
+        "loc2-dev0-pub-0-bi-int16-1": hlp.create_dp(
+            sql_engine_data_source, "name_1", "device_0", "location_8", "provider_2",
+            view_role="view_public", data_type='smallint', temporality='bitemporal'
+        ),
+
     }
 
 
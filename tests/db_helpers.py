@@ -1,7 +1,10 @@
 """
 Implements some test helper functions that can be used in multiple modules
 """
+import contextlib
 import datetime
+import os
+import re
 
 import sqlalchemy as sql
 
@@ -45,6 +48,28 @@ def create_dp(eng: sql.Engine, name, device_id, location_code, data_provider, un
     return dp_id
 
 
+def insert_minute_samples(eng: sql.Engine, dp_id: int, values: list, start: str = "2020-01-01T00:00:00Z"):
+    """Inserts one unitemporal double sample per minute starting at the given time"""
+
+    with eng.begin() as con:
+        con.execute(sql.text("""
+            INSERT INTO raw_unitemporal_double(dp_id, valid_time, value)
+                SELECT :dp_id, CAST(:start AS TIMESTAMPTZ) + (pos - 1) * INTERVAL '1 minute', value
+                    FROM unnest(CAST(:values AS DOUBLE PRECISION[])) WITH ORDINALITY AS samples(value, pos);
+        """), parameters=dict(dp_id=dp_id, values=values, start=start))
+
+
+def pause_jobs(con: sql.Connection, proc_name: str = None):
+    """Unschedules the jobs of the given procedure or, by default, the jobs on the public hypertables"""
+
+    con.execute(sql.text("""
+        SELECT alter_job(job_id, scheduled => false)
+            FROM timescaledb_information.jobs
+            WHERE CASE WHEN CAST(:proc_name AS TEXT) IS NULL THEN hypertable_schema = 'public'
+                ELSE proc_name = :proc_name END;
+    """), parameters=dict(proc_name=proc_name))
+
+
 def bind_params(statement, parameters: dict):
     """Binds the parameters to the statement supporting json"""
 
@@ -56,3 +81,55 @@ def bind_params(statement, parameters: dict):
             bindings.append(sql.bindparam(param_key, param_val, type_=sql.dialects.postgresql.JSONB))
 
     return statement.bindparams(*bindings)
+
+
+@contextlib.contextmanager
+def get_admin_engine() -> sql.Engine:
+    """Creates the engine that manages the databases via the maintenance database in autocommit mode"""
+
+    engine = sql.create_engine(os.environ["RDP_POSTGRES_URL_INIT"], isolation_level="AUTOCOMMIT")
+    yield engine
+    engine.dispose(close=True)
+
+
+def create_db(engine: sql.Engine, db_name: str, template_name: str = None):
+    """Creates the database from scratch, optionally as a copy of the template database"""
+
+    template = f" TEMPLATE {quote_db_name(template_name)}" if template_name is not None else ""
+    with engine.connect() as con:
+        con.execute(sql.text(f"DROP DATABASE IF EXISTS {quote_db_name(db_name)} WITH (FORCE);"))
+        con.execute(sql.text(f"CREATE DATABASE {quote_db_name(db_name)}{template};"))
+
+
+def drop_db(engine: sql.Engine, db_name: str):
+    """Drops the database, even if there are still open connections"""
+
+    with engine.connect() as con:
+        con.execute(sql.text(f"DROP DATABASE IF EXISTS {quote_db_name(db_name)} WITH (FORCE);"))
+
+
+def quote_db_name(db_name: str) -> str:
+    """Validates and quotes the database name"""
+
+    if not re.match(r"^[a-zA-Z0-9_]+$", db_name):
+        raise ValueError(f"The database name '{db_name}' is invalid. Only [a-zA-Z0-9_]+ is allowed")
+    return f'"{db_name}"'
+
+
+@contextlib.contextmanager
+def use_database(db_name: str, **variables):
+    """Points the connection fixtures and the migration environment to the given database in the meantime"""
+
+    db_url = sql.make_url(os.environ["RDP_POSTGRES_URL"]).set(database=db_name)
+    overrides = dict(variables, POSTGRES_DB=db_name, RDP_POSTGRES_URL=db_url.render_as_string(hide_password=False))
+    previous = {name: os.environ.get(name) for name in overrides}
+
+    os.environ.update(overrides)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
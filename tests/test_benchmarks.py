@@ -0,0 +1,38 @@
+"""
+Runs the benchmark suite on a tiny data set to ensure that it keeps working with the current revision
+"""
+import datetime
+
+import sqlalchemy.sql as sql
+
+import benchmarks.data_generator as gen
+import benchmarks.run as run
+
+
+def test_benchmark_smoke_run(clean_db, sql_engine_postgres, sql_engine_data_source, sql_engine_private_vis,
+                             sql_engine_public_vis):
+    """Tests whether all write paths and queries are measured and the synthetic data is removed afterward"""
+
+    engines = dict(admin=sql_engine_postgres, data_source=sql_engine_data_source, private_vis=sql_engine_private_vis,
+                   public_vis=sql_engine_public_vis)
+    config = gen.GeneratorConfig(data_points=2, days=0.5, sampling_interval=datetime.timedelta(hours=1),
+                                 issue_interval=datetime.timedelta(hours=6), horizon=datetime.timedelta(hours=12),
+                                 batch_size=5)
+    results = run.run_benchmarks(engines, config, repetitions=2)
+
+    assert results["environment"]["revision"] is not None
+    assert len(results["ingestion"]) == sum(len(tables) for tables in run.write_paths.values())
+    for r in results["ingestion"]:
+        assert r["rows"] > 0 and r["rows_per_second"] > 0
+
+    admin_queries = [r for r in results["queries"] if r["role"] == "admin"]
+    assert len(admin_queries) == len(run.get_queries(config))
+    assert all(r["rows"] > 0 for r in admin_queries if r["query"].endswith("_details_all"))
+
+    # The public user only sees the public half of the data points
+    rows = {(r["query"], r["role"]): r["rows"] for r in results["queries"]}
+    assert rows[("unitemporal_double_details_all", "public_vis")] < rows[("unitemporal_double_details_all", "admin")]
+
+    with sql_engine_postgres.begin() as con:
+        assert con.execute(sql.text("SELECT count(*) FROM data_points WHERE data_provider = 'rdp_benchmark';")) \
+                   .scalar_one() == 0
@@ -0,0 +1,117 @@
+"""
+Tests the dictionary-encoded category type
+"""
+import pandas as pd
+import pytest
+import sqlalchemy.exc
+import sqlalchemy.sql as sql
+
+import tests.db_helpers as hlp
+
+
+@pytest.fixture()
+def category_dps(clean_db, sql_engine_data_source) -> dict[str, int]:
+    """Creates a private and a public category data point"""
+    return {
+        "pr": hlp.create_dp(
+            sql_engine_data_source, "mode", "inverter_0", "location_9", "provider_1",
+            view_role="view_internal", data_type='category', temporality='unitemporal'
+        ),
+        "pub": hlp.create_dp(
+            sql_engine_data_source, "mode", "inverter_1", "location_9", "provider_1",
+            view_role="view_public", data_type='category', temporality='unitemporal'
+        ),
+    }
+
+
+def test_category_encoding(category_dps, sql_engine_data_source):
+    """Tests the assignment of the codes per data point"""
+
+    dp_id = category_dps["pr"]
+    with sql_engine_data_source.begin() as con:
+        codes_a = con.execute(sql.text("""
+            SELECT rdp_encode_categories(:dp_id, ARRAY['Run', 'Fault', 'Run', NULL]);
+        """), parameters=dict(dp_id=dp_id)).scalar_one()
+        codes_b = con.execute(sql.text("""
+            SELECT rdp_encode_categories(:dp_id, ARRAY['Standby', 'Fault']);
+        """), parameters=dict(dp_id=dp_id)).scalar_one()
+        codes_other = con.execute(sql.text("""
+            SELECT rdp_encode_categories(:dp_id, ARRAY['Fault']);
+        """), parameters=dict(dp_id=category_dps["pub"])).scalar_one()
+
+    assert codes_a == [0, 1, 0, None]
+    assert codes_b == [2, 1]
+    assert codes_other == [0]
+
+
+def test_category_details_view(category_dps, sql_engine_data_source, sql_engine_public_vis):
+    """Tests the decoding via the details view and the filtering by code"""
+
+    dp_id = category_dps["pub"]
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text("""
+            INSERT INTO raw_unitemporal_category(dp_id, valid_time, value)
+                SELECT :dp_id, '2025-01-01T00:00:00Z'::TIMESTAMPTZ + (pos - 1) * INTERVAL '1 hour', code
+                    FROM unnest(rdp_encode_categories(:dp_id, ARRAY['Run', 'Fault', 'Run']))
+                        WITH ORDINALITY AS codes(code, pos);
+        """), parameters=dict(dp_id=dp_id))
+        con.execute(sql.text("""
+            INSERT INTO raw_unitemporal_category(dp_id, valid_time, value)
+                SELECT :dp_id, '2025-01-01T00:00:00Z', code
+                    FROM unnest(rdp_encode_categories(:dp_id, ARRAY['Run'])) AS codes(code);
+        """), parameters=dict(dp_id=category_dps["pr"]))
+
+    with sql_engine_public_vis.begin() as con:
+        data = pd.read_sql("""
+            SELECT dp_id, value, value_code FROM unitemporal_category_details ORDER BY valid_time;
+        """, con)
+        faults = pd.read_sql("""
+            SELECT details.valid_time
+                FROM unitemporal_category_details AS details
+                JOIN category_labels AS labels ON (labels.dp_id = details.dp_id AND labels.code = details.value_code)
+                WHERE labels.label = 'Fault';
+        """, con)
+
+    pd.testing.assert_frame_equal(data, pd.DataFrame({
+        "dp_id": [dp_id] * 3,
+        "value": ["Run", "Fault", "Run"],
+        "value_code": [0, 1, 0]
+    }), check_names=False)
+    assert list(faults["valid_time"]) == [pd.Timestamp("2025-01-01T01:00:00Z")]
+
+
+def test_category_invalid_code(category_dps, sql_engine_data_source):
+    """Tests that only codes from the dictionary can be stored"""
+
+    with pytest.raises(sqlalchemy.exc.IntegrityError, match=".*raw_unitemporal_category_code_fkey.*"):
+        with sql_engine_data_source.begin() as con:
+            con.execute(sql.text("""
+                INSERT INTO raw_unitemporal_category(dp_id, valid_time, value) VALUES
+                    (:dp_id, '2025-01-01T00:00:00Z', 42);
+            """), parameters=dict(dp_id=category_dps["pr"]))
+
+
+def test_jsonb_conversion(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres, sql_engine_private_vis):
+    """Tests the conversion of a jsonb string series into a category series"""
+
+    dp_id = basic_dp_test_set["loc2-dev0-pr-0-uni-json-0"]
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text("""
+            INSERT INTO raw_unitemporal_jsonb(dp_id, valid_time, value) VALUES
+                (:dp_id, '2025-01-01T00:00:00Z', to_jsonb('Run'::TEXT)),
+                (:dp_id, '2025-01-01T01:00:00Z', to_jsonb('Fault'::TEXT));
+        """), parameters=dict(dp_id=dp_id))
+
+    with sql_engine_postgres.begin() as con:
+        converted_rows = con.execute(sql.text("SELECT rdp_convert_jsonb_to_category(:dp_id);"),
+                                     parameters=dict(dp_id=dp_id)).scalar_one()
+
+    with sql_engine_private_vis.begin() as con:
+        data = pd.read_sql("SELECT dp_id, value, data_type FROM unitemporal_category_details ORDER BY valid_time;", con)
+
+    assert converted_rows == 2
+    pd.testing.assert_frame_equal(data, pd.DataFrame({
+        "dp_id": [dp_id] * 2,
+        "value": ["Run", "Fault"],
+        "data_type": ["category"] * 2
+    }), check_names=False)
@@ -0,0 +1,53 @@
+"""
+Tests the change-only storage of unitemporal data points and the LOCF reconstruction
+"""
+import pandas as pd
+import sqlalchemy.sql as sql
+
+import tests.db_helpers as hlp
+
+
+def test_deadband_filter(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres):
+    """Tests that only the changed samples of change-only data points are stored"""
+
+    dp_change_only = basic_dp_test_set["loc2-dev0-pr-0-uni-dbl-0"]
+    dp_regular = basic_dp_test_set["loc2-dev0-pub-0-uni-dbl-1"]
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("UPDATE data_points SET change_only = TRUE, deadband_abs = 0.5 WHERE id = :dp_id;"),
+                    parameters=dict(dp_id=dp_change_only))
+
+    hlp.insert_minute_samples(sql_engine_data_source, dp_change_only, [1.0, 1.0, 1.2, 2.0, 2.0, 1.0])
+    hlp.insert_minute_samples(sql_engine_data_source, dp_regular, [1.0, 1.0, 1.2, 2.0, 2.0, 1.0])
+
+    with sql_engine_postgres.begin() as con:
+        data = pd.read_sql("""
+            SELECT dp_id, value FROM raw_unitemporal_double ORDER BY dp_id, valid_time;
+        """, con)
+
+    pd.testing.assert_frame_equal(data, pd.DataFrame({
+        "dp_id": [dp_change_only] * 3 + [dp_regular] * 6,
+        "value": [1.0, 2.0, 1.0] + [1.0, 1.0, 1.2, 2.0, 2.0, 1.0]
+    }), check_names=False)
+
+
+def test_locf_reconstruction(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres, sql_engine_private_vis):
+    """Tests that the LOCF function fills the dropped samples including the value before the series begin"""
+
+    dp_id = basic_dp_test_set["loc2-dev0-pr-0-uni-dbl-0"]
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("UPDATE data_points SET change_only = TRUE WHERE id = :dp_id;"),
+                    parameters=dict(dp_id=dp_id))
+
+    hlp.insert_minute_samples(sql_engine_data_source, dp_id, [1.0, 1.0, 1.0, 2.0, 2.0, 1.0])
+
+    with sql_engine_private_vis.begin() as con:
+        data = pd.read_sql(sql.text("""
+            SELECT valid_time, value FROM unitemporal_double_locf(
+                    ARRAY[:dp_id], '2020-01-01T00:01:00Z', '2020-01-01T00:06:00Z', INTERVAL '1 minute'
+                );
+        """), con, params=dict(dp_id=dp_id))
+
+    pd.testing.assert_frame_equal(data, pd.DataFrame({
+        "valid_time": pd.date_range("2020-01-01T00:01:00Z", periods=5, freq="1min"),
+        "value": [1.0, 1.0, 2.0, 2.0, 1.0]
+    }), check_names=False, check_dtype=False)
@@ -0,0 +1,95 @@
+"""
+Tests the chunk-wise processing of hypertables in migrations
+"""
+import pytest
+import sqlalchemy.exc
+import sqlalchemy.sql as sql
+
+import rdp_db.utils.chunk_migration as chunk_migration
+
+
+@pytest.fixture()
+def compressed_chunks(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres) -> list[str]:
+    """Inserts three days of samples, compresses the chunks and returns their names"""
+
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text("""
+            INSERT INTO raw_unitemporal_double(dp_id, valid_time, value)
+                SELECT :dp_id, valid_time, 1.0
+                    FROM generate_series(
+                        '2020-01-01T00:00:00Z'::TIMESTAMPTZ, '2020-01-03T23:00:00Z', INTERVAL '1 hour'
+                    ) AS valid_time;
+        """), parameters=dict(dp_id=basic_dp_test_set["loc2-dev0-pr-0-uni-dbl-0"]))
+
+    with sql_engine_postgres.begin() as con:
+        return list(con.execute(sql.text("""
+            SELECT compress_chunk(c)::TEXT FROM show_chunks('raw_unitemporal_double') AS c ORDER BY c;
+        """)).scalars())
+
+
+def count_compressed_chunks(con) -> int:
+    """Returns the number of compressed chunks of the test table"""
+
+    return con.execute(sql.text("""
+        SELECT count(*) FROM timescaledb_information.chunks
+            WHERE hypertable_name = 'raw_unitemporal_double' AND is_compressed;
+    """)).scalar_one()
+
+
+def test_decompress_chunks(compressed_chunks, sql_engine_postgres):
+    """Tests the decompression and the cleanup of the progress records"""
+
+    with sql_engine_postgres.connect() as con:
+        con = con.execution_options(isolation_level="AUTOCOMMIT")
+        assert count_compressed_chunks(con) == 3
+
+        processed = chunk_migration.decompress_chunks(con, "test_decompress", "raw_unitemporal_double")
+        assert processed == 3
+        assert count_compressed_chunks(con) == 0
+        assert con.execute(sql.text("SELECT to_regclass('rdp_chunk_migration_progress');")).scalar_one() is None
+
+
+def test_resume_chunk_processing(compressed_chunks, sql_engine_postgres):
+    """Tests whether the chunks processed by a previous, interrupted run are skipped"""
+
+    with sql_engine_postgres.connect() as con:
+        con = con.execution_options(isolation_level="AUTOCOMMIT")
+        with pytest.raises(sqlalchemy.exc.DataError, match=".*division by zero.*"):
+            # Fails after the first chunk has been committed
+            chunk_migration.process_chunks(con, "test_resume", "raw_unitemporal_double", """
+                SELECT decompress_chunk(CAST(:chunk AS REGCLASS));
+                SELECT 1 / CASE WHEN CAST(:range_start AS TIMESTAMPTZ) > '2020-01-01T00:00:00Z' THEN 0 ELSE 1 END;
+            """)
+
+    with sql_engine_postgres.connect() as con:
+        con = con.execution_options(isolation_level="AUTOCOMMIT")
+        done = con.execute(sql.text("SELECT chunk_name FROM rdp_chunk_migration_progress;")).scalars().all()
+        assert done == [compressed_chunks[0]]
+        assert count_compressed_chunks(con) == 2
+
+        processed = chunk_migration.decompress_chunks(con, "test_resume", "raw_unitemporal_double")
+        assert processed == 2
+        assert count_compressed_chunks(con) == 0
+
+
+def test_rewrite_chunks(compressed_chunks, sql_engine_postgres):
+    """Tests rewriting the samples one time slice at a time"""
+
+    with sql_engine_postgres.connect() as con:
+        con = con.execution_options(isolation_level="AUTOCOMMIT")
+        processed = chunk_migration.process_chunks(con, "test_rewrite", "raw_unitemporal_double", """
+            UPDATE raw_unitemporal_double SET value = value * 2
+                WHERE valid_time >= :range_start AND valid_time < :range_end;
+        """)
+        total = con.execute(sql.text("SELECT sum(value) FROM raw_unitemporal_double;")).scalar_one()
+
+    assert processed == 3
+    assert total == 2.0 * 3 * 24
+
+
+def test_requires_autocommit(compressed_chunks, sql_engine_postgres):
+    """Tests whether processing the chunks within a transaction is rejected"""
+
+    with sql_engine_postgres.begin() as con:
+        with pytest.raises(ValueError):
+            chunk_migration.decompress_chunks(con, "test_transaction", "raw_unitemporal_double")
@@ -0,0 +1,111 @@
+"""
+Tests the background processing of the registered data migrations
+"""
+import json
+
+import pytest
+import sqlalchemy.sql as sql
+
+import rdp_db.utils.data_migration as data_migration
+import tests.db_helpers as hlp
+
+# Sets the unit of the data points in the order of their IDs
+unit_statement = """
+    WITH batch AS (
+        SELECT id FROM data_points WHERE id > COALESCE(CAST($1 AS INTEGER), 0) ORDER BY id LIMIT $2
+    ), updated AS (
+        UPDATE data_points SET unit = 'migrated' WHERE id IN (SELECT id FROM batch)
+    )
+    SELECT max(id)::TEXT, count(*) FROM batch;
+"""
+
+
+@pytest.fixture()
+def dp_count(basic_dp_test_set, sql_engine_postgres) -> int:
+    """Pauses the background job and returns the number of data points"""
+
+    with sql_engine_postgres.begin() as con:
+        hlp.pause_jobs(con, "rdp_run_data_migrations")
+        return con.execute(sql.text("SELECT count(*) FROM data_points;")).scalar_one()
+
+
+def run_migrations(eng, **config):
+    """Runs the job procedure once outside a transaction, since it commits each batch"""
+
+    with eng.connect() as con:
+        con = con.execution_options(isolation_level="AUTOCOMMIT")
+        con.execute(sql.text("CALL rdp_run_data_migrations(0, CAST(:config AS JSONB));"),
+                    parameters=dict(config=json.dumps(config)))
+
+
+def get_status(eng, name: str) -> dict:
+    """Returns the status of the data migration"""
+
+    with eng.begin() as con:
+        return con.execute(sql.text("SELECT * FROM rdp_data_migration_status WHERE name = :name;"),
+                           parameters=dict(name=name)).one()._asdict()
+
+
+def test_data_migration(dp_count, sql_engine_postgres):
+    """Tests whether a task is processed in batches and completed"""
+
+    with sql_engine_postgres.begin() as con:
+        data_migration.register(con, "test_units", unit_statement, batch_size=3, batch_delay="0 seconds",
+                                total_rows=dp_count)
+        with pytest.raises(RuntimeError, match="is pending"):
+            data_migration.require_completed(con, "test_units")
+
+    run_migrations(sql_engine_postgres)
+
+    status = get_status(sql_engine_postgres, "test_units")
+    assert status["status"] == "completed" and status["progress"] == 1.0
+    assert status["processed_rows"] == dp_count
+    assert status["batch_count"] == (dp_count + 2) // 3 + 1  # The last batch finds no rows
+    assert status["completed_at"] is not None and status["estimated_completion"] is None
+    with sql_engine_postgres.begin() as con:
+        assert con.execute(sql.text("SELECT DISTINCT unit FROM data_points;")).scalars().all() == ["migrated"]
+        data_migration.require_completed(con, "test_units")
+
+
+def test_resume_data_migration(dp_count, sql_engine_postgres):
+    """Tests whether the runtime limit interrupts the task, which is continued by the next run"""
+
+    with sql_engine_postgres.begin() as con:
+        data_migration.register(con, "test_units", unit_statement, batch_size=1, batch_delay="1 second",
+                                total_rows=dp_count)
+
+    run_migrations(sql_engine_postgres, max_runtime="0.1 seconds")
+    status = get_status(sql_engine_postgres, "test_units")
+    assert status["status"] == "running" and status["batch_count"] == 1
+    assert status["progress"] == pytest.approx(1 / dp_count)
+
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("UPDATE rdp_data_migrations SET batch_size = :dp_count, batch_delay = '0 seconds';"),
+                    parameters=dict(dp_count=dp_count))
+    run_migrations(sql_engine_postgres)
+    status = get_status(sql_engine_postgres, "test_units")
+    assert status["status"] == "completed" and status["processed_rows"] == dp_count
+
+
+def test_failed_data_migration(dp_count, sql_engine_postgres):
+    """Tests whether failing batches are rolled back and the task fails after the configured number of errors"""
+
+    with sql_engine_postgres.begin() as con:
+        data_migration.register(con, "test_failure", """
+            WITH updated AS (UPDATE data_points SET unit = 'migrated')
+            SELECT CAST(1 / 0 AS TEXT), 0;
+        """, batch_delay="0 seconds")
+
+    run_migrations(sql_engine_postgres, max_errors=2)
+    status = get_status(sql_engine_postgres, "test_failure")
+    assert status["status"] == "pending" and status["error_count"] == 1  # Skipped for the rest of the run
+    assert "division by zero" in status["last_error"]
+
+    run_migrations(sql_engine_postgres, max_errors=2)
+    status = get_status(sql_engine_postgres, "test_failure")
+    assert status["status"] == "failed" and status["error_count"] == 2
+    with sql_engine_postgres.begin() as con:
+        assert con.execute(sql.text("SELECT count(*) FROM data_points WHERE unit = 'migrated';")).scalar_one() == 0
+        data_migration.unregister(con, "test_failure")
+        with pytest.raises(RuntimeError, match="not registered"):
+            data_migration.require_completed(con, "test_failure")
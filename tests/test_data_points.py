@@ -236,7 +236,7 @@ def test_invalid_temporality(clean_db, sql_engine_data_source):
 
 
 @pytest.mark.parametrize("type_name", [
-    "bigint", "boolean", "jsonb"
+    "bigint", "boolean", "jsonb", "real", "integer", "smallint"
 ])
 def test_missing_temporality_insert(clean_db, sql_engine_data_source: sqlalchemy.Engine, type_name):
     """Tests whether inserting a spurious data point fails"""
@@ -250,7 +250,7 @@ def test_missing_temporality_insert(clean_db, sql_engine_data_source: sqlalchemy
 
 
 @pytest.mark.parametrize("type_name", [
-    "bigint", "boolean", "jsonb"
+    "bigint", "boolean", "jsonb", "real", "integer", "smallint"
 ])
 def test_missing_temporality_side_update(clean_db, sql_engine_data_source: sqlalchemy.Engine, type_name):
     """Tests whether inserting a spurious data point fails"""
@@ -270,7 +270,7 @@ def test_missing_temporality_side_update(clean_db, sql_engine_data_source: sqlal
 
 
 @pytest.mark.parametrize("type_name", [
-    "bigint", "boolean", "jsonb"
+    "bigint", "boolean", "jsonb", "real", "integer", "smallint"
 ])
 def test_missing_temporality_direct_update(clean_db, sql_engine_data_source: sqlalchemy.Engine, type_name):
     """Tests whether inserting a spurious data point fails"""
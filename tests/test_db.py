@@ -4,10 +4,14 @@ Runs some basic tests on the DB connection and DB version
 
 import os
 import re
+import threading
 import warnings
 
+import alembic.config
 import sqlalchemy.sql as sql
 
+import tests.db_helpers as hlp
+
 
 def test_db_version(sql_engine_postgres):
     """Test whether the DB connection is succesful and whether the DB version is as expected"""
@@ -24,3 +28,98 @@ def test_db_version(sql_engine_postgres):
         version_pattern = os.environ["RDP_EXPECTED_POSTGRES_VERSION"]
         assert re.search(version_pattern, server_version), \
             f"Unexpected server version '{server_version}', expected '{version_pattern}'"
+
+
+def test_background_jobs_restored(clean_db, sql_engine_postgres):
+    """Tests whether the migration restores the previous scheduling state of the background jobs"""
+
+    with sql_engine_postgres.begin() as con:
+        hlp.pause_jobs(con, "rdp_apply_retention_rules")
+
+    alembic.config.main(argv=['--raiseerr', 'downgrade', '-1'])
+    alembic.config.main(argv=['--raiseerr', 'upgrade', 'head'])
+
+    with sql_engine_postgres.begin() as con:
+        paused_jobs = con.execute(sql.text("""
+            SELECT proc_name FROM timescaledb_information.jobs WHERE job_id >= 1000 AND NOT scheduled;
+        """)).scalars().all()
+
+    assert paused_jobs == ["rdp_apply_retention_rules"]
+
+
+def test_background_jobs_leftovers(clean_db, sql_engine_postgres):
+    """Tests whether jobs left paused by an interrupted migration are resumed by the next migration"""
+
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("""
+            CREATE TABLE rdp_paused_jobs (
+                job_id INTEGER NOT NULL,
+                proc_name TEXT NOT NULL,
+                hypertable_name TEXT,
+                paused_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                PRIMARY KEY (job_id)
+            );
+            WITH paused AS (
+                INSERT INTO rdp_paused_jobs(job_id, proc_name, hypertable_name)
+                    SELECT job_id, proc_name, hypertable_name
+                        FROM timescaledb_information.jobs
+                        WHERE proc_name = 'rdp_apply_retention_rules'
+                    RETURNING job_id
+            )
+            SELECT alter_job(job_id, scheduled => false) FROM paused;
+        """))
+
+    alembic.config.main(argv=['--raiseerr', 'downgrade', '-1'])
+    alembic.config.main(argv=['--raiseerr', 'upgrade', 'head'])
+
+    with sql_engine_postgres.begin() as con:
+        paused_jobs = con.execute(sql.text("""
+            SELECT proc_name FROM timescaledb_information.jobs WHERE job_id >= 1000 AND NOT scheduled;
+        """)).scalars().all()
+        leftovers = con.execute(sql.text("SELECT to_regclass('rdp_paused_jobs');")).scalar_one()
+
+    assert paused_jobs == []
+    assert leftovers is None
+
+
+def test_concurrent_migrations(clean_db, sql_engine_postgres):
+    """Tests whether a migration waits for a concurrently running one before pausing the background jobs"""
+
+    with sql_engine_postgres.connect() as lock_con:
+        lock_con.execute(sql.text("SELECT pg_advisory_lock(hashtext('rdp_migration'));"))
+        migration = threading.Thread(target=alembic.config.main, kwargs=dict(argv=['--raiseerr', 'downgrade', '-1']))
+        migration.start()
+        migration.join(timeout=5)
+        is_waiting = migration.is_alive()
+        with sql_engine_postgres.begin() as con:
+            paused_table = con.execute(sql.text("SELECT to_regclass('rdp_paused_jobs');")).scalar_one()
+        lock_con.execute(sql.text("SELECT pg_advisory_unlock(hashtext('rdp_migration'));"))
+        lock_con.commit()
+    migration.join()
+    alembic.config.main(argv=['--raiseerr', 'upgrade', 'head'])
+
+    assert is_waiting
+    assert paused_table is None
+
+
+def test_migration_history(clean_db, sql_engine_postgres):
+    """Tests whether the cost of each revision is recorded"""
+
+    alembic.config.main(argv=['--raiseerr', 'downgrade', '-1'])
+    alembic.config.main(argv=['--raiseerr', 'upgrade', 'head'])
+
+    with sql_engine_postgres.begin() as con:
+        head = con.execute(sql.text("SELECT version_num FROM alembic_version;")).scalar_one()
+        res = con.execute(sql.text("""
+            SELECT direction, statement_count, affected_rows, wall_seconds, lock_wait_seconds
+                FROM rdp_migration_history
+                WHERE revision = :head
+                ORDER BY id DESC
+                LIMIT 2;
+        """), parameters=dict(head=head)).mappings().fetchall()
+
+    assert [r["direction"] for r in res] == ["upgrade", "downgrade"]
+    for r in res:
+        assert r["statement_count"] > 0
+        assert r["affected_rows"] >= 0
+        assert r["wall_seconds"] >= r["lock_wait_seconds"] >= 0
@@ -0,0 +1,120 @@
+"""
+Tests the array-valued ensemble type
+"""
+import numpy as np
+import pandas as pd
+import pytest
+import sqlalchemy.exc
+import sqlalchemy.sql as sql
+
+import tests.db_helpers as hlp
+
+
+@pytest.fixture()
+def ensemble_dps(clean_db, sql_engine_data_source) -> dict[str, int]:
+    """Creates a quantile and a plain ensemble data point including some forecasts"""
+
+    dp_ids = {
+        "quantiles": hlp.create_dp(
+            sql_engine_data_source, "pv_power", "inverter_0", "location_10", "provider_1",
+            view_role="view_internal", data_type='ensemble', temporality='bitemporal'
+        ),
+        "members": hlp.create_dp(
+            sql_engine_data_source, "pv_power", "inverter_1", "location_10", "provider_1",
+            view_role="view_internal", data_type='ensemble', temporality='bitemporal'
+        ),
+    }
+
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text("""
+            INSERT INTO data_point_ensemble_members(dp_id, member_index, label, quantile_level) VALUES
+                (:quantiles, 1, 'q10', 0.1), (:quantiles, 2, 'q50', 0.5), (:quantiles, 3, 'q90', 0.9),
+                (:members, 1, 'm0', NULL), (:members, 2, 'm1', NULL), (:members, 3, 'm2', NULL),
+                (:members, 4, 'm3', NULL);
+            INSERT INTO raw_bitemporal_ensemble(dp_id, valid_time, transaction_time, value) VALUES
+                (:quantiles, '2025-01-01T12:00:00Z', '2025-01-01T00:00:00Z', ARRAY[1, 2, 3]),
+                (:quantiles, '2025-01-01T13:00:00Z', '2025-01-01T00:00:00Z', ARRAY[4, 5, 6]),
+                (:members, '2025-01-01T12:00:00Z', '2025-01-01T00:00:00Z', ARRAY[1, 2, 3, 4]);
+        """), parameters=dp_ids)
+
+    return dp_ids
+
+
+def test_ensemble_member(ensemble_dps, sql_engine_private_vis, sql_engine_public_vis):
+    """Tests the extraction of a single member by its label including the access restrictions"""
+
+    with sql_engine_private_vis.begin() as con:
+        data = pd.read_sql(sql.text("""
+            SELECT * FROM bitemporal_ensemble_member(
+                ARRAY[:quantiles, :members], 'q90', '2025-01-01T00:00:00Z', '2025-01-02T00:00:00Z'
+            );
+        """).bindparams(**ensemble_dps), con)
+
+    pd.testing.assert_frame_equal(data, pd.DataFrame({
+        "dp_id": [ensemble_dps["quantiles"]] * 2,
+        "valid_time": pd.to_datetime(["2025-01-01T12:00:00Z", "2025-01-01T13:00:00Z"]),
+        "transaction_time": pd.to_datetime(["2025-01-01T00:00:00Z"] * 2),
+        "value": np.array([3., 6.], dtype=np.float32),
+    }), check_names=False, check_dtype=False)
+
+    with sql_engine_public_vis.begin() as con:
+        count = con.execute(sql.text("SELECT count(*) FROM ensemble_members;")).scalar_one()
+    assert count == 0
+
+
+def test_ensemble_quantile(ensemble_dps, sql_engine_private_vis):
+    """Tests the declared and the interpolated quantiles"""
+
+    with sql_engine_private_vis.begin() as con:
+        data = pd.read_sql(sql.text("""
+            SELECT dp_id, value FROM bitemporal_ensemble_quantile(
+                ARRAY[:quantiles, :members], 0.5, '2025-01-01T12:00:00Z', '2025-01-01T13:00:00Z'
+            );
+        """).bindparams(**ensemble_dps), con)
+
+    pd.testing.assert_frame_equal(data, pd.DataFrame({
+        "dp_id": [ensemble_dps["quantiles"], ensemble_dps["members"]],
+        "value": [2., 2.5],
+    }), check_names=False, check_dtype=False)
+
+
+@pytest.mark.parametrize("quantile_level,expected", [(0.3, 1.5), (0.8, 2.75), (0.05, None), (0.95, None)])
+def test_undeclared_quantile(ensemble_dps, sql_engine_private_vis, quantile_level, expected):
+    """Tests whether undeclared levels of quantile forecasts are interpolated between the declared levels"""
+
+    with sql_engine_private_vis.begin() as con:
+        value = con.execute(sql.text("""
+            SELECT value FROM bitemporal_ensemble_quantile(
+                ARRAY[:quantiles], :quantile_level, '2025-01-01T12:00:00Z', '2025-01-01T13:00:00Z'
+            );
+        """), parameters=dict(quantiles=ensemble_dps["quantiles"], quantile_level=quantile_level)).scalar_one()
+
+    assert value == (pytest.approx(expected) if expected is not None else None)
+
+
+def test_ensemble_statistics(ensemble_dps, sql_engine_private_vis):
+    """Tests the server-side mean and spread"""
+
+    with sql_engine_private_vis.begin() as con:
+        data = pd.read_sql(sql.text("""
+            SELECT dp_id, member_count, mean, spread FROM bitemporal_ensemble_statistics(
+                ARRAY[:members], '2025-01-01T00:00:00Z', '2025-01-02T00:00:00Z'
+            );
+        """).bindparams(**ensemble_dps), con)
+
+    pd.testing.assert_frame_equal(data, pd.DataFrame({
+        "dp_id": [ensemble_dps["members"]],
+        "member_count": [4],
+        "mean": [2.5],
+        "spread": [np.std([1, 2, 3, 4], ddof=1)],
+    }), check_names=False)
+
+
+def test_ensemble_requires_bitemporal(clean_db, sql_engine_data_source):
+    """Tests whether unitemporal ensemble data points are rejected"""
+
+    with pytest.raises(sqlalchemy.exc.IntegrityError, match=".*check_ensemble_temporality.*"):
+        hlp.create_dp(
+            sql_engine_data_source, "pv_power", "inverter_2", "location_10", "provider_1",
+            data_type='ensemble', temporality='unitemporal'
+        )
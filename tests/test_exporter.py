@@ -0,0 +1,95 @@
+"""
+Runs the Prometheus exporter against the test database and parses the served metrics
+"""
+import re
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+import sqlalchemy.event
+import sqlalchemy.sql as sql
+
+import rdp_db.exporter as exporter
+
+sample_pattern = re.compile(r'^([a-z_][a-z0-9_]*)(?:\{(.*)})? (\S+)$')
+label_pattern = re.compile(r'([a-z_]+)="((?:[^"\\]|\\.)*)"')
+
+
+@pytest.fixture()
+def exporter_url(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres):
+    """Polls the database with some ingested samples once as monitoring_base and serves the metrics on a free port"""
+
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text("""
+            INSERT INTO raw_unitemporal_double(dp_id, valid_time, value)
+                VALUES (:dp_id, '2020-01-01T00:00:00Z', 1.0), (:dp_id, '2020-01-01T00:01:00Z', 2.0);
+        """), parameters=dict(dp_id=basic_dp_test_set["loc2-dev0-pr-0-uni-dbl-0"]))
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("CALL rdp_aggregate_ingestion_stats(0, '{}');"))
+
+    # Proves that the grants of monitoring_base cover all metric queries
+    monitoring_engine = sqlalchemy.create_engine(sql_engine_postgres.url, pool_size=1, max_overflow=0)
+    sqlalchemy.event.listen(monitoring_engine, "connect", set_monitoring_role)
+    collector = exporter.MetricsCollector(monitoring_engine, interval=60)
+    collector.poll()
+    server = exporter.create_server(collector, "127.0.0.1", 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/metrics"
+    server.shutdown()
+    server.server_close()
+    monitoring_engine.dispose(close=True)
+
+
+def set_monitoring_role(dbapi_connection, _):
+    """Switches each new connection to the monitoring role. The commit keeps the role across the pooled sessions."""
+
+    with dbapi_connection.cursor() as cursor:
+        cursor.execute("SET ROLE monitoring_base;")
+    dbapi_connection.commit()
+
+
+def test_exporter_metrics(exporter_url):
+    """Tests whether all metric families are served in the text format"""
+
+    with urllib.request.urlopen(exporter_url) as response:
+        assert response.headers["Content-Type"] == exporter.content_type
+        exposition = response.read().decode()
+
+    types, samples = parse_exposition(exposition)
+    assert samples[("rdp_exporter_up", ())] == 1
+    expected_families = {m.name: m.kind for q in exporter.metric_queries for m in q.metrics}
+    assert {name: kind for name, kind in types.items() if not name.startswith("rdp_exporter_")} == expected_families
+
+    raw_table_label = ("hypertable", "raw_unitemporal_double")
+    assert sum(value for (name, labels), value in samples.items()
+               if name == "rdp_raw_table_chunks" and raw_table_label in labels) >= 1
+    assert ("rdp_compression_backlog_bytes", (raw_table_label,)) in samples
+    assert samples[("rdp_ingested_rows_total", (("data_type", "double"), ("temporality", "unitemporal")))] == 2
+    assert samples[("rdp_data_points_bytes", ())] > 0
+    assert any(name == "rdp_job_failures_total" for name, _ in samples)
+
+
+def test_exporter_not_found(exporter_url):
+    """Tests whether other paths are rejected"""
+
+    with pytest.raises(urllib.error.HTTPError, match="404"):
+        urllib.request.urlopen(exporter_url.replace("/metrics", "/other"))
+
+
+def parse_exposition(exposition: str) -> tuple[dict[str, str], dict[tuple[str, tuple], float]]:
+    """Parses the metric types and the samples by name and sorted labels. Fails on malformed lines."""
+
+    types, samples = {}, {}
+    for line in exposition.splitlines():
+        if line.startswith("# TYPE "):
+            name, kind = line[len("# TYPE "):].split(" ")
+            types[name] = kind
+        elif not line.startswith("# HELP "):
+            match = sample_pattern.match(line)
+            assert match is not None, f"Malformed sample: {line}"
+            labels = tuple(sorted(label_pattern.findall(match.group(2) or "")))
+            assert (match.group(1), labels) not in samples, f"Duplicate sample: {line}"
+            samples[(match.group(1), labels)] = float(match.group(3))
+    return types, samples
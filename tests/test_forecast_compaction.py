@@ -0,0 +1,60 @@
+"""
+Tests the compaction of superseded forecast versions
+"""
+import pandas as pd
+import sqlalchemy.sql as sql
+
+
+def query_forecasts(con):
+    """Queries the horizon and the latest forecasts of the compacted data point"""
+
+    horizon = pd.read_sql("""
+        SELECT obs_time, value FROM forecasts_horizon(
+                INTERVAL '6 hours', '2020-01-01T00:00:00Z', '2020-01-03T00:00:00Z',
+                'name_0', 'location_2', 'provider_2', 'device_0'
+            ) ORDER BY obs_time;
+    """, con)
+    latest = pd.read_sql("""
+        SELECT obs_time, value FROM forecasts_latest
+            WHERE name = 'name_0' AND location_code = 'location_2' AND data_provider = 'provider_2' AND
+                device_id = 'device_0'
+            ORDER BY obs_time;
+    """, con)
+    return horizon, latest
+
+
+def test_forecast_compaction(basic_dp_test_set, sql_engine_data_source, sql_engine_private_vis, sql_engine_postgres):
+    """Compacts hourly issued forecasts and ensures that the kept lead times are not affected"""
+
+    dp_id = basic_dp_test_set["loc2-dev0-pr-0-bi-dbl-0"]
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text("""
+            INSERT INTO raw_bitemporal_double(dp_id, valid_time, transaction_time, value)
+                SELECT :dp_id, vt, tt, extract(EPOCH FROM vt - tt) / 3600.0
+                    FROM generate_series('2020-01-01T00:00:00Z'::TIMESTAMPTZ, '2020-01-01T23:00:00Z', '1 hour') AS tt
+                    CROSS JOIN generate_series(
+                        '2020-01-02T00:00:00Z'::TIMESTAMPTZ, '2020-01-02T05:00:00Z', '1 hour'
+                    ) AS vt;
+        """), parameters=dict(dp_id=dp_id))
+
+    with sql_engine_private_vis.begin() as con:
+        horizon_before, latest_before = query_forecasts(con)
+
+    with sql_engine_postgres.connect() as con:
+        con = con.execution_options(isolation_level="AUTOCOMMIT")
+        con.execute(sql.text("""
+            CALL rdp_compact_forecast_versions(NULL, jsonb_build_object(
+                'compact_after', '1 day', 'keep_lead_times', jsonb_build_array('6 hours')
+            ));
+        """))
+
+    with sql_engine_private_vis.begin() as con:
+        horizon_after, latest_after = query_forecasts(con)
+    with sql_engine_postgres.begin() as con:
+        remaining_rows = con.execute(sql.text("SELECT count(*) FROM raw_bitemporal_double;")).scalar_one()
+
+    # Per valid time, the latest version and the 6-hour version remain, which coincide for the last valid time
+    assert remaining_rows == 11
+    assert len(horizon_before) == 6
+    pd.testing.assert_frame_equal(horizon_before, horizon_after)
+    pd.testing.assert_frame_equal(latest_before, latest_after)
@@ -0,0 +1,111 @@
+"""
+Tests the access to bitemporal data by transaction time
+"""
+import pandas as pd
+import pytest
+import sqlalchemy.exc
+import sqlalchemy.sql as sql
+
+
+@pytest.fixture
+def forecast_runs(basic_dp_test_set, sql_engine_data_source) -> dict[str, int]:
+    """Inserts two double runs and one bigint run and returns the data point IDs"""
+
+    dp_ids = {
+        "double": basic_dp_test_set["loc2-dev0-pr-0-bi-dbl-0"],
+        "bigint": basic_dp_test_set["loc2-dev0-pr-0-bi-int-0"],
+    }
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text("""
+            INSERT INTO raw_bitemporal_double(dp_id, valid_time, transaction_time, value) VALUES
+                (:double, '2020-01-01T01:00:00Z', '2020-01-01T00:00:00Z', 1.0),
+                (:double, '2020-01-01T02:00:00Z', '2020-01-01T00:00:00Z', 2.0),
+                (:double, '2020-01-01T07:00:00Z', '2020-01-01T06:00:00Z', 3.0);
+            INSERT INTO raw_bitemporal_bigint(dp_id, valid_time, transaction_time, value) VALUES
+                (:bigint, '2020-01-01T07:00:00Z', '2020-01-01T06:00:00Z', 42);
+        """), parameters=dp_ids)
+    return dp_ids
+
+
+def test_list_runs(forecast_runs, sql_engine_private_vis, sql_engine_public_vis):
+    """Tests the listing of the runs across multiple data types"""
+
+    with sql_engine_private_vis.begin() as con:
+        runs = pd.read_sql(sql.text("""
+            SELECT * FROM bitemporal_list_runs(ARRAY[:double, :bigint], '2020-01-01T00:00:00Z', '2020-01-02T00:00:00Z')
+                ORDER BY transaction_time, dp_id;
+        """).bindparams(**forecast_runs), con)
+
+    pd.testing.assert_frame_equal(runs, pd.DataFrame({
+        "dp_id": [forecast_runs["double"], forecast_runs["double"], forecast_runs["bigint"]],
+        "transaction_time": pd.to_datetime(["2020-01-01T00:00:00Z", "2020-01-01T06:00:00Z", "2020-01-01T06:00:00Z"]),
+        "first_valid_time": pd.to_datetime(["2020-01-01T01:00:00Z", "2020-01-01T07:00:00Z", "2020-01-01T07:00:00Z"]),
+        "last_valid_time": pd.to_datetime(["2020-01-01T02:00:00Z", "2020-01-01T07:00:00Z", "2020-01-01T07:00:00Z"]),
+        "sample_count": [2, 1, 1],
+    }), check_names=False)
+
+    with sql_engine_public_vis.begin() as con:
+        count = con.execute(sql.text("""
+            SELECT count(*) FROM bitemporal_list_runs(ARRAY[:double], '2020-01-01T00:00:00Z', '2020-01-02T00:00:00Z');
+        """), parameters=forecast_runs).scalar_one()
+    assert count == 0
+
+
+def test_delete_run(forecast_runs, sql_engine_data_source):
+    """Tests whether only the samples of the selected run are removed"""
+
+    with sql_engine_data_source.begin() as con:
+        deleted = con.execute(sql.text("""
+            SELECT rdp_delete_run(:double, '2020-01-01T00:00:00Z');
+        """), parameters=forecast_runs).scalar_one()
+        remaining = pd.read_sql(sql.text("""
+            SELECT transaction_time, value FROM raw_bitemporal_double WHERE dp_id = :double;
+        """).bindparams(double=forecast_runs["double"]), con)
+
+    assert deleted == 2
+    pd.testing.assert_frame_equal(remaining, pd.DataFrame({
+        "transaction_time": pd.to_datetime(["2020-01-01T06:00:00Z"]),
+        "value": [3.0],
+    }), check_names=False)
+
+
+def test_replace_run(forecast_runs, sql_engine_data_source):
+    """Tests the atomic replacement of a run"""
+
+    with sql_engine_data_source.begin() as con:
+        inserted = con.execute(sql.text("""
+            SELECT rdp_replace_run(
+                :bigint, '2020-01-01T06:00:00Z',
+                ARRAY['2020-01-01T08:00:00Z', '2020-01-01T09:00:00Z']::TIMESTAMPTZ[], ARRAY[7, 8]::BIGINT[]
+            );
+        """), parameters=forecast_runs).scalar_one()
+        data = pd.read_sql(sql.text("""
+            SELECT valid_time, value FROM raw_bitemporal_bigint WHERE dp_id = :bigint ORDER BY valid_time;
+        """).bindparams(bigint=forecast_runs["bigint"]), con)
+
+    assert inserted == 2
+    pd.testing.assert_frame_equal(data, pd.DataFrame({
+        "valid_time": pd.to_datetime(["2020-01-01T08:00:00Z", "2020-01-01T09:00:00Z"]),
+        "value": [7, 8],
+    }), check_names=False)
+
+
+def test_delete_run_unitemporal(basic_dp_test_set, sql_engine_data_source):
+    """Tests whether runs of unitemporal data points are rejected"""
+
+    with pytest.raises(sqlalchemy.exc.InternalError, match=".*Invalid data point.*"):
+        with sql_engine_data_source.begin() as con:
+            con.execute(sql.text("SELECT rdp_delete_run(:dp_id, '2020-01-01T00:00:00Z');"),
+                        parameters=dict(dp_id=basic_dp_test_set["loc2-dev0-pr-0-uni-dbl-0"]))
+
+
+def test_delete_run_permissions(forecast_runs, sql_engine_data_source, sql_engine_private_vis):
+    """Tests whether samples can only be removed run-wise by the data sources"""
+
+    with pytest.raises(sqlalchemy.exc.ProgrammingError, match=".*permission denied.*"):
+        with sql_engine_data_source.begin() as con:
+            con.execute(sql.text("DELETE FROM raw_bitemporal_double WHERE dp_id = :double;"), parameters=forecast_runs)
+
+    with pytest.raises(sqlalchemy.exc.ProgrammingError, match=".*permission denied.*"):
+        with sql_engine_private_vis.begin() as con:
+            con.execute(sql.text("SELECT rdp_delete_run(:double, '2020-01-01T00:00:00Z');"), parameters=forecast_runs)
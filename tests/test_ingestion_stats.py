@@ -0,0 +1,116 @@
+"""
+Tests the per data point ingestion statistics and the freshness view
+"""
+import datetime
+
+import pytest
+import sqlalchemy.sql as sql
+
+import tests.db_helpers as hlp
+
+
+def aggregate_stats(eng):
+    """Runs the aggregation job once"""
+
+    with eng.begin() as con:
+        con.execute(sql.text("CALL rdp_aggregate_ingestion_stats(0, '{}');"))
+
+
+def get_freshness(eng, dp_id) -> dict:
+    """Returns the freshness of the data point or None, if it is not visible"""
+
+    with eng.begin() as con:
+        row = con.execute(sql.text("SELECT * FROM rdp_ingestion_freshness WHERE dp_id = :dp_id;"),
+                          parameters=dict(dp_id=dp_id)).one_or_none()
+    return row._asdict() if row is not None else None
+
+
+def test_ingestion_counters(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres, sql_engine_private_vis):
+    """Tests whether the stored samples are counted and the counters accumulate across job runs"""
+
+    dp_id = basic_dp_test_set["loc2-dev0-pr-0-uni-dbl-0"]
+    hlp.insert_minute_samples(sql_engine_data_source, dp_id, [1.0, 2.0, 3.0])
+    aggregate_stats(sql_engine_postgres)
+    hlp.insert_minute_samples(sql_engine_data_source, dp_id, [4.0, 5.0, 6.0, 7.0], start="2020-01-01T00:03:00Z")
+    aggregate_stats(sql_engine_postgres)
+
+    freshness = get_freshness(sql_engine_private_vis, dp_id)
+    assert freshness["total_rows"] == 7
+    assert freshness["rows_last_hour"] == 7 and freshness["rows_last_day"] == 7
+    assert freshness["rejected_rows"] == 0
+    assert freshness["last_valid_time"] == datetime.datetime(2020, 1, 1, 0, 6, tzinfo=datetime.timezone.utc)
+    assert freshness["last_ingest_time"] is not None
+
+    with sql_engine_postgres.begin() as con:
+        assert con.execute(sql.text("SELECT count(*) FROM rdp_ingestion_queue;")).scalar_one() == 0
+
+
+@pytest.mark.parametrize("table_name,dp_name,value", [
+    ("raw_unitemporal_real", "loc2-dev0-pr-0-uni-real-0", 1.5),
+    ("raw_unitemporal_integer", "loc2-dev0-pr-0-uni-int32-0", 100000),
+    ("raw_unitemporal_smallint", "loc2-dev0-pr-0-uni-int16-0", 404),
+    ("raw_unitemporal_bigint", "loc2-dev0-pr-0-uni-int-0", -1000),
+])
+def test_typed_ingestion(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres, sql_engine_private_vis,
+                         table_name, dp_name, value):
+    """Tests whether the samples of the other value types are counted as well"""
+
+    dp_id = basic_dp_test_set[dp_name]
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text(f"""
+            INSERT INTO {table_name}(dp_id, valid_time, value) VALUES
+                (:dp_id, '2020-01-01T00:00:00Z', :value), (:dp_id, '2020-01-01T00:01:00Z', :value);
+        """), parameters=dict(dp_id=dp_id, value=value))
+    aggregate_stats(sql_engine_postgres)
+
+    freshness = get_freshness(sql_engine_private_vis, dp_id)
+    assert freshness["total_rows"] == 2
+
+
+def test_tracked_raw_tables(clean_db, sql_engine_postgres):
+    """Tests whether every raw table tracks the stored samples"""
+
+    with sql_engine_postgres.begin() as con:
+        untracked = con.execute(sql.text("""
+            SELECT ht.hypertable_name
+                FROM timescaledb_information.hypertables AS ht
+                WHERE ht.hypertable_schema = 'public' AND starts_with(ht.hypertable_name, 'raw_') AND NOT EXISTS (
+                    SELECT FROM pg_trigger AS tr
+                        WHERE tr.tgrelid = format('%I.%I', ht.hypertable_schema, ht.hypertable_name)::REGCLASS AND
+                            tr.tgname = 'track_ingestion'
+                );
+        """)).scalars().all()
+
+    assert untracked == []
+
+
+def test_rejected_samples(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres, sql_engine_private_vis):
+    """Tests whether the samples dropped by the deadband filter are counted as rejected"""
+
+    dp_id = basic_dp_test_set["loc2-dev0-pr-0-uni-dbl-0"]
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("UPDATE data_points SET change_only = TRUE WHERE id = :dp_id;"),
+                    parameters=dict(dp_id=dp_id))
+
+    hlp.insert_minute_samples(sql_engine_data_source, dp_id, [1.0, 1.0, 1.0, 2.0, 2.0, 1.0])
+    aggregate_stats(sql_engine_postgres)
+
+    freshness = get_freshness(sql_engine_private_vis, dp_id)
+    assert freshness["total_rows"] == 3 and freshness["rejected_rows"] == 3
+    assert freshness["last_rejected_time"] is not None
+
+
+def test_freshness_access(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres, sql_engine_private_vis,
+                          sql_engine_public_vis):
+    """Tests whether the freshness view applies the access policies of the data points"""
+
+    dp_private = basic_dp_test_set["loc2-dev0-pr-0-uni-dbl-0"]
+    dp_public = basic_dp_test_set["loc2-dev0-pub-0-uni-dbl-1"]
+    hlp.insert_minute_samples(sql_engine_data_source, dp_private, [1.0])
+    hlp.insert_minute_samples(sql_engine_data_source, dp_public, [1.0])
+    aggregate_stats(sql_engine_postgres)
+
+    assert get_freshness(sql_engine_private_vis, dp_private) is not None
+    assert get_freshness(sql_engine_private_vis, dp_public) is not None
+    assert get_freshness(sql_engine_public_vis, dp_private) is None
+    assert get_freshness(sql_engine_public_vis, dp_public) is not None
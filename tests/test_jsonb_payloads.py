@@ -0,0 +1,144 @@
+"""
+Tests the deduplicated storage of the jsonb payloads
+"""
+import pandas as pd
+import pytest
+import sqlalchemy.dialects
+import sqlalchemy.engine
+import sqlalchemy.exc
+import sqlalchemy.sql as sql
+
+
+@pytest.mark.parametrize("temporality,value_a,value_b,dp_a,dp_b", [
+    (
+            "unitemporal", {"yippee": "objects"}, "Nö möre umlautß!", "loc2-dev0-pr-0-uni-json-0",
+            "loc2-dev0-pub-0-uni-json-1"
+    ),
+    (
+            "bitemporal", {"yippee": "objects"}, "Nö möre umlautß!", "loc2-dev0-pr-0-bi-json-0",
+            "loc2-dev0-pub-0-bi-json-1"
+    ),
+])
+def test_raw_jsonb_access(
+        basic_dp_test_set, sql_engine_data_source: sqlalchemy.engine.Engine,
+        temporality, value_a, value_b, dp_a, dp_b
+):
+    """Tests whether the inserted payloads are moved to the store and referenced by the raw tables"""
+    dp_id_a = basic_dp_test_set[dp_a]
+    dp_id_b = basic_dp_test_set[dp_b]
+
+    transaction_column = "" if temporality == "unitemporal" else ", transaction_time"
+    transaction_time = "" if temporality == "unitemporal" else ", '2024-01-01T00:00:00Z'"
+
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text(f"""
+            INSERT INTO raw_{temporality}_jsonb(dp_id, valid_time, value{transaction_column}) VALUES
+                (:dp_id_a, '2025-01-01T00:00:00Z', :value_a{transaction_time}),
+                (:dp_id_b, '2025-01-01T12:00:00Z', :value_b{transaction_time}),
+                (:dp_id_b, '2025-01-01T13:00:00Z', :value_a{transaction_time})
+        """).bindparams(
+            sql.bindparam("value_a", value_a, type_=sqlalchemy.dialects.postgresql.JSONB),
+            sql.bindparam("value_b", value_b, type_=sqlalchemy.dialects.postgresql.JSONB),
+            sql.bindparam("dp_id_a", dp_id_a), sql.bindparam("dp_id_b", dp_id_b),
+        ))
+
+        data = pd.read_sql(f"""
+            SELECT raw.dp_id, raw.valid_time, raw.value AS inline_value, pl.payload
+                FROM raw_{temporality}_jsonb AS raw
+                JOIN rdp_jsonb_payloads AS pl ON (raw.payload_hash = pl.payload_hash)
+                ORDER BY raw.dp_id, raw.valid_time;
+        """, con)
+        payload_count = con.execute(sql.text("SELECT count(*) FROM rdp_jsonb_payloads;")).scalar_one()
+
+    pd.testing.assert_frame_equal(data, pd.DataFrame({
+        "dp_id": [dp_id_a, dp_id_b, dp_id_b],
+        "valid_time": pd.to_datetime(["2025-01-01T00:00:00Z", "2025-01-01T12:00:00Z", "2025-01-01T13:00:00Z"]),
+        "inline_value": [None] * 3,
+        "payload": [value_a, value_b, value_a]
+    }), check_names=False)
+    assert payload_count == 2
+
+
+def test_store_jsonb_payloads(clean_db, sql_engine_data_source):
+    """Tests the set-wise storage of the payloads"""
+
+    with sql_engine_data_source.begin() as con:
+        hashes = con.execute(sql.text("""
+            SELECT rdp_store_jsonb_payloads(ARRAY[
+                    jsonb_build_object('mode', 'auto'), jsonb_build_object('mode', 'manual'),
+                    jsonb_build_object('mode', 'auto'), NULL
+                ]);
+        """)).scalar_one()
+        payload_count = con.execute(sql.text("SELECT count(*) FROM rdp_jsonb_payloads;")).scalar_one()
+
+    assert len(hashes) == 4
+    assert hashes[0] == hashes[2]
+    assert hashes[0] != hashes[1]
+    assert hashes[3] is None
+    assert payload_count == 2
+
+
+def test_unknown_payload_hash(basic_dp_test_set, sql_engine_data_source):
+    """Tests whether references to payloads that have not been stored are rejected"""
+
+    with pytest.raises(sqlalchemy.exc.InternalError, match=".*Unknown payload hash.*"):
+        with sql_engine_data_source.begin() as con:
+            con.execute(sql.text("""
+                INSERT INTO raw_unitemporal_jsonb(dp_id, valid_time, payload_hash)
+                    VALUES (:dp_id, '2025-01-01T00:00:00Z', sha256('missing'::BYTEA));
+            """), parameters=dict(dp_id=basic_dp_test_set["loc2-dev0-pr-0-uni-json-0"]))
+
+
+def test_jsonb_change_only(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres, sql_engine_private_vis):
+    """Tests the deadband filter on the payload references and the rehydration via the details view"""
+
+    dp_id = basic_dp_test_set["loc2-dev0-pr-0-uni-json-0"]
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("UPDATE data_points SET change_only = TRUE WHERE id = :dp_id;"),
+                    parameters=dict(dp_id=dp_id))
+
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text("""
+            INSERT INTO raw_unitemporal_jsonb(dp_id, valid_time, value) VALUES
+                (:dp_id, '2025-01-01T00:00:00Z', jsonb_build_object('mode', 'auto')),
+                (:dp_id, '2025-01-01T01:00:00Z', jsonb_build_object('mode', 'auto')),
+                (:dp_id, '2025-01-01T02:00:00Z', jsonb_build_object('mode', 'manual'));
+        """), parameters=dict(dp_id=dp_id))
+
+    with sql_engine_private_vis.begin() as con:
+        data = pd.read_sql("SELECT dp_id, value FROM unitemporal_jsonb_details ORDER BY valid_time;", con)
+
+    pd.testing.assert_frame_equal(data, pd.DataFrame({
+        "dp_id": [dp_id] * 2,
+        "value": [{"mode": "auto"}, {"mode": "manual"}]
+    }), check_names=False)
+
+
+def test_purge_jsonb_payloads(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres):
+    """Tests whether only unreferenced payloads are purged after the grace period"""
+
+    dp_id = basic_dp_test_set["loc2-dev0-pr-0-uni-json-0"]
+    with sql_engine_data_source.begin() as con:
+        hashes = con.execute(sql.text("""
+            SELECT rdp_store_jsonb_payloads(ARRAY[
+                    jsonb_build_object('mode', 'auto'), jsonb_build_object('mode', 'manual')
+                ]);
+        """)).scalar_one()
+
+    # The hashes have not been inserted yet, but the payloads are recently stored
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("CALL rdp_purge_jsonb_payloads();"))
+        assert con.execute(sql.text("SELECT count(*) FROM rdp_jsonb_payloads;")).scalar_one() == 2
+
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text("""
+            INSERT INTO raw_unitemporal_jsonb(dp_id, valid_time, payload_hash)
+                VALUES (:dp_id, '2025-01-01T00:00:00Z', :payload_hash);
+        """), parameters=dict(dp_id=dp_id, payload_hash=hashes[0]))
+
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("""
+            CALL rdp_purge_jsonb_payloads(config => jsonb_build_object('grace_period', '0 seconds'));
+        """))
+        remaining = con.execute(sql.text("SELECT payload_hash FROM rdp_jsonb_payloads;")).scalars().all()
+    assert remaining == [hashes[0]]
@@ -0,0 +1,181 @@
+"""
+Tests the monitoring views that attribute the query statistics to the rdp objects
+"""
+import pytest
+import sqlalchemy.engine
+import sqlalchemy.exc
+import sqlalchemy.sql as sql
+
+import tests.db_helpers as hlp
+
+monitoring_views = [
+    "rdp_monitoring_objects", "rdp_monitoring_statements", "rdp_monitoring_object_stats", "rdp_monitoring_table_stats",
+    "rdp_monitoring_job_stats", "rdp_monitoring_hypertable_health", "rdp_monitoring_largest_segments",
+    "rdp_monitoring_compression_jobs", "rdp_monitoring_ingestion_stats", "rdp_data_migration_status",
+]
+
+
+def test_monitored_objects(clean_db, sql_engine_postgres):
+    """Tests whether the details views, the functions and the raw tables are monitored"""
+
+    with sql_engine_postgres.begin() as con:
+        objects = con.execute(sql.text("SELECT object_type, object_name FROM rdp_monitoring_objects;")).all()
+        raw_tables = con.execute(sql.text("""
+            SELECT hypertable_name FROM timescaledb_information.hypertables
+                WHERE hypertable_schema = 'public' AND starts_with(hypertable_name, 'raw_');
+        """)).scalars().all()
+
+    assert ("details_view", "unitemporal_double_details") in objects
+    assert ("details_view", "measurements_details") in objects
+    assert ("horizon_function", "forecasts_horizon") in objects
+    assert ("resolver_function", "rdp_resolve_data_point_info") in objects
+    assert ("resolver_function", "get_or_create_data_point_id") in objects
+    assert {name for object_type, name in objects if object_type == "raw_table"} == set(raw_tables)
+
+
+def test_table_stats(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres):
+    """Tests whether each raw table is listed and its chunks are counted"""
+
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text("""
+            INSERT INTO raw_unitemporal_double(dp_id, valid_time, value)
+                VALUES (:dp_id, '2025-01-01 00:00:00+00', 1.0), (:dp_id, '2025-01-10 00:00:00+00', 2.0);
+        """), parameters=dict(dp_id=basic_dp_test_set["loc2-dev0-pr-0-uni-dbl-0"]))
+
+    with sql_engine_postgres.begin() as con:
+        stats = {
+            r.hypertable_name: r for r in
+            con.execute(sql.text("SELECT * FROM rdp_monitoring_table_stats;")).all()
+        }
+        raw_tables = con.execute(sql.text("""
+            SELECT object_name FROM rdp_monitoring_objects WHERE object_type = 'raw_table';
+        """)).scalars().all()
+
+    assert set(stats.keys()) == set(raw_tables)
+    assert stats["raw_unitemporal_double"].chunk_count >= 1
+
+
+def test_job_stats(clean_db, sql_engine_postgres):
+    """Tests whether the compression jobs of the raw tables are reported"""
+
+    with sql_engine_postgres.begin() as con:
+        jobs = con.execute(sql.text("""
+            SELECT hypertable_name FROM rdp_monitoring_job_stats WHERE proc_name = 'policy_compression';
+        """)).scalars().all()
+
+    assert "raw_unitemporal_double" in jobs
+    assert "raw_bitemporal_double" in jobs
+
+
+def test_statement_stats(basic_dp_test_set, sql_engine_postgres):
+    """Tests whether the queries are attributed to the objects, if pg_stat_statements collects statistics"""
+
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("SELECT count(*) FROM unitemporal_double_details;"))
+
+    with sql_engine_postgres.begin() as con:
+        collecting = con.execute(sql.text("""
+            SELECT 'pg_stat_statements' = ANY(string_to_array(
+                    replace(current_setting('shared_preload_libraries'), ' ', ''), ','
+                )) AND EXISTS (SELECT FROM pg_extension WHERE extname = 'pg_stat_statements');
+        """)).scalar_one()
+        stats = con.execute(sql.text("""
+            SELECT * FROM rdp_monitoring_object_stats WHERE object_name = 'unitemporal_double_details';
+        """)).one()
+
+    if collecting:
+        assert stats.calls >= 1
+        assert stats.mean_time_ms is not None and stats.p95_time_ms >= 0
+    else:
+        assert stats.calls == 0 and stats.statement_count == 0
+
+
+def test_statement_stats_permissions(clean_db, sql_engine_postgres):
+    """Tests whether the monitoring role only reads the statements on the rdp objects and no utility statements"""
+
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("ALTER ROLE monitoring_base NOLOGIN;"))  # A utility statement referring to no rdp object
+        con.execute(sql.text("SELECT count(*) FROM unitemporal_double_details;"))
+
+    with sql_engine_postgres.begin() as con:
+        queries = con.execute(sql.text("SELECT query FROM rdp_monitoring_statement_stats();")).scalars().all()
+        assert not any("ALTER ROLE" in q.upper() for q in queries)
+
+        con.execute(sql.text("SET LOCAL ROLE monitoring_base;"))
+        objects = con.execute(sql.text("SELECT DISTINCT object_name FROM rdp_monitoring_object_statements();"))
+        assert set(objects.scalars().all()) <= set(con.execute(sql.text("""
+            SELECT object_name FROM rdp_monitoring_objects;
+        """)).scalars().all())
+
+    with pytest.raises(sqlalchemy.exc.ProgrammingError, match="permission denied"):
+        with sql_engine_postgres.begin() as con:
+            con.execute(sql.text("SET LOCAL ROLE monitoring_base;"))
+            con.execute(sql.text("SELECT * FROM rdp_monitoring_statement_stats();")).all()
+
+
+def test_compression_backlog(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres):
+    """Tests whether old uncompressed chunks are reported as backlog until they are compressed"""
+
+    dp_id = basic_dp_test_set["loc2-dev0-pr-0-uni-dbl-0"]
+    with sql_engine_postgres.begin() as con:
+        # Keep the chunks uncompressed until they are compressed explicitly
+        hlp.pause_jobs(con)
+
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text("""
+            INSERT INTO raw_unitemporal_double(dp_id, valid_time, value)
+                SELECT :dp_id, t, random()
+                    FROM generate_series('2025-01-01 00:00:00+00'::TIMESTAMPTZ, '2025-01-03 00:00:00+00', '1 min') AS t;
+        """), parameters=dict(dp_id=dp_id))
+
+    with sql_engine_postgres.begin() as con:
+        health = get_health(con, "raw_unitemporal_double")
+        assert health.chunk_count >= 1
+        assert health.backlog_chunk_count == health.uncompressed_chunk_count == health.chunk_count
+        assert health.backlog_bytes > 0
+        assert health.compression_ratio is None
+
+        con.execute(sql.text("SELECT compress_chunk(c) FROM show_chunks('raw_unitemporal_double') AS c;"))
+        health = get_health(con, "raw_unitemporal_double")
+        assert health.compressed_chunk_count == health.chunk_count
+        assert health.backlog_chunk_count == 0 and health.backlog_bytes == 0
+        assert health.compression_ratio > 1
+
+        segments = con.execute(sql.text("""
+            SELECT * FROM rdp_monitoring_largest_segments WHERE hypertable_name = 'raw_unitemporal_double';
+        """)).all()
+        assert [(s.dp_id, s.row_count) for s in segments] == [(dp_id, 2 * 24 * 60 + 1)]
+        assert segments[0].chunk_count == health.chunk_count and segments[0].compressed_bytes > 0
+
+
+def test_compression_jobs(clean_db, sql_engine_postgres):
+    """Tests whether the compression jobs of all raw tables are reported"""
+
+    with sql_engine_postgres.begin() as con:
+        jobs = con.execute(sql.text("SELECT * FROM rdp_monitoring_compression_jobs;")).all()
+        raw_tables = con.execute(sql.text("""
+            SELECT hypertable_name FROM rdp_monitoring_hypertable_health WHERE compress_after IS NOT NULL;
+        """)).scalars().all()
+
+    assert {j.hypertable_name for j in jobs} == set(raw_tables)
+    assert not any(j.is_failed for j in jobs)
+
+
+@pytest.mark.parametrize("view_name", monitoring_views)
+def test_monitoring_permissions(clean_db, sql_engine_postgres, sql_engine_private_vis, view_name):
+    """Tests whether the views are only readable by the monitoring role"""
+
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("SET LOCAL ROLE monitoring_base;"))
+        con.execute(sql.text(f"SELECT * FROM {view_name};")).all()
+
+    with pytest.raises(sqlalchemy.exc.ProgrammingError, match="permission denied"):
+        with sql_engine_private_vis.begin() as con:
+            con.execute(sql.text(f"SELECT * FROM {view_name};")).all()
+
+
+def get_health(con: sqlalchemy.engine.Connection, hypertable_name: str) -> sqlalchemy.engine.Row:
+    """Returns the health of the given raw table"""
+
+    return con.execute(sql.text("SELECT * FROM rdp_monitoring_hypertable_health WHERE hypertable_name = :name;"),
+                       parameters=dict(name=hypertable_name)).one()
@@ -0,0 +1,85 @@
+"""
+Tests the index builds that do not block the writers
+"""
+import pytest
+import sqlalchemy.exc
+import sqlalchemy.sql as sql
+
+import rdp_db.utils.online_index as online_index
+
+
+def get_index_validity(con, index_name: str) -> bool | None:
+    """Returns whether the index is valid or None, if it does not exist"""
+
+    return con.execute(sql.text("""
+        SELECT idx.indisvalid
+            FROM pg_index AS idx
+            JOIN pg_class AS cls ON (cls.oid = idx.indexrelid)
+            WHERE cls.relname = :index_name;
+    """), parameters=dict(index_name=index_name)).scalar_one_or_none()
+
+
+def test_plain_table_index(basic_dp_test_set, sql_engine_postgres):
+    """Tests building and dropping an index concurrently"""
+
+    with sql_engine_postgres.connect() as con:
+        con = con.execution_options(isolation_level="AUTOCOMMIT")
+        online_index.create_index(con, "data_points_test_unit_idx", "data_points", "unit", where="unit IS NOT NULL")
+        assert get_index_validity(con, "data_points_test_unit_idx") is True
+
+        # Reruns of the revision must not fail
+        online_index.create_index(con, "data_points_test_unit_idx", "data_points", "unit", where="unit IS NOT NULL")
+
+        online_index.drop_index(con, "data_points_test_unit_idx", "data_points")
+        assert get_index_validity(con, "data_points_test_unit_idx") is None
+
+
+def test_hypertable_index(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres):
+    """Tests building an index one chunk at a time"""
+
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text("""
+            INSERT INTO raw_unitemporal_double(dp_id, valid_time, value)
+                SELECT :dp_id, valid_time, 1.0
+                    FROM generate_series(
+                        '2020-01-01T00:00:00Z'::TIMESTAMPTZ, '2020-01-20T00:00:00Z', INTERVAL '1 hour'
+                    ) AS valid_time;
+        """), parameters=dict(dp_id=basic_dp_test_set["loc2-dev0-pr-0-uni-dbl-0"]))
+
+    with sql_engine_postgres.connect() as con:
+        con = con.execution_options(isolation_level="AUTOCOMMIT")
+        online_index.create_index(con, "raw_unitemporal_double_test_value_idx", "raw_unitemporal_double",
+                                  "value, valid_time DESC")
+        assert get_index_validity(con, "raw_unitemporal_double_test_value_idx") is True
+
+        chunk_indexes = con.execute(sql.text("""
+            SELECT count(*)
+                FROM show_chunks('raw_unitemporal_double') AS chunk
+                JOIN pg_index AS idx ON (idx.indrelid = chunk)
+                JOIN pg_class AS cls ON (cls.oid = idx.indexrelid)
+                WHERE cls.relname LIKE '%test_value_idx';
+        """)).scalar_one()
+        chunk_count = con.execute(sql.text("SELECT count(*) FROM show_chunks('raw_unitemporal_double');")).scalar_one()
+        assert chunk_indexes == chunk_count
+
+        online_index.drop_index(con, "raw_unitemporal_double_test_value_idx", "raw_unitemporal_double")
+        assert get_index_validity(con, "raw_unitemporal_double_test_value_idx") is None
+
+
+def test_failed_build_cleanup(basic_dp_test_set, sql_engine_postgres):
+    """Tests whether the invalid index of a failed build is removed"""
+
+    with sql_engine_postgres.connect() as con:
+        con = con.execution_options(isolation_level="AUTOCOMMIT")
+        with pytest.raises(sqlalchemy.exc.IntegrityError, match=".*could not create unique index.*"):
+            online_index.create_index(con, "data_points_test_location_idx", "data_points", "location_code",
+                                      unique=True)
+        assert get_index_validity(con, "data_points_test_location_idx") is None
+
+
+def test_transaction_rejected(basic_dp_test_set, sql_engine_postgres):
+    """Tests whether building an index within the migration transaction is rejected"""
+
+    with sql_engine_postgres.begin() as con:
+        with pytest.raises(ValueError, match=".*autocommit.*"):
+            online_index.create_index(con, "data_points_test_unit_idx", "data_points", "unit")
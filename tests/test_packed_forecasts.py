@@ -0,0 +1,109 @@
+"""
+Tests the packed storage of regularly sampled forecast runs
+"""
+import pandas as pd
+import pytest
+import sqlalchemy.exc
+import sqlalchemy.sql as sql
+
+
+@pytest.fixture
+def packed_runs(basic_dp_test_set, sql_engine_data_source):
+    """Inserts two overlapping runs and returns the data point ID"""
+
+    dp_id = basic_dp_test_set["loc2-dev0-pr-0-bi-dbl-0"]
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text("""
+            INSERT INTO raw_bitemporal_double_packed(dp_id, transaction_time, valid_from, step, value_array) VALUES
+                (:dp_id, '2020-01-01T00:00:00Z', '2020-01-01T01:00:00Z', INTERVAL '1 hour', ARRAY[1, 2, 3, 4]),
+                (:dp_id, '2020-01-01T02:00:00Z', '2020-01-01T03:00:00Z', INTERVAL '1 hour', ARRAY[10, 20, 30]);
+        """), parameters=dict(dp_id=dp_id))
+    return dp_id
+
+
+def test_packed_details(packed_runs, sql_engine_data_source, sql_engine_private_vis, sql_engine_public_vis):
+    """Tests the derived end of the runs and the unpacking view including the access restrictions"""
+
+    with sql_engine_data_source.begin() as con:
+        valid_to = pd.read_sql("""
+            SELECT valid_to FROM raw_bitemporal_double_packed ORDER BY transaction_time;
+        """, con)
+    pd.testing.assert_frame_equal(valid_to, pd.DataFrame({
+        "valid_to": pd.to_datetime(["2020-01-01T05:00:00Z", "2020-01-01T06:00:00Z"]),
+    }), check_names=False)
+
+    with sql_engine_private_vis.begin() as con:
+        data = pd.read_sql("""
+            SELECT dp_id, valid_time, transaction_time, value, name, location_code
+                FROM bitemporal_double_packed_details 
+                ORDER BY transaction_time, valid_time;
+        """, con)
+    pd.testing.assert_frame_equal(data, pd.DataFrame({
+        "dp_id": [packed_runs] * 7,
+        "valid_time": pd.to_datetime([
+            "2020-01-01T01:00:00Z", "2020-01-01T02:00:00Z", "2020-01-01T03:00:00Z", "2020-01-01T04:00:00Z",
+            "2020-01-01T03:00:00Z", "2020-01-01T04:00:00Z", "2020-01-01T05:00:00Z",
+        ]),
+        "transaction_time": pd.to_datetime(["2020-01-01T00:00:00Z"] * 4 + ["2020-01-01T02:00:00Z"] * 3),
+        "value": [1., 2., 3., 4., 10., 20., 30.],
+        "name": ["name_0"] * 7,
+        "location_code": ["location_2"] * 7,
+    }), check_names=False)
+
+    with sql_engine_public_vis.begin() as con:
+        count = con.execute(sql.text("SELECT count(*) FROM bitemporal_double_packed_details;")).scalar_one()
+    assert count == 0
+
+
+def test_packed_latest(packed_runs, sql_engine_private_vis):
+    """Tests whether the latest run overrides the previous ones within the requested range"""
+
+    with sql_engine_private_vis.begin() as con:
+        data = pd.read_sql(sql.text("""
+            SELECT * FROM bitemporal_double_packed_latest(
+                ARRAY[:dp_id], '2020-01-01T01:30:00Z', '2020-01-01T06:00:00Z'
+            );
+        """).bindparams(dp_id=packed_runs), con)
+
+    pd.testing.assert_frame_equal(data, pd.DataFrame({
+        "dp_id": [packed_runs] * 4,
+        "valid_time": pd.to_datetime([
+            "2020-01-01T02:00:00Z", "2020-01-01T03:00:00Z", "2020-01-01T04:00:00Z", "2020-01-01T05:00:00Z"
+        ]),
+        "transaction_time": pd.to_datetime(["2020-01-01T00:00:00Z"] + ["2020-01-01T02:00:00Z"] * 3),
+        "value": [2., 10., 20., 30.],
+    }), check_names=False)
+
+
+def test_packed_horizon(packed_runs, sql_engine_private_vis):
+    """Tests whether only values that have been forecast at least the horizon in advance are returned"""
+
+    with sql_engine_private_vis.begin() as con:
+        data = pd.read_sql(sql.text("""
+            SELECT * FROM bitemporal_double_packed_horizon(
+                ARRAY[:dp_id], INTERVAL '2 hours', '2020-01-01T00:00:00Z', '2020-01-01T06:00:00Z'
+            );
+        """).bindparams(dp_id=packed_runs), con)
+
+    pd.testing.assert_frame_equal(data, pd.DataFrame({
+        "dp_id": [packed_runs] * 4,
+        "valid_time": pd.to_datetime([
+            "2020-01-01T02:00:00Z", "2020-01-01T03:00:00Z", "2020-01-01T04:00:00Z", "2020-01-01T05:00:00Z"
+        ]),
+        "transaction_time": pd.to_datetime(["2020-01-01T00:00:00Z"] * 2 + ["2020-01-01T02:00:00Z"] * 2),
+        "value": [2., 3., 20., 30.],
+    }), check_names=False)
+
+
+@pytest.mark.parametrize("step, value_count", [("1 month", 2), ("1 day", 2), ("1 hour", 745)])
+def test_packed_invalid_runs(step, value_count, basic_dp_test_set, sql_engine_data_source):
+    """Tests whether steps of varying duration and runs exceeding the maximum run length are rejected"""
+
+    with pytest.raises(sqlalchemy.exc.IntegrityError):
+        with sql_engine_data_source.begin() as con:
+            con.execute(sql.text("""
+                INSERT INTO raw_bitemporal_double_packed(dp_id, transaction_time, valid_from, step, value_array)
+                    VALUES (:dp_id, '2020-01-01T00:00:00Z', '2020-01-01T01:00:00Z', CAST(:step AS INTERVAL),
+                        array_fill(1.0::DOUBLE PRECISION, ARRAY[:value_count]));
+            """), parameters=dict(dp_id=basic_dp_test_set["loc2-dev0-pr-0-bi-dbl-0"], step=step,
+                                  value_count=value_count))
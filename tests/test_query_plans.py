@@ -0,0 +1,351 @@
+"""
+Checks the structural properties of the query plans of the public views and functions
+
+Performance regressions typically stem from the plan shape: time filters that do not exclude chunks anymore, correlated
+subqueries that are executed per row or sequential scans on data_points. Hence, the plans of typical queries are
+captured on a data set that spans several chunks of each raw table. Since the row level security of the data points
+adds filters, which may change the shape, the plans are captured for each login role. The plans of the views are
+captured via EXPLAIN and the ones of the statements within functions via auto_explain.
+
+The data set is far smaller than a production one, such that the planner would rightfully prefer sequential scans.
+Hence, sequential scans are disabled while capturing the plans, which still reveals whether an index is usable at all.
+"""
+import datetime
+import difflib
+import json
+import os
+
+import pytest
+import sqlalchemy.engine
+import sqlalchemy.exc
+import sqlalchemy.sql as sql
+
+import benchmarks.data_generator as gen
+import tests.db_helpers as hlp
+
+plan_config = gen.GeneratorConfig(
+    data_points=4, days=10, sampling_interval=datetime.timedelta(hours=1),
+    issue_interval=datetime.timedelta(hours=12), horizon=datetime.timedelta(days=1),
+    end=datetime.datetime(2025, 1, 10, tzinfo=datetime.timezone.utc)
+)
+last_day = dict(begin=plan_config.end - datetime.timedelta(days=1), end=plan_config.end)
+
+# The login roles by the environment variable of the user name. The admin user queries without switching the role.
+plan_roles = dict(admin=None, private_vis="POSTGRES_DATA_VIS_USER", public_vis="POSTGRES_DATA_PUB_VIS_USER")
+
+single_series_filter = """
+    name = :name AND device_id = :device_id AND location_code = :location_code AND data_provider = :data_provider
+"""
+
+
+def get_plan_queries() -> list[dict]:
+    """
+    Returns the checked queries
+
+    Each query refers to the series of a raw table, if any, and lists the checked properties:
+    - chunk_exclusion: Only the chunks of the hypertable that overlap the requested time range are scanned
+    - raw_index: The chunks of the raw tables are not scanned sequentially
+    - data_points_index: The data_points table is not scanned sequentially
+    - no_subplan: No subquery is executed per row
+    - data_type_filter: Only the data points of the hypertable's data type are read from data_points
+    """
+
+    queries = []
+    for temporality, type_name in gen.raw_tables:
+        details = f"{temporality}_{type_name}_details"
+        queries.append(dict(
+            name=f"{details}_single", series=(temporality, type_name), hypertable=f"raw_{temporality}_{type_name}",
+            statement=f"""
+                SELECT * FROM {details}
+                    WHERE {single_series_filter} AND valid_time >= :begin AND valid_time < :end;
+            """, checks=["chunk_exclusion", "raw_index", "data_points_index", "no_subplan"]
+        ))
+        queries.append(dict(
+            name=f"{details}_all", series=None, hypertable=f"raw_{temporality}_{type_name}",
+            statement=f"""
+                SELECT * FROM {details}
+                    WHERE data_provider = :data_provider AND valid_time >= :begin AND valid_time < :end;
+            """, checks=["chunk_exclusion", "no_subplan"]
+        ))
+
+    for view, temporality in [("measurements", "unitemporal"), ("forecasts", "bitemporal")]:
+        for suffix in ["", "_samples"]:
+            queries.append(dict(
+                name=f"{view}{suffix}", series=(temporality, "double"), hypertable=f"raw_{temporality}_double",
+                statement=f"""
+                    SELECT * FROM {view}{suffix} WHERE dp_id = :dp_id AND obs_time >= :begin AND obs_time < :end;
+                """, checks=["chunk_exclusion", "raw_index"]
+            ))
+        queries.append(dict(
+            name=f"{view}_details", series=(temporality, "double"), hypertable=f"raw_{temporality}_double",
+            statement=f"""
+                SELECT * FROM {view}_details
+                    WHERE {single_series_filter} AND obs_time >= :begin AND obs_time < :end;
+            """, checks=["chunk_exclusion", "raw_index", "data_points_index", "no_subplan"]
+        ))
+
+    queries.append(dict(
+        name="forecasts_latest_single", series=("bitemporal", "double"), hypertable="raw_bitemporal_double",
+        statement=f"""
+            SELECT * FROM forecasts_latest WHERE {single_series_filter} AND obs_time >= :begin AND obs_time < :end;
+        """, checks=["chunk_exclusion", "raw_index", "data_points_index", "no_subplan"]
+    ))
+    queries.append(dict(
+        name="forecasts_latest_all", series=None, hypertable="raw_bitemporal_double",
+        statement="""
+            SELECT * FROM forecasts_latest
+                WHERE data_provider = :data_provider AND obs_time >= :begin AND obs_time < :end;
+        """, checks=["chunk_exclusion", "no_subplan"]
+    ))
+    queries.append(dict(
+        name="forecasts_latest_unfiltered", series=None, hypertable="raw_bitemporal_double",
+        statement="SELECT * FROM forecasts_latest WHERE obs_time >= :begin AND obs_time < :end;",
+        checks=["chunk_exclusion", "no_subplan", "data_type_filter"]
+    ))
+
+    queries.append(dict(
+        name="forecasts_horizon", series=("bitemporal", "double"), hypertable="raw_bitemporal_double", function=True,
+        statement="""
+            SELECT * FROM forecasts_horizon(
+                INTERVAL '6 hours', :begin, :end, :name, :location_code, :data_provider, :device_id
+            );
+        """, checks=["chunk_exclusion", "raw_index", "data_points_index"]
+    ))
+    queries.append(dict(
+        name="bitemporal_list_runs", series=None, hypertable=None, function=True,
+        statement="SELECT * FROM bitemporal_list_runs(CAST(:dp_ids AS INTEGER[]), :begin, :end);",
+        checks=["raw_index", "data_points_index"]
+    ))
+    return queries
+
+
+plan_queries = get_plan_queries()
+
+
+@pytest.fixture()
+def plan_test_set(clean_db, sql_engine_data_source, sql_engine_postgres) -> dict[tuple[str, str], int]:
+    """
+    Loads the data set, which spans several chunks of each raw table
+
+    :return: The ID of the first, public series of each raw table by (temporality, type_name)
+    """
+
+    with sql_engine_postgres.begin() as con:
+        # Keep all chunks uncompressed, such that the plans do not depend on the timing of the background jobs
+        hlp.pause_jobs(con)
+
+    dp_ids = {}
+    for temporality, type_name in gen.raw_tables:
+        with sql_engine_data_source.begin() as con:
+            series_ids = gen.create_data_points(con, plan_config, "raw_table", temporality, type_name)
+            statement = gen.get_insert_statement(f"raw_{temporality}_{type_name}", temporality, type_name)
+            for index, dp_id in enumerate(series_ids):
+                for batch in gen.generate_batches(plan_config, temporality, type_name, index):
+                    con.execute(statement, parameters=dict(batch, dp_id=dp_id))
+        dp_ids[(temporality, type_name)] = series_ids[0]
+
+    with sql_engine_postgres.connect() as con:
+        for temporality, type_name in gen.raw_tables:
+            con.execute(sql.text(f"ANALYZE raw_{temporality}_{type_name};"))
+        con.execute(sql.text("ANALYZE data_points;"))
+        con.commit()
+
+    return dp_ids
+
+
+@pytest.mark.parametrize("query", plan_queries, ids=[query["name"] for query in plan_queries])
+def test_query_plan(plan_test_set, sql_engine_postgres, query):
+    """Captures the plans of the query for each login role and checks their structural properties"""
+
+    parameters = dict(last_day, data_provider=gen.benchmark_provider, dp_ids=[
+        dp_id for (temporality, _), dp_id in plan_test_set.items() if temporality == "bitemporal"
+    ])
+    if query["series"] is not None:
+        parameters.update(gen.get_series_key("raw_table", *query["series"], 0), dp_id=plan_test_set[query["series"]])
+
+    with sql_engine_postgres.connect() as con:
+        chunks = get_chunks(con)
+
+    rendered_plans, reports = {}, []
+    for role, user_variable in plan_roles.items():
+        plans = capture_plans(sql_engine_postgres, query, parameters, user_variable)
+        if plans is None:
+            continue
+        assert len(plans) > 0, f"No plan of {query['name']} has been captured for {role}"
+        violations = find_violations(plans, query, chunks, parameters)
+        rendered_plans[role] = [line for plan in plans for line in render_plan(plan)]
+        if len(violations) > 0:
+            reports.append(format_report(role, plans, violations, rendered_plans))
+
+    assert "admin" in rendered_plans
+    assert len(reports) == 0, "\n\n".join(reports)
+
+
+def test_latest_forecasts(plan_test_set, sql_engine_postgres):
+    """Ensures that the latest forecasts view selects the most recent forecast of each observation time"""
+
+    parameters = dict(last_day, dp_id=plan_test_set[("bitemporal", "double")])
+    with sql_engine_postgres.connect() as con:
+        latest = con.execute(sql.text("""
+            SELECT obs_time, fc_time, value FROM forecasts_latest
+                WHERE dp_id = :dp_id AND obs_time >= :begin AND obs_time < :end
+                ORDER BY obs_time;
+        """), parameters=parameters).all()
+        reference = con.execute(sql.text("""
+            SELECT fc_full.valid_time, fc_full.transaction_time, fc_full.value
+                FROM raw_bitemporal_double AS fc_full
+                WHERE fc_full.dp_id = :dp_id AND fc_full.valid_time >= :begin AND fc_full.valid_time < :end AND
+                    fc_full.transaction_time = (
+                        SELECT max(fc_red.transaction_time)
+                            FROM raw_bitemporal_double AS fc_red
+                            WHERE fc_red.dp_id = fc_full.dp_id AND fc_red.valid_time = fc_full.valid_time
+                    )
+                ORDER BY fc_full.valid_time;
+        """), parameters=parameters).all()
+
+    assert len(latest) == 24
+    assert [tuple(row) for row in latest] == [tuple(row) for row in reference]
+
+
+def get_chunks(con: sqlalchemy.engine.Connection) -> dict[str, dict]:
+    """Returns the hypertable and the time range of each chunk by its name"""
+
+    return {
+        row["chunk_name"]: row for row in con.execute(sql.text("""
+            SELECT chunk_name, hypertable_name, range_start, range_end
+                FROM timescaledb_information.chunks
+                WHERE hypertable_schema = 'public';
+        """)).mappings()
+    }
+
+
+def capture_plans(engine: sqlalchemy.engine.Engine, query: dict, parameters: dict,
+                  user_variable: str | None) -> list[dict] | None:
+    """
+    Captures the plan of the query or, for functions, the plans of all executed statements
+
+    :param engine: The engine of the admin user, which may switch to the role of any user
+    :param query: The query as in get_plan_queries()
+    :param parameters: The bound parameters of the statement
+    :param user_variable: The environment variable of the login role or None to keep the admin role
+    :return: The plan trees or None, if the role is not permitted to execute the query
+    """
+
+    with engine.connect() as con:
+        if query.get("function", False):
+            # The statements of PL/pgSQL functions are hidden in EXPLAIN, but auto_explain reports them as notices
+            con.execute(sql.text("LOAD 'auto_explain';"))
+            con.execute(sql.text("""
+                SET LOCAL auto_explain.log_min_duration = 0;
+                SET LOCAL auto_explain.log_nested_statements = on;
+                SET LOCAL auto_explain.log_format = 'json';
+                SET LOCAL auto_explain.log_level = 'notice';
+                SET LOCAL client_min_messages = 'notice';
+            """))
+        con.execute(sql.text("SET LOCAL enable_seqscan = off; SET LOCAL jit = off;"))
+        if user_variable is not None:
+            con.execute(sql.text(f"SET LOCAL ROLE {os.environ[user_variable]};"))
+
+        try:
+            if not query.get("function", False):
+                result = con.execute(sql.text(f"EXPLAIN (FORMAT JSON) {query['statement']}"),
+                                     parameters=parameters).scalar_one()
+                return [plan["Plan"] for plan in (json.loads(result) if isinstance(result, str) else result)]
+
+            notices = con.connection.dbapi_connection.notices
+            del notices[:]
+            con.execute(sql.text(query["statement"]), parameters=parameters).all()
+            return [json.loads(notice[notice.index("{"):])["Plan"] for notice in notices if "plan:" in notice]
+        except sqlalchemy.exc.ProgrammingError as e:
+            if getattr(e.orig, "pgcode", None) != "42501":  # insufficient_privilege
+                raise
+            return None
+        finally:
+            con.rollback()
+
+
+def iterate_nodes(plan: dict):
+    """Yields all nodes of the plan tree in depth-first order"""
+
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from iterate_nodes(child)
+
+
+def find_violations(plans: list[dict], query: dict, chunks: dict[str, dict], parameters: dict) -> dict[int, str]:
+    """
+    Checks the structural properties of the plans
+
+    :return: The violation by the id() of the violating node
+    """
+
+    violations = {}
+    nodes = [node for plan in plans for node in iterate_nodes(plan)]
+    raw_relations = {name for name, chunk in chunks.items() if chunk["hypertable_name"].startswith("raw_")}
+
+    if "chunk_exclusion" in query["checks"]:
+        hypertable_chunks = {name: c for name, c in chunks.items() if c["hypertable_name"] == query["hypertable"]}
+        scanning_nodes = [node for node in nodes if node.get("Relation Name") in hypertable_chunks]
+        if len(scanning_nodes) == 0:
+            violations[id(plans[0])] = f"no chunk of {query['hypertable']} is scanned"
+        for node in scanning_nodes:
+            chunk = hypertable_chunks[node["Relation Name"]]
+            if chunk["range_start"] > parameters["end"] or chunk["range_end"] <= parameters["begin"]:
+                violations[id(node)] = "the chunk is outside of the requested time range"
+
+    for node in nodes:
+        relation = node.get("Relation Name")
+        if node["Node Type"] != "Seq Scan":
+            continue
+        if "raw_index" in query["checks"] and (relation in raw_relations or relation.startswith("raw_")):
+            violations[id(node)] = "the raw table is scanned sequentially"
+        if "data_points_index" in query["checks"] and relation == "data_points":
+            violations[id(node)] = "data_points is scanned sequentially"
+
+    if "data_type_filter" in query["checks"]:
+        for node in nodes:
+            conditions = " ".join(node.get(key, "") for key in ("Filter", "Index Cond", "Recheck Cond"))
+            if node.get("Relation Name") == "data_points" and "data_type" not in conditions:
+                violations[id(node)] = "data_points is not filtered by the data type"
+
+    if "no_subplan" in query["checks"]:
+        for node in nodes:
+            if node.get("Parent Relationship") == "SubPlan":
+                violations[id(node)] = "the subquery is executed per row"
+
+    return violations
+
+
+def render_plan(plan: dict, violations: dict[int, str] = None, depth: int = 0) -> list[str]:
+    """Renders the plan as indented tree with one line per node and optionally marks the violations"""
+
+    node_type = plan["Node Type"]
+    if node_type == "Custom Scan":
+        node_type = f"Custom Scan ({plan['Custom Plan Provider']})"
+    line = "  " * depth + ("-> " if depth > 0 else "") + node_type
+    if "Subplan Name" in plan:
+        line += f" [{plan['Subplan Name']}]"
+    if "Relation Name" in plan:
+        line += f" on {plan['Relation Name']}"
+    if "Index Name" in plan:
+        line += f" using {plan['Index Name']}"
+    if violations is not None and id(plan) in violations:
+        line += f"    <-- {violations[id(plan)]}"
+
+    lines = [line]
+    for child in plan.get("Plans", []):
+        lines.extend(render_plan(child, violations, depth + 1))
+    return lines
+
+
+def format_report(role: str, plans: list[dict], violations: dict[int, str], rendered_plans: dict[str, list]) -> str:
+    """Describes the violations of a role including the marked plan and its difference to the plan of the admin"""
+
+    lines = [f"The plan of {role} violates {len(violations)} properties:"]
+    lines.extend(line for plan in plans for line in render_plan(plan, violations))
+    if role != "admin" and "admin" in rendered_plans:
+        diff = list(difflib.unified_diff(rendered_plans["admin"], rendered_plans[role], fromfile="admin",
+                                         tofile=role, lineterm=""))
+        lines.append("Difference to the plan of admin:" if len(diff) > 0 else "The plan of admin is identical.")
+        lines.extend(diff)
+    return "\n".join(lines)
@@ -15,10 +15,9 @@ import sqlalchemy.dialects
     ("raw_unitemporal_double", -123.4, -567.8, "loc2-dev0-pr-0-uni-dbl-0", "loc2-dev0-pub-0-uni-dbl-1", None),
     ("raw_unitemporal_bigint", -1000, 2200, "loc2-dev0-pr-0-uni-int-0", "loc2-dev0-pub-0-uni-int-1", None),
     ("raw_unitemporal_boolean", True, False, "loc2-dev0-pr-0-uni-bool-0", "loc2-dev0-pub-0-uni-bool-1", None),
-    (
-            "raw_unitemporal_jsonb", {"yippee": "objects"}, "Nö möre umlautß!", "loc2-dev0-pr-0-uni-json-0",
-            "loc2-dev0-pub-0-uni-json-1", sqlalchemy.dialects.postgresql.JSONB
-    ),
+    ("raw_unitemporal_real", 123.5, -0.25, "loc2-dev0-pr-0-uni-real-0", "loc2-dev0-pub-0-uni-real-1", None),
+    ("raw_unitemporal_integer", -100000, 2200, "loc2-dev0-pr-0-uni-int32-0", "loc2-dev0-pub-0-uni-int32-1", None),
+    ("raw_unitemporal_smallint", -1000, 404, "loc2-dev0-pr-0-uni-int16-0", "loc2-dev0-pub-0-uni-int16-1", None),
 ])
 def test_raw_unitemporal_access(
         basic_dp_test_set, sql_engine_data_source: sqlalchemy.engine.Engine,
@@ -55,10 +54,9 @@ def test_raw_unitemporal_access(
     ("raw_bitemporal_double", -123.4, -567.8, "loc2-dev0-pr-0-bi-dbl-0", "loc2-dev0-pub-0-bi-dbl-1", None),
     ("raw_bitemporal_bigint", -1000, 2200, "loc2-dev0-pr-0-bi-int-0", "loc2-dev0-pub-0-bi-int-1", None),
     ("raw_bitemporal_boolean", True, False, "loc2-dev0-pr-0-bi-bool-0", "loc2-dev0-pub-0-bi-bool-1", None),
-    (
-            "raw_bitemporal_jsonb", {"yippee": "objects"}, "Nö möre umlautß!", "loc2-dev0-pr-0-bi-json-0",
-            "loc2-dev0-pub-0-bi-json-1", sqlalchemy.dialects.postgresql.JSONB
-    ),
+    ("raw_bitemporal_real", 123.5, -0.25, "loc2-dev0-pr-0-bi-real-0", "loc2-dev0-pub-0-bi-real-1", None),
+    ("raw_bitemporal_integer", -100000, 2200, "loc2-dev0-pr-0-bi-int32-0", "loc2-dev0-pub-0-bi-int32-1", None),
+    ("raw_bitemporal_smallint", -1000, 404, "loc2-dev0-pr-0-bi-int16-0", "loc2-dev0-pub-0-bi-int16-1", None),
 ])
 def test_raw_bitemporal_access(
         basic_dp_test_set, sql_engine_data_source: sqlalchemy.engine.Engine,
@@ -97,6 +95,9 @@ def test_raw_bitemporal_access(
     ("raw_unitemporal_bigint", "loc2-dev0-pub-0-bi-int-1", "loc2-dev0-pub-0-uni-dbl-1"),
     ("raw_unitemporal_boolean", "loc2-dev0-pub-0-bi-bool-1", "loc2-dev0-pub-0-uni-int-1"),
     ("raw_unitemporal_jsonb", "loc2-dev0-pub-0-bi-json-1", "loc2-dev0-pub-0-uni-bool-1"),
+    ("raw_unitemporal_real", "loc2-dev0-pub-0-bi-real-1", "loc2-dev0-pub-0-uni-dbl-1"),
+    ("raw_unitemporal_integer", "loc2-dev0-pub-0-bi-int32-1", "loc2-dev0-pub-0-uni-int-1"),
+    ("raw_unitemporal_smallint", "loc2-dev0-pub-0-bi-int16-1", "loc2-dev0-pub-0-uni-int32-1"),
 ])
 def test_raw_unitemporal_invalid_inserts(
         basic_dp_test_set, sql_engine_data_source: sqlalchemy.engine.Engine,
@@ -128,6 +129,9 @@ def test_raw_unitemporal_invalid_inserts(
     ("raw_bitemporal_bigint", "loc2-dev0-pub-0-uni-int-1", "loc2-dev0-pub-0-bi-dbl-1"),
     ("raw_bitemporal_boolean", "loc2-dev0-pub-0-uni-bool-1", "loc2-dev0-pub-0-bi-int-1"),
     ("raw_bitemporal_jsonb", "loc2-dev0-pub-0-uni-json-1", "loc2-dev0-pub-0-bi-bool-1"),
+    ("raw_bitemporal_real", "loc2-dev0-pub-0-uni-real-1", "loc2-dev0-pub-0-bi-dbl-1"),
+    ("raw_bitemporal_integer", "loc2-dev0-pub-0-uni-int32-1", "loc2-dev0-pub-0-bi-int-1"),
+    ("raw_bitemporal_smallint", "loc2-dev0-pub-0-uni-int16-1", "loc2-dev0-pub-0-bi-int32-1"),
 ])
 def test_raw_bitemporal_invalid_inserts(
         basic_dp_test_set, sql_engine_data_source: sqlalchemy.engine.Engine,
@@ -166,9 +170,23 @@ def test_hypertables_enabled(clean_db, sql_engine_postgres):
 
     pd.testing.assert_frame_equal(hypertables, pd.DataFrame({
         "hypertable_name": [
-            "raw_bitemporal_bigint", "raw_bitemporal_boolean", "raw_bitemporal_double", "raw_bitemporal_jsonb",
-            "raw_unitemporal_bigint", "raw_unitemporal_boolean", "raw_unitemporal_double", "raw_unitemporal_jsonb"
+            "raw_bitemporal_bigint", "raw_bitemporal_boolean", "raw_bitemporal_category", "raw_bitemporal_double",
+            "raw_bitemporal_double_packed", "raw_bitemporal_ensemble", "raw_bitemporal_integer", "raw_bitemporal_jsonb",
+            "raw_bitemporal_real", "raw_bitemporal_smallint", "raw_unitemporal_bigint", "raw_unitemporal_boolean",
+            "raw_unitemporal_category", "raw_unitemporal_double", "raw_unitemporal_integer", "raw_unitemporal_jsonb",
+            "raw_unitemporal_real", "raw_unitemporal_smallint"
         ],
-        "num_dimensions": [1] * 8,
-        "compression_enabled": [True] * 8
+        "num_dimensions": [1] * 18,
+        "compression_enabled": [True] * 18
     }), check_names=False)
+
+
+def test_numeric_storage_comparison(clean_db, sql_engine_postgres):
+    """Checks whether the storage comparison of the numeric types reports all types"""
+
+    with sql_engine_postgres.begin() as con:
+        report = pd.read_sql("SELECT * FROM rdp_compare_numeric_storage(1000);", con)
+
+    assert list(report["data_type"]) == ["double precision", "real", "integer", "smallint"]
+    assert (report["uncompressed_bytes"] > 0).all()
+    assert (report["compressed_bytes"] > 0).all()
@@ -0,0 +1,75 @@
+"""
+Tests the chunk-based retention policies and the rule-based retention of selected data points
+"""
+import pandas as pd
+import sqlalchemy.sql as sql
+
+
+def test_raw_retention_policy(clean_db, sql_engine_postgres):
+    """Tests setting, replacing and removing the chunk-based retention policy"""
+
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("SELECT rdp_set_raw_retention('raw_unitemporal_double', INTERVAL '30 days');"))
+        con.execute(sql.text("SELECT rdp_set_raw_retention('raw_unitemporal_double', INTERVAL '60 days');"))
+        policies = pd.read_sql("""
+            SELECT hypertable_name, (config ->> 'drop_after')::INTERVAL AS drop_after
+                FROM timescaledb_information.jobs
+                WHERE proc_name = 'policy_retention';
+        """, con)
+
+    pd.testing.assert_frame_equal(policies, pd.DataFrame({
+        "hypertable_name": ["raw_unitemporal_double"],
+        "drop_after": [pd.Timedelta(days=60)],
+    }), check_names=False)
+
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("SELECT rdp_set_raw_retention('raw_unitemporal_double', NULL);"))
+        policies = pd.read_sql("SELECT job_id FROM timescaledb_information.jobs WHERE proc_name = 'policy_retention';",
+                               con)
+
+    assert len(policies) == 0, "The retention policy has not been removed"
+
+
+def test_retention_rules(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres):
+    """Tests the dry run report and the deletion of the rule-based retention"""
+
+    dp_expiring = basic_dp_test_set["loc2-dev0-pr-0-uni-dbl-0"]  # provider_1
+    dp_kept = basic_dp_test_set["loc0-dev0-pub-0"]  # provider_0
+
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text("""
+            INSERT INTO raw_unitemporal_double(dp_id, valid_time, value) VALUES
+                (:dp_expiring, '2020-01-01T00:00:00Z', 1.0),
+                (:dp_expiring, '2020-01-01T12:00:00Z', 2.0),
+                (:dp_expiring, now() - INTERVAL '1 hour', 3.0),
+                (:dp_kept, '2020-01-01T00:00:00Z', 4.0),
+                (:dp_kept, now() - INTERVAL '1 hour', 5.0);
+        """), parameters=dict(dp_expiring=dp_expiring, dp_kept=dp_kept))
+
+    with sql_engine_postgres.begin() as con:
+        rule_id = con.execute(sql.text("""
+            INSERT INTO rdp_retention_rules(data_provider, retention_period, description) VALUES
+                ('provider_1', INTERVAL '365 days', 'Keep provider 1 for one year')
+                RETURNING id;
+        """)).scalar_one()
+
+        report = pd.read_sql("SELECT * FROM rdp_retention_dry_run();", con)
+
+    assert list(report["rule_id"]) == [rule_id]
+    assert list(report["hypertable_name"]) == ["raw_unitemporal_double"]
+    assert list(report["affected_rows"]) == [2]
+    assert report["reclaimable_bytes"].iloc[0] > 0
+
+    with sql_engine_postgres.connect() as con:
+        con = con.execution_options(isolation_level="AUTOCOMMIT")
+        con.execute(sql.text("CALL rdp_apply_retention_rules(NULL, NULL);"))
+
+    with sql_engine_postgres.begin() as con:
+        data = pd.read_sql("""
+            SELECT dp_id, value FROM raw_unitemporal_double ORDER BY dp_id, valid_time;
+        """, con)
+
+    pd.testing.assert_frame_equal(data, pd.DataFrame({
+        "dp_id": [dp_kept, dp_kept, dp_expiring],
+        "value": [4.0, 5.0, 3.0]
+    }), check_names=False)
@@ -0,0 +1,80 @@
+"""
+Tests the fast start of the migration environment and the detection of manual schema changes
+"""
+import pathlib
+
+import alembic.config
+import alembic.script
+import pytest
+import sqlalchemy.exc
+import sqlalchemy.sql as sql
+
+import rdp_db.utils.schema_state as schema_state
+import tests.db_helpers as hlp
+
+
+@pytest.fixture()
+def heads() -> set[str]:
+    """Returns the heads of the revision files"""
+
+    return schema_state.find_heads([pathlib.Path(__file__).parent.parent / "rdp_db" / "core"])
+
+
+def test_find_heads(heads, tmp_path):
+    """Tests whether the heads are determined from the revision files without loading them"""
+
+    script = alembic.script.ScriptDirectory.from_config(alembic.config.Config("alembic.ini"))
+    assert heads == set(script.get_heads())
+
+    (tmp_path / "rev_a.py").write_text("revision = 'a'\ndown_revision = None\n")
+    (tmp_path / "rev_b.py").write_text("revision: str = 'b'\ndown_revision: str | None = 'a'\n")
+    (tmp_path / "rev_c.py").write_text("revision = 'c'\ndown_revision = 'a'\n")
+    assert schema_state.find_heads([tmp_path]) == {"b", "c"}
+
+    (tmp_path / "rev_d.py").write_text("revision = 'd'\ndown_revision = ('b', 'c')\n")
+    (tmp_path / "helpers.py").write_text("value = 1\n")
+    assert schema_state.find_heads([tmp_path]) == {"d"}
+
+
+def test_fast_start(clean_db, heads, sql_engine_postgres, monkeypatch):
+    """Tests whether an upgrade of a database at head returns without creating the database"""
+
+    with sql_engine_postgres.begin() as con:
+        assert schema_state.check(con, heads) == (True, [])
+        assert schema_state.check(con, heads | {"other"}) == (False, [])
+
+        # The operational state does not count as a change of the schema
+        hlp.pause_jobs(con)
+        assert schema_state.check(con, heads) == (True, [])
+
+    # Creating the database would fail with the invalid init URL
+    monkeypatch.setenv("RDP_POSTGRES_URL_INIT", "invalid")
+    alembic.config.main(argv=['--raiseerr', 'upgrade', 'head'])
+
+    monkeypatch.setenv("RDP_FAST_START", "off")
+    with pytest.raises(sqlalchemy.exc.ArgumentError):
+        alembic.config.main(argv=['--raiseerr', 'upgrade', 'head'])
+
+
+def test_schema_drift(clean_db, heads, sql_engine_postgres, monkeypatch):
+    """Tests whether manually altered views are reported and kept as drift after upgrades without revisions"""
+
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("""
+            CREATE VIEW rdp_ingestion_freshness_copy AS SELECT * FROM rdp_ingestion_freshness WHERE FALSE;
+        """))
+        con.execute(sql.text("COMMENT ON VIEW rdp_ingestion_freshness IS 'Manually altered';"))
+
+        up_to_date, drift = schema_state.check(con, heads)
+    assert not up_to_date
+    assert any(d.startswith("relations: rdp_ingestion_freshness_copy is unexpected") for d in drift)
+    assert any(d.startswith("comments: view public.rdp_ingestion_freshness differs") for d in drift)
+
+    # The upgrade runs as usual and keeps the recorded state
+    alembic.config.main(argv=['--raiseerr', 'upgrade', 'head'])
+    with sql_engine_postgres.begin() as con:
+        assert schema_state.check(con, heads) == (False, drift)
+
+    monkeypatch.setenv("RDP_SCHEMA_DRIFT", "fail")
+    with pytest.raises(RuntimeError, match="rdp_ingestion_freshness_copy"):
+        alembic.config.main(argv=['--raiseerr', 'upgrade', 'head'])
@@ -0,0 +1,227 @@
+"""
+Tests the hash partitioning of the raw tables by dp_id
+"""
+import json
+
+import pandas as pd
+import pytest
+import sqlalchemy.exc
+import sqlalchemy.sql as sql
+
+import rdp_db.utils.space_partitioning as space_partitioning
+
+
+def insert_cross_series_data(basic_dp_test_set, sql_engine_data_source):
+    """Inserts one day of samples for all double data points"""
+
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text("""
+            INSERT INTO raw_unitemporal_double(dp_id, valid_time, value)
+                SELECT dp.id, series.valid_time, random()
+                    FROM data_points AS dp
+                    CROSS JOIN generate_series(
+                        '2025-01-01T00:00:00Z'::TIMESTAMPTZ, '2025-01-01T23:59:00Z', INTERVAL '1 minute'
+                    ) AS series(valid_time)
+                    WHERE dp.data_type = 'double' AND (dp.temporality IS NULL OR dp.temporality = 'unitemporal');
+        """))
+
+
+def set_space_partitioning(eng, hypertable: str, number_partitions: int) -> int:
+    """Partitions the raw table outside a transaction, since the chunks are copied in separate transactions"""
+
+    with eng.connect() as con:
+        con = con.execution_options(isolation_level="AUTOCOMMIT")
+        return space_partitioning.set_space_partitioning(con, hypertable, number_partitions)
+
+
+def test_space_partitioning_existing_data(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres):
+    """Tests whether the existing samples are kept and distributed over multiple chunks of the same time slice"""
+
+    insert_cross_series_data(basic_dp_test_set, sql_engine_data_source)
+    with sql_engine_postgres.begin() as con:
+        rows_before = con.execute(sql.text("SELECT count(*) FROM raw_unitemporal_double;")).scalar_one()
+        details_before = con.execute(sql.text("SELECT count(*) FROM unitemporal_double_details;")).scalar_one()
+    copied_chunks = set_space_partitioning(sql_engine_postgres, "raw_unitemporal_double", 4)
+
+    with sql_engine_postgres.begin() as con:
+        rows_after = con.execute(sql.text("SELECT count(*) FROM raw_unitemporal_double;")).scalar_one()
+        details_after = con.execute(sql.text("SELECT count(*) FROM unitemporal_double_details;")).scalar_one()
+        dimensions = pd.read_sql("""
+            SELECT column_name, dimension_type, num_partitions
+                FROM timescaledb_information.dimensions
+                WHERE hypertable_name = 'raw_unitemporal_double'
+                ORDER BY dimension_number;
+        """, con)
+        chunks_per_slice = con.execute(sql.text("""
+            SELECT max(chunk_count) FROM (
+                SELECT count(*) AS chunk_count
+                    FROM timescaledb_information.chunks
+                    WHERE hypertable_name = 'raw_unitemporal_double'
+                    GROUP BY range_start
+            ) AS slices;
+        """)).scalar_one()
+
+    assert rows_before > 0
+    assert copied_chunks > 0
+    assert rows_after == rows_before
+    assert details_after == details_before
+    assert list(dimensions["column_name"]) == ["valid_time", "dp_id"]
+    assert list(dimensions["dimension_type"]) == ["Time", "Space"]
+    assert dimensions["num_partitions"].iloc[1] == 4
+    assert chunks_per_slice > 1
+
+
+def test_space_partitioning_parallel_scan(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres):
+    """Tests whether cross-series aggregations scan the chunks of a time slice by parallel workers"""
+
+    assert set_space_partitioning(sql_engine_postgres, "raw_unitemporal_double", 4) == 0  # Empty table
+    insert_cross_series_data(basic_dp_test_set, sql_engine_data_source)
+
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("""
+            SET LOCAL max_parallel_workers_per_gather = 4;
+            SET LOCAL parallel_setup_cost = 0;
+            SET LOCAL parallel_tuple_cost = 0;
+            SET LOCAL min_parallel_table_scan_size = 0;
+            ANALYZE raw_unitemporal_double;
+        """))
+        plan = con.execute(sql.text("""
+            EXPLAIN (FORMAT JSON)
+            SELECT time_bucket(INTERVAL '1 hour', valid_time) AS bucket, avg(value)
+                FROM raw_unitemporal_double
+                WHERE valid_time >= '2025-01-01T00:00:00Z' AND valid_time < '2025-01-02T00:00:00Z'
+                GROUP BY bucket;
+        """)).scalar_one()
+
+    plan_text = json.dumps(plan)
+    assert '"Workers Planned"' in plan_text, "No parallel workers planned"
+    assert plan_text.count('"Parallel Aware": true') > 1, "Not multiple chunks scanned in parallel"
+
+
+def test_space_partitioning_compression(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres):
+    """Tests whether the compression is still segmented by dp_id and the chunks can be compressed"""
+
+    insert_cross_series_data(basic_dp_test_set, sql_engine_data_source)
+    set_space_partitioning(sql_engine_postgres, "raw_unitemporal_double", 4)
+
+    with sql_engine_postgres.begin() as con:
+        rows_before = con.execute(sql.text("SELECT count(*) FROM raw_unitemporal_double;")).scalar_one()
+        con.execute(sql.text("SELECT compress_chunk(c) FROM show_chunks('raw_unitemporal_double') AS c;"))
+        rows_after = con.execute(sql.text("SELECT count(*) FROM raw_unitemporal_double;")).scalar_one()
+        segmentby = pd.read_sql("""
+            SELECT attname FROM timescaledb_information.compression_settings
+                WHERE hypertable_name = 'raw_unitemporal_double' AND segmentby_column_index IS NOT NULL;
+        """, con)
+        uncompressed_chunks = con.execute(sql.text("""
+            SELECT count(*) FROM timescaledb_information.chunks
+                WHERE hypertable_name = 'raw_unitemporal_double' AND NOT is_compressed;
+        """)).scalar_one()
+
+    assert list(segmentby["attname"]) == ["dp_id"]
+    assert rows_after == rows_before
+    assert uncompressed_chunks == 0
+
+
+def test_space_partitioning_swap(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres):
+    """Tests whether changes during the rebuild are copied and the triggers and keys are active after the swap"""
+
+    insert_cross_series_data(basic_dp_test_set, sql_engine_data_source)
+    dp_id = basic_dp_test_set["loc2-dev0-pr-0-uni-dbl-0"]
+    with sql_engine_postgres.connect() as con:
+        con = con.execution_options(isolation_level="AUTOCOMMIT")
+        con.execute(sql.text("SELECT rdp_set_space_partitioning('raw_unitemporal_double', 4);"))
+        con.execute(sql.text("""
+            SELECT rdp_copy_space_partitioning_chunk(c) FROM show_chunks('raw_unitemporal_double') AS c;
+        """))
+
+    # Changes the already copied samples before the swap
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text("""
+            UPDATE raw_unitemporal_double SET value = 42 WHERE dp_id = :dp_id;
+            INSERT INTO raw_unitemporal_double(dp_id, valid_time, value) VALUES (:dp_id, '2025-01-02T00:00:00Z', 43);
+        """), parameters=dict(dp_id=dp_id))
+
+    with sql_engine_postgres.begin() as con:
+        recopied_rows = con.execute(sql.text("""
+            SELECT rdp_finish_space_partitioning('raw_unitemporal_double');
+        """)).scalar_one()
+        values = con.execute(sql.text("""
+            SELECT DISTINCT value FROM raw_unitemporal_double WHERE dp_id = :dp_id ORDER BY value;
+        """), parameters=dict(dp_id=dp_id)).scalars().all()
+        names = con.execute(sql.text("""
+            SELECT conname FROM pg_constraint WHERE conrelid = 'raw_unitemporal_double'::REGCLASS
+            UNION ALL
+            SELECT tgname FROM pg_trigger WHERE tgrelid = 'raw_unitemporal_double'::REGCLASS AND NOT tgisinternal;
+        """)).scalars().all()
+        leftovers = con.execute(sql.text("""
+            SELECT to_regclass('rdp_partitioning_raw_unitemporal_double'),
+                to_regclass('raw_unitemporal_double_unpartitioned');
+        """)).one()
+
+    assert recopied_rows > 0
+    assert values == [42, 43]
+    assert "raw_unitemporal_double_pkey" in names
+    assert "check_type" in names and "deadband_filter" in names
+    assert tuple(leftovers) == (None, None)
+
+    # The foreign keys and the type check of the original table apply to the new table
+    with pytest.raises(sqlalchemy.exc.IntegrityError):
+        with sql_engine_data_source.begin() as con:
+            con.execute(sql.text("""
+                INSERT INTO raw_unitemporal_double(dp_id, valid_time, value) VALUES (-1, '2025-01-03T00:00:00Z', 1);
+            """))
+    with pytest.raises(sqlalchemy.exc.InternalError, match=".*Invalid data type.*"):
+        with sql_engine_data_source.begin() as con:
+            con.execute(sql.text("""
+                INSERT INTO raw_unitemporal_double(dp_id, valid_time, value) VALUES (:dp_id, '2025-01-03T00:00:00Z', 1);
+            """), parameters=dict(dp_id=basic_dp_test_set["loc2-dev0-pr-0-uni-json-0"]))
+
+
+def test_space_partitioning_packed_runs(basic_dp_test_set, sql_engine_data_source, sql_engine_postgres):
+    """Tests the rebuild of a raw table having a different time column and the transfer of all its jobs"""
+
+    dp_id = basic_dp_test_set["loc2-dev0-pr-0-bi-dbl-0"]
+    insert_runs = sql.text("""
+        INSERT INTO raw_bitemporal_double_packed(dp_id, transaction_time, valid_from, step, value_array)
+            SELECT :dp_id, runs.valid_from - INTERVAL '1 hour', runs.valid_from, INTERVAL '1 hour', ARRAY[1, 2, 3]
+                FROM generate_series(:first_run, :last_run, INTERVAL '1 day') AS runs(valid_from);
+    """)
+    with sql_engine_data_source.begin() as con:
+        con.execute(insert_runs, parameters=dict(dp_id=dp_id, first_run="2025-01-01T00:00:00Z",
+                                                 last_run="2025-01-31T00:00:00Z"))
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("""
+            SELECT add_reorder_policy('raw_bitemporal_double_packed', 'raw_bitemporal_double_packed_valid_to_idx');
+        """))
+        jobs_before = con.execute(sql.text("""
+            SELECT proc_name FROM timescaledb_information.jobs
+                WHERE hypertable_name = 'raw_bitemporal_double_packed'
+                ORDER BY proc_name;
+        """)).scalars().all()
+    with sql_engine_postgres.connect() as con:
+        con = con.execution_options(isolation_level="AUTOCOMMIT")
+        con.execute(sql.text("SELECT rdp_set_space_partitioning('raw_bitemporal_double_packed', 4);"))
+        con.execute(sql.text("""
+            SELECT rdp_copy_space_partitioning_chunk(c) FROM show_chunks('raw_bitemporal_double_packed') AS c;
+        """))
+
+    # The feeders keep on writing while the table is rebuilt
+    with sql_engine_data_source.begin() as con:
+        con.execute(insert_runs, parameters=dict(dp_id=dp_id, first_run="2025-02-01T00:00:00Z",
+                                                 last_run="2025-02-01T00:00:00Z"))
+
+    with sql_engine_postgres.begin() as con:
+        recopied_rows = con.execute(sql.text("""
+            SELECT rdp_finish_space_partitioning('raw_bitemporal_double_packed');
+        """)).scalar_one()
+        run_count = con.execute(sql.text("SELECT count(*) FROM raw_bitemporal_double_packed;")).scalar_one()
+        jobs_after = con.execute(sql.text("""
+            SELECT proc_name FROM timescaledb_information.jobs
+                WHERE hypertable_name = 'raw_bitemporal_double_packed'
+                ORDER BY proc_name;
+        """)).scalars().all()
+
+    assert recopied_rows > 0
+    assert run_count == 32
+    assert jobs_before == ["policy_compression", "policy_reorder"]
+    assert jobs_after == jobs_before
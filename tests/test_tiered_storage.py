@@ -0,0 +1,115 @@
+"""
+Tests moving the cold chunks of the raw tables to a dedicated tablespace
+"""
+import os
+
+import pandas as pd
+import pytest
+import sqlalchemy.dialects
+import sqlalchemy.sql as sql
+
+
+@pytest.fixture()
+def cold_tablespace(clean_db, sql_engine_postgres) -> str:
+    """
+    Creates the cold tablespace, if needed
+
+    By default, an in-place tablespace inside the data directory is used. Set RDP_TEST_COLD_TABLESPACE_LOCATION to an
+    existing, empty directory on the database server to use a dedicated location instead.
+    """
+
+    tablespace = "rdp_test_cold"
+    location = os.environ.get("RDP_TEST_COLD_TABLESPACE_LOCATION", "")
+
+    with sql_engine_postgres.connect() as con:
+        con = con.execution_options(isolation_level="AUTOCOMMIT")
+        exists = con.execute(sql.text("SELECT EXISTS (SELECT FROM pg_tablespace WHERE spcname = :tablespace);"),
+                             parameters=dict(tablespace=tablespace)).scalar_one()
+        if not exists:
+            if location == "":
+                con.execute(sql.text("SET allow_in_place_tablespaces = on;"))
+            con.execute(sql.text(f"CREATE TABLESPACE {tablespace} LOCATION '{location}';"))
+
+    return tablespace
+
+
+def test_move_cold_chunks(basic_dp_test_set, cold_tablespace, sql_engine_data_source, sql_engine_postgres):
+    """Tests the throttled movement of the compressed chunks and the usage report"""
+
+    dp_id = basic_dp_test_set["loc2-dev0-pr-0-uni-dbl-0"]
+    with sql_engine_data_source.begin() as con:
+        con.execute(sql.text("""
+            INSERT INTO raw_unitemporal_double(dp_id, valid_time, value)
+                SELECT :dp_id, valid_time, 1.0
+                    FROM generate_series(
+                        '2020-01-01T00:00:00Z'::TIMESTAMPTZ, '2020-01-03T23:00:00Z', INTERVAL '1 hour'
+                    ) AS valid_time;
+            INSERT INTO raw_unitemporal_double(dp_id, valid_time, value) VALUES (:dp_id, now(), 2.0);
+        """), parameters=dict(dp_id=dp_id))
+
+    with sql_engine_postgres.begin() as con:
+        con.execute(sql.text("""
+            SELECT compress_chunk(c) FROM show_chunks('raw_unitemporal_double', older_than => INTERVAL '1 year') AS c;
+        """))
+
+    def move_chunks(max_chunks):
+        with sql_engine_postgres.connect() as con:
+            con = con.execution_options(isolation_level="AUTOCOMMIT")
+            con.execute(sql.text("""
+                CALL rdp_move_cold_chunks(NULL, jsonb_build_object(
+                    'tablespace', CAST(:tablespace AS TEXT), 'move_after', '30 days', 'max_chunks', :max_chunks
+                ));
+            """), parameters=dict(tablespace=cold_tablespace, max_chunks=max_chunks))
+
+        with sql_engine_postgres.begin() as con:
+            return pd.read_sql("""
+                SELECT tablespace_name, chunk_count, compressed_chunk_count
+                    FROM rdp_tablespace_usage
+                    WHERE hypertable_name = 'raw_unitemporal_double'
+                    ORDER BY tablespace_name;
+            """, con)
+
+    # Only the number of chunks per run is moved
+    pd.testing.assert_frame_equal(move_chunks(1), pd.DataFrame({
+        "tablespace_name": ["pg_default", cold_tablespace],
+        "chunk_count": [3, 1],
+        "compressed_chunk_count": [2, 1],
+    }), check_names=False)
+
+    # The recent and uncompressed chunk is kept
+    pd.testing.assert_frame_equal(move_chunks(10), pd.DataFrame({
+        "tablespace_name": ["pg_default", cold_tablespace],
+        "chunk_count": [1, 3],
+        "compressed_chunk_count": [0, 3],
+    }), check_names=False)
+
+    with sql_engine_postgres.begin() as con:
+        row_count = con.execute(sql.text("SELECT count(*) FROM raw_unitemporal_double;")).scalar_one()
+        index_tablespaces = con.execute(sql.text("""
+            SELECT DISTINCT COALESCE(ts.spcname, 'pg_default')
+                FROM timescaledb_information.chunks AS chunks
+                JOIN pg_index AS idx
+                    ON (idx.indrelid = format('%I.%I', chunks.chunk_schema, chunks.chunk_name)::REGCLASS)
+                JOIN pg_class AS cls ON (cls.oid = idx.indexrelid)
+                LEFT JOIN pg_tablespace AS ts ON (ts.oid = cls.reltablespace)
+                WHERE chunks.hypertable_name = 'raw_unitemporal_double' AND chunks.is_compressed;
+        """)).scalars().all()
+
+    assert row_count == 3 * 24 + 1
+    assert index_tablespaces == [cold_tablespace]
+
+
+def test_move_cold_chunks_unconfigured(clean_db, sql_engine_postgres):
+    """Tests whether the job is registered but does not move anything without a tablespace"""
+
+    with sql_engine_postgres.connect() as con:
+        con = con.execution_options(isolation_level="AUTOCOMMIT")
+        config = con.execute(sql.text("""
+            SELECT config FROM timescaledb_information.jobs WHERE proc_name = 'rdp_move_cold_chunks';
+        """)).scalar_one()
+        con.execute(sql.text("CALL rdp_move_cold_chunks(NULL, :config);").bindparams(
+            sql.bindparam("config", config, type_=sqlalchemy.dialects.postgresql.JSONB)
+        ))
+
+    assert config["tablespace"] is None
+    assert config["move_after"] == "30 days"